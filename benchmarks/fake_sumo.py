@@ -0,0 +1,112 @@
+#!/usr/bin/env python
+"""A stand-in of the `sumo` command for tests and benchmarks. It writes an E1 detector output instead of simulating.
+Only the standard library is imported, so it starts fast. `tests/resources/fake_sumo.py` runs this file.
+
+The banner is the one `LocalSumoController.check_connection` expects.
+The process reads the config as SUMO does. The output has a row per detector of the additional files and
+per interval of <begin>-<end> by `freq` of the detectors, and it is written to <output-prefix> + the output name.
+`--save-state.files` writes a dummy state. <load-state> of the config is reported in stdout.
+
+Environment variables overwrite the scenario:
+    FAKE_SUMO_SLEEP: seconds to sleep as if simulating. Default 0.
+    FAKE_SUMO_SLEEP_AFTER_OUTPUT: seconds to sleep after writing the output. Default 0.
+    FAKE_SUMO_N_DETECTORS: the number of detectors in the output. Detectors of the scenario, or 64.
+    FAKE_SUMO_N_INTERVALS: the number of intervals in the output. Intervals of the scenario, or 24.
+    FAKE_SUMO_OUTPUT_NAME: a file name of the output. Default "grid_loop.out.xml".
+"""
+import os
+import sys
+import time
+import typing
+import xml.etree.ElementTree as ElementTree
+from pathlib import Path
+
+BANNER = 'Eclipse SUMO sumo Version 1.9.1\n Copyright (C) 2001-2021 German Aerospace Center (DLR) and others.\n'
+ROW = '    <interval begin="{begin:.2f}" end="{end:.2f}" id="d{i}" nVehContrib="{n}" flow="{flow:.2f}" ' \
+      'harmonicMeanSpeed="{speed:.2f}" occupancy="{occupancy:.2f}" speed="{speed:.2f}" length="5.00" ' \
+      'nVehEntered="{n}"/>\n'
+DEFAULT_N_DETECTORS = 64
+DEFAULT_N_INTERVALS = 24
+DEFAULT_LENGTH_INTERVAL = 300.0
+
+
+def write_output(path_output: Path, n_detectors: int, n_intervals: int, length_interval: float = 300.0):
+    path_output.parent.mkdir(parents=True, exist_ok=True)
+    with path_output.open('w') as f:
+        f.write('<?xml version="1.0" encoding="UTF-8"?>\n<detector>\n')
+        for i_interval in range(n_intervals):
+            begin = i_interval * length_interval
+            f.write(''.join(ROW.format(begin=begin, end=begin + length_interval, i=i,
+                                       n=(i + i_interval) % 17, flow=12.0 * ((i + i_interval) % 17),
+                                       speed=5.0 + (i * 7 + i_interval) % 11, occupancy=(i + 3 * i_interval) % 23 / 2)
+                            for i in range(n_detectors)))
+        # end for
+        f.write('</detector>\n')
+    # end with
+
+
+def get_value(root: ElementTree.Element, path: str) -> typing.Optional[str]:
+    element = root.find(path)
+    return element.attrib.get('value') if element is not None else None
+
+
+def read_detectors(root: ElementTree.Element, path_config_dir: Path) -> typing.List[ElementTree.Element]:
+    """E1 detectors of the additional files of the config."""
+    seq_detectors = []
+    for name in (get_value(root, 'input/additional-files') or '').split(','):
+        path_additional = path_config_dir.joinpath(name.strip())
+        if name.strip() == '' or not path_additional.exists():
+            continue
+        # end if
+        root_additional = ElementTree.parse(str(path_additional)).getroot()
+        seq_detectors += list(root_additional.iter('e1Detector')) + list(root_additional.iter('inductionLoop'))
+    # end for
+    return seq_detectors
+
+
+def main(args) -> int:
+    if len(args) == 0 or args[0] == '-V':
+        sys.stdout.write(BANNER)
+        return 0
+    # end if
+    path_cfg = Path(args[args.index('-c') + 1])
+    time.sleep(float(os.environ.get('FAKE_SUMO_SLEEP', '0')))
+    root = ElementTree.parse(str(path_cfg)).getroot()
+    path_load_state = get_value(root, 'input/load-state')
+    if path_load_state is not None:
+        path_state = path_cfg.parent.joinpath(path_load_state)
+        sys.stdout.write(f'Loading state from "{path_state}" ({len(path_state.read_bytes())} bytes)\n')
+    # end if
+    if '--save-state.files' in args:
+        Path(args[args.index('--save-state.files') + 1]).write_text('<snapshot time="1800.00"/>\n')
+    # end if
+
+    seq_detectors = read_detectors(root, path_cfg.parent)
+    length_interval = float(seq_detectors[0].attrib.get('freq', DEFAULT_LENGTH_INTERVAL)) \
+        if len(seq_detectors) > 0 else DEFAULT_LENGTH_INTERVAL
+    time_begin = float(get_value(root, 'time/begin') or '0')
+    time_end = float(get_value(root, 'time/end') or '-1')
+    if 'FAKE_SUMO_N_INTERVALS' in os.environ:
+        n_intervals = int(os.environ['FAKE_SUMO_N_INTERVALS'])
+    elif time_end > time_begin:
+        n_intervals = max(1, int((time_end - time_begin) // length_interval))
+    else:
+        n_intervals = DEFAULT_N_INTERVALS
+    # end if
+    if 'FAKE_SUMO_N_DETECTORS' in os.environ:
+        n_detectors = int(os.environ['FAKE_SUMO_N_DETECTORS'])
+    else:
+        n_detectors = len(seq_detectors) if len(seq_detectors) > 0 else DEFAULT_N_DETECTORS
+    # end if
+    output_prefix = get_value(root, 'output/output-prefix') or ''
+    write_output(path_cfg.parent.joinpath(output_prefix + os.environ.get('FAKE_SUMO_OUTPUT_NAME', 'grid_loop.out.xml')),
+                 n_detectors=n_detectors,
+                 n_intervals=n_intervals,
+                 length_interval=length_interval)
+    time.sleep(float(os.environ.get('FAKE_SUMO_SLEEP_AFTER_OUTPUT', '0')))
+    sys.stdout.write(f'Simulation ended at time: {time_begin + n_intervals * length_interval:.2f}\n')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,373 @@
+"""Benchmarks of the package's own overhead. SUMO is replaced by `benchmarks/fake_sumo.py`.
+
+Run from the repository root.
+
+    python -m benchmarks.run_benchmarks --output benchmark.json
+    python -m benchmarks.run_benchmarks --quick
+    python -m benchmarks.run_benchmarks --baseline benchmark.json --max-slowdown 1.2
+    python -m benchmarks.run_benchmarks --gcs-endpoint http://localhost:4443
+
+`--gcs-endpoint` runs `GcsFileHandler` against a local fake GCS server,
+Ex. `docker run -d -p 4443:4443 fsouza/fake-gcs-server -scheme http`.
+With `--baseline`, the process exits with 1 when a benchmark is slower than the baseline by `--max-slowdown`.
+"""
+import argparse
+import dataclasses
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import time
+import typing
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from tempfile import mkdtemp
+
+from sumo_tasks_pipeline import static
+from sumo_tasks_pipeline.commons.result_module import SumoResultObjects
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+from sumo_tasks_pipeline.config_generation_module import Template2SuMoConfig, CompiledTemplate
+from sumo_tasks_pipeline.file_handler import LocalFileHandler, GcsFileHandler, BaseFileHandler
+from sumo_tasks_pipeline.output_parser_module import parse_detector_output, save_columnar, load_columnar
+from sumo_tasks_pipeline.pipeline.pipeline import LocalSumoPipeline
+
+from .fake_sumo import write_output
+from .synthetic_scenario import generate_grid_template, generate_update_values, fill_wildcards
+
+PATH_FAKE_SUMO = Path(__file__).absolute().parent.joinpath('fake_sumo.py')
+PREFIX_JOB_ID = 'bench-'
+
+
+@dataclasses.dataclass
+class BenchmarkResult(object):
+    """Seconds of repeated runs of a benchmark.
+
+    Args:
+        name: a benchmark name.
+        params: parameters of the benchmark. A result is compared with the baseline of the same name and params.
+        n_items: the number of items (configs, jobs, files) processed in a run.
+        seconds: wall-clock seconds of runs.
+    """
+    name: str
+    params: typing.Dict[str, typing.Any]
+    n_items: int
+    seconds: typing.List[float]
+
+    @property
+    def key(self) -> str:
+        return f'{self.name}:{json.dumps(self.params, sort_keys=True)}'
+
+    def to_dict(self) -> typing.Dict[str, typing.Any]:
+        median = statistics.median(self.seconds)
+        return {'name': self.name,
+                'params': self.params,
+                'n_items': self.n_items,
+                'seconds': self.seconds,
+                'min_seconds': min(self.seconds),
+                'median_seconds': median,
+                'seconds_per_item': median / self.n_items,
+                'items_per_second': self.n_items / median if median > 0 else None}
+
+
+def measure(func: typing.Callable[[], typing.Any],
+            n_repeat: int,
+            setup: typing.Optional[typing.Callable[[], typing.Any]] = None,
+            teardown: typing.Optional[typing.Callable[[], typing.Any]] = None) -> typing.List[float]:
+    """Wall-clock seconds of `func`. `setup` and `teardown` run around each call and are not measured."""
+    seq_seconds = []
+    for __ in range(n_repeat):
+        if setup is not None:
+            setup()
+        # end if
+        time_start = time.perf_counter()
+        func()
+        seq_seconds.append(time.perf_counter() - time_start)
+        if teardown is not None:
+            teardown()
+        # end if
+    # end for
+    return seq_seconds
+
+
+def reset_dir(path_dir: Path):
+    shutil.rmtree(path_dir, ignore_errors=True)
+    path_dir.mkdir(parents=True)
+
+
+def bench_template_generation(path_work: Path,
+                              seq_n_wildcards: typing.List[int],
+                              n_configs: int,
+                              n_repeat: int) -> typing.List[BenchmarkResult]:
+    seq_results = []
+    for n_wildcards in seq_n_wildcards:
+        path_template = generate_grid_template(path_work.joinpath(f'template-{n_wildcards}'), n_wildcards=n_wildcards)
+        seq_values = [generate_update_values(n_wildcards, seed=i) for i in range(n_configs)]
+        path_generated = path_work.joinpath(f'generated-{n_wildcards}')
+
+        def run_template2sumo_config():
+            for i, values in enumerate(seq_values):
+                generator = Template2SuMoConfig(path_config_file=path_template,
+                                                path_destination_dir=path_generated.joinpath(str(i)))
+                generator.update_configs(values)
+                generator.generate_updated_config_file()
+            # end for
+
+        def run_compiled_template():
+            template = CompiledTemplate(path_template)
+            template.render_many(seq_values, [path_generated.joinpath(str(i)) for i in range(n_configs)])
+
+        for name, func in (('template2sumo_config', run_template2sumo_config),
+                           ('compiled_template', run_compiled_template)):
+            seq_seconds = measure(func, n_repeat,
+                                  setup=lambda: reset_dir(path_generated),
+                                  teardown=lambda: shutil.rmtree(path_generated, ignore_errors=True))
+            seq_results.append(BenchmarkResult(name=name,
+                                               params={'n_wildcards': n_wildcards, 'n_configs': n_configs},
+                                               n_items=n_configs,
+                                               seconds=seq_seconds))
+        # end for
+    # end for
+    return seq_results
+
+
+def remove_staged_dirs():
+    """Remove job directories that `LocalSumoController` copied for the benchmark."""
+    path_copied = Path(static.PATH_PACKAGE_WORK_DIR).joinpath(static.SUBDIRECTORY_COPIED)
+    if not path_copied.exists():
+        return
+    # end if
+    for path_dir in path_copied.glob(f'{PREFIX_JOB_ID}*'):
+        shutil.rmtree(path_dir, ignore_errors=True)
+    # end for
+
+
+def bench_pipeline_dispatch(path_work: Path,
+                            seq_n_jobs: typing.List[int],
+                            n_processes: int,
+                            staging_mode: str,
+                            n_repeat: int) -> typing.List[BenchmarkResult]:
+    """`LocalSumoPipeline` against spawning the fake `sumo` directly. The difference is the pipeline overhead."""
+    # a few detectors, so that the benchmark measures the pipeline rather than writing outputs.
+    path_config = fill_wildcards(generate_grid_template(path_work.joinpath('scenario'), n_wildcards=4, n_detectors=4),
+                                 4)
+    path_save_root = path_work.joinpath('saved')
+    seq_results = []
+    for n_jobs in seq_n_jobs:
+        sumo_configs = [SumoConfigObject(scenario_name=f'{PREFIX_JOB_ID}{i}',
+                                         path_config_dir=path_config.parent,
+                                         config_name=path_config.name) for i in range(n_jobs)]
+
+        def run_pipeline():
+            pipeline = LocalSumoPipeline(sumo_command=str(PATH_FAKE_SUMO),
+                                         file_handler=LocalFileHandler(path_save_root=path_save_root),
+                                         n_jobs=n_processes,
+                                         staging_mode=staging_mode)
+            seq_sumo_results = pipeline.run_simulation(sumo_configs)
+            assert len(seq_sumo_results) == n_jobs, f'{len(pipeline.failed_job_ids)} jobs failed.'
+
+        def run_processes():
+            command = [sys.executable, str(PATH_FAKE_SUMO), '-c', str(path_config)]
+            with ThreadPoolExecutor(n_processes) as pool:
+                for process in pool.map(lambda __: subprocess.run(command, stdout=subprocess.DEVNULL), range(n_jobs)):
+                    assert process.returncode == 0
+                # end for
+            # end with
+
+        def teardown():
+            shutil.rmtree(path_save_root, ignore_errors=True)
+            remove_staged_dirs()
+
+        params = {'n_jobs': n_jobs, 'n_processes': n_processes, 'staging_mode': staging_mode}
+        seq_results.append(BenchmarkResult(name='local_pipeline_dispatch', params=params, n_items=n_jobs,
+                                           seconds=measure(run_pipeline, n_repeat,
+                                                           setup=lambda: reset_dir(path_save_root),
+                                                           teardown=teardown)))
+        seq_results.append(BenchmarkResult(name='process_spawn_baseline',
+                                           params={'n_jobs': n_jobs, 'n_processes': n_processes},
+                                           n_items=n_jobs,
+                                           seconds=measure(run_processes, n_repeat)))
+    # end for
+    return seq_results
+
+
+def bench_file_handler(name: str,
+                       create_file_handler: typing.Callable[[], BaseFileHandler],
+                       path_work: Path,
+                       n_jobs: int,
+                       n_repeat: int) -> typing.List[BenchmarkResult]:
+    """start_job, get_job_statuses, save_file and end_job of `n_jobs` jobs."""
+    path_config = fill_wildcards(generate_grid_template(path_work.joinpath('scenario-handler'), n_wildcards=4), 4)
+    write_output(path_config.parent.joinpath('output/grid_loop.out.xml'), n_detectors=64, n_intervals=24)
+    sumo_result = SumoResultObjects(id_scenario='bench',
+                                    sumo_config_obj=SumoConfigObject(scenario_name='bench',
+                                                                     path_config_dir=path_config.parent,
+                                                                     config_name=path_config.name),
+                                    path_output_dir=path_config.parent.joinpath('output'))
+    seq_results = []
+    d_operation2seconds: typing.Dict[str, typing.List[float]] = {}
+    for __ in range(n_repeat):
+        file_handler = create_file_handler()
+        seq_job_ids = [f'{PREFIX_JOB_ID}{uuid.uuid4()}' for __ in range(n_jobs)]
+        seq_operations = [('start_job', lambda: [file_handler.start_job(job_id) for job_id in seq_job_ids]),
+                          ('get_job_statuses', lambda: file_handler.get_job_statuses(seq_job_ids)),
+                          ('save_file',
+                           lambda: [file_handler.save_file(job_id, sumo_result) for job_id in seq_job_ids]),
+                          ('end_job', lambda: [file_handler.end_job(job_id) for job_id in seq_job_ids])]
+        for operation, func in seq_operations:
+            d_operation2seconds.setdefault(operation, []).extend(measure(func, 1))
+        # end for
+    # end for
+    for operation, seq_seconds in d_operation2seconds.items():
+        seq_results.append(BenchmarkResult(name=f'{name}.{operation}', params={'n_jobs': n_jobs},
+                                           n_items=n_jobs, seconds=seq_seconds))
+    # end for
+    return seq_results
+
+
+def bench_output_parsing(path_work: Path,
+                         seq_sizes: typing.List[typing.Tuple[int, int]],
+                         n_repeat: int) -> typing.List[BenchmarkResult]:
+    """Parsing of XML and gzip outputs, and reading npz files converted from them."""
+    seq_results = []
+    for n_detectors, n_intervals in seq_sizes:
+        path_xml = path_work.joinpath(f'parse-{n_detectors}x{n_intervals}.out.xml')
+        write_output(path_xml, n_detectors=n_detectors, n_intervals=n_intervals)
+        path_gz = path_xml.with_name(path_xml.name + '.gz')
+        subprocess.run(['gzip', '-k', '-f', str(path_xml)], check=True)
+        path_npz = save_columnar(parse_detector_output(path_xml), path_xml.with_name(path_xml.name + '.npz'),
+                                 is_compress=True)
+        params = {'n_detectors': n_detectors, 'n_intervals': n_intervals}
+        for name, func in (('parse_xml', lambda: parse_detector_output(path_xml)),
+                           ('parse_xml_gzip', lambda: parse_detector_output(path_gz)),
+                           ('load_npz', lambda: load_columnar(path_npz, attributes=None))):
+            seq_results.append(BenchmarkResult(name=name, params=params, n_items=n_detectors * n_intervals,
+                                               seconds=measure(func, n_repeat)))
+        # end for
+    # end for
+    return seq_results
+
+
+def get_git_commit() -> typing.Optional[str]:
+    try:
+        process = subprocess.run(['git', 'rev-parse', 'HEAD'], stdout=subprocess.PIPE, stderr=subprocess.DEVNULL,
+                                 cwd=Path(__file__).parent)
+    except OSError:
+        return None
+    # end try
+    return process.stdout.decode('utf-8').strip() if process.returncode == 0 else None
+
+
+def compare_with_baseline(seq_results: typing.List[BenchmarkResult],
+                          path_baseline: Path,
+                          max_slowdown: float) -> typing.List[str]:
+    """Returns: messages of benchmarks slower than the baseline. Benchmarks not in the baseline are skipped."""
+    with Path(path_baseline).open() as f:
+        baseline = json.load(f)
+    # end with
+    d_key2median = {f'{r["name"]}:{json.dumps(r["params"], sort_keys=True)}': r['median_seconds']
+                    for r in baseline['results']}
+    seq_messages = []
+    for result in seq_results:
+        if result.key not in d_key2median:
+            continue
+        # end if
+        ratio = statistics.median(result.seconds) / d_key2median[result.key]
+        if ratio > max_slowdown:
+            seq_messages.append(f'{result.key} is {ratio:.2f} times slower than the baseline.')
+        # end if
+    # end for
+    return seq_messages
+
+
+def main(args: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', type=Path, default=None, help='a JSON file of results. stdout if not given.')
+    parser.add_argument('--quick', action='store_true', help='small sizes for a smoke test.')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--only', nargs='*', default=None,
+                        choices=['template', 'dispatch', 'local_file_handler', 'gcs_file_handler', 'parsing'])
+    parser.add_argument('--dispatch-jobs', type=int, nargs='*', default=[1000, 10000])
+    parser.add_argument('--n-processes', type=int, default=os.cpu_count())
+    parser.add_argument('--staging-mode', default='hardlink')
+    parser.add_argument('--gcs-endpoint', default=None, help='an endpoint of a fake GCS server.')
+    parser.add_argument('--gcs-project', default='benchmark')
+    parser.add_argument('--baseline', type=Path, default=None, help='a JSON file of a previous run.')
+    parser.add_argument('--max-slowdown', type=float, default=1.2)
+    parsed = parser.parse_args(args)
+
+    if parsed.quick:
+        n_repeat, seq_n_wildcards, n_configs, seq_dispatch_jobs, n_handler_jobs = 1, [4, 16], 5, [10], 5
+        seq_parse_sizes = [(16, 8)]
+    else:
+        n_repeat, seq_n_wildcards, n_configs, seq_dispatch_jobs, n_handler_jobs = \
+            parsed.repeat, [10, 100, 1000], 100, parsed.dispatch_jobs, 200
+        seq_parse_sizes = [(64, 96), (256, 288), (1024, 288)]
+    # end if
+    set_targets = set(parsed.only) if parsed.only is not None else \
+        {'template', 'dispatch', 'local_file_handler', 'gcs_file_handler', 'parsing'}
+
+    path_work = Path(mkdtemp(prefix='sumo-tasks-pipeline-benchmark-'))
+    seq_results: typing.List[BenchmarkResult] = []
+    try:
+        if 'template' in set_targets:
+            seq_results += bench_template_generation(path_work, seq_n_wildcards, n_configs, n_repeat)
+        # end if
+        if 'dispatch' in set_targets:
+            seq_results += bench_pipeline_dispatch(path_work, seq_dispatch_jobs, parsed.n_processes,
+                                                   parsed.staging_mode, n_repeat)
+        # end if
+        if 'local_file_handler' in set_targets:
+            path_save_root = path_work.joinpath('local-file-handler')
+            path_save_root.mkdir()
+            seq_results += bench_file_handler('local_file_handler', lambda: LocalFileHandler(path_save_root),
+                                              path_work, n_handler_jobs, n_repeat)
+        # end if
+        if 'gcs_file_handler' in set_targets and parsed.gcs_endpoint is not None:
+            bucket_name = f'benchmark-{uuid.uuid4().hex[:12]}'
+            GcsFileHandler(parsed.gcs_project, bucket_name, api_endpoint=parsed.gcs_endpoint).create_bucket()
+            seq_results += bench_file_handler(
+                'gcs_file_handler',
+                lambda: GcsFileHandler(parsed.gcs_project, bucket_name, api_endpoint=parsed.gcs_endpoint),
+                path_work, n_handler_jobs, n_repeat)
+        # end if
+        if 'parsing' in set_targets:
+            seq_results += bench_output_parsing(path_work, seq_parse_sizes, n_repeat)
+        # end if
+    finally:
+        shutil.rmtree(path_work, ignore_errors=True)
+        remove_staged_dirs()
+    # end try
+
+    report = {'meta': {'created_at': datetime.utcnow().isoformat(),
+                       'git_commit': get_git_commit(),
+                       'python': platform.python_version(),
+                       'platform': platform.platform(),
+                       'cpu_count': os.cpu_count(),
+                       'is_quick': parsed.quick},
+              'results': [r.to_dict() for r in seq_results]}
+    if parsed.output is None:
+        json.dump(report, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with parsed.output.open('w') as f:
+            json.dump(report, f, indent=2)
+        # end with
+    # end if
+
+    if parsed.baseline is not None:
+        seq_messages = compare_with_baseline(seq_results, parsed.baseline, parsed.max_slowdown)
+        for message in seq_messages:
+            sys.stderr.write(f'REGRESSION: {message}\n')
+        # end for
+        return 1 if len(seq_messages) > 0 else 0
+    # end if
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,137 @@
+"""Generate synthetic grid scenarios for benchmarks.
+
+The network has the structure of `netgenerate --grid` output (junctions, edges and lanes) without connections
+and shapes. It is enough for the fake `sumo` and for the package's own code; the real SUMO needs a network
+built with `netgenerate --grid --grid.number {size}`.
+"""
+import random
+import typing
+from pathlib import Path
+
+LENGTH_EDGE = 100.0
+NAME_CONFIG = 'grid.sumo.cfg'
+NAME_FLOWS = 'grid.flows.xml'
+
+
+def write_net(path_net: Path, grid_size: int):
+    def junction_id(x: int, y: int) -> str:
+        return f'J{x}_{y}'
+
+    seq_lines = ['<?xml version="1.0" encoding="UTF-8"?>\n', '<net version="1.9" junctionCornerDetail="5">\n',
+                 f'    <location netOffset="0.00,0.00" convBoundary="0.00,0.00,{LENGTH_EDGE * (grid_size - 1):.2f},'
+                 f'{LENGTH_EDGE * (grid_size - 1):.2f}" projParameter="!"/>\n']
+    for x in range(grid_size):
+        for y in range(grid_size):
+            for dx, dy in ((1, 0), (-1, 0), (0, 1), (0, -1)):
+                x_to, y_to = x + dx, y + dy
+                if not (0 <= x_to < grid_size and 0 <= y_to < grid_size):
+                    continue
+                # end if
+                edge_id = f'{junction_id(x, y)}to{junction_id(x_to, y_to)}'
+                seq_lines.append(f'    <edge id="{edge_id}" from="{junction_id(x, y)}" to="{junction_id(x_to, y_to)}" '
+                                 f'priority="-1">\n')
+                seq_lines.append(f'        <lane id="{edge_id}_0" index="0" speed="13.89" length="{LENGTH_EDGE:.2f}" '
+                                 f'shape="{x * LENGTH_EDGE:.2f},{y * LENGTH_EDGE:.2f} '
+                                 f'{x_to * LENGTH_EDGE:.2f},{y_to * LENGTH_EDGE:.2f}"/>\n')
+                seq_lines.append('    </edge>\n')
+            # end for
+        # end for
+    # end for
+    for x in range(grid_size):
+        for y in range(grid_size):
+            seq_lines.append(f'    <junction id="{junction_id(x, y)}" type="priority" '
+                             f'x="{x * LENGTH_EDGE:.2f}" y="{y * LENGTH_EDGE:.2f}" incLanes="" intLanes=""/>\n')
+        # end for
+    # end for
+    seq_lines.append('</net>\n')
+    path_net.write_text(''.join(seq_lines))
+
+
+def write_flows(path_flows: Path, grid_size: int, n_wildcards: int):
+    """One flow per wildcard. `vehsPerHour` of every flow is the wildcard."""
+    seq_lines = ['<?xml version="1.0" encoding="UTF-8"?>\n', '<routes>\n',
+                 '    <vType id="passenger" accel="2.6" decel="4.5" sigma="0.5" length="5" maxSpeed="13.89"/>\n']
+    last = grid_size - 1
+    for i in range(n_wildcards):
+        y = i % grid_size
+        seq_lines.append(f'    <flow id="f{i}" type="passenger" begin="0" end="3600" vehsPerHour="?" '
+                         f'from="J0_{y}toJ1_{y}" to="J{last - 1}_{y}toJ{last}_{y}"/>\n')
+    # end for
+    seq_lines.append('</routes>\n')
+    path_flows.write_text(''.join(seq_lines))
+
+
+def write_detectors(path_detectors: Path, grid_size: int, n_detectors: int):
+    seq_lines = ['<?xml version="1.0" encoding="UTF-8"?>\n', '<additional>\n']
+    for i in range(n_detectors):
+        x, y = i % (grid_size - 1), (i // (grid_size - 1)) % grid_size
+        seq_lines.append(f'    <e1Detector id="d{i}" lane="J{x}_{y}toJ{x + 1}_{y}_0" pos="50.0" freq="300" '
+                         f'file="grid_loop.out.xml"/>\n')
+    # end for
+    seq_lines.append('</additional>\n')
+    path_detectors.write_text(''.join(seq_lines))
+
+
+def write_config(path_config: Path):
+    path_config.write_text(f"""<?xml version="1.0" encoding="UTF-8"?>
+<configuration>
+    <input>
+        <net-file value="grid.net.xml"/>
+        <route-files value="{NAME_FLOWS}"/>
+        <additional-files value="grid_detectors.det.xml"/>
+    </input>
+    <output>
+        <output-prefix value="output/"/>
+    </output>
+    <time>
+        <begin value="0"/>
+        <end value="7200"/>
+    </time>
+    <random_number>
+        <seed value="42"/>
+    </random_number>
+</configuration>
+""")
+
+
+def generate_grid_template(path_dir: Path,
+                           grid_size: int = 10,
+                           n_wildcards: int = 10,
+                           n_detectors: int = 64) -> Path:
+    """Write a grid scenario whose flows have `n_wildcards` wildcard slots.
+
+    Args:
+        path_dir: a directory to write files.
+        grid_size: the number of junctions on a side.
+        n_wildcards: the number of `?` attributes in the flows file.
+        n_detectors: the number of E1 detectors.
+    Returns: a path to the sumo.cfg template.
+    """
+    assert grid_size >= 3, f'grid_size must be >= 3. Given {grid_size}'
+    path_dir = Path(path_dir)
+    path_dir.joinpath('output').mkdir(parents=True, exist_ok=True)
+    write_net(path_dir.joinpath('grid.net.xml'), grid_size)
+    write_flows(path_dir.joinpath(NAME_FLOWS), grid_size, n_wildcards)
+    write_detectors(path_dir.joinpath('grid_detectors.det.xml'), grid_size, n_detectors)
+    write_config(path_dir.joinpath(NAME_CONFIG))
+    return path_dir.joinpath(NAME_CONFIG)
+
+
+def generate_update_values(n_wildcards: int, seed: int = 0
+                           ) -> typing.Dict[str, typing.Dict[str, typing.Dict[str, typing.Any]]]:
+    """Values for the wildcards of `generate_grid_template`. {"sub config file name": {"xml key": {values}}}"""
+    random_generator = random.Random(seed)
+    return {NAME_FLOWS: {f'/routes/flow[{i + 1}]': {'vehsPerHour': random_generator.randint(100, 1200)}
+                         for i in range(n_wildcards)}}
+
+
+def fill_wildcards(path_config: Path, n_wildcards: int, seed: int = 0) -> Path:
+    """Replace wildcards in place so that the scenario can run. Returns `path_config`."""
+    path_flows = Path(path_config).parent.joinpath(NAME_FLOWS)
+    values = generate_update_values(n_wildcards, seed)[NAME_FLOWS]
+    text = path_flows.read_text()
+    for i in range(n_wildcards):
+        text = text.replace('vehsPerHour="?"', f'vehsPerHour="{values[f"/routes/flow[{i + 1}]"]["vehsPerHour"]}"', 1)
+    # end for
+    path_flows.write_text(text)
+    return Path(path_config)
@@ -6,11 +6,11 @@ import numpy
 sys.path.append('../')
 
 from sumo_tasks_pipeline import DockerPipeline
-from sumo_tasks_pipeline import Template2SuMoConfig
+from sumo_tasks_pipeline import CompiledTemplate
 from sumo_tasks_pipeline import SumoConfigObject
+from sumo_tasks_pipeline import ResultCollection
 from sumo_tasks_pipeline.logger_unit import logger
 from sumo_tasks_pipeline.static import PATH_PACKAGE_WORK_DIR
-import sumo_output_parsers
 
 from pathlib import Path
 
@@ -26,14 +26,12 @@ def generate_multiple_simulations(path_sumo_cfg: Path,
         list of `Path` where generated configuration files exist.
     """
     # region update configurations
-    seq_mount_dirs = []
-    for simulation_i in range(0, n_simulation):
-        # a path to directory where docker mounts
-        path_mounted = Path(PATH_PACKAGE_WORK_DIR).joinpath(str(simulation_i)).absolute()
-        config_convertor = Template2SuMoConfig(path_config_file=path_sumo_cfg, path_destination_dir=path_mounted)
-        config_convertor.update_configs({'grid.flows.xml': flow_configs})
-        config_convertor.generate_updated_config_file()
-        seq_mount_dirs.append(path_mounted)
+    # the template is parsed once. Every simulation is rendered from it.
+    compiled_template = CompiledTemplate(path_config_file=path_sumo_cfg)
+    # a path to directory where docker mounts
+    seq_mount_dirs = [Path(PATH_PACKAGE_WORK_DIR).joinpath(str(simulation_i)).absolute()
+                      for simulation_i in range(0, n_simulation)]
+    compiled_template.render_many([{'grid.flows.xml': flow_configs}] * n_simulation, seq_mount_dirs)
     # end region
     return seq_mount_dirs
 
@@ -69,7 +67,6 @@ def test_example_iterative():
 
     s_config_files = generate_multiple_simulations(path_sumo_cfg, flow_configs, n_simulation)
 
-    from sumo_output_parsers import LoopDetectorParser, LoopDetectorMatrixObject
     for i_iter in range(0, n_iterations):
         logger.info(f'running {i_iter} iteration...')
         sumo_configs = [SumoConfigObject(scenario_name=dir_config.name, path_config_dir=dir_config,
@@ -78,15 +75,9 @@ def test_example_iterative():
         pipeline_obj = DockerPipeline(n_jobs=n_parallel)
         result_objs = pipeline_obj.run_simulation(sumo_configs=sumo_configs)
         # region computing mean flow of simulations
-        stack_mean_flows = []
-        for scenario_name, result_obj in result_objs.items():
-            m_obj: LoopDetectorMatrixObject = result_obj.parse_output('grid_loop.out.xml',
-                                                                      parser_class=LoopDetectorParser,
-                                                                      target_element='flow')
-            mean_flow = m_obj.matrix.mean()
-            stack_mean_flows.append(mean_flow)
-        # end for
-        mean_flow = numpy.mean(stack_mean_flows)
+        # outputs are parsed in parallel and stacked into (scenario, detector, interval) arrays.
+        stack = ResultCollection(result_objs, n_jobs=n_parallel).stack('grid_loop.out.xml', attributes=['flow'])
+        mean_flow = float(numpy.mean(stack.scenario_means('flow')))
         # endregion
 
         # region updating parameters
@@ -1,6 +1,15 @@
 from sumo_tasks_pipeline.pipeline.pipeline import DockerPipeline, LocalSumoPipeline
+from sumo_tasks_pipeline.pipeline.async_pipeline import AsyncDockerPipeline, AsyncLocalPipeline
 from sumo_tasks_pipeline.file_handler import LocalFileHandler, GcsFileHandler
-from sumo_tasks_pipeline.operation_module import SumoDockerController, LocalSumoController
+from sumo_tasks_pipeline.operation_module import SumoDockerController, LocalSumoController, TraciSumoController, \
+    LibsumoWorkerPool
 from sumo_tasks_pipeline.commons.result_module import ResultFile, SumoResultObjects
+from sumo_tasks_pipeline.columnar_module import ColumnarConverter
+from sumo_tasks_pipeline.result_collection_module import ResultCollection, ScenarioStack
+from sumo_tasks_pipeline.warmup_module import WarmupStateCache
+from sumo_tasks_pipeline.trace_module import StageTracer
+from sumo_tasks_pipeline.work_queue_module import WorkQueue, run_worker
+from sumo_tasks_pipeline.shard_module import select_shard, merge_manifests
 from .commons import SumoConfigObject
-from .config_generation_module import Template2SuMoConfig
+from .config_generation_module import Template2SuMoConfig, CompiledTemplate
+from .sweep_module import ParameterSweep, SweepParameter, LazySumoConfig
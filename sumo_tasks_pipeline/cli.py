@@ -0,0 +1,160 @@
+"""Command line interface.
+
+A jobs file is JSON lines. A line is a job.
+    {"scenario_name": "s0", "path_config_dir": "scenarios/s0", "config_name": "grid.sumo.cfg", "job_id": "s0"}
+`config_name` and `job_id` are optional. A relative `path_config_dir` is relative to the jobs file.
+
+Ex. run the same command on every machine. Workers share jobs through the bucket.
+    python -m sumo_tasks_pipeline.cli worker --jobs jobs.jsonl --gcs-project P --gcs-bucket B --n-jobs 8
+
+Ex. split the jobs into N shards without coordination. Machine i runs the i-th shard, then merge manifests of shards.
+    python -m sumo_tasks_pipeline.cli run --jobs jobs.jsonl --gcs-project P --gcs-bucket B --shard 0/4
+    python -m sumo_tasks_pipeline.cli merge --jobs jobs.jsonl --gcs-project P --gcs-bucket B --output manifest.json
+"""
+import argparse
+import json
+import sys
+import typing
+from pathlib import Path
+
+from .logger_unit import logger
+from .commons.sumo_config_obj import SumoConfigObject
+from .file_handler import BaseFileHandler, LocalFileHandler, GcsFileHandler
+from .pipeline.pipeline import LocalSumoPipeline
+from .work_queue_module import run_worker
+from .shard_module import parse_shard, select_shard, create_shard_manifest, save_shard_manifest, merge_manifests, \
+    NAME_MERGED_MANIFEST
+from . import static
+
+
+def load_jobs(path_jobs: Path) -> typing.List[SumoConfigObject]:
+    seq_sumo_configs = []
+    with Path(path_jobs).open() as f:
+        for line in f:
+            if line.strip() == '':
+                continue
+            # end if
+            d_job = json.loads(line)
+            path_config_dir = Path(d_job['path_config_dir'])
+            if not path_config_dir.is_absolute():
+                path_config_dir = Path(path_jobs).absolute().parent.joinpath(path_config_dir)
+            # end if
+            seq_sumo_configs.append(SumoConfigObject(scenario_name=d_job['scenario_name'],
+                                                     path_config_dir=path_config_dir,
+                                                     config_name=d_job.get('config_name', 'sumo.cfg'),
+                                                     job_id=d_job.get('job_id')))
+        # end for
+    # end with
+    return seq_sumo_configs
+
+
+def add_backend_arguments(parser: argparse.ArgumentParser):
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--path-save-root', type=Path, help='a directory of outputs. A shared file system for workers.')
+    group.add_argument('--gcs-bucket', help='a bucket of outputs.')
+    parser.add_argument('--gcs-project', default=None)
+    parser.add_argument('--gcs-credential', type=Path, default=None)
+    parser.add_argument('--gcs-endpoint', default=None, help='an endpoint of the storage API. Ex. a fake GCS server.')
+
+
+def create_file_handler(args: argparse.Namespace) -> BaseFileHandler:
+    if args.path_save_root is not None:
+        args.path_save_root.mkdir(parents=True, exist_ok=True)
+        # an empty lease file is held as long as a lease of workers. Commands without leases use the default.
+        return LocalFileHandler(path_save_root=args.path_save_root,
+                                lease_grace_seconds=getattr(args, 'lease_seconds', 300.0))
+    # end if
+    assert args.gcs_project is not None, '--gcs-project is required with --gcs-bucket.'
+    return GcsFileHandler(project_name=args.gcs_project,
+                          bucket_name=args.gcs_bucket,
+                          path_credential=args.gcs_credential,
+                          api_endpoint=args.gcs_endpoint)
+
+
+def add_pipeline_arguments(parser: argparse.ArgumentParser):
+    parser.add_argument('--jobs', type=Path, required=True, help='a jobs file of JSON lines.')
+    parser.add_argument('--sumo-command', default=static.DEFAULT_SUMO_COMMAND)
+    parser.add_argument('--n-jobs', type=int, default=1, help='the number of SUMO processes at the same time.')
+    parser.add_argument('--timeout-per-job', type=float, default=None)
+    parser.add_argument('--staging-mode', default='copy')
+
+
+def create_pipeline(args: argparse.Namespace) -> LocalSumoPipeline:
+    return LocalSumoPipeline(file_handler=create_file_handler(args),
+                             n_jobs=args.n_jobs,
+                             sumo_command=args.sumo_command,
+                             timeout_per_job=args.timeout_per_job,
+                             staging_mode=args.staging_mode)
+
+
+def command_worker(args: argparse.Namespace) -> int:
+    sumo_configs = load_jobs(args.jobs)
+    seq_results = run_worker(create_pipeline(args),
+                             sumo_configs,
+                             worker_id=args.worker_id,
+                             lease_seconds=args.lease_seconds,
+                             interval_wait=args.interval_wait)
+    logger.info(f'{len(seq_results)} jobs are done by this worker.')
+    return 0
+
+
+def command_run(args: argparse.Namespace) -> int:
+    shard = args.shard if args.shard is not None else (0, 1)
+    seq_all_configs = load_jobs(args.jobs)
+    pipeline = create_pipeline(args)
+    seq_results = pipeline.run_simulation(seq_all_configs, shard=shard)
+    sumo_configs = select_shard(seq_all_configs, shard)
+    manifest = create_shard_manifest(shard, sumo_configs, seq_results, file_handler=pipeline.file_handler)
+    name = save_shard_manifest(pipeline.file_handler, manifest)
+    logger.info(f'{len(seq_results)} of {len(sumo_configs)} jobs of the shard {shard[0]}/{shard[1]} are done. '
+                f'The manifest is {name}')
+    return 0 if len(seq_results) == len(sumo_configs) else 1
+
+
+def command_merge(args: argparse.Namespace) -> int:
+    file_handler = create_file_handler(args)
+    manifest = merge_manifests(file_handler, load_jobs(args.jobs) if args.jobs is not None else None)
+    data = json.dumps(manifest, indent=2).encode('utf-8')
+    file_handler.save_manifest(NAME_MERGED_MANIFEST, data)
+    if args.output is not None:
+        args.output.write_bytes(data)
+    # end if
+    logger.info(f'{manifest["n_finished"]} jobs finished, {manifest["n_failed"]} failed and '
+                f'{manifest["n_missing"]} missing. Shards without a manifest: {manifest["shards_missing"]}')
+    return 0 if len(manifest['shards_missing']) == 0 and manifest['n_missing'] == 0 else 1
+
+
+def main(args: typing.Optional[typing.List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog='sumo-tasks-pipeline', description=__doc__,
+                                     formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    parser_worker = subparsers.add_parser('worker', help='pull jobs from the shared queue until it drains.')
+    add_pipeline_arguments(parser_worker)
+    add_backend_arguments(parser_worker)
+    parser_worker.add_argument('--worker-id', default=None)
+    parser_worker.add_argument('--lease-seconds', type=float, default=300.0)
+    parser_worker.add_argument('--interval-wait', type=float, default=10.0,
+                               help='seconds to wait when the remaining jobs are held by other workers.')
+    parser_worker.set_defaults(func=command_worker)
+
+    parser_run = subparsers.add_parser('run', help='run jobs, or jobs of a shard, and save a manifest of the shard.')
+    add_pipeline_arguments(parser_run)
+    add_backend_arguments(parser_run)
+    parser_run.add_argument('--shard', type=parse_shard, default=None,
+                            help='"i/N" runs jobs whose job-id hashes into the i-th of N shards. i starts at 0.')
+    parser_run.set_defaults(func=command_run)
+
+    parser_merge = subparsers.add_parser('merge', help='assemble one manifest from manifests of shards.')
+    add_backend_arguments(parser_merge)
+    parser_merge.add_argument('--jobs', type=Path, default=None,
+                              help='(optional) a jobs file. Jobs in no manifest are reported as missing.')
+    parser_merge.add_argument('--output', type=Path, default=None, help='(optional) a local copy of the manifest.')
+    parser_merge.set_defaults(func=command_merge)
+
+    parsed = parser.parse_args(args)
+    return parsed.func(parsed)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
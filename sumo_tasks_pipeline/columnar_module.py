@@ -0,0 +1,73 @@
+import typing
+from pathlib import Path
+
+from .logger_unit import logger
+from .commons.result_module import SumoResultObjects, ResultFile
+from .output_parser_module import COLUMNAR_FORMATS, parse_detector_output, save_columnar, get_columnar_path
+
+
+class ColumnarConverter(object):
+    def __init__(self,
+                 output_file_names: typing.List[str],
+                 columnar_format: str = 'npz',
+                 attributes: typing.Optional[typing.List[str]] = None,
+                 is_compress: bool = True):
+        """Converts detector outputs into columnar files when a job finishes.
+
+        A columnar file is saved next to the XML output, Ex. output/grid_loop.out.xml.npz,
+        and is registered in `SumoResultObjects.result_files`. `SumoResultObjects.parse_output` reads it
+        instead of parsing the XML.
+
+        Args:
+            output_file_names: names of outputs to convert. Ex. ["grid_loop.out.xml"]
+            columnar_format: 'npz' or 'parquet'. 'parquet' needs pyarrow or fastparquet.
+            attributes: (optional) attribute names to keep. All numeric attributes if None.
+            is_compress: True compresses npz files. False writes npz files that `load_columnar(mmap_mode='r')`
+             memory-maps.
+        """
+        assert columnar_format in COLUMNAR_FORMATS, \
+            f'columnar_format must be one of {COLUMNAR_FORMATS}. Given {columnar_format}'
+        if columnar_format == 'parquet':
+            self.check_parquet_engine()
+        # end if
+        self.output_file_names = output_file_names
+        self.columnar_format = columnar_format
+        self.attributes = attributes
+        self.is_compress = is_compress
+
+    @staticmethod
+    def check_parquet_engine():
+        for module_name in ('pyarrow', 'fastparquet'):
+            try:
+                __import__(module_name)
+                return
+            except ImportError:
+                continue
+            # end try
+        # end for
+        raise Exception('columnar_format=parquet needs pyarrow or fastparquet. Run `pip install pyarrow`.')
+
+    def convert_file(self, path_output_file: Path) -> Path:
+        matrix = parse_detector_output(path_output_file, attributes=self.attributes)
+        path_columnar = get_columnar_path(path_output_file, self.columnar_format)
+        return save_columnar(matrix, path_columnar, is_compress=self.is_compress)
+
+    def convert(self, sumo_result_obj: SumoResultObjects) -> SumoResultObjects:
+        """Convert outputs of a finished job. Outputs not found in `result_files` are skipped with a warning.
+
+        Returns: the same object with columnar files in `result_files`.
+        """
+        if sumo_result_obj.is_compressed:
+            logger.warning(f'outputs of {sumo_result_obj.id_scenario} are compressed. Skip the columnar conversion.')
+            return sumo_result_obj
+        # end if
+        for output_file_name in self.output_file_names:
+            if output_file_name not in sumo_result_obj.result_files:
+                logger.warning(f'{output_file_name} does not exist in outputs of {sumo_result_obj.id_scenario}.')
+                continue
+            # end if
+            path_columnar = self.convert_file(sumo_result_obj.result_files[output_file_name].path_file)
+            sumo_result_obj.result_files[f'{output_file_name}.{self.columnar_format}'] = ResultFile(path_columnar)
+            logger.debug(f'saved a columnar file at {path_columnar}')
+        # end for
+        return sumo_result_obj
@@ -0,0 +1,128 @@
+import contextlib
+import gzip
+import tarfile
+import typing
+from pathlib import Path
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+# end try
+
+# tar archives written and read as a stream. No temporary copy is made.
+STREAMING_ARCHIVE_FORMATS = ('tar.zst', 'tar.gz')
+DEFAULT_COMPRESS_LEVELS = {'tar.zst': 3, 'tar.gz': 6}
+
+
+def get_archive_format(path_archive: Path) -> typing.Optional[str]:
+    """'tar.zst' or 'tar.gz' by the file name. None if the file is not a streaming archive."""
+    for archive_format in STREAMING_ARCHIVE_FORMATS:
+        if Path(path_archive).name.endswith(f'.{archive_format}'):
+            return archive_format
+        # end if
+    # end for
+    return None
+
+
+def check_zstandard():
+    if zstandard is None:
+        raise Exception('tar.zst needs zstandard package. Run `pip install zstandard`.')
+    # end if
+
+
+def write_tar_stream(path_dir: Path,
+                     fileobj: typing.BinaryIO,
+                     archive_format: str = 'tar.zst',
+                     compress_level: typing.Optional[int] = None,
+                     n_threads: int = -1):
+    """Write files under `path_dir` into a file object as a compressed tar stream. `fileobj` is not closed.
+
+    Names in the archive are relative to `path_dir`. The file object is only written, never sought nor flushed,
+    so that it can be an upload stream. See `write_tar_archive` for the arguments.
+    """
+    assert archive_format in STREAMING_ARCHIVE_FORMATS, \
+        f'archive_format must be one of {STREAMING_ARCHIVE_FORMATS}. Given {archive_format}'
+    if compress_level is None:
+        compress_level = DEFAULT_COMPRESS_LEVELS[archive_format]
+    # end if
+    if archive_format == 'tar.gz':
+        writer = gzip.GzipFile(fileobj=fileobj, mode='wb', compresslevel=compress_level)
+    else:
+        check_zstandard()
+        compressor = zstandard.ZstdCompressor(level=compress_level, threads=n_threads)
+        writer = compressor.stream_writer(fileobj, closefd=False)
+    # end if
+    with writer:
+        with tarfile.open(fileobj=writer, mode='w|') as tar:
+            tar.add(str(path_dir), arcname='.')
+        # end with
+    # end with
+
+
+def write_tar_archive(path_dir: Path,
+                      path_archive: Path,
+                      archive_format: str = 'tar.zst',
+                      compress_level: typing.Optional[int] = None,
+                      n_threads: int = -1) -> Path:
+    """Write files under `path_dir` into a compressed tar archive. Names in the archive are relative to `path_dir`.
+
+    The tar stream goes into the compressor directly.
+
+    Args:
+        path_dir: a directory to archive.
+        path_archive: a path of the archive.
+        archive_format: 'tar.zst' or 'tar.gz'. 'tar.zst' needs `zstandard` package.
+        compress_level: (optional) a compression level. 3 for zstd and 6 for gzip if None.
+        n_threads: the number of threads of zstd. -1 uses all cores. gzip always runs in one thread.
+    Returns: `path_archive`
+    """
+    Path(path_archive).parent.mkdir(parents=True, exist_ok=True)
+    with Path(path_archive).open('wb') as f:
+        write_tar_stream(path_dir, f, archive_format, compress_level=compress_level, n_threads=n_threads)
+    # end with
+    return Path(path_archive)
+
+
+@contextlib.contextmanager
+def open_tar_stream(path_archive: Path) -> typing.Iterator[tarfile.TarFile]:
+    """Open a streaming archive as `TarFile` of the stream mode. Members must be read in order."""
+    archive_format = get_archive_format(path_archive)
+    assert archive_format is not None, f'{path_archive} is not one of {STREAMING_ARCHIVE_FORMATS}.'
+    with Path(path_archive).open('rb') as f:
+        if archive_format == 'tar.gz':
+            reader = gzip.GzipFile(fileobj=f, mode='rb')
+        else:
+            check_zstandard()
+            reader = zstandard.ZstdDecompressor().stream_reader(f)
+        # end if
+        with reader:
+            with tarfile.open(fileobj=reader, mode='r|') as tar:
+                yield tar
+            # end with
+        # end with
+    # end with
+
+
+def list_archive_members(path_archive: Path) -> typing.List[str]:
+    """Names of files in a streaming archive. Ex. ['./grid_loop.out.xml']"""
+    with open_tar_stream(path_archive) as tar:
+        return [member.name for member in tar if member.isfile()]
+    # end with
+
+
+@contextlib.contextmanager
+def open_archive_member(path_archive: Path, member_name: str) -> typing.Iterator[typing.BinaryIO]:
+    """Open a file in a streaming archive without extracting the archive.
+
+    The archive is decompressed from the head until the member, and the member is read as a stream.
+    """
+    with open_tar_stream(path_archive) as tar:
+        for member in tar:
+            if member.name == member_name and member.isfile():
+                yield tar.extractfile(member)
+                return
+            # end if
+        # end for
+    # end with
+    raise Exception(f'{member_name} does not exist in {path_archive}')
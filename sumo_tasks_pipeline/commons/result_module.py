@@ -1,9 +1,12 @@
 import dataclasses
 
 from pathlib import Path
-from typing import Dict, Optional, Type
+from typing import Dict, Optional, Type, List
 
 from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+from sumo_tasks_pipeline.commons.archive_module import get_archive_format, list_archive_members, open_archive_member
+from sumo_tasks_pipeline.output_parser_module import DetectorMatrix, parse_detector_output, load_columnar, \
+    COLUMNAR_FORMATS
 
 
 @dataclasses.dataclass
@@ -13,9 +16,11 @@ class ResultFile(object):
     Args:
         path_file: pathlib.Path object that leads into output file's path.
         name_file: (optional) file name of the output file.
+        archive_member: (optional) a member name if the file is in an archive. `path_file` is the archive then.
     """
     path_file: Path
     name_file: Optional[str] = None
+    archive_member: Optional[str] = None
 
     def __repr__(self):
         return self.__str__()
@@ -24,7 +29,11 @@ class ResultFile(object):
         return f'ResultFile class for {self.path_file}'
 
     def __post_init__(self):
-        self.name_file = self.path_file.name
+        if self.archive_member is None:
+            self.name_file = self.path_file.name
+        else:
+            self.name_file = Path(self.archive_member).name
+        # end if
 
 
 @dataclasses.dataclass
@@ -34,33 +43,78 @@ class SumoResultObjects(object):
     Args:
         path_output_dir: A directory where your output xmls exist.
         log_message: A log message from SUMO.
-        result_files: {output-file-name: `ResultFile`}
+
+    `result_files` is {relative-path-of-output-file: `ResultFile`}. Ex. "grid_loop.out.xml", "detectors/e1.out.xml"
+    It is collected from `path_output_dir` at the first access,
+    so that creating the object does not walk the directory nor decompress the archive.
     """
     id_scenario: str
     sumo_config_obj: SumoConfigObject
     path_output_dir: Path
     log_message: Optional[str] = None
-    result_files: Optional[Dict[str, ResultFile]] = None
     is_compressed: bool = False
+    _result_files: Optional[Dict[str, ResultFile]] = dataclasses.field(default=None, init=False, repr=False,
+                                                                       compare=False)
+
+    @property
+    def result_files(self) -> Dict[str, ResultFile]:
+        if self._result_files is None:
+            if self.is_compressed:
+                self._result_files = self.collect_archive_files(self.path_output_dir)
+            else:
+                self._result_files = self.collect_result_files(self.path_output_dir)
+            # end if
+        # end if
+        return self._result_files
+
+    @result_files.setter
+    def result_files(self, result_files: Optional[Dict[str, ResultFile]]):
+        self._result_files = result_files
+
+    @staticmethod
+    def collect_result_files(path_output_dir: Path) -> Dict[str, ResultFile]:
+        """List up files in the output directory by their relative paths.
+        Empty if the directory is not on the local disk."""
+        if path_output_dir is None or not Path(path_output_dir).is_dir():
+            return {}
+        # end if
+        return {p.relative_to(path_output_dir).as_posix(): ResultFile(p)
+                for p in sorted(Path(path_output_dir).rglob('*')) if p.is_file()}
+
+    @staticmethod
+    def collect_archive_files(path_archive: Path) -> Dict[str, ResultFile]:
+        """List up files in a tar.zst or tar.gz archive by their paths in the archive. Empty for other formats."""
+        if path_archive is None or get_archive_format(path_archive) is None or not Path(path_archive).is_file():
+            return {}
+        # end if
+        return {Path(m).as_posix(): ResultFile(Path(path_archive), archive_member=m)
+                for m in list_archive_members(path_archive)}
+
+    def parse_output(self,
+                     output_file_name: str,
+                     attributes: Optional[List[str]] = None) -> DetectorMatrix:
+        """Parse a detector output (E1, E2, E3, edgeData or laneData) into (detector, interval) matrices.
+        A columnar file of the output is read instead if it exists in `result_files`.
+        A file in a tar.zst or tar.gz archive is parsed from the decompressed stream without extracting the archive.
+
+        Args:
+            output_file_name: a relative path in `result_files`. Ex. "grid_loop.out.xml"
+            attributes: (optional) attribute names to read. Ex. ['flow', 'occupancy', 'speed']
+        Returns: `DetectorMatrix`
+        """
+        assert self.result_files is not None and output_file_name in self.result_files, \
+            f'{output_file_name} does not exits in outputs.'
+        result_file = self.result_files[output_file_name]
+        if result_file.archive_member is not None:
+            with open_archive_member(result_file.path_file, result_file.archive_member) as f:
+                return parse_detector_output(f, attributes=attributes)
+            # end with
+        # end if
+        for columnar_format in COLUMNAR_FORMATS:
+            if f'{output_file_name}.{columnar_format}' in self.result_files:
+                return load_columnar(self.result_files[f'{output_file_name}.{columnar_format}'].path_file,
+                                     attributes=attributes)
+            # end if
+        # end for
+        return parse_detector_output(result_file.path_file, attributes=attributes)
 
-    # def parse_output(self,
-    #                  output_file_name: str,
-    #                  parser_class: Type[ParserClass],
-    #                  target_element: str):
-    #     """
-    #
-    #     Args:
-    #         parser_class:
-    #         target_element:
-    #
-    #     Returns:
-    #
-    #     """
-    #     assert output_file_name in self.result_files, f'{output_file_name} does not exits in outputs.'
-    #     try:
-    #         parser = parser_class(self.result_files[output_file_name].path_file)
-    #         matrix_obj = parser.xml2matrix(target_element)
-    #         return matrix_obj
-    #     except Exception as e:
-    #         raise Exception(f'unexpected error. Is your parser correct to the file? your-file: {output_file_name}, '
-    #                         f'your parser: {parser_class}')
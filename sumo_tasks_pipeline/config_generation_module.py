@@ -1,11 +1,45 @@
+import hashlib
 import pathlib
+import re
+import uuid
 from xml import etree
+from xml.sax.saxutils import escape
 from pathlib import Path
 from typing import Dict, Any, Tuple, List, Optional
 from lxml import etree
 
 import copy
 import dataclasses
+import shutil
+import joblib
+
+from .operation_module.staging_module import stage_file, STAGING_MODES
+
+# bytes read at once by `scan_wildcard`.
+SIZE_SCAN_CHUNK = 1024 * 1024
+# bytes kept from the previous chunk, so that a match across chunks is not missed.
+SIZE_SCAN_OVERLAP = 4096
+
+
+def scan_wildcard(path_file: Path, element_wildcard: str = '?') -> bool:
+    """Check if a file may have an attribute with the wildcard value, without building an XML tree.
+
+    The file is read in chunks and searched for `="?"`. A match does not always mean a wildcard (Ex. in a comment),
+    so a file with a match should be parsed. A file without a match has no wildcard.
+    """
+    pattern = re.compile(b'=\\s*(["\'])' + re.escape(element_wildcard.encode('utf-8')) + b'\\1')
+    with Path(path_file).open('rb') as f:
+        tail = b''
+        while True:
+            chunk = f.read(SIZE_SCAN_CHUNK)
+            if len(chunk) == 0:
+                return False
+            # end if
+            if pattern.search(tail + chunk) is not None:
+                return True
+            # end if
+            tail = chunk[-SIZE_SCAN_OVERLAP:]
+        # end while
 
 
 @dataclasses.dataclass
@@ -28,12 +62,28 @@ class SubConfigFile(object):
     is_wildcard_element: bool = False
 
     def __post_init__(self):
-        self.element_with_wildcard = self.find_wildcard_element_xpath()
-        self.tree_original = etree.parse(self.path_config_file)
+        self.__tree_original = None
         self.tree_update = None
+        if scan_wildcard(Path(self.path_config_file), self.element_wildcard):
+            self.element_with_wildcard = self.find_wildcard_element_xpath(self.tree_original)
+        else:
+            # the file is not parsed until `tree_original` is used.
+            self.element_with_wildcard = []
+        # end if
         if len(self.element_with_wildcard) > 0:
             self.is_wildcard_element = True
 
+    @property
+    def tree_original(self) -> etree.ElementTree:
+        if self.__tree_original is None:
+            self.__tree_original = etree.parse(self.path_config_file)
+        # end if
+        return self.__tree_original
+
+    @tree_original.setter
+    def tree_original(self, tree: etree.ElementTree):
+        self.__tree_original = tree
+
     def write_out_update_tree(self, path_destination: str):
         if self.tree_update is None:
             raise Exception(f'For {self.name_config_file}. tree_update is None. You have to update values.')
@@ -54,6 +104,10 @@ class SubConfigFile(object):
         :param path_destination: a path to write the tree out.
         :return: None
         """
+        if not self.is_wildcard_element:
+            # nothing to update. The file is copied as it is.
+            return
+        # end if
         config_objects = copy.deepcopy(self.element_with_wildcard)
         for elem_obj in config_objects:
             xpath_required = elem_obj.xpath
@@ -108,11 +162,291 @@ class SubConfigFile(object):
         return target_attributes
 
 
+def extract_input_files(path_config_file: Path) -> List[Tuple[str, Path]]:
+    """extract paths to input files which are written in <input> of sumo.cfg file.
+
+    Boolean and numeric options are ignored. A comma-separated value gives multiple files.
+
+    Args:
+        path_config_file: a path to sumo.cfg file.
+    Returns: [(option-name, path-input-file)]
+    """
+    input_files = []
+    path_config_dir = pathlib.Path(path_config_file).absolute().parent
+    tree = etree.parse(str(path_config_file))
+    root = tree.getroot()
+    input_element = root.find('input')
+    if input_element is None:
+        return input_files
+    # end if
+    for t in input_element:
+        if not isinstance(t.tag, str):
+            # comments
+            continue
+        # end if
+        element_name = t.tag
+        value_name: Dict[str, Any] = t.attrib
+        if isinstance(value_name['value'], bool):
+            # remove boolean options
+            continue
+        if value_name['value'] in ('true', 'false'):
+            continue
+        # end if
+        try:
+            # remove int value option
+            float(value_name['value'])
+            continue
+        except ValueError:
+            for path_cfg_file in value_name['value'].split(','):
+                path_cfg_file = path_cfg_file.strip()
+                if path_cfg_file == '':
+                    continue
+                # end if
+                if '..' in path_cfg_file:
+                    raise Exception(f'config file must be in the same directory level or below level. {path_cfg_file}')
+                # end if
+                input_files.append((element_name, path_config_dir.joinpath(path_cfg_file)))
+            # end for
+        # end try
+    # end for
+    return input_files
+
+
+def copy_file(path_source: Path, path_destination: Path, staging_mode: str = 'copy'):
+    """Put a file without parsing it. An existing destination is replaced."""
+    if path_destination.exists():
+        path_destination.unlink()
+    # end if
+    if staging_mode == 'copy':
+        shutil.copyfile(path_source, path_destination)
+    else:
+        stage_file(path_source, path_destination, staging_mode)
+    # end if
+
+
+def update_output_prefix(tree: etree.ElementTree) -> etree.ElementTree:
+    """update 'output-prefix' element in the xml."""
+    root = tree.getroot()
+    output_element = root.find('output')
+    if output_element is None:
+        output_element = etree.Element('output')
+        root.append(output_element)
+    # end if
+    output_prefix_element = output_element.find('output-prefix')
+    if output_prefix_element is None:
+        etree.SubElement(_parent=output_element, _tag='output-prefix', attrib={'value': 'output/'})
+        output_element.insert(1, output_element[-1])
+    else:
+        output_prefix_element.attrib['value'] = 'output/'
+    # end if
+    return tree
+
+
+def update_load_state(tree: etree.ElementTree, state_file: str, time_begin: float) -> etree.ElementTree:
+    """set 'load-state' element and 'begin' element in the xml, so that the simulation starts from a saved state."""
+    root = tree.getroot()
+    for section_name, option_name, value in (('input', 'load-state', state_file), ('time', 'begin', str(time_begin))):
+        section_element = root.find(section_name)
+        if section_element is None:
+            section_element = etree.SubElement(root, section_name)
+        # end if
+        option_element = section_element.find(option_name)
+        if option_element is None:
+            etree.SubElement(_parent=section_element, _tag=option_name, attrib={'value': value})
+        else:
+            option_element.attrib['value'] = value
+        # end if
+    # end for
+    return tree
+
+
+@dataclasses.dataclass
+class CompiledConfigFile(object):
+    """A config file split at wildcard attributes.
+
+    Args:
+        name_config_file: a file name.
+        segments: bytes between wildcards. len(segments) == len(slots) + 1.
+        slots: (xpath, attribute-name) of the wildcards in the order of appearance.
+        path_source: a path to the template file. The file is copied as it is when it has no wildcard.
+    """
+    name_config_file: str
+    segments: List[bytes]
+    slots: List[Tuple[str, str]]
+    path_source: Optional[Path] = None
+
+    def render(self, values: Dict[str, Dict[str, Any]]) -> bytes:
+        """Fill wildcards with values.
+
+        Args:
+            values: {'xPath': {attribute-name: value}}
+        Returns: bytes of the config file.
+        """
+        seq_bytes = [self.segments[0]]
+        for (xpath, key_name), segment in zip(self.slots, self.segments[1:]):
+            assert xpath in values, f'{xpath} must be in the given values object. ' \
+                                    f'The existing keys are {values.keys()}'
+            assert key_name in values[xpath], \
+                f'{key_name} must be in the given values object. Actual object={values[xpath]}'
+            value = escape(str(values[xpath][key_name]), {'"': '&quot;', '\n': '&#10;', '\r': '&#13;', '\t': '&#9;'})
+            seq_bytes.append(value.encode('ascii', errors='xmlcharrefreplace'))
+            seq_bytes.append(segment)
+        # end for
+        return b''.join(seq_bytes)
+
+
+class CompiledTemplate(object):
+    def __init__(self, path_config_file: Path, element_wildcard: str = '?', staging_mode: str = 'copy'):
+        """A template parsed once. It renders config files for many values without parsing XML again.
+
+        Every file is parsed once here. The wildcard attributes are replaced with unique markers
+        and the serialized bytes are split at the markers. Rendering joins the bytes with the values.
+        Files without wildcards are found with `scan_wildcard` and never parsed.
+        The outputs are the same as `Template2SuMoConfig.generate_updated_config_file`.
+
+        Args:
+            path_config_file: a path to the sumo.cfg template.
+            element_wildcard: an attribute value to be filled.
+            staging_mode: how to put files without wildcards. 'copy', 'hardlink', 'reflink' or 'auto'.
+        """
+        assert Path(path_config_file).exists()
+        assert staging_mode in STAGING_MODES, f'staging_mode must be one of {STAGING_MODES}. Given {staging_mode}'
+        self.path_config_file = Path(path_config_file).absolute()
+        self.name_sumo_cfg = self.path_config_file.name
+        self.element_wildcard = element_wildcard
+        self.staging_mode = staging_mode
+        self.config_files: Dict[str, CompiledConfigFile] = {}
+        for __, path_sub_config in extract_input_files(self.path_config_file):
+            self.config_files[path_sub_config.name] = self.compile_file(path_sub_config)
+        # end for
+        self.config_files[self.name_sumo_cfg] = self.compile_file(self.path_config_file, is_root_config=True)
+
+    def compile_file(self, path_config_file: Path, is_root_config: bool = False) -> CompiledConfigFile:
+        if not is_root_config and not scan_wildcard(path_config_file, self.element_wildcard):
+            return CompiledConfigFile(name_config_file=Path(path_config_file).name,
+                                      segments=[], slots=[], path_source=Path(path_config_file))
+        # end if
+        tree = etree.parse(str(path_config_file))
+        if is_root_config:
+            tree = update_output_prefix(tree)
+        # end if
+        marker_prefix = f'__wildcard_{uuid.uuid4().hex}_'
+        slots = []
+        for elem in tree.iter():
+            if len(elem) > 0 or not isinstance(elem.tag, str):
+                continue
+            # end if
+            for key_name, value in elem.attrib.items():
+                if value == self.element_wildcard:
+                    elem.attrib[key_name] = f'{marker_prefix}{len(slots)}_'
+                    slots.append((tree.getpath(elem), key_name))
+                # end if
+            # end for
+        # end for
+        if len(slots) == 0 and not is_root_config:
+            return CompiledConfigFile(name_config_file=Path(path_config_file).name,
+                                      segments=[], slots=[], path_source=Path(path_config_file))
+        # end if
+        seq_split = re.split(f'{marker_prefix}(\\d+)_'.encode('ascii'), etree.tostring(tree))
+        assert [int(i) for i in seq_split[1::2]] == list(range(len(slots)))
+        return CompiledConfigFile(name_config_file=Path(path_config_file).name,
+                                  segments=seq_split[0::2], slots=slots)
+
+    def get_digest(self) -> str:
+        """A hash of the template. It changes when a compiled file or a file copied as it is changes.
+
+        Files without wildcards are identified by the path, the size and the modification time, not read.
+        """
+        hash_obj = hashlib.sha256()
+        for name in sorted(self.config_files.keys()):
+            config_file = self.config_files[name]
+            hash_obj.update(name.encode('utf-8') + b'\0')
+            if config_file.path_source is not None:
+                stat = Path(config_file.path_source).stat()
+                hash_obj.update(f'{Path(config_file.path_source).absolute()}:{stat.st_size}:{stat.st_mtime_ns}'
+                                .encode('utf-8'))
+            else:
+                for segment in config_file.segments:
+                    hash_obj.update(len(segment).to_bytes(8, 'little') + segment)
+                # end for
+                hash_obj.update(repr(config_file.slots).encode('utf-8'))
+            # end if
+        # end for
+        return hash_obj.hexdigest()
+
+    def get_wildcards(self) -> Dict[str, List[Tuple[str, str]]]:
+        """Returns: {config-file-name: [(xpath, attribute-name)]} of files with wildcards."""
+        return {name: c.slots for name, c in self.config_files.items() if len(c.slots) > 0}
+
+    def render(self, update_values: Dict[str, Dict[str, Dict[str, Any]]]) -> Dict[str, bytes]:
+        """Render config files with wildcards.
+
+        Args:
+            update_values: {"sub config file name": {"xml key": {values}}}
+        Returns: {config-file-name: bytes}. Files without wildcards are not included except the root sumo.cfg.
+        """
+        for file_name in update_values.keys():
+            assert file_name in self.config_files, f'{file_name} does not exist in {self.path_config_file.parent}'
+        # end for
+        d_file2bytes = {}
+        for name, config_file in self.config_files.items():
+            if config_file.path_source is not None:
+                continue
+            # end if
+            d_file2bytes[name] = config_file.render(update_values.get(name, {}))
+        # end for
+        return d_file2bytes
+
+    def generate(self,
+                 update_values: Dict[str, Dict[str, Dict[str, Any]]],
+                 path_destination_dir: Path) -> Path:
+        """Write config files into a directory. Files without wildcards are copied.
+
+        Returns: `path_destination_dir`
+        """
+        path_destination_dir = Path(path_destination_dir)
+        path_destination_dir.joinpath('output').mkdir(parents=True, exist_ok=True)
+        for name, data in self.render(update_values).items():
+            path_destination_dir.joinpath(name).write_bytes(data)
+        # end for
+        for name, config_file in self.config_files.items():
+            if config_file.path_source is not None:
+                copy_file(config_file.path_source, path_destination_dir.joinpath(name), self.staging_mode)
+            # end if
+        # end for
+        return path_destination_dir
+
+    def render_many(self,
+                    seq_update_values: List[Dict[str, Dict[str, Dict[str, Any]]]],
+                    seq_destination_dirs: List[Path],
+                    n_jobs: int = 1) -> List[Path]:
+        """Write config files for many values. n_jobs > 1 runs in processes with joblib.
+
+        Returns: list of destination directories.
+        """
+        assert len(seq_update_values) == len(seq_destination_dirs)
+        if n_jobs == 1:
+            return [self.generate(v, d) for v, d in zip(seq_update_values, seq_destination_dirs)]
+        # end if
+        return joblib.Parallel(n_jobs=n_jobs)(
+            joblib.delayed(self.generate)(v, d) for v, d in zip(seq_update_values, seq_destination_dirs))
+
+
 class Template2SuMoConfig(object):
     def __init__(self,
                  path_config_file: Path,
-                 path_destination_dir: Path):
+                 path_destination_dir: Path,
+                 staging_mode: str = 'copy'):
+        """Generate SUMO config files from template files with wildcards.
+
+        Args:
+            path_config_file: a path to the sumo.cfg template.
+            path_destination_dir: a directory to write config files.
+            staging_mode: how to put files without wildcards into the destination. They are never parsed.
+             'copy' copies bytes. 'hardlink', 'reflink' or 'auto' links the file and falls back to a copy.
+        """
         assert Path(path_config_file).exists()
+        assert staging_mode in STAGING_MODES, f'staging_mode must be one of {STAGING_MODES}. Given {staging_mode}'
         if not Path(path_destination_dir).exists():
             path_destination_dir.mkdir()
         # end if
@@ -121,6 +455,7 @@ class Template2SuMoConfig(object):
         self.path_config_dir = str(pathlib.Path(path_config_file).parent)
         self.name_sumo_cfg = Path(path_config_file).name
         self.path_destination_dir = path_destination_dir
+        self.staging_mode = staging_mode
         # set root and sub config files
         __sub_config_files = self.__extract_input_options(str(path_config_file))
         __sub_config_files.append(self.__set_root_cfg_config_object(self.path_config_file))
@@ -136,20 +471,7 @@ class Template2SuMoConfig(object):
     @staticmethod
     def __update_output_prefix(tree: etree.ElementTree) -> etree.ElementTree:
         """update 'output-prefix' element in the xml."""
-        root = tree.getroot()
-        output_element = root.find('output')
-        if output_element is None:
-            output_element = etree.Element('output')
-            root.append(output_element)
-        # end if
-        output_prefix_element = output_element.find('output-prefix')
-        if output_prefix_element is None:
-            etree.SubElement(_parent=output_element, _tag='output-prefix', attrib={'value': 'output/'})
-            output_element.insert(1, output_element[-1])
-        else:
-            output_prefix_element.attrib['value'] = 'output/'
-        # end if
-        return tree
+        return update_output_prefix(tree)
 
     def __extract_input_options(self, config_file_name: str) -> List[SubConfigFile]:
         """extract path-to-config which is written in sumo.cfg file.
@@ -158,30 +480,8 @@ class Template2SuMoConfig(object):
         :return: (option-name, path-config-file)
         """
         cfg_files = []
-
-        tree = etree.parse(config_file_name)
-        root = tree.getroot()
-        for t in root.find('input'):
-            element_name = t.tag
-            value_name: Dict[str, Any] = t.attrib
-            if isinstance(value_name['value'], bool):
-                # remove boolean options
-                continue
-            if value_name['value'] in ('true', 'false'):
-                continue
-            # end if
-            try:
-                # remove int value option
-                float(value_name['value'])
-                continue
-            except ValueError:
-                path_cfg_file = value_name['value']
-                if '..' in path_cfg_file:
-                    raise Exception(f'config file must be in the same directory level or below level. {path_cfg_file}')
-                # end if
-                __sub_cfg_file: str = str(pathlib.Path(self.path_config_dir).joinpath(path_cfg_file))
-                cfg_files.append(SubConfigFile(Path(__sub_cfg_file).name, element_name, __sub_cfg_file))
-            # end try
+        for element_name, __sub_cfg_file in extract_input_files(Path(config_file_name)):
+            cfg_files.append(SubConfigFile(__sub_cfg_file.name, element_name, str(__sub_cfg_file)))
         # end for
         return cfg_files
 
@@ -225,6 +525,11 @@ class Template2SuMoConfig(object):
             new_destination_path: str = str(Path(self.path_destination_dir).
                                             joinpath(f'{config_obj.name_config_file}'))
             # end if
+            if config_obj.tree_update is None and not config_obj.is_wildcard_element:
+                # a file without wildcards is put byte-for-byte.
+                copy_file(Path(config_obj.path_config_file), Path(new_destination_path), self.staging_mode)
+                continue
+            # end if
             if config_obj.tree_update is None:
                 config_obj.tree_update = config_obj.tree_original
             # end if
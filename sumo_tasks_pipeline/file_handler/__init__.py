@@ -1,3 +1,3 @@
 from .gcs_filehandler import GcsFileHandler
 from .local_filehandler import LocalFileHandler
-from .base import BaseFileHandler
+from .base import BaseFileHandler, Lease
@@ -1,3 +1,6 @@
+import dataclasses
+import json
+import time
 import typing
 from pathlib import Path
 from ..commons.result_module import SumoResultObjects
@@ -9,10 +12,50 @@ SIGNALS = {
 }
 
 
+@dataclasses.dataclass
+class Lease(object):
+    """A claim of a job by a worker. The claim is valid until `expires_at` unless the worker renews it.
+
+    Args:
+        job_id: job-id.
+        worker_id: an id of the worker holding the lease.
+        generation: a version of the lease. A claim, a renewal and a release succeed only on the latest version.
+        expires_at: unix time when other workers may take the job over.
+        is_released: True if the worker gave the job back.
+    """
+    job_id: str
+    worker_id: str
+    generation: int
+    expires_at: float
+    is_released: bool = False
+
+    def is_held(self, now: typing.Optional[float] = None) -> bool:
+        now = time.time() if now is None else now
+        return not self.is_released and self.expires_at > now
+
+    def to_bytes(self) -> bytes:
+        return json.dumps({'worker_id': self.worker_id,
+                           'expires_at': self.expires_at,
+                           'is_released': self.is_released}).encode('utf-8')
+
+    @classmethod
+    def from_bytes(cls, job_id: str, generation: int, data: bytes) -> "Lease":
+        d = json.loads(data)
+        return cls(job_id=job_id, worker_id=d['worker_id'], generation=generation,
+                   expires_at=d['expires_at'], is_released=d['is_released'])
+
+
 class BaseFileHandler(object):
     def get_job_status(self, job_id: str) -> typing.Tuple[str, Path]:
         raise NotImplementedError()
 
+    def get_job_statuses(self, job_ids: typing.List[str]) -> typing.Dict[str, typing.Tuple[str, Path]]:
+        """Get status of multiple jobs at once.
+
+        Returns: {job-id: (status, path)}. The status is 'empty' if a job has not started.
+        """
+        return {job_id: self.get_job_status(job_id) for job_id in job_ids}
+
     def start_job(self, job_id: str):
         raise NotImplementedError()
 
@@ -21,3 +64,58 @@ class BaseFileHandler(object):
 
     def save_file(self, job_id: str, sumo_result: SumoResultObjects) -> Path:
         raise NotImplementedError()
+
+    def get_output_path(self, job_id: str) -> Path:
+        """The path where `save_file` saves outputs of the job. The same path as `save_file` returns."""
+        raise NotImplementedError()
+
+    def save_manifest(self, name: str, data: bytes):
+        """Save a manifest of results. Ex. a record of jobs that a shard ran."""
+        raise NotImplementedError()
+
+    def load_manifests(self) -> typing.Dict[str, bytes]:
+        """Returns: {name: data} of all saved manifests."""
+        raise NotImplementedError()
+
+    def read_lease(self, job_id: str) -> typing.Optional[Lease]:
+        """Returns: the latest lease of the job. None if no worker has claimed it."""
+        raise NotImplementedError()
+
+    def write_lease(self, lease: Lease, generation_expected: typing.Optional[int]) -> typing.Optional[Lease]:
+        """Write a new version of the lease only if the latest version is `generation_expected`.
+
+        Args:
+            lease: a lease to write. Its generation is ignored.
+            generation_expected: the generation that the writer read. None means that no lease exists yet.
+
+        Returns: the written lease with the new generation. None if another worker wrote a lease in between.
+        """
+        raise NotImplementedError()
+
+    def claim_job(self, job_id: str, worker_id: str, lease_seconds: float) -> typing.Optional[Lease]:
+        """Claim a job atomically. A claim succeeds if no lease is held; an expired lease is taken over.
+
+        Returns: the lease. None if another worker holds the job.
+        """
+        lease_current = self.read_lease(job_id)
+        if lease_current is not None and lease_current.is_held():
+            return None
+        # end if
+        lease_new = Lease(job_id=job_id, worker_id=worker_id, generation=-1, expires_at=time.time() + lease_seconds)
+        return self.write_lease(lease_new, None if lease_current is None else lease_current.generation)
+
+    def renew_lease(self, lease: Lease, lease_seconds: float) -> typing.Optional[Lease]:
+        """Extend a lease. It fails if another worker took the job over after the lease expired.
+
+        Returns: the renewed lease. None if the lease is lost.
+        """
+        lease_new = dataclasses.replace(lease, expires_at=time.time() + lease_seconds)
+        return self.write_lease(lease_new, lease.generation)
+
+    def release_lease(self, lease: Lease) -> bool:
+        """Give a job back, so that other workers can claim it at once.
+
+        Returns: False if the lease had already been lost.
+        """
+        lease_new = dataclasses.replace(lease, is_released=True)
+        return self.write_lease(lease_new, lease.generation) is not None
@@ -4,15 +4,21 @@ from pathlib import Path
 import typing
 import copy
 import google
+import google.api_core.exceptions
 import os
 import json
-import glob
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from google.oauth2 import service_account
-from .base import BaseFileHandler, SIGNALS
+from google.auth.credentials import AnonymousCredentials
+from .base import BaseFileHandler, SIGNALS, Lease
+from .gcs_transfer_module import GcsTransfer
 from ..commons.result_module import SumoResultObjects
 from ..static import PATH_PACKAGE_WORK_DIR
 
+# a lease overwritten between its metadata and its content is read again at most this number of times.
+N_LEASE_READ_ATTEMPTS = 5
+
 
 class GcsFileHandler(BaseFileHandler):
     def __init__(self,
@@ -20,13 +26,54 @@ class GcsFileHandler(BaseFileHandler):
                  bucket_name: str,
                  path_credential: typing.Optional[Path] = None,
                  status_file_name: str = 'status.json',
-                 subdir_output: str = 'output'):
+                 subdir_output: str = 'output',
+                 n_io_workers: int = 16,
+                 upload_format: str = 'files',
+                 chunk_size: int = 16 * 1024 * 1024,
+                 threshold_resumable_upload: int = 16 * 1024 * 1024,
+                 api_endpoint: typing.Optional[str] = None,
+                 lease_file_name: str = 'lease.json',
+                 subdir_manifest: str = 'manifests'):
+        """A file handler to save outputs on Google Cloud Storage.
+
+        Args:
+            project_name: GCP project name.
+            bucket_name: a bucket name.
+            path_credential: (optional) a path to a credential file. GOOGLE_APPLICATION_CREDENTIALS is used if None.
+            status_file_name: a name of status file.
+            subdir_output: a prefix of objects.
+            n_io_workers: the number of threads to read or write objects in parallel.
+            upload_format: 'files' uploads output files one by one (in parallel).
+             'tar.gz' or 'tar.zst' uploads one archive `output.tar.gz` or `output.tar.zst` per job.
+            chunk_size: a chunk size of resumable uploads.
+            threshold_resumable_upload: a file larger than this (bytes) is uploaded in chunks with resumable upload.
+            api_endpoint: (optional) an endpoint of the storage API. Ex. "http://localhost:4443" of fake-gcs-server.
+             No credential is used if given.
+            lease_file_name: a name of the lease object of a job. Claims are atomic with generation preconditions.
+            subdir_manifest: a prefix of manifests.
+        """
         self.path_credential = path_credential
-        credentials = self.get_credentials()
-        self.storage_client = storage.Client(project=project_name, credentials=credentials)
+        if api_endpoint is None:
+            credentials = self.get_credentials()
+            self.storage_client = storage.Client(project=project_name, credentials=credentials)
+        else:
+            self.storage_client = storage.Client(project=project_name,
+                                                 credentials=AnonymousCredentials(),
+                                                 client_options={'api_endpoint': api_endpoint})
+        # end if
         self.bucket_name = bucket_name
         self.status_file_name = status_file_name
         self.subdir_output = subdir_output
+        self.lease_file_name = lease_file_name
+        self.subdir_manifest = subdir_manifest
+        self.n_io_workers = n_io_workers
+        self.upload_format = upload_format
+        self.transfer = GcsTransfer(storage_client=self.storage_client,
+                                    bucket_name=self.bucket_name,
+                                    n_io_workers=n_io_workers,
+                                    chunk_size=chunk_size,
+                                    threshold_resumable_upload=threshold_resumable_upload)
+        self.bucket = self.transfer.bucket
 
     def get_credentials(self) -> google.auth.credentials.Credentials:
         if self.path_credential is None:
@@ -45,20 +92,49 @@ class GcsFileHandler(BaseFileHandler):
         bucket = self.storage_client.create_bucket(self.bucket_name)
 
     def get_job_status(self, job_id: str) -> typing.Tuple[str, Path]:
-        path_local = Path(PATH_PACKAGE_WORK_DIR).joinpath(job_id)
-        bucket = self.storage_client.get_bucket(self.bucket_name)
-        file_name = f"{self.subdir_output}/{job_id}/" + self.status_file_name
-        blob = bucket.blob(file_name)
-        blob.download_to_filename(path_local.joinpath(self.status_file_name))
-
-        stats = storage.Blob(bucket=bucket, name=file_name).exists(self.storage_client)
-        if stats is False:
+        blob = self.bucket.get_blob(f"{self.subdir_output}/{job_id}/" + self.status_file_name)
+        if blob is None:
             return 'empty', Path()
-
-        with path_local.joinpath(self.status_file_name).open('r') as f:
-            signals = json.loads(f.read())
+        # end if
+        signals = json.loads(blob.download_as_bytes())
         return signals['status'], Path(f"{self.subdir_output}/{job_id}/")
 
+    def get_job_statuses(self, job_ids: typing.List[str]) -> typing.Dict[str, typing.Tuple[str, Path]]:
+        """Get status of multiple jobs with one listing of status files and parallel reads of them.
+
+        The listing matches only status files with `match_glob`, so that output files of jobs are not paged through.
+
+        Returns: {job-id: (status, path)}. The status is 'empty' if a job has not started.
+        """
+        set_job_ids = set(job_ids)
+        suffix_status = '/' + self.status_file_name
+        d_job_id2blob = {}
+        for blob in self.storage_client.list_blobs(self.bucket_name, prefix=f'{self.subdir_output}/',
+                                                   match_glob=f'{self.subdir_output}/**{suffix_status}',
+                                                   fields='items(name),nextPageToken'):
+            job_id = blob.name[len(f'{self.subdir_output}/'):-len(suffix_status)]
+            if job_id in set_job_ids:
+                d_job_id2blob[job_id] = blob
+            # end if
+        # end for
+
+        def read_status(job_id: str) -> typing.Tuple[str, typing.Tuple[str, Path]]:
+            try:
+                signals = json.loads(d_job_id2blob[job_id].download_as_bytes())
+            except google.api_core.exceptions.NotFound:
+                # deleted after the listing.
+                return job_id, ('empty', Path())
+            # end try
+            return job_id, (signals['status'], Path(f"{self.subdir_output}/{job_id}/"))
+
+        d_job_id2status = {job_id: ('empty', Path()) for job_id in job_ids}
+        with ThreadPoolExecutor(self.n_io_workers) as pool:
+            for job_id, status in pool.map(read_status, d_job_id2blob.keys()):
+                d_job_id2status[job_id] = status
+            # end for
+        # end with
+        return d_job_id2status
+
     def start_job(self, job_id: str):
         __signals = copy.deepcopy(SIGNALS)
         __signals['started_at'] = datetime.utcnow().isoformat()
@@ -71,15 +147,13 @@ class GcsFileHandler(BaseFileHandler):
             f.write(json.dumps(__signals))
 
         # save on GCS
-        bucket = self.storage_client.get_bucket(self.bucket_name)
-        blob = bucket.blob(f"{self.subdir_output}/{job_id}/" + self.status_file_name)
+        blob = self.bucket.blob(f"{self.subdir_output}/{job_id}/" + self.status_file_name)
         blob.upload_from_filename(path_local.joinpath(self.status_file_name))
 
     def end_job(self, job_id: str):
         path_local = Path(PATH_PACKAGE_WORK_DIR).joinpath(job_id)
 
-        bucket = self.storage_client.get_bucket(self.bucket_name)
-        blob = bucket.blob(f"{self.subdir_output}/{job_id}/" + self.status_file_name)
+        blob = self.bucket.blob(f"{self.subdir_output}/{job_id}/" + self.status_file_name)
         blob.download_to_filename(path_local.joinpath(self.status_file_name))
 
         # get status file from gcs
@@ -92,15 +166,54 @@ class GcsFileHandler(BaseFileHandler):
             f.write(json.dumps(signals))
 
         # upload to GCS
-        bucket = self.storage_client.get_bucket(self.bucket_name)
-        blob = bucket.blob(f"{self.subdir_output}/{job_id}/" + self.status_file_name)
+        blob = self.bucket.blob(f"{self.subdir_output}/{job_id}/" + self.status_file_name)
         blob.upload_from_filename(path_local.joinpath(self.status_file_name))
 
+    def get_output_path(self, job_id: str) -> Path:
+        return Path(f"{self.subdir_output}/{job_id}")
+
     def save_file(self, job_id: str, sumo_result: SumoResultObjects) -> Path:
-        bucket = self.storage_client.get_bucket(self.bucket_name)
-        for local_file in glob.glob(sumo_result.path_output_dir.as_posix() + '/**'):
-            filename = local_file.split('/')[-1]
-            blob = bucket.blob(f"{self.subdir_output}/{job_id}" + filename)
-            blob.upload_from_filename(local_file)
+        self.transfer.upload_directory(sumo_result.path_output_dir,
+                                       prefix=f"{self.subdir_output}/{job_id}",
+                                       upload_format=self.upload_format)
+        return self.get_output_path(job_id)
+
+    def save_manifest(self, name: str, data: bytes):
+        blob = self.bucket.blob(f'{self.subdir_manifest}/{name}')
+        blob.upload_from_string(data, content_type='application/json')
+
+    def load_manifests(self) -> typing.Dict[str, bytes]:
+        seq_blobs = list(self.storage_client.list_blobs(self.bucket_name, prefix=f'{self.subdir_manifest}/'))
+        with ThreadPoolExecutor(self.n_io_workers) as pool:
+            seq_data = list(pool.map(lambda b: b.download_as_bytes(), seq_blobs))
+        # end with
+        return {blob.name[len(f'{self.subdir_manifest}/'):]: data for blob, data in zip(seq_blobs, seq_data)}
+
+    def read_lease(self, job_id: str) -> typing.Optional[Lease]:
+        for __ in range(N_LEASE_READ_ATTEMPTS):
+            blob = self.bucket.get_blob(f"{self.subdir_output}/{job_id}/" + self.lease_file_name)
+            if blob is None:
+                return None
+            # end if
+            try:
+                data = blob.download_as_bytes(if_generation_match=blob.generation)
+            except (google.api_core.exceptions.NotFound, google.api_core.exceptions.PreconditionFailed):
+                # overwritten after the metadata was read.
+                continue
+            # end try
+            return Lease.from_bytes(job_id, blob.generation, data)
         # end for
-        return Path(f"{self.subdir_output}/{job_id}")
+        raise Exception(f'the lease of job_id={job_id} was overwritten during {N_LEASE_READ_ATTEMPTS} reads.')
+
+    def write_lease(self, lease: Lease, generation_expected: typing.Optional[int]) -> typing.Optional[Lease]:
+        blob = self.bucket.blob(f"{self.subdir_output}/{lease.job_id}/" + self.lease_file_name)
+        try:
+            # generation 0 means that the object must not exist.
+            blob.upload_from_string(lease.to_bytes(),
+                                    content_type='application/json',
+                                    if_generation_match=0 if generation_expected is None else generation_expected)
+        except google.api_core.exceptions.PreconditionFailed:
+            return None
+        # end try
+        return Lease(job_id=lease.job_id, worker_id=lease.worker_id, generation=blob.generation,
+                     expires_at=lease.expires_at, is_released=lease.is_released)
@@ -0,0 +1,145 @@
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from google.cloud import storage
+
+from ..logger_unit import logger
+from ..commons.archive_module import STREAMING_ARCHIVE_FORMATS, write_tar_archive, write_tar_stream
+
+# the chunk size of resumable uploads must be a multiple of 256 KB.
+CHUNK_SIZE_UNIT = 256 * 1024
+UPLOAD_FORMATS = ('files', 'tar.gz', 'tar.zst')
+
+
+def list_upload_files(path_dir: Path, prefix: str) -> typing.List[typing.Tuple[Path, str]]:
+    """List files under a directory recursively with their object names.
+
+    Returns: [(local file, object name)]. The object name is {prefix}/{relative path}.
+    """
+    path_dir = Path(path_dir)
+    prefix = prefix.rstrip('/')
+    return [(p, f'{prefix}/{p.relative_to(path_dir).as_posix()}')
+            for p in sorted(path_dir.rglob('*')) if p.is_file()]
+
+
+def write_archive(path_dir: Path, path_archive: Path, upload_format: str = 'tar.gz') -> Path:
+    """Write files under `path_dir` into one tar archive. Names in the archive are relative to `path_dir`.
+
+    Args:
+        path_dir: a directory to archive.
+        path_archive: a path of the archive.
+        upload_format: 'tar.gz' or 'tar.zst'. 'tar.zst' needs `zstandard` package.
+    Returns: `path_archive`
+    """
+    if upload_format not in STREAMING_ARCHIVE_FORMATS:
+        raise Exception(f'Unknown archive format {upload_format}. Choose from tar.gz, tar.zst')
+    # end if
+    return write_tar_archive(path_dir, path_archive, archive_format=upload_format)
+
+
+class GcsTransfer(object):
+    def __init__(self,
+                 storage_client: storage.Client,
+                 bucket_name: str,
+                 n_io_workers: int = 16,
+                 chunk_size: int = 16 * 1024 * 1024,
+                 threshold_resumable_upload: int = 16 * 1024 * 1024):
+        """Uploads files to a bucket with a shared thread pool. The bucket handle and the HTTP session are reused.
+
+        Args:
+            storage_client: a client of GCS.
+            bucket_name: a bucket name.
+            n_io_workers: the max number of uploads running at the same time. The pool is shared by all callers.
+            chunk_size: a chunk size of resumable uploads. Rounded up to a multiple of 256 KB.
+            threshold_resumable_upload: a file larger than this (bytes) is uploaded in chunks.
+             A failed chunk is retried without sending the whole file again.
+        """
+        assert n_io_workers > 0, f'n_io_workers must be > 0. Given {n_io_workers}'
+        self.storage_client = storage_client
+        self.bucket_name = bucket_name
+        # `bucket()` does not send a request, unlike `get_bucket()`.
+        self.bucket = self.storage_client.bucket(self.bucket_name)
+        self.n_io_workers = n_io_workers
+        self.chunk_size = -(-chunk_size // CHUNK_SIZE_UNIT) * CHUNK_SIZE_UNIT
+        self.threshold_resumable_upload = threshold_resumable_upload
+        self.lock = threading.Lock()
+        self.pool: typing.Optional[ThreadPoolExecutor] = None
+
+    def get_pool(self) -> ThreadPoolExecutor:
+        with self.lock:
+            if self.pool is None:
+                self.pool = ThreadPoolExecutor(self.n_io_workers, thread_name_prefix='gcs-upload')
+            # end if
+        # end with
+        return self.pool
+
+    def close(self):
+        with self.lock:
+            if self.pool is not None:
+                self.pool.shutdown(wait=True)
+                self.pool = None
+            # end if
+        # end with
+
+    def upload_file(self, path_local: Path, blob_name: str) -> str:
+        if Path(path_local).stat().st_size > self.threshold_resumable_upload:
+            blob = self.bucket.blob(blob_name, chunk_size=self.chunk_size)
+        else:
+            blob = self.bucket.blob(blob_name)
+        # end if
+        blob.upload_from_filename(str(path_local))
+        return blob_name
+
+    def upload_archive(self, path_dir: Path, blob_name: str, upload_format: str) -> str:
+        """Compress a directory into one tar archive while uploading it. No archive is written on the local disk.
+
+        The archive goes up in chunks of `chunk_size` with a resumable upload.
+        """
+        blob = self.bucket.blob(blob_name, chunk_size=self.chunk_size)
+        logger.debug(f'uploading {path_dir} to {blob_name} as a stream')
+        # the writer can not flush before the end; compressors do not need it.
+        with blob.open('wb', ignore_flush=True) as f:
+            write_tar_stream(path_dir, f, archive_format=upload_format)
+        # end with
+        return blob_name
+
+    def upload_files(self, seq_files: typing.List[typing.Tuple[Path, str]]) -> typing.List[str]:
+        """Upload files concurrently. Waits until all uploads end and raises the first error if any.
+
+        Args:
+            seq_files: [(local file, object name)]
+        Returns: object names.
+        """
+        pool = self.get_pool()
+        seq_futures = [pool.submit(self.upload_file, path_local, blob_name) for path_local, blob_name in seq_files]
+        seq_blob_names = []
+        errors = []
+        for future in seq_futures:
+            try:
+                seq_blob_names.append(future.result())
+            except Exception as e:
+                errors.append(e)
+            # end try
+        # end for
+        if len(errors) > 0:
+            raise errors[0]
+        # end if
+        return seq_blob_names
+
+    def upload_directory(self, path_dir: Path, prefix: str, upload_format: str = 'files') -> typing.List[str]:
+        """Upload a directory.
+
+        Args:
+            path_dir: a local directory.
+            prefix: a prefix of objects.
+            upload_format: 'files' uploads every file to {prefix}/{relative path}.
+             'tar.gz' and 'tar.zst' upload one archive {prefix}/output.{format}, compressed while it is uploaded.
+        Returns: object names.
+        """
+        assert upload_format in UPLOAD_FORMATS, f'upload_format must be one of {UPLOAD_FORMATS}'
+        if upload_format == 'files':
+            return self.upload_files(list_upload_files(path_dir, prefix))
+        # end if
+        return [self.upload_archive(path_dir, f'{prefix.rstrip("/")}/output.{upload_format}', upload_format)]
@@ -1,7 +1,9 @@
 import copy
 import json
 import shutil
+import time
 import typing
+import uuid
 import os
 
 from pathlib import Path
@@ -9,18 +11,40 @@ from datetime import datetime
 
 
 from ..commons.result_module import SumoResultObjects
-from .base import BaseFileHandler, SIGNALS
+from .base import BaseFileHandler, SIGNALS, Lease
 
 
 class LocalFileHandler(BaseFileHandler):
     def __init__(self,
                  path_save_root: Path,
                  status_file_name: str = 'status.json',
-                 subdir_output: str = 'pipeline-output'):
+                 subdir_output: str = 'pipeline-output',
+                 subdir_lease: str = 'leases',
+                 subdir_manifest: str = 'manifests',
+                 lease_grace_seconds: float = 300.0):
+        """A file handler to save outputs on a local (or a shared network) file system.
+
+        Leases of jobs are files `{path_save_root}/{job_id}/{subdir_lease}/{generation}.json`.
+        A new generation is created with O_EXCL, so only one worker wins a claim.
+        Its content is written to a temporary file and renamed, so a lease is never read half-written.
+        Until the rename, the new generation is an empty file. It is regarded as held by the winner of the claim
+        for `lease_grace_seconds` from its mtime, so that a slow writer, Ex. on NFS, does not lose its claim.
+
+        Args:
+            path_save_root: a directory of status files and outputs.
+            status_file_name: a name of status file.
+            subdir_output: a directory name of outputs.
+            subdir_lease: a directory name of leases of a job.
+            subdir_manifest: a directory name of manifests.
+            lease_grace_seconds: seconds until an empty lease file expires. Set `lease_seconds` of workers.
+        """
         self.path_save_root = path_save_root
         assert self.path_save_root.exists()
         self.status_file_name = status_file_name
         self.subdir_output = subdir_output
+        self.subdir_lease = subdir_lease
+        self.subdir_manifest = subdir_manifest
+        self.lease_grace_seconds = lease_grace_seconds
 
     def get_job_status(self, job_id: str) -> typing.Tuple[str, Path]:
         path_status = self.path_save_root.joinpath(job_id).joinpath(self.status_file_name)
@@ -36,8 +60,8 @@ class LocalFileHandler(BaseFileHandler):
         __signals['started_at'] = datetime.utcnow().isoformat()
         __signals['status'] = 'started'
         self.path_save_root.joinpath(job_id.__str__()).mkdir(exist_ok=True, parents=True)
-        with self.path_save_root.joinpath(job_id).joinpath(self.status_file_name).open('w') as f:
-            f.write(json.dumps(__signals))
+        self.write_file_atomic(self.path_save_root.joinpath(job_id).joinpath(self.status_file_name),
+                               json.dumps(__signals).encode('utf-8'))
 
     def end_job(self, job_id: str):
         with self.path_save_root.joinpath(job_id).joinpath(self.status_file_name).open('r') as f:
@@ -45,10 +69,113 @@ class LocalFileHandler(BaseFileHandler):
 
         signals['end_job'] = datetime.utcnow().isoformat()
         signals['status'] = 'finished'
-        with self.path_save_root.joinpath(job_id).joinpath(self.status_file_name).open('w') as f:
-            f.write(json.dumps(signals))
+        self.write_file_atomic(self.path_save_root.joinpath(job_id).joinpath(self.status_file_name),
+                               json.dumps(signals).encode('utf-8'))
+
+    def get_output_path(self, job_id: str) -> Path:
+        return self.path_save_root.joinpath(self.subdir_output).joinpath(job_id)
 
     def save_file(self, job_id: str, sumo_result: SumoResultObjects) -> Path:
-        path_destination = self.path_save_root.joinpath(self.subdir_output).joinpath(job_id)
-        shutil.copytree(sumo_result.path_output_dir, path_destination)
+        """Copy outputs into a temporary sibling directory and rename it to the destination.
+
+        Outputs saved before, Ex. by a worker whose lease expired, are replaced.
+        """
+        path_destination = self.get_output_path(job_id)
+        path_destination.parent.mkdir(parents=True, exist_ok=True)
+        path_tmp = path_destination.with_name(f'.{job_id}.{uuid.uuid4()}.tmp')
+        shutil.copytree(sumo_result.path_output_dir, path_tmp)
+        try:
+            os.rename(path_tmp, path_destination)
+        except OSError:
+            # the destination exists. It is moved aside and removed, since a directory can not be replaced.
+            path_old = path_destination.with_name(f'.{job_id}.{uuid.uuid4()}.old')
+            os.rename(path_destination, path_old)
+            os.rename(path_tmp, path_destination)
+            shutil.rmtree(path_old, ignore_errors=True)
+        # end try
         return path_destination
+
+    @staticmethod
+    def write_file_atomic(path_file: Path, data: bytes):
+        """Write a temporary file and rename it. Readers see the old or the new contents, never a part."""
+        path_tmp = path_file.with_name(f'.{path_file.name}.{uuid.uuid4()}.tmp')
+        with path_tmp.open('wb') as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
+        # end with
+        os.replace(path_tmp, path_file)
+
+    def save_manifest(self, name: str, data: bytes):
+        path_manifest_dir = self.path_save_root.joinpath(self.subdir_manifest)
+        path_manifest_dir.mkdir(parents=True, exist_ok=True)
+        self.write_file_atomic(path_manifest_dir.joinpath(name), data)
+
+    def load_manifests(self) -> typing.Dict[str, bytes]:
+        path_manifest_dir = self.path_save_root.joinpath(self.subdir_manifest)
+        if not path_manifest_dir.exists():
+            return {}
+        # end if
+        return {p.name: p.read_bytes() for p in path_manifest_dir.iterdir() if not p.name.startswith('.')}
+
+    def get_lease_dir(self, job_id: str) -> Path:
+        return self.path_save_root.joinpath(job_id).joinpath(self.subdir_lease)
+
+    def read_lease(self, job_id: str) -> typing.Optional[Lease]:
+        path_lease_dir = self.get_lease_dir(job_id)
+        mtime = time.time()
+        for __ in range(10):
+            seq_generations = [int(p.stem) for p in path_lease_dir.glob('*.json')] if path_lease_dir.exists() else []
+            if len(seq_generations) == 0:
+                return None
+            # end if
+            generation = max(seq_generations)
+            path_lease = path_lease_dir.joinpath(f'{generation:010d}.json')
+            try:
+                data = path_lease.read_bytes()
+                mtime = path_lease.stat().st_mtime
+            except FileNotFoundError:
+                # an old generation removed after a newer one was written. Read again.
+                continue
+            # end try
+            if len(data) > 0:
+                return Lease.from_bytes(job_id, generation, data)
+            # end if
+            # the winner of the claim is renaming the content into the file.
+            time.sleep(0.01)
+        # end for
+        # the content is not renamed yet. The lease expires after the grace period if the writer died.
+        return Lease(job_id=job_id, worker_id='', generation=generation, expires_at=mtime + self.lease_grace_seconds)
+
+    def write_lease(self, lease: Lease, generation_expected: typing.Optional[int]) -> typing.Optional[Lease]:
+        lease_latest = self.read_lease(lease.job_id)
+        generation_latest = None if lease_latest is None else lease_latest.generation
+        if generation_latest != generation_expected:
+            return None
+        # end if
+        generation = 0 if generation_expected is None else generation_expected + 1
+        path_lease_dir = self.get_lease_dir(lease.job_id)
+        path_lease_dir.mkdir(parents=True, exist_ok=True)
+        path_lease = path_lease_dir.joinpath(f'{generation:010d}.json')
+        try:
+            fd = os.open(path_lease, os.O_CREAT | os.O_EXCL | os.O_WRONLY)
+        except FileExistsError:
+            return None
+        # end try
+        os.close(fd)
+        if max(int(p.stem) for p in path_lease_dir.glob('*.json')) > generation:
+            # the generation had been written and removed. Newer generations exist.
+            path_lease.unlink()
+            return None
+        # end if
+        lease_new = Lease(job_id=lease.job_id, worker_id=lease.worker_id, generation=generation,
+                          expires_at=lease.expires_at, is_released=lease.is_released)
+        self.write_file_atomic(path_lease, lease_new.to_bytes())
+        if generation_expected is not None:
+            try:
+                path_lease_dir.joinpath(f'{generation_expected:010d}.json').unlink()
+            except FileNotFoundError:
+                pass
+            # end try
+        # end if
+        return lease_new
@@ -1,2 +1,6 @@
 from .docker_operation_module import SumoDockerController
+from .docker_pool_module import SumoDockerContainerPool
 from .local_operation_module import LocalSumoController
+from .local_executor_module import SumoProcessExecutor, ProcessJob, ProcessJobResult
+from .traci_operation_module import TraciSumoController, SubscriptionSpec, KpiConvergence, stop_when_network_empty
+from .libsumo_pool_module import LibsumoWorkerPool
@@ -11,6 +11,22 @@ from ..logger_unit import logger
 from ..commons.sumo_config_obj import SumoConfigObject
 from ..commons.result_module import SumoResultObjects, ResultFile
 from .. import static
+from ..commons.archive_module import STREAMING_ARCHIVE_FORMATS, write_tar_archive, zstandard
+from .staging_module import stage_config_dir
+from ..trace_module import StageTracer, trace_stage
+
+
+def is_simulation_running(simulation) -> bool:
+    """True until the simulation ends. `simulation` is the simulation domain of traci or libsumo.
+
+    The end is <end> of the config. Without <end> (-1), the simulation ends when no vehicle is running or waiting,
+    in the same way as a SUMO process.
+    """
+    time_end = simulation.getEndTime()
+    if time_end >= 0:
+        return simulation.getTime() < time_end
+    # end if
+    return simulation.getMinExpectedNumber() > 0
 
 
 class BaseController(object):
@@ -19,12 +35,23 @@ class BaseController(object):
                  is_rewrite_windows_path: bool = True,
                  is_copy_config_dir: bool = True,
                  is_compress_result: bool = False,
-                 default_archive_format: str = 'bztar'):
+                 default_archive_format: typing.Optional[str] = None,
+                 staging_mode: str = 'copy',
+                 compress_level: typing.Optional[int] = None,
+                 n_compress_threads: int = -1,
+                 tracer: typing.Optional[StageTracer] = None):
         self.sumo_command = sumo_command
         self.is_rewrite_windows_path = is_rewrite_windows_path
         self.is_copy_config_dir = is_copy_config_dir
         self.is_compress_result = is_compress_result
+        if default_archive_format is None:
+            default_archive_format = 'tar.zst' if zstandard is not None else 'tar.gz'
+        # end if
         self.default_archive_format = default_archive_format
+        self.staging_mode = staging_mode
+        self.compress_level = compress_level
+        self.n_compress_threads = n_compress_threads
+        self.tracer = tracer
 
     def check_connection(self):
         raise NotImplementedError()
@@ -44,11 +71,13 @@ class BaseController(object):
                 path_copy_directory = path_target
             # end if
 
-            if Path(path_copy_directory).exists():
-                shutil.rmtree(path_copy_directory)
-            # end if
-            shutil.copytree(sumo_config.path_config_dir, dst=path_copy_directory)
-            logger.debug(f"Copy the config directory to {path_copy_directory}")
+            with trace_stage(self.tracer, 'copy_config', sumo_config.job_id):
+                d_method2count = stage_config_dir(path_source_dir=sumo_config.path_config_dir,
+                                                  path_target_dir=path_copy_directory,
+                                                  config_name=sumo_config.config_name,
+                                                  staging_mode=self.staging_mode)
+            # end with
+            logger.debug(f"Copy the config directory to {path_copy_directory}. Files: {d_method2count}")
             sumo_config.path_config_dir_original = copy.deepcopy(sumo_config.path_config_dir)
             sumo_config.path_config_dir = path_copy_directory
             # pass
@@ -57,13 +86,27 @@ class BaseController(object):
             return sumo_config
 
     def pack_sumo_result(self, sumo_config: SumoConfigObject, log_output: bytes) -> SumoResultObjects:
+        with trace_stage(self.tracer, 'pack_sumo_result', sumo_config.job_id):
+            return self.__pack_sumo_result(sumo_config, log_output)
+        # end with
+
+    def __pack_sumo_result(self, sumo_config: SumoConfigObject, log_output: bytes) -> SumoResultObjects:
         path_output_dir = self.extract_output_dir(sumo_config.path_config_dir.joinpath(sumo_config.config_name))
         if self.is_compress_result:
             path_compressed_file = Path(static.PATH_PACKAGE_WORK_DIR).joinpath(static.SUBDIRECTORY_COMPRESSED).\
                 joinpath(f'{sumo_config.scenario_name}.{self.default_archive_format}')
-            o = shutil.make_archive(base_name=path_compressed_file.as_posix(),
-                                    format=self.default_archive_format,
-                                    root_dir=sumo_config.path_config_dir)
+            if self.default_archive_format in STREAMING_ARCHIVE_FORMATS:
+                # only outputs are archived. Inputs such as the network stay in the scenario directory.
+                o = write_tar_archive(path_output_dir,
+                                      path_compressed_file,
+                                      archive_format=self.default_archive_format,
+                                      compress_level=self.compress_level,
+                                      n_threads=self.n_compress_threads)
+            else:
+                o = shutil.make_archive(base_name=path_compressed_file.as_posix(),
+                                        format=self.default_archive_format,
+                                        root_dir=sumo_config.path_config_dir)
+            # end if
             shutil.rmtree(sumo_config.path_config_dir)
             logger.debug(f'The compressed file is at {o}')
             res_obj = SumoResultObjects(
@@ -152,6 +195,17 @@ class BaseController(object):
             'output-prefix element does not exist in config file. Check your config file.'
         return Path(path_config_file).parent.joinpath(output_prefix_element.attrib['value'])
 
+    @staticmethod
+    def extract_net_file(path_config_file: Path) -> Path:
+        with open(path_config_file, 'r') as f:
+            tree = lxml.etree.parse(f)
+        # end with
+        root = tree.getroot()
+        net_file_element = root.find('input').find('net-file') if root.find('input') is not None else None
+        assert net_file_element is not None, \
+            'net-file element does not exist in config file. Check your config file.'
+        return Path(path_config_file).parent.joinpath(net_file_element.attrib['value'])
+
     @staticmethod
     def rewrite_windows_path(mount_dir_host: str) -> str:
         """rewrite from Windows style into Unix style.
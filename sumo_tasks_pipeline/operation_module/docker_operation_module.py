@@ -1,4 +1,5 @@
 import shutil
+import typing
 import uuid
 
 import docker
@@ -9,6 +10,8 @@ from pathlib import Path, WindowsPath
 from datetime import datetime
 from sumo_tasks_pipeline.logger_unit import logger
 from sumo_tasks_pipeline.operation_module.base_operation import BaseController
+from sumo_tasks_pipeline.trace_module import StageTracer, trace_stage
+from sumo_tasks_pipeline.operation_module.docker_pool_module import SumoDockerContainerPool
 from sumo_tasks_pipeline import static
 from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
 from sumo_tasks_pipeline.commons.result_module import SumoResultObjects, ResultFile
@@ -27,19 +30,57 @@ class SumoDockerController(BaseController):
                  docker_client: docker.DockerClient = None,
                  is_copy_config_dir: bool = True,
                  is_compress_result: bool = False,
-                 default_archive_format: str = 'bztar'):
+                 default_archive_format: typing.Optional[str] = None,
+                 container_pool: typing.Optional[SumoDockerContainerPool] = None,
+                 staging_mode: str = 'copy',
+                 compress_level: typing.Optional[int] = None,
+                 n_compress_threads: int = -1,
+                 tracer: typing.Optional[StageTracer] = None,
+                 timeout_per_job: typing.Optional[float] = None):
+        """
+
+        Args:
+            staging_mode: how to copy the config directory into the mount directory. 'copy' copies all files.
+             'hardlink', 'reflink' or 'auto' links input files, copies config files and creates an empty output directory.
+             Links need the mount directory on the same file system as the scenario; otherwise files are copied.
+            default_archive_format: 'tar.zst' or 'tar.gz' archives only outputs as a stream.
+             Formats of `shutil.make_archive` (Ex. 'bztar') archive the whole config directory.
+             'tar.zst' if zstandard is installed, otherwise 'tar.gz' if None.
+            compress_level: (optional) a compression level of 'tar.zst' or 'tar.gz'.
+            n_compress_threads: the number of threads of zstd. -1 uses all cores.
+            tracer: (optional) records time of copying the config, running SUMO and packing outputs.
+            container_pool: (optional) a started `SumoDockerContainerPool`.
+             If given, jobs run in the pooled containers with `exec_run` instead of a new container per job.
+             The image, mount directories and the SUMO command of the pool are used.
+            timeout_per_job: (optional) wall-clock time limit in seconds per job. SUMO runs with `timeout` of
+             coreutils in the container, so that a hung SUMO is killed and the container or the pooled slot is freed.
+             A job over the limit raises `TimeoutError`.
+        """
+        if container_pool is not None:
+            image_name = container_pool.image_name
+            mount_dir_host = container_pool.mount_dir_host
+            mount_dir_container = container_pool.mount_dir_container
+            sumo_command = container_pool.sumo_command
+            docker_client = container_pool.client
+        # end if
         super(SumoDockerController, self).__init__(
             sumo_command=sumo_command,
             is_rewrite_windows_path=is_rewrite_windows_path,
             is_copy_config_dir=is_copy_config_dir,
             is_compress_result=is_compress_result,
-            default_archive_format=default_archive_format
+            default_archive_format=default_archive_format,
+            staging_mode=staging_mode,
+            compress_level=compress_level,
+            n_compress_threads=n_compress_threads,
+            tracer=tracer
         )
         self.image_name = image_name
         self.container_name_base = container_name_base
         self.mount_dir_container = mount_dir_container
         self.mount_dir_host = mount_dir_host
         self.sumo_command = sumo_command
+        self.container_pool = container_pool
+        self.timeout_per_job = timeout_per_job
 
         self.is_auto_remove = True
         if docker_client is None:
@@ -47,7 +88,10 @@ class SumoDockerController(BaseController):
         else:
             self.client = docker_client
         # end if
-        self.check_connection()
+        if self.container_pool is None:
+            # the pool checks the connection when it starts.
+            self.check_connection()
+        # end if
         self.is_rewrite_windows_path = is_rewrite_windows_path
 
     def __generate_tmp_container_name(self) -> str:
@@ -185,11 +229,30 @@ class SumoDockerController(BaseController):
         # end if
         return path_updated
 
-    def start_job(self, sumo_config: SumoConfigObject) -> SumoResultObjects:
-        c_name = self.__generate_tmp_container_name()
+    def generate_container_name(self) -> str:
+        return self.__generate_tmp_container_name()
+
+    def get_mount_volumes(self) -> typing.Dict[str, typing.Dict[str, str]]:
+        """Volumes argument of `containers.run`."""
+        if self.is_rewrite_windows_path and isinstance(Path('./'), WindowsPath):
+            # from windows style path into Unix style path. Docker does not accept Windows format.
+            logger.info('I replaced a format of source directory in the host side. '
+                        'Check it if there is an unknown issue.')
+            logger.info(f'Before {self.mount_dir_host}')
+            mount_dir_host = self.rewrite_windows_path(str(self.mount_dir_host))
+            logger.info(f'After {mount_dir_host}')
+        else:
+            mount_dir_host = str(self.mount_dir_host)
+        # end if
+        return {mount_dir_host: {'bind': self.mount_dir_container, 'mode': 'rw'}}
+
+    def build_job_command(self, sumo_config: SumoConfigObject) -> typing.Tuple[SumoConfigObject, str]:
+        """Copy the config directory into the mount directory and build a command to run inside a container.
+
+        Returns: (`SumoConfigObject` after copying the config directory, command)
+        """
         # region copy to tmp directory
         suffix_uuid = str(uuid.uuid4())
-        # shutil.copytree(sumo_config.path_config_dir, self.mount_dir_host.joinpath(suffix_uuid))
         # endregion
 
         # region set Path inside container.
@@ -206,25 +269,46 @@ class SumoDockerController(BaseController):
         # end if
         job_command = f'{self.sumo_command} -c {path_config_file}'
         # endregion
+        return sumo_config, job_command
 
-        if self.is_rewrite_windows_path and isinstance(Path('./'), WindowsPath):
-            # from windows style path into Unix style path. Docker does not accept Windows format.
-            logger.info('I replaced a format of source directory in the host side. '
-                        'Check it if there is an unknown issue.')
-            logger.info(f'Before {self.mount_dir_host}')
-            mount_dir_host = self.rewrite_windows_path(str(self.mount_dir_host))
-            logger.info(f'After {mount_dir_host}')
-        else:
-            mount_dir_host = str(self.mount_dir_host)
+    def check_timeout(self, sumo_config: SumoConfigObject, exit_code: int):
+        """Raise `TimeoutError` if `timeout` killed SUMO. `timeout -s KILL` exits with 137 (128 + SIGKILL)."""
+        if self.timeout_per_job is not None and exit_code in (124, 137):
+            raise TimeoutError(f'job_id={sumo_config.job_id} exceeded {self.timeout_per_job} seconds.')
+        # end if
+
+    def start_job(self, sumo_config: SumoConfigObject) -> SumoResultObjects:
+        c_name = self.__generate_tmp_container_name()
+        sumo_config, job_command = self.build_job_command(sumo_config)
+        if self.timeout_per_job is not None:
+            job_command = f'timeout -s KILL {self.timeout_per_job} {job_command}'
         # end if
         logger.debug(f'executing job with command {job_command}')
 
-        command_message = self.client.containers.run(image=self.image_name,
-                                                     command=job_command,
-                                                     name=c_name,
-                                                     auto_remove=self.is_auto_remove,
-                                                     volumes={mount_dir_host: {'bind': self.mount_dir_container,
-                                                                               'mode': 'rw'}})
+        if self.container_pool is not None:
+            with trace_stage(self.tracer, 'sumo_run', sumo_config.job_id):
+                exit_code, command_message = self.container_pool.exec_job(job_command)
+            # end with
+            self.check_timeout(sumo_config, exit_code)
+            if exit_code != 0:
+                raise Exception(f'SUMO failed with exit code {exit_code}. Message: {command_message.decode("utf-8")}')
+            # end if
+            return self.pack_sumo_result(sumo_config=sumo_config, log_output=command_message)
+        # end if
+
+        # the stage includes the start of the container.
+        with trace_stage(self.tracer, 'container_run', sumo_config.job_id):
+            try:
+                command_message = self.client.containers.run(image=self.image_name,
+                                                             command=job_command,
+                                                             name=c_name,
+                                                             auto_remove=self.is_auto_remove,
+                                                             volumes=self.get_mount_volumes())
+            except docker.errors.ContainerError as e:
+                self.check_timeout(sumo_config, e.exit_status)
+                raise
+            # end try
+        # end with
         # path_config_file_host = self.mount_dir_host.joinpath(suffix_uuid).\
         #     joinpath(sumo_config.config_name)
         # result_file_types = self.extract_output_options(path_config_file_host)
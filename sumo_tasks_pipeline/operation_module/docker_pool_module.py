@@ -0,0 +1,218 @@
+import dataclasses
+import queue
+import threading
+import typing
+from datetime import datetime
+from pathlib import Path, WindowsPath
+
+import docker
+from docker.models.containers import Container
+
+from sumo_tasks_pipeline.logger_unit import logger
+from sumo_tasks_pipeline.operation_module.base_operation import BaseController
+from sumo_tasks_pipeline import static
+
+
+@dataclasses.dataclass
+class PooledContainer(object):
+    container: Container
+    n_executed_jobs: int = 0
+
+
+class SumoDockerContainerPool(object):
+    def __init__(self,
+                 n_containers: int,
+                 image_name: str = "kensukemi/sumo-ubuntu18",
+                 container_name_base: str = "sumo-docker-pool",
+                 mount_dir_host: Path = Path(static.PATH_PACKAGE_WORK_DIR).joinpath(static.DIR_NAME_DOCKER_MOUNT),
+                 mount_dir_container: str = "/mount_dir",
+                 sumo_command: str = "sumo",
+                 is_rewrite_windows_path: bool = True,
+                 docker_client: docker.DockerClient = None,
+                 max_jobs_per_container: typing.Optional[int] = 100,
+                 keep_alive_command: str = 'tail -f /dev/null'):
+        """A pool of long-lived containers. A SUMO job runs with `exec_run` in an idle container.
+
+        The mount directory is bound once when a container starts. A container is health-checked before
+        every job, and it is replaced when it is not running anymore or when it ran `max_jobs_per_container` jobs.
+
+        Args:
+            n_containers: the number of containers in the pool.
+            image_name: A name of docker-image that you call.
+            container_name_base: A prefix of container names.
+            mount_dir_host: A directory in the host side where containers mount.
+            mount_dir_container: A directory in the container side.
+            sumo_command: SUMO command in the container.
+            is_rewrite_windows_path: True, then the class updates Path only when your OS is Windows.
+            docker_client: (optional) docker client.
+            max_jobs_per_container: a container is recycled after running this number of jobs. None never recycles.
+            keep_alive_command: a command that keeps a container alive.
+        """
+        assert n_containers > 0, f'n_containers must be > 0. Given {n_containers}'
+        self.n_containers = n_containers
+        self.image_name = image_name
+        self.container_name_base = container_name_base
+        self.mount_dir_host = mount_dir_host
+        self.mount_dir_container = mount_dir_container
+        self.sumo_command = sumo_command
+        self.is_rewrite_windows_path = is_rewrite_windows_path
+        self.max_jobs_per_container = max_jobs_per_container
+        self.keep_alive_command = keep_alive_command
+        if docker_client is None:
+            self.client = docker.from_env()
+        else:
+            self.client = docker_client
+        # end if
+
+        self.idle_containers: "queue.Queue[PooledContainer]" = queue.Queue()
+        self.lock = threading.Lock()
+        self.pooled_containers: typing.List[PooledContainer] = []
+        self.is_started = False
+
+    def __enter__(self) -> "SumoDockerContainerPool":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def __generate_tmp_container_name(self) -> str:
+        c_name = f'{self.container_name_base}-{datetime.now().timestamp()}'
+        return c_name
+
+    def get_mount_dir_host(self) -> str:
+        if self.is_rewrite_windows_path and isinstance(Path('./'), WindowsPath):
+            # from windows style path into Unix style path. Docker does not accept Windows format.
+            return BaseController.rewrite_windows_path(str(self.mount_dir_host))
+        else:
+            return str(self.mount_dir_host)
+        # end if
+
+    def __run_container(self) -> PooledContainer:
+        container = self.client.containers.run(image=self.image_name,
+                                               command=self.keep_alive_command,
+                                               name=self.__generate_tmp_container_name(),
+                                               detach=True,
+                                               volumes={self.get_mount_dir_host(): {'bind': self.mount_dir_container,
+                                                                                    'mode': 'rw'}})
+        pooled = PooledContainer(container=container)
+        with self.lock:
+            self.pooled_containers.append(pooled)
+        # end with
+        logger.debug(f'started a pooled container {container.name}')
+        return pooled
+
+    def __remove_container(self, pooled: PooledContainer):
+        with self.lock:
+            if pooled in self.pooled_containers:
+                self.pooled_containers.remove(pooled)
+            # end if
+        # end with
+        try:
+            pooled.container.remove(force=True)
+        except Exception as e:
+            logger.warning(f'We failed to remove container = {pooled.container.name}. '
+                           f'We recommend to remove it manually. '
+                           f'The reason is {e}')
+        # end try
+
+    def __recycle(self, pooled: PooledContainer) -> typing.Optional[PooledContainer]:
+        """Remove a container and start a new one.
+        None if the new one does not start. The pool shrinks then, and the error is logged, not raised."""
+        logger.debug(f'recycling a pooled container {pooled.container.name}')
+        self.__remove_container(pooled)
+        try:
+            return self.__run_container()
+        except Exception as e:
+            logger.error(f'We failed to start a container in place of {pooled.container.name}. '
+                         f'The pool shrinks to {len(self.pooled_containers)} containers. '
+                         f'The reason is {e}')
+            return None
+        # end try
+
+    def __get_idle_container(self) -> PooledContainer:
+        while True:
+            with self.lock:
+                if len(self.pooled_containers) == 0:
+                    raise Exception('No container is left in the pool. Containers failed to start.')
+                # end if
+            # end with
+            try:
+                return self.idle_containers.get(timeout=1.0)
+            except queue.Empty:
+                continue
+            # end try
+        # end while
+
+    def __release(self, pooled: PooledContainer, is_valid: bool):
+        """Put a container back to idle ones. A broken or a used-up container is replaced by a new one."""
+        if is_valid and (self.max_jobs_per_container is None or pooled.n_executed_jobs < self.max_jobs_per_container):
+            self.idle_containers.put(pooled)
+            return
+        # end if
+        pooled_new = self.__recycle(pooled)
+        if pooled_new is not None:
+            self.idle_containers.put(pooled_new)
+        # end if
+
+    @staticmethod
+    def is_healthy(pooled: PooledContainer) -> bool:
+        try:
+            pooled.container.reload()
+        except docker.errors.NotFound:
+            return False
+        # end try
+        return pooled.container.status == 'running'
+
+    def check_connection(self):
+        pooled = self.idle_containers.get()
+        try:
+            exit_code, command_message = pooled.container.exec_run(self.sumo_command)
+        finally:
+            self.idle_containers.put(pooled)
+        # end try
+        assert "German Aerospace Center" in command_message.decode('utf-8')
+
+    def start(self):
+        if self.is_started:
+            return
+        # end if
+        Path(self.mount_dir_host).mkdir(parents=True, exist_ok=True)
+        for __ in range(self.n_containers):
+            self.idle_containers.put(self.__run_container())
+        # end for
+        self.is_started = True
+        self.check_connection()
+
+    def close(self):
+        for pooled in list(self.pooled_containers):
+            self.__remove_container(pooled)
+        # end for
+        self.idle_containers = queue.Queue()
+        self.is_started = False
+
+    def exec_job(self, command: str) -> typing.Tuple[int, bytes]:
+        """Run a command in an idle container. The call blocks until a container is available.
+
+        Returns: (exit-code, output message)
+        """
+        assert self.is_started, 'The pool is not started yet. Call start() first.'
+        pooled = self.__get_idle_container()
+        try:
+            if not self.is_healthy(pooled):
+                pooled = self.__recycle(pooled)
+                if pooled is None:
+                    raise Exception('We failed to start a container in place of an unhealthy one.')
+                # end if
+            # end if
+            exit_code, command_message = pooled.container.exec_run(command)
+            pooled.n_executed_jobs += 1
+        except Exception:
+            # the container is not put back. A new one is started instead, if any container is left.
+            if pooled is not None:
+                self.__release(pooled, is_valid=False)
+            # end if
+            raise
+        # end try
+        self.__release(pooled, is_valid=True)
+        return exit_code, command_message
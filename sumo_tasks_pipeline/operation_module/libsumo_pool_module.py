@@ -0,0 +1,243 @@
+import dataclasses
+import importlib.util
+import multiprocessing
+import queue
+import time
+import typing
+from pathlib import Path
+
+from sumo_tasks_pipeline.logger_unit import logger
+from sumo_tasks_pipeline.operation_module.base_operation import BaseController, is_simulation_running
+from sumo_tasks_pipeline.operation_module.local_executor_module import ProcessJob, ProcessJobResult
+
+
+def run_libsumo_worker(sumo_command: str,
+                       queue_job: multiprocessing.Queue,
+                       queue_result: multiprocessing.Queue,
+                       i_worker: int):
+    """A loop of a worker process. The simulator is started once and every job is loaded into it.
+
+    A task is (job-id, command, path-log). None ends the loop.
+    """
+    import libsumo
+    is_started = False
+    while True:
+        task = queue_job.get()
+        if task is None:
+            break
+        # end if
+        job_id, command, path_log = task
+        path_config_file = Path(command[command.index('-c') + 1])
+        # all options of the job are given to SUMO, as a SUMO process would receive them.
+        args = list(command[1:])
+        if '--log' not in args:
+            args += ['--log', str(path_log)]
+        # end if
+        try:
+            if is_started:
+                libsumo.simulation.load(args)
+            else:
+                libsumo.start([sumo_command] + args)
+                is_started = True
+            # end if
+            while is_simulation_running(libsumo.simulation):
+                libsumo.simulationStep()
+            # end while
+            # SUMO closes output files of the job when something else is loaded. Only the network is loaded.
+            libsumo.simulation.load(['-n', str(BaseController.extract_net_file(path_config_file)), '--end', '0'])
+            queue_result.put((i_worker, job_id, 0, None))
+        except Exception as e:
+            queue_result.put((i_worker, job_id, 1, repr(e)))
+        # end try
+    # end while
+    if is_started:
+        libsumo.close()
+    # end if
+
+
+@dataclasses.dataclass
+class _LibsumoWorker(object):
+    process: multiprocessing.Process
+    queue_job: multiprocessing.Queue
+    affinity_key: typing.Optional[str] = None
+    job: typing.Optional[ProcessJob] = None
+    started_at: float = 0.0
+
+
+def select_job(pending_jobs: typing.List[ProcessJob], affinity_key: typing.Optional[str]) -> ProcessJob:
+    """Take the first job with the same affinity key as the worker's last job. The first job if nothing matches."""
+    for i, job in enumerate(pending_jobs):
+        if affinity_key is not None and job.affinity_key == affinity_key:
+            return pending_jobs.pop(i)
+        # end if
+    # end for
+    return pending_jobs.pop(0)
+
+
+class LibsumoWorkerPool(object):
+    def __init__(self,
+                 n_workers: int = 1,
+                 sumo_command: str = 'sumo',
+                 timeout_per_job: typing.Optional[float] = None,
+                 interval_poll: float = 0.05,
+                 n_lookahead: typing.Optional[int] = None):
+        """Worker processes that keep a libsumo simulator loaded and switch scenarios with `simulation.load`.
+
+        A job skips the start of a process and of the simulator. Jobs with the same `ProcessJob.affinity_key`,
+        Ex. the net file, go to the worker that ran the key last, so that consecutive loads read the same network,
+        which is already in the page cache. SUMO parses the network again at every `load`.
+
+        The pool has the same `run` interface as `SumoProcessExecutor`.
+        A worker over the timeout or aborted by `on_poll` is killed and started again.
+
+        Args:
+            n_workers: the number of worker processes.
+            sumo_command: a name of the SUMO binary given to `libsumo.start`.
+            timeout_per_job: (optional) wall-clock time limit in seconds per job.
+            interval_poll: interval (seconds) to check workers when nothing has ended.
+            n_lookahead: (optional) the number of jobs taken in advance to find jobs of the same key.
+             4 * n_workers if None.
+        """
+        assert n_workers > 0, f'n_workers must be > 0. Given {n_workers}'
+        if importlib.util.find_spec('libsumo') is None:
+            raise Exception('LibsumoWorkerPool needs libsumo. Run `pip install libsumo`.')
+        # end if
+        self.n_workers = n_workers
+        self.sumo_command = sumo_command
+        self.timeout_per_job = timeout_per_job
+        self.interval_poll = interval_poll
+        self.n_lookahead = n_lookahead if n_lookahead is not None else 4 * n_workers
+        self.queue_result: multiprocessing.Queue = multiprocessing.Queue()
+        self.workers: typing.List[_LibsumoWorker] = []
+
+    def __enter__(self) -> "LibsumoWorkerPool":
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def launch_worker(self, i_worker: int) -> _LibsumoWorker:
+        queue_job = multiprocessing.Queue()
+        process = multiprocessing.Process(target=run_libsumo_worker,
+                                          args=(self.sumo_command, queue_job, self.queue_result, i_worker),
+                                          daemon=True)
+        process.start()
+        return _LibsumoWorker(process=process, queue_job=queue_job)
+
+    def start(self):
+        if len(self.workers) == 0:
+            self.workers = [self.launch_worker(i) for i in range(self.n_workers)]
+        # end if
+
+    def close(self):
+        for worker in self.workers:
+            if worker.process.is_alive():
+                worker.queue_job.put(None)
+                worker.process.join(timeout=10)
+            # end if
+            if worker.process.is_alive():
+                worker.process.kill()
+            # end if
+        # end for
+        self.workers = []
+
+    def restart_worker(self, i_worker: int):
+        self.workers[i_worker].process.kill()
+        self.workers[i_worker].process.join()
+        self.workers[i_worker] = self.launch_worker(i_worker)
+
+    def get_timeout(self, job: ProcessJob) -> typing.Optional[float]:
+        if job.timeout is not None:
+            return job.timeout
+        else:
+            return self.timeout_per_job
+        # end if
+
+    @staticmethod
+    def read_log(job: ProcessJob) -> bytes:
+        path_log = Path(job.path_log)
+        if not path_log.exists():
+            return b''
+        # end if
+        log_output = path_log.read_bytes()
+        path_log.unlink()
+        return log_output
+
+    def collect(self, worker: _LibsumoWorker, return_code: typing.Optional[int],
+                is_timeout: bool = False, is_aborted: bool = False) -> ProcessJobResult:
+        result = ProcessJobResult(job=worker.job,
+                                  return_code=return_code,
+                                  log_output=self.read_log(worker.job),
+                                  elapsed_seconds=time.monotonic() - worker.started_at,
+                                  is_timeout=is_timeout,
+                                  is_aborted=is_aborted)
+        worker.job = None
+        return result
+
+    def run(self,
+            jobs: typing.Iterable[ProcessJob],
+            on_poll: typing.Optional[typing.Callable[[ProcessJob], bool]] = None,
+            can_launch: typing.Optional[typing.Callable[[], bool]] = None
+            ) -> typing.Iterator[ProcessJobResult]:
+        """Run jobs and yield results in the order of completion. See `SumoProcessExecutor.run`."""
+        self.start()
+        iter_jobs = iter(jobs)
+        pending_jobs: typing.List[ProcessJob] = []
+        is_exhausted = False
+        while True:
+            while is_exhausted is False and len(pending_jobs) < self.n_lookahead:
+                try:
+                    pending_jobs.append(next(iter_jobs))
+                except StopIteration:
+                    is_exhausted = True
+                # end try
+            # end while
+            for worker in self.workers:
+                if worker.job is None and len(pending_jobs) > 0 and (can_launch is None or can_launch()):
+                    job = select_job(pending_jobs, worker.affinity_key)
+                    Path(job.path_log).parent.mkdir(parents=True, exist_ok=True)
+                    worker.job, worker.affinity_key, worker.started_at = job, job.affinity_key, time.monotonic()
+                    worker.queue_job.put((job.job_id, job.command, str(job.path_log)))
+                # end if
+            # end for
+            if all(worker.job is None for worker in self.workers) and len(pending_jobs) == 0:
+                break
+            # end if
+
+            seq_done = []
+            try:
+                i_worker, job_id, return_code, message = self.queue_result.get(timeout=self.interval_poll)
+                worker_result = self.workers[i_worker]
+                if worker_result.job is None or worker_result.job.job_id != job_id:
+                    # a result of a job killed at timeout, put just before the worker was killed.
+                    logger.debug(f'drop a stale result of job_id={job_id} from worker {i_worker}.')
+                else:
+                    if message is not None:
+                        logger.error(f'job_id={job_id} failed in a libsumo worker. The reason is {message}')
+                    # end if
+                    seq_done.append(self.collect(worker_result, return_code))
+                # end if
+            except queue.Empty:
+                pass
+            # end try
+            for i_worker, worker in enumerate(self.workers):
+                if worker.job is None:
+                    continue
+                # end if
+                if not worker.process.is_alive():
+                    logger.error(f'a libsumo worker died while running job_id={worker.job.job_id}.')
+                    seq_done.append(self.collect(worker, worker.process.exitcode))
+                    self.workers[i_worker] = self.launch_worker(i_worker)
+                    continue
+                # end if
+                timeout = self.get_timeout(worker.job)
+                is_timeout = timeout is not None and time.monotonic() - worker.started_at > timeout
+                if is_timeout or (on_poll is not None and on_poll(worker.job)):
+                    logger.warning(f'job_id={worker.job.job_id} is killed. timeout={is_timeout}')
+                    seq_done.append(self.collect(worker, None, is_timeout=is_timeout, is_aborted=not is_timeout))
+                    self.restart_worker(i_worker)
+                # end if
+            # end for
+            yield from seq_done
+        # end while
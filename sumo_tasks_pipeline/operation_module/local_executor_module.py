@@ -0,0 +1,197 @@
+import dataclasses
+import os
+import signal
+import subprocess
+import time
+import typing
+from pathlib import Path
+
+from sumo_tasks_pipeline.logger_unit import logger
+
+
+@dataclasses.dataclass
+class ProcessJob(object):
+    """A command to run by `SumoProcessExecutor`.
+
+    Args:
+        job_id: job-id.
+        command: command to run. Ex. ['sumo', '-c', 'grid.sumo.cfg']
+        path_log: a file where stdout and stderr of the process are written.
+        timeout: (optional) wall-clock time limit in seconds. Overwrites the executor's one.
+        payload: (optional) any object that is given back with the result.
+        affinity_key: (optional) jobs with the same key prefer the same worker. Ex. a path to the net file.
+    """
+    job_id: str
+    command: typing.List[str]
+    path_log: Path
+    timeout: typing.Optional[float] = None
+    payload: typing.Any = None
+    affinity_key: typing.Optional[str] = None
+
+
+@dataclasses.dataclass
+class ProcessJobResult(object):
+    job: ProcessJob
+    return_code: typing.Optional[int]
+    log_output: bytes
+    elapsed_seconds: float
+    is_timeout: bool = False
+    is_aborted: bool = False
+
+    @property
+    def is_success(self) -> bool:
+        return self.is_timeout is False and self.is_aborted is False and self.return_code == 0
+
+
+@dataclasses.dataclass
+class _RunningProcess(object):
+    job: ProcessJob
+    process: subprocess.Popen
+    log_file: typing.IO
+    started_at: float
+
+
+class SumoProcessExecutor(object):
+    def __init__(self,
+                 n_jobs: int = 1,
+                 timeout_per_job: typing.Optional[float] = None,
+                 interval_poll: float = 0.05):
+        """Runs processes from a single supervisor. Nothing is serialized, and no worker process is spawned.
+
+        The supervisor keeps up to `n_jobs` processes running, checks them with non-blocking waits
+        and kills a process (with its children) when it exceeds the wall-clock timeout.
+
+        Args:
+            n_jobs: the number of processes running at the same time.
+            timeout_per_job: (optional) wall-clock time limit in seconds per job. None never kills.
+            interval_poll: interval (seconds) to check processes when nothing has ended.
+        """
+        assert n_jobs > 0, f'n_jobs must be > 0. Given {n_jobs}'
+        self.n_jobs = n_jobs
+        self.timeout_per_job = timeout_per_job
+        self.interval_poll = interval_poll
+
+    @staticmethod
+    def kill_process(process: subprocess.Popen):
+        try:
+            if os.name == 'posix':
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+            # end if
+        except (ProcessLookupError, PermissionError):
+            pass
+        # end try
+        process.wait()
+
+    def launch(self, job: ProcessJob) -> typing.Union[_RunningProcess, ProcessJobResult]:
+        """Start a process. Returns: a failed `ProcessJobResult` if the process can not start."""
+        Path(job.path_log).parent.mkdir(parents=True, exist_ok=True)
+        log_file = Path(job.path_log).open('wb')
+        logger.debug(f'executing job with command {job.command}')
+        try:
+            # a new session lets us kill SUMO together with its child processes.
+            process = subprocess.Popen(job.command, stdout=log_file, stderr=subprocess.STDOUT,
+                                       start_new_session=(os.name == 'posix'))
+        except (OSError, ValueError) as e:
+            log_file.close()
+            Path(job.path_log).unlink()
+            return ProcessJobResult(job=job,
+                                    return_code=None,
+                                    log_output=f'failed to start the process. The reason is {e}'.encode('utf-8'),
+                                    elapsed_seconds=0.0)
+        # end try
+        return _RunningProcess(job=job, process=process, log_file=log_file, started_at=time.monotonic())
+
+    def get_timeout(self, job: ProcessJob) -> typing.Optional[float]:
+        if job.timeout is not None:
+            return job.timeout
+        else:
+            return self.timeout_per_job
+        # end if
+
+    @staticmethod
+    def collect(running: _RunningProcess, is_timeout: bool, is_aborted: bool = False) -> ProcessJobResult:
+        running.log_file.close()
+        path_log = Path(running.job.path_log)
+        log_output = path_log.read_bytes()
+        path_log.unlink()
+        return ProcessJobResult(job=running.job,
+                                return_code=running.process.returncode,
+                                log_output=log_output,
+                                elapsed_seconds=time.monotonic() - running.started_at,
+                                is_timeout=is_timeout,
+                                is_aborted=is_aborted)
+
+    def run(self,
+            jobs: typing.Iterable[ProcessJob],
+            on_poll: typing.Optional[typing.Callable[[ProcessJob], bool]] = None,
+            can_launch: typing.Optional[typing.Callable[[], bool]] = None
+            ) -> typing.Iterator[ProcessJobResult]:
+        """Run jobs and yield results in the order of completion.
+
+        `jobs` is consumed lazily; a job is taken only when a slot becomes free.
+        Closing the iterator kills the running processes.
+
+        Args:
+            jobs: jobs to run.
+            on_poll: (optional) a function called with a running job at every check. Returning True kills the job.
+            can_launch: (optional) no new job is taken while it returns False. Running jobs are still checked.
+        """
+        iter_jobs = iter(jobs)
+        seq_running: typing.List[_RunningProcess] = []
+        is_exhausted = False
+        try:
+            while True:
+                while is_exhausted is False and len(seq_running) < self.n_jobs \
+                        and (can_launch is None or can_launch()):
+                    try:
+                        job = next(iter_jobs)
+                    except StopIteration:
+                        is_exhausted = True
+                        break
+                    # end try
+                    running_or_result = self.launch(job)
+                    if isinstance(running_or_result, ProcessJobResult):
+                        yield running_or_result
+                    else:
+                        seq_running.append(running_or_result)
+                    # end if
+                # end while
+                if len(seq_running) == 0 and is_exhausted:
+                    break
+                # end if
+
+                seq_done = []
+                for running in seq_running:
+                    if running.process.poll() is not None:
+                        seq_done.append((running, False, False))
+                        continue
+                    # end if
+                    timeout = self.get_timeout(running.job)
+                    if timeout is not None and time.monotonic() - running.started_at > timeout:
+                        logger.warning(f'job_id={running.job.job_id} exceeded {timeout} seconds. Killing it.')
+                        self.kill_process(running.process)
+                        seq_done.append((running, True, False))
+                    elif on_poll is not None and on_poll(running.job):
+                        logger.warning(f'job_id={running.job.job_id} is aborted. Killing it.')
+                        self.kill_process(running.process)
+                        seq_done.append((running, False, True))
+                    # end if
+                # end for
+
+                if len(seq_done) == 0:
+                    time.sleep(self.interval_poll)
+                    continue
+                # end if
+                for running, is_timeout, is_aborted in seq_done:
+                    seq_running.remove(running)
+                    yield self.collect(running, is_timeout, is_aborted)
+                # end for
+            # end while
+        finally:
+            for running in seq_running:
+                self.kill_process(running.process)
+                running.log_file.close()
+            # end for
+        # end try
@@ -1,8 +1,10 @@
 from pathlib import Path, WindowsPath
 import subprocess
 import shutil
+import typing
 from sumo_tasks_pipeline.logger_unit import logger
 from sumo_tasks_pipeline.operation_module.base_operation import BaseController
+from sumo_tasks_pipeline.trace_module import StageTracer, trace_stage
 from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
 from sumo_tasks_pipeline.commons.result_module import SumoResultObjects
 
@@ -13,7 +15,11 @@ class LocalSumoController(BaseController):
                  is_rewrite_windows_path: bool = True,
                  is_copy_config_dir: bool = True,
                  is_compress_result: bool = False,
-                 default_archive_format: str = 'bztar'):
+                 default_archive_format: typing.Optional[str] = None,
+                 staging_mode: str = 'copy',
+                 compress_level: typing.Optional[int] = None,
+                 n_compress_threads: int = -1,
+                 tracer: typing.Optional[StageTracer] = None):
         """
 
         Args:
@@ -21,6 +27,14 @@ class LocalSumoController(BaseController):
             is_rewrite_windows_path: Automatic path fix for Windows.
             is_copy_config_dir: True; run SUMO simulation AFTER copy the original config file to tmp directory; False NOT.
             is_compress_result: True; Compress the result with tar.zip (deleting the uncompressed directory). False; not compress the directory nor delete it.
+            default_archive_format: 'tar.zst' or 'tar.gz' archives only outputs as a stream.
+             Formats of `shutil.make_archive` (Ex. 'bztar') archive the whole config directory.
+             'tar.zst' if zstandard is installed, otherwise 'tar.gz' if None.
+            compress_level: (optional) a compression level of 'tar.zst' or 'tar.gz'.
+            n_compress_threads: the number of threads of zstd. -1 uses all cores.
+            tracer: (optional) records time of copying the config, running SUMO and packing outputs.
+            staging_mode: how to copy the config directory. 'copy' copies all files.
+             'hardlink', 'reflink' or 'auto' links input files, copies config files and creates an empty output directory.
         """
         if sumo_command is None:
             sumo_command = shutil.which('sumo')
@@ -33,7 +47,11 @@ class LocalSumoController(BaseController):
             is_rewrite_windows_path=is_rewrite_windows_path,
             is_copy_config_dir=is_copy_config_dir,
             is_compress_result=is_compress_result,
-            default_archive_format=default_archive_format
+            default_archive_format=default_archive_format,
+            staging_mode=staging_mode,
+            compress_level=compress_level,
+            n_compress_threads=n_compress_threads,
+            tracer=tracer
         )
         self.check_connection()
 
@@ -53,14 +71,10 @@ class LocalSumoController(BaseController):
         assert r_code == 0
         return outs.decode('utf-8')
 
-    def start_job(self, sumo_config: SumoConfigObject) -> SumoResultObjects:
-        """Run SUMO on local.
+    def build_job_command(self, sumo_config: SumoConfigObject) -> typing.Tuple[SumoConfigObject, typing.List[str]]:
+        """Prepare the config directory and build a command to run SUMO.
 
-        Args:
-            target_scenario_name: Nothing. Keep it None.
-            config_file_name: "sumo.cfg" name.
-
-        Returns: `SumoResultObjects`
+        Returns: (`SumoConfigObject` after copying the config directory, command)
         """
         sumo_config = self.copy_config_file(sumo_config, is_copy_config_dir=self.is_copy_config_dir)
         if self.is_rewrite_windows_path and isinstance(sumo_config.path_config_dir, WindowsPath):
@@ -69,13 +83,24 @@ class LocalSumoController(BaseController):
         else:
             path_config_file = sumo_config.path_config_dir.joinpath(sumo_config.config_name)
         # end if
+        return sumo_config, [self.sumo_command, '-c', str(path_config_file)]
+
+    def start_job(self, sumo_config: SumoConfigObject) -> SumoResultObjects:
+        """Run SUMO on local.
 
-        job_command = f'{self.sumo_command} -c {path_config_file}'
-        logger.debug(f'executing job with command {job_command}')
+        Args:
+            target_scenario_name: Nothing. Keep it None.
+            config_file_name: "sumo.cfg" name.
 
-        sumo_bash_command = [self.sumo_command, '-c', path_config_file]
-        pipe_obj = subprocess.Popen(sumo_bash_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        outs, errs = pipe_obj.communicate()
+        Returns: `SumoResultObjects`
+        """
+        sumo_config, sumo_bash_command = self.build_job_command(sumo_config)
+        logger.debug(f'executing job with command {" ".join(sumo_bash_command)}')
+
+        with trace_stage(self.tracer, 'sumo_run', sumo_config.job_id):
+            pipe_obj = subprocess.Popen(sumo_bash_command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+            outs, errs = pipe_obj.communicate()
+        # end with
         r_code = pipe_obj.returncode
         assert r_code == 0
 
@@ -0,0 +1,150 @@
+import errno
+import os
+import shutil
+import typing
+from pathlib import Path
+
+import lxml.etree
+
+from sumo_tasks_pipeline.logger_unit import logger
+
+try:
+    import fcntl
+except ImportError:
+    # not available on Windows.
+    fcntl = None
+# end try
+
+STAGING_MODES = ('copy', 'hardlink', 'reflink', 'auto')
+# ioctl request code of FICLONE on Linux. Btrfs, XFS (reflink=1) and some other file systems support it.
+FICLONE = 0x40049409
+# files that are always copied. SUMO never writes into inputs, but config files may be rewritten per job.
+SUFFIXES_ALWAYS_COPY = ('.cfg', '.sumocfg')
+
+
+def reflink_file(path_source: Path, path_target: Path):
+    """Clone a file with copy-on-write. Raises OSError if the file system does not support it."""
+    if fcntl is None:
+        raise OSError(errno.EOPNOTSUPP, 'reflink is not supported on this platform')
+    # end if
+    with Path(path_source).open('rb') as f_source:
+        with Path(path_target).open('wb') as f_target:
+            try:
+                fcntl.ioctl(f_target.fileno(), FICLONE, f_source.fileno())
+            except OSError:
+                f_target.close()
+                Path(path_target).unlink()
+                raise
+            # end try
+        # end with
+    # end with
+    shutil.copystat(path_source, path_target)
+
+
+def stage_file(path_source: Path, path_target: Path, staging_mode: str) -> str:
+    """Put a file at `path_target` without copying data if possible.
+
+    Args:
+        path_source: a source file.
+        path_target: a target path.
+        staging_mode: 'hardlink' tries a hard link, 'reflink' tries a copy-on-write clone,
+         'auto' tries reflink and then hardlink. Every mode falls back to a copy.
+    Returns: the method used. 'reflink', 'hardlink' or 'copy'.
+    """
+    if staging_mode == 'auto':
+        seq_methods = ['reflink', 'hardlink']
+    elif staging_mode in ('reflink', 'hardlink'):
+        seq_methods = [staging_mode]
+    else:
+        seq_methods = []
+    # end if
+    for method in seq_methods:
+        try:
+            if method == 'reflink':
+                reflink_file(path_source, path_target)
+            else:
+                os.link(path_source, path_target)
+            # end if
+            return method
+        except OSError as e:
+            logger.debug(f'{method} failed for {path_source}. The reason is {e}')
+        # end try
+    # end for
+    shutil.copy2(path_source, path_target)
+    return 'copy'
+
+
+def find_output_dir(path_config_file: Path) -> typing.Optional[Path]:
+    """A directory of outputs given by <output-prefix>. None if the prefix does not point to a directory."""
+    root = lxml.etree.parse(str(path_config_file)).getroot()
+    if root.find('output') is None or root.find('output').find('output-prefix') is None:
+        return None
+    # end if
+    prefix = root.find('output').find('output-prefix').attrib['value']
+    path_candidate = Path(os.path.normpath(Path(path_config_file).parent.joinpath(prefix)))
+    if prefix.endswith('/') or path_candidate.is_dir():
+        return path_candidate
+    elif Path(prefix).parent != Path('.'):
+        # Ex. "output/y99." is a file-name prefix in "output/"
+        return path_candidate.parent
+    else:
+        return None
+    # end if
+
+
+def stage_config_dir(path_source_dir: Path,
+                     path_target_dir: Path,
+                     config_name: str,
+                     staging_mode: str = 'auto') -> typing.Dict[str, int]:
+    """Build a job directory from a scenario directory.
+
+    Input files are linked with `stage_file`, config files are copied,
+    and the output directory starts empty. Stale outputs in the source are not staged.
+
+    Args:
+        path_source_dir: a scenario directory.
+        path_target_dir: a job directory. Removed first if it exists.
+        config_name: a name of the SUMO config file in `path_source_dir`.
+        staging_mode: 'copy', 'hardlink', 'reflink' or 'auto'. 'copy' copies the whole directory as it is.
+    Returns: {method: the number of files}
+    """
+    assert staging_mode in STAGING_MODES, f'staging_mode must be one of {STAGING_MODES}. Given {staging_mode}'
+    path_source_dir = Path(path_source_dir)
+    path_target_dir = Path(path_target_dir)
+    if path_target_dir.exists():
+        shutil.rmtree(path_target_dir)
+    # end if
+    if staging_mode == 'copy':
+        shutil.copytree(path_source_dir, dst=path_target_dir)
+        return {'copy': sum(1 for p in path_target_dir.rglob('*') if p.is_file())}
+    # end if
+
+    path_output_dir = find_output_dir(path_source_dir.joinpath(config_name))
+    if path_output_dir is not None and path_source_dir not in path_output_dir.parents:
+        # outputs are written outside of the scenario directory.
+        path_output_dir = None
+    # end if
+    d_method2count = {'reflink': 0, 'hardlink': 0, 'copy': 0}
+    for dir_path, dir_names, file_names in os.walk(path_source_dir):
+        path_dir = Path(dir_path)
+        path_dir_target = path_target_dir.joinpath(path_dir.relative_to(path_source_dir))
+        if path_output_dir is not None and path_dir == path_output_dir:
+            dir_names.clear()
+            continue
+        # end if
+        path_dir_target.mkdir(parents=True, exist_ok=True)
+        for file_name in file_names:
+            path_file = path_dir.joinpath(file_name)
+            if path_file.suffix in SUFFIXES_ALWAYS_COPY:
+                shutil.copy2(path_file, path_dir_target.joinpath(file_name))
+                d_method2count['copy'] += 1
+            else:
+                d_method2count[stage_file(path_file, path_dir_target.joinpath(file_name), staging_mode)] += 1
+            # end if
+        # end for
+    # end for
+    if path_output_dir is not None:
+        # SUMO fails if the output directory does not exist.
+        path_target_dir.joinpath(path_output_dir.relative_to(path_source_dir)).mkdir(parents=True, exist_ok=True)
+    # end if
+    return d_method2count
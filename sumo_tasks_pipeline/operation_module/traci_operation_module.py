@@ -0,0 +1,351 @@
+import dataclasses
+import typing
+import uuid
+from pathlib import Path
+
+import numpy
+
+from sumo_tasks_pipeline.logger_unit import logger
+from sumo_tasks_pipeline.operation_module.base_operation import BaseController, is_simulation_running
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+from sumo_tasks_pipeline.commons.result_module import SumoResultObjects
+from sumo_tasks_pipeline import static
+
+try:
+    import traci
+    import traci.constants as traci_constants
+except ImportError:
+    traci = None
+    traci_constants = None
+# end try
+
+# a file in the output directory where subscribed values are saved.
+FILE_NAME_SUBSCRIPTIONS = 'traci_subscriptions.npz'
+# domains of TraCI that have subscriptions of a fixed set of objects.
+SUBSCRIPTION_DOMAINS = ('edge', 'lane', 'inductionloop', 'lanearea', 'multientryexit', 'junction', 'trafficlight')
+
+
+def resolve_variable(variable: typing.Union[int, str]) -> int:
+    """A variable id of TraCI. A name in `traci.constants` is converted. Ex. 'LAST_STEP_VEHICLE_NUMBER' -> 0x10"""
+    if isinstance(variable, int):
+        return variable
+    # end if
+    if traci_constants is None:
+        raise Exception('variable names need traci. Run `pip install traci` or give variable ids.')
+    # end if
+    return getattr(traci_constants, variable)
+
+
+@dataclasses.dataclass
+class SubscriptionSpec(object):
+    """Variables to subscribe for objects of a domain.
+
+    Args:
+        domain: a domain of TraCI. Ex. 'edge', 'lane', 'inductionloop'
+        object_ids: ids of objects. Ex. ids of edges.
+        variables: variable ids or names in `traci.constants`. Ex. ['LAST_STEP_VEHICLE_NUMBER', 'LAST_STEP_MEAN_SPEED']
+        name: (optional) a name of the subscription. `domain` if None.
+    """
+    domain: str
+    object_ids: typing.List[str]
+    variables: typing.List[typing.Union[int, str]]
+    name: typing.Optional[str] = None
+
+    def __post_init__(self):
+        assert self.domain in SUBSCRIPTION_DOMAINS, f'domain must be one of {SUBSCRIPTION_DOMAINS}.'
+        if self.name is None:
+            self.name = self.domain
+        # end if
+
+
+class SubscriptionBuffer(object):
+    def __init__(self, spec: SubscriptionSpec, initial_capacity: int = 1024):
+        """Values of a subscription in a (step, object, variable) array. The capacity doubles when it is full.
+
+        Args:
+            spec: `SubscriptionSpec`
+            initial_capacity: the number of steps allocated first.
+        """
+        self.spec = spec
+        self.variable_ids = [resolve_variable(v) for v in spec.variables]
+        self.d_object2index = {object_id: i for i, object_id in enumerate(spec.object_ids)}
+        self.times = numpy.zeros(initial_capacity)
+        self.values = numpy.full((initial_capacity, len(spec.object_ids), len(self.variable_ids)), numpy.nan)
+        self.n_steps = 0
+
+    def grow(self):
+        capacity = len(self.times) * 2
+        times = numpy.zeros(capacity)
+        times[:self.n_steps] = self.times[:self.n_steps]
+        values = numpy.full((capacity,) + self.values.shape[1:], numpy.nan)
+        values[:self.n_steps] = self.values[:self.n_steps]
+        self.times, self.values = times, values
+
+    def append(self, time_step: float, results: typing.Dict[str, typing.Dict[int, typing.Any]]):
+        """Add results of `getAllSubscriptionResults`. {object-id: {variable-id: value}}. Non-numeric values are NaN."""
+        if self.n_steps == len(self.times):
+            self.grow()
+        # end if
+        self.times[self.n_steps] = time_step
+        row = self.values[self.n_steps]
+        for object_id, d_variable2value in results.items():
+            i_object = self.d_object2index.get(object_id)
+            if i_object is None:
+                continue
+            # end if
+            for i_variable, variable_id in enumerate(self.variable_ids):
+                value = d_variable2value.get(variable_id)
+                if isinstance(value, (int, float)):
+                    row[i_object, i_variable] = value
+                # end if
+            # end for
+        # end for
+        self.n_steps += 1
+
+    def get_times(self) -> numpy.ndarray:
+        return self.times[:self.n_steps]
+
+    def get_values(self) -> numpy.ndarray:
+        """Returns: an array of (step, object, variable)."""
+        return self.values[:self.n_steps]
+
+    def get_variable(self, variable: typing.Union[int, str]) -> numpy.ndarray:
+        """Returns: an array of (step, object) of a variable."""
+        return self.get_values()[:, :, self.variable_ids.index(resolve_variable(variable))]
+
+
+@dataclasses.dataclass
+class TraciStepState(object):
+    """A state given to stop conditions after every step.
+
+    Args:
+        connection: a TraCI connection. Ex. `connection.simulation.getMinExpectedNumber()`
+        time_step: the simulation time in seconds.
+        n_steps: the number of steps done.
+        buffers: {subscription-name: `SubscriptionBuffer`}
+    """
+    connection: typing.Any
+    time_step: float
+    n_steps: int
+    buffers: typing.Dict[str, SubscriptionBuffer]
+
+
+def stop_when_network_empty(state: TraciStepState) -> bool:
+    """True when no vehicle is running and no vehicle waits for the departure."""
+    return state.connection.simulation.getMinExpectedNumber() == 0
+
+
+class KpiConvergence(object):
+    def __init__(self,
+                 subscription_name: str,
+                 variable: typing.Union[int, str],
+                 window: int = 100,
+                 rtol: float = 0.01,
+                 min_steps: int = 0,
+                 reduce: typing.Callable[[numpy.ndarray], float] = numpy.nanmean):
+        """A stop condition that is True when a KPI stops changing.
+
+        The KPI is `reduce` of a subscribed variable over the last `window` steps and all objects.
+        It converges when the relative change from the previous window is below `rtol`.
+
+        Args:
+            subscription_name: a name of `SubscriptionSpec`.
+            variable: a variable of the subscription.
+            window: the number of steps of a window.
+            rtol: the tolerance of the relative change.
+            min_steps: the condition is False before this number of steps.
+            reduce: a function to compute the KPI from an array of (step, object).
+        """
+        self.subscription_name = subscription_name
+        self.variable = variable
+        self.window = window
+        self.rtol = rtol
+        self.min_steps = min_steps
+        self.reduce = reduce
+
+    def __call__(self, state: TraciStepState) -> bool:
+        if state.n_steps < max(self.min_steps, 2 * self.window) or state.n_steps % self.window != 0:
+            return False
+        # end if
+        values = state.buffers[self.subscription_name].get_variable(self.variable)
+        kpi_previous = self.reduce(values[-2 * self.window:-self.window])
+        kpi_current = self.reduce(values[-self.window:])
+        if numpy.isnan(kpi_previous) or numpy.isnan(kpi_current):
+            return False
+        # end if
+        return abs(kpi_current - kpi_previous) <= self.rtol * max(abs(kpi_previous), 1e-12)
+
+
+class TraciSumoController(BaseController):
+    def __init__(self,
+                 sumo_command: str = 'sumo',
+                 subscriptions: typing.Optional[typing.List[SubscriptionSpec]] = None,
+                 stop_conditions: typing.Optional[typing.List[typing.Callable[[TraciStepState], bool]]] = None,
+                 max_steps: typing.Optional[int] = None,
+                 is_reuse_process: bool = True,
+                 is_copy_config_dir: bool = True,
+                 is_compress_result: bool = False,
+                 default_archive_format: typing.Optional[str] = None,
+                 staging_mode: str = 'copy',
+                 label: typing.Optional[str] = None):
+        """Runs SUMO step by step through TraCI.
+
+        Subscribed values are pulled once per step with `getAllSubscriptionResults` into NumPy buffers,
+        and the simulation stops early when any of `stop_conditions` returns True.
+        Otherwise it runs until the end time of the config, as a SUMO process does.
+        Give `stop_when_network_empty` to stop when no vehicle is left.
+        The SUMO process stays open after a job, and the next job is loaded into the same process.
+
+        Args:
+            sumo_command: Path to the SUMO command.
+            subscriptions: (optional) variables to record every step.
+             Buffers are saved into `traci_subscriptions.npz` in the output directory.
+            stop_conditions: (optional) functions called with `TraciStepState` after every step.
+             Ex. `stop_when_network_empty`, `KpiConvergence`.
+            max_steps: (optional) the max number of steps.
+            is_reuse_process: True loads the next job into the running SUMO process. False starts SUMO per job.
+            is_copy_config_dir: True; run SUMO simulation AFTER copy the original config file to tmp directory.
+            is_compress_result: True; Compress the result (deleting the uncompressed directory).
+            default_archive_format: see `LocalSumoController`.
+            staging_mode: how to copy the config directory. See `LocalSumoController`.
+            label: (optional) a label of the TraCI connection. A random label if None.
+        """
+        if traci is None:
+            raise Exception('TraciSumoController needs traci. Run `pip install traci`.')
+        # end if
+        super(TraciSumoController, self).__init__(
+            sumo_command=sumo_command,
+            is_copy_config_dir=is_copy_config_dir,
+            is_compress_result=is_compress_result,
+            default_archive_format=default_archive_format,
+            staging_mode=staging_mode
+        )
+        self.subscriptions = subscriptions if subscriptions is not None else []
+        self.stop_conditions = stop_conditions if stop_conditions is not None else []
+        self.max_steps = max_steps
+        self.is_reuse_process = is_reuse_process
+        self.label = label if label is not None else f'sumo-tasks-pipeline-{uuid.uuid4()}'
+        self.path_log = Path(static.PATH_PACKAGE_WORK_DIR).joinpath(static.SUBDIRECTORY_LOG).\
+            joinpath(f'{self.label}.log')
+        self.connection = None
+
+    def check_connection(self):
+        assert self.connection is not None, 'SUMO is not running.'
+
+    def get_sumo_version(self) -> str:
+        if self.connection is None:
+            return ''
+        # end if
+        return str(self.connection.getVersion())
+
+    def open_connection(self, command: typing.List[str]):
+        if self.connection is not None and self.is_reuse_process:
+            self.connection.load(command[1:])
+            return
+        # end if
+        self.close()
+        self.path_log.parent.mkdir(parents=True, exist_ok=True)
+        with self.path_log.open('ab') as f_log:
+            traci.start(command, label=self.label, stdout=f_log)
+        # end with
+        self.connection = traci.getConnection(self.label)
+
+    def release_outputs(self, path_config_file: Path):
+        """Let SUMO close output files of the job.
+
+        The process is kept; only the network is loaded, so that no output of the config file is opened again.
+        """
+        if self.is_reuse_process:
+            self.connection.load(['-n', str(self.extract_net_file(path_config_file)), '--end', '0'])
+        else:
+            self.close()
+        # end if
+
+    def close(self):
+        """Close SUMO. Outputs are flushed."""
+        if self.connection is not None:
+            self.connection.close()
+            self.connection = None
+        # end if
+
+    def subscribe(self) -> typing.Dict[str, SubscriptionBuffer]:
+        buffers = {}
+        for spec in self.subscriptions:
+            buffer = SubscriptionBuffer(spec)
+            domain = getattr(self.connection, spec.domain)
+            for object_id in spec.object_ids:
+                domain.subscribe(object_id, buffer.variable_ids)
+            # end for
+            buffers[spec.name] = buffer
+        # end for
+        return buffers
+
+    def run_steps(self, buffers: typing.Dict[str, SubscriptionBuffer]) -> TraciStepState:
+        state = TraciStepState(connection=self.connection, time_step=0.0, n_steps=0, buffers=buffers)
+        d_name2domain = {spec.name: getattr(self.connection, spec.domain) for spec in self.subscriptions}
+        while is_simulation_running(self.connection.simulation):
+            self.connection.simulationStep()
+            state.n_steps += 1
+            state.time_step = self.connection.simulation.getTime()
+            for name, domain in d_name2domain.items():
+                # one call per domain, not one call per object and variable.
+                buffers[name].append(state.time_step, domain.getAllSubscriptionResults())
+            # end for
+            if self.max_steps is not None and state.n_steps >= self.max_steps:
+                logger.debug(f'reached max_steps={self.max_steps}.')
+                break
+            # end if
+            if any(condition(state) for condition in self.stop_conditions):
+                logger.debug(f'a stop condition is met at time={state.time_step}.')
+                break
+            # end if
+        # end while
+        return state
+
+    @staticmethod
+    def save_buffers(buffers: typing.Dict[str, SubscriptionBuffer], path_output_dir: Path) -> typing.Optional[Path]:
+        if len(buffers) == 0:
+            return None
+        # end if
+        arrays = {}
+        for name, buffer in buffers.items():
+            arrays[f'{name}.times'] = buffer.get_times()
+            arrays[f'{name}.values'] = buffer.get_values()
+            arrays[f'{name}.object_ids'] = numpy.array(buffer.spec.object_ids, dtype=str)
+            arrays[f'{name}.variables'] = numpy.array(buffer.variable_ids, dtype=int)
+        # end for
+        path_output_dir.mkdir(parents=True, exist_ok=True)
+        path_npz = path_output_dir.joinpath(FILE_NAME_SUBSCRIPTIONS)
+        with path_npz.open('wb') as f:
+            numpy.savez_compressed(f, **arrays)
+        # end with
+        return path_npz
+
+    def start_job(self, sumo_config: SumoConfigObject) -> SumoResultObjects:
+        """Run SUMO with TraCI until the simulation ends, `max_steps` or a stop condition.
+
+        Returns: `SumoResultObjects`
+        """
+        sumo_config = self.copy_config_file(sumo_config, is_copy_config_dir=self.is_copy_config_dir)
+        path_config_file = sumo_config.path_config_dir.joinpath(sumo_config.config_name)
+        # SUMO writes logs of all jobs into one file. Logs of this job start from here.
+        offset_log = self.path_log.stat().st_size if self.path_log.exists() else 0
+        try:
+            self.open_connection([self.sumo_command, '-c', str(path_config_file)])
+            buffers = self.subscribe()
+            state = self.run_steps(buffers)
+            self.release_outputs(path_config_file)
+        except Exception:
+            self.close()
+            raise
+        # end try
+        logger.debug(f'job_id={sumo_config.job_id} ended at time={state.time_step} after {state.n_steps} steps.')
+        self.save_buffers(buffers, self.extract_output_dir(path_config_file))
+        log_output = b''
+        if self.path_log.exists():
+            with self.path_log.open('rb') as f:
+                f.seek(offset_log)
+                log_output = f.read()
+            # end with
+        # end if
+        return self.pack_sumo_result(sumo_config, log_output)
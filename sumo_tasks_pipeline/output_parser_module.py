@@ -0,0 +1,341 @@
+import array
+import contextlib
+import dataclasses
+import gzip
+import struct
+import typing
+import zipfile
+from pathlib import Path
+
+import numpy
+import pandas
+from lxml import etree
+
+# attributes that identify a row. They are not converted into matrices.
+KEY_ATTRIBUTES = ('id', 'begin', 'end')
+# elements that make rows. <interval> of E1/E2/E3 detectors, <edge> and <lane> of edgeData/laneData.
+TAGS_ROW = ('interval', 'edge', 'lane')
+COLUMNAR_FORMATS = ('npz', 'parquet')
+# a prefix of arrays of attributes in a npz file.
+PREFIX_NPZ_ATTRIBUTE = 'attribute.'
+
+
+@dataclasses.dataclass
+class DetectorMatrix(object):
+    """Values of detector outputs in dense matrices.
+
+    Args:
+        detector_ids: ids of detectors (or edges, lanes) in the order of appearance. Rows of matrices.
+        interval_begins: begin times of intervals in ascending order. Columns of matrices.
+        interval_ends: end times of intervals.
+        matrices: {attribute-name: array of (detector, interval)}. A missing value is NaN.
+         SUMO writes -1 for some attributes (Ex. speed) when no vehicle passed. It is kept as it is.
+    """
+    detector_ids: typing.List[str]
+    interval_begins: numpy.ndarray
+    interval_ends: numpy.ndarray
+    matrices: typing.Dict[str, numpy.ndarray]
+
+    def __getitem__(self, attribute_name: str) -> numpy.ndarray:
+        return self.matrices[attribute_name]
+
+    @property
+    def attributes(self) -> typing.List[str]:
+        return list(self.matrices.keys())
+
+    def get_detector_index(self) -> typing.Dict[str, int]:
+        return {detector_id: i for i, detector_id in enumerate(self.detector_ids)}
+
+
+class _RowCollector(object):
+    """Collects rows into compact arrays. Memory is proportional to values, not to the XML tree."""
+
+    def __init__(self, attributes: typing.Optional[typing.List[str]]):
+        self.attributes = attributes
+        self.d_detector2index: typing.Dict[str, int] = {}
+        self.d_begin2end: typing.Dict[float, float] = {}
+        self.seq_detector_index = array.array('q')
+        self.seq_begin = array.array('d')
+        self.d_attribute2values: typing.Dict[str, array.array] = {}
+
+    def set_attributes(self, attrib: typing.Mapping[str, str]):
+        attributes = []
+        for key_name, value in attrib.items():
+            if key_name in KEY_ATTRIBUTES:
+                continue
+            # end if
+            try:
+                float(value)
+            except ValueError:
+                continue
+            # end try
+            attributes.append(key_name)
+        # end for
+        self.attributes = attributes
+
+    def add(self, detector_id: str, time_begin: float, time_end: float, attrib: typing.Mapping[str, str]):
+        if self.attributes is None:
+            self.set_attributes(attrib)
+        # end if
+        if len(self.d_attribute2values) == 0:
+            self.d_attribute2values = {a: array.array('d') for a in self.attributes}
+        # end if
+        if detector_id not in self.d_detector2index:
+            self.d_detector2index[detector_id] = len(self.d_detector2index)
+        # end if
+        self.d_begin2end[time_begin] = time_end
+        self.seq_detector_index.append(self.d_detector2index[detector_id])
+        self.seq_begin.append(time_begin)
+        for attribute_name, values in self.d_attribute2values.items():
+            value = attrib.get(attribute_name)
+            values.append(float(value) if value is not None else numpy.nan)
+        # end for
+
+    def to_matrix(self) -> DetectorMatrix:
+        interval_begins = numpy.array(sorted(self.d_begin2end.keys()), dtype=float)
+        interval_ends = numpy.array([self.d_begin2end[b] for b in interval_begins], dtype=float)
+        index_detector = numpy.frombuffer(self.seq_detector_index, dtype=numpy.int64) \
+            if len(self.seq_detector_index) > 0 else numpy.zeros(0, dtype=int)
+        index_interval = numpy.searchsorted(interval_begins, numpy.frombuffer(self.seq_begin, dtype=float)) \
+            if len(self.seq_begin) > 0 else numpy.zeros(0, dtype=int)
+        shape = (len(self.d_detector2index), len(interval_begins))
+        matrices = {}
+        for attribute_name in (self.attributes or []):
+            matrix = numpy.full(shape, numpy.nan)
+            if attribute_name in self.d_attribute2values and len(index_detector) > 0:
+                matrix[index_detector, index_interval] = numpy.frombuffer(self.d_attribute2values[attribute_name],
+                                                                          dtype=float)
+            # end if
+            matrices[attribute_name] = matrix
+        # end for
+        return DetectorMatrix(detector_ids=list(self.d_detector2index.keys()),
+                              interval_begins=interval_begins,
+                              interval_ends=interval_ends,
+                              matrices=matrices)
+
+
+class RowReader(object):
+    """Turns parser events of a detector output into rows of (detector-id, begin, end, attributes).
+
+    Give events of ('start', 'end') on `TAGS_ROW`. The attributes of a row are alive until the element is released.
+    """
+
+    def __init__(self):
+        self.time_begin: typing.Optional[float] = None
+        self.time_end: typing.Optional[float] = None
+        self.is_interval_with_edges = False
+        self.is_edge_with_lanes = False
+
+    def read(self, event: str, elem: etree._Element
+             ) -> typing.Optional[typing.Tuple[str, float, float, typing.Mapping[str, str]]]:
+        if event == 'start':
+            if elem.tag == 'interval':
+                self.time_begin = float(elem.attrib['begin'])
+                self.time_end = float(elem.attrib['end'])
+                self.is_interval_with_edges = False
+            elif elem.tag == 'edge':
+                self.is_interval_with_edges = True
+                self.is_edge_with_lanes = False
+            # end if
+            return None
+        # end if
+        if elem.tag == 'interval':
+            if not self.is_interval_with_edges and 'id' in elem.attrib:
+                # E1, E2 and E3 detectors. An interval of meandata also has an id.
+                return elem.attrib['id'], self.time_begin, self.time_end, elem.attrib
+            # end if
+        elif elem.tag == 'lane':
+            self.is_edge_with_lanes = True
+            return elem.attrib['id'], self.time_begin, self.time_end, elem.attrib
+        elif elem.tag == 'edge' and not self.is_edge_with_lanes:
+            return elem.attrib['id'], self.time_begin, self.time_end, elem.attrib
+        # end if
+        return None
+
+
+def release_element(elem: etree._Element):
+    """Clear an element and drop finished siblings, so that the tree does not grow while parsing."""
+    elem.clear()
+    parent = elem.getparent()
+    if parent is not None:
+        while elem.getprevious() is not None:
+            del parent[0]
+        # end while
+    # end if
+
+
+def open_output_file(path_output_file: typing.Union[Path, typing.BinaryIO]) -> typing.ContextManager[typing.BinaryIO]:
+    """Open an output file. A gzip file is decompressed on the fly. A file object is used as it is."""
+    if hasattr(path_output_file, 'read'):
+        return contextlib.nullcontext(path_output_file)
+    # end if
+    with Path(path_output_file).open('rb') as f:
+        magic = f.read(2)
+    # end with
+    if magic == b'\x1f\x8b':
+        return gzip.open(path_output_file, 'rb')
+    # end if
+    return Path(path_output_file).open('rb')
+
+
+def parse_detector_output(path_output_file: typing.Union[Path, typing.BinaryIO],
+                          attributes: typing.Optional[typing.List[str]] = None) -> DetectorMatrix:
+    """Parse a detector output into (detector, interval) matrices with a streaming parser.
+
+    Supported outputs are
+    E1 (induction loop), E2 (lane area) and E3 (entry-exit) detectors: <detector><interval id=.../></detector>,
+    and edgeData / laneData: <meandata><interval><edge id=...><lane id=.../></edge></interval></meandata>.
+    For laneData, rows are lanes. A gzip file is read as it is.
+
+    Args:
+        path_output_file: a path to an output file of SUMO, or a binary file object.
+        attributes: (optional) attribute names to read. Ex. ['flow', 'occupancy', 'speed'].
+         All numeric attributes of the first row are read if None.
+    Returns: `DetectorMatrix`
+    """
+    collector = _RowCollector(attributes)
+    row_reader = RowReader()
+    with open_output_file(path_output_file) as f:
+        for event, elem in etree.iterparse(f, events=('start', 'end'), tag=TAGS_ROW):
+            row = row_reader.read(event, elem)
+            if row is not None:
+                collector.add(*row)
+            # end if
+            if event == 'end':
+                release_element(elem)
+            # end if
+        # end for
+    # end with
+    return collector.to_matrix()
+
+
+def get_columnar_path(path_output_file: Path, columnar_format: str) -> Path:
+    """Ex. output/grid_loop.out.xml -> output/grid_loop.out.xml.npz"""
+    assert columnar_format in COLUMNAR_FORMATS, f'columnar_format must be one of {COLUMNAR_FORMATS}.'
+    return Path(path_output_file).parent.joinpath(f'{Path(path_output_file).name}.{columnar_format}')
+
+
+def save_columnar(matrix: DetectorMatrix, path_columnar_file: Path, is_compress: bool = True) -> Path:
+    """Save `DetectorMatrix` into a npz file or a parquet file. The format is decided by the suffix.
+
+    A npz file has one array per attribute, and a parquet file is a long table of
+    (detector_id, begin, end, attributes...) with a categorical detector_id.
+    Parquet needs pyarrow or fastparquet.
+
+    Args:
+        matrix: `DetectorMatrix`
+        path_columnar_file: a path ending with ".npz" or ".parquet".
+        is_compress: True compresses the npz file. Parquet files are always compressed by the engine.
+         An uncompressed npz file can be memory-mapped by `load_columnar(mmap_mode='r')`.
+    Returns: `path_columnar_file`
+    """
+    path_columnar_file = Path(path_columnar_file)
+    if path_columnar_file.suffix == '.npz':
+        arrays = {'detector_ids': numpy.array(matrix.detector_ids, dtype=str),
+                  'interval_begins': matrix.interval_begins,
+                  'interval_ends': matrix.interval_ends}
+        arrays.update({f'{PREFIX_NPZ_ATTRIBUTE}{a}': m for a, m in matrix.matrices.items()})
+        with path_columnar_file.open('wb') as f:
+            if is_compress:
+                numpy.savez_compressed(f, **arrays)
+            else:
+                numpy.savez(f, **arrays)
+            # end if
+        # end with
+    elif path_columnar_file.suffix == '.parquet':
+        n_detectors, n_intervals = len(matrix.detector_ids), len(matrix.interval_begins)
+        # detector-major order, so that the order of detectors is restored by the order of appearance.
+        table = pandas.DataFrame({
+            'detector_id': pandas.Categorical(numpy.repeat(numpy.array(matrix.detector_ids, dtype=object), n_intervals),
+                                              categories=matrix.detector_ids),
+            'begin': numpy.tile(matrix.interval_begins, n_detectors),
+            'end': numpy.tile(matrix.interval_ends, n_detectors)})
+        for attribute_name, m in matrix.matrices.items():
+            table[attribute_name] = m.reshape(-1)
+        # end for
+        table.to_parquet(path_columnar_file, index=False)
+    else:
+        raise Exception(f'unknown suffix of {path_columnar_file}. The suffix must be one of {COLUMNAR_FORMATS}.')
+    # end if
+    return path_columnar_file
+
+
+def load_npz_member_mmap(path_npz: Path, member_name: str, mmap_mode: str = 'r') -> numpy.memmap:
+    """Memory-map an array in an uncompressed npz file. `numpy.load` does not map arrays in npz files.
+
+    Args:
+        path_npz: a path to a npz file written by `numpy.savez`.
+        member_name: a name of the array. Ex. "attribute.speed"
+        mmap_mode: a mode of `numpy.memmap`. 'r' or 'c'.
+    Returns: `numpy.memmap`
+    """
+    with zipfile.ZipFile(path_npz) as zip_file:
+        info = zip_file.getinfo(f'{member_name}.npy')
+    # end with
+    if info.compress_type != zipfile.ZIP_STORED:
+        raise Exception(f'{member_name} of {path_npz} is compressed and can not be memory-mapped. '
+                        f'Save it with is_compress=False.')
+    # end if
+    with Path(path_npz).open('rb') as f:
+        # the data follows the local file header, whose name and extra fields differ from the central directory.
+        f.seek(info.header_offset)
+        local_header = f.read(30)
+        length_name, length_extra = struct.unpack('<HH', local_header[26:30])
+        f.seek(info.header_offset + 30 + length_name + length_extra)
+        version = numpy.lib.format.read_magic(f)
+        if version == (1, 0):
+            shape, fortran_order, dtype = numpy.lib.format.read_array_header_1_0(f)
+        else:
+            shape, fortran_order, dtype = numpy.lib.format.read_array_header_2_0(f)
+        # end if
+        offset = f.tell()
+    # end with
+    return numpy.memmap(path_npz, dtype=dtype, mode=mmap_mode, shape=shape, offset=offset,
+                        order='F' if fortran_order else 'C')
+
+
+def load_columnar(path_columnar_file: Path,
+                  attributes: typing.Optional[typing.List[str]] = None,
+                  mmap_mode: typing.Optional[str] = None) -> DetectorMatrix:
+    """Load `DetectorMatrix` saved by `save_columnar`. Only `attributes` are read from the file.
+
+    Args:
+        path_columnar_file: a path to a npz file or a parquet file.
+        attributes: (optional) attribute names to read. All attributes if None.
+        mmap_mode: (optional) 'r' or 'c' memory-maps matrices of an uncompressed npz file instead of reading them.
+         A compressed npz file raises an Exception. Parquet files are always read.
+    Returns: `DetectorMatrix`
+    """
+    path_columnar_file = Path(path_columnar_file)
+    if path_columnar_file.suffix == '.npz':
+        # arrays in a npz file are read lazily, one by one.
+        with numpy.load(path_columnar_file, allow_pickle=False) as npz:
+            attributes_file = [k[len(PREFIX_NPZ_ATTRIBUTE):] for k in npz.files if k.startswith(PREFIX_NPZ_ATTRIBUTE)]
+            seq_attributes = attributes if attributes is not None else attributes_file
+            if mmap_mode is None:
+                matrices = {a: npz[f'{PREFIX_NPZ_ATTRIBUTE}{a}'] for a in seq_attributes}
+            else:
+                matrices = {a: load_npz_member_mmap(path_columnar_file, f'{PREFIX_NPZ_ATTRIBUTE}{a}', mmap_mode)
+                            for a in seq_attributes}
+            # end if
+            return DetectorMatrix(
+                detector_ids=npz['detector_ids'].tolist(),
+                interval_begins=npz['interval_begins'],
+                interval_ends=npz['interval_ends'],
+                matrices=matrices)
+        # end with
+    elif path_columnar_file.suffix == '.parquet':
+        columns = None if attributes is None else ['detector_id', 'begin', 'end'] + list(attributes)
+        table = pandas.read_parquet(path_columnar_file, columns=columns)
+        detector_ids = pandas.unique(table['detector_id'].astype(str)).tolist()
+        interval_begins, index_begin = numpy.unique(table['begin'].to_numpy(), return_index=True)
+        n_detectors, n_intervals = len(detector_ids), len(interval_begins)
+        return DetectorMatrix(
+            detector_ids=detector_ids,
+            interval_begins=interval_begins,
+            interval_ends=table['end'].to_numpy()[index_begin],
+            matrices={a: table[a].to_numpy(dtype=float).reshape(n_detectors, n_intervals)
+                      for a in table.columns if a not in ('detector_id', 'begin', 'end')})
+    else:
+        raise Exception(f'unknown suffix of {path_columnar_file}. The suffix must be one of {COLUMNAR_FORMATS}.')
+    # end if
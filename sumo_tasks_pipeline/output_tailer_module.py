@@ -0,0 +1,234 @@
+import asyncio
+import dataclasses
+import time
+import typing
+from pathlib import Path
+
+from lxml import etree
+
+from .logger_unit import logger
+from .output_parser_module import KEY_ATTRIBUTES, TAGS_ROW, RowReader, release_element
+
+
+@dataclasses.dataclass
+class IntervalRecord(object):
+    """A row of a detector output read while SUMO runs.
+
+    Args:
+        job_id: (optional) job-id of the simulation.
+        output_file_name: a name of the output file. Ex. "grid_loop.out.xml"
+        detector_id: an id of the detector (or the edge, the lane).
+        begin: the begin time of the interval.
+        end: the end time of the interval.
+        values: {attribute-name: value}
+    """
+    job_id: typing.Optional[str]
+    output_file_name: str
+    detector_id: str
+    begin: float
+    end: float
+    values: typing.Dict[str, float]
+
+
+def get_output_path(path_config_file: Path, output_file_name: str) -> Path:
+    """The path where SUMO writes an output. SUMO puts <output-prefix> in front of the file name.
+
+    Ex. output-prefix="output/" and "grid_loop.out.xml" -> {config dir}/output/grid_loop.out.xml
+    """
+    root = etree.parse(str(path_config_file)).getroot()
+    prefix = ''
+    if root.find('output') is not None and root.find('output').find('output-prefix') is not None:
+        prefix = root.find('output').find('output-prefix').attrib['value']
+    # end if
+    return Path(path_config_file).parent.joinpath(prefix + output_file_name)
+
+
+class OutputTailer(object):
+    def __init__(self,
+                 path_output_file: Path,
+                 job_id: typing.Optional[str] = None,
+                 attributes: typing.Optional[typing.List[str]] = None,
+                 chunk_size: int = 64 * 1024):
+        """Reads rows of a detector output that SUMO is still writing.
+
+        Each `poll` reads bytes appended since the last call and returns rows whose closing tags are written.
+        A half-written element waits for the next call. A gzip output can not be tailed.
+
+        Args:
+            path_output_file: a path to the output file. The file may not exist yet.
+            job_id: (optional) job-id given to records.
+            attributes: (optional) attribute names to read. All numeric attributes if None.
+            chunk_size: bytes read at once.
+        """
+        self.path_output_file = Path(path_output_file)
+        self.job_id = job_id
+        self.attributes = attributes
+        self.chunk_size = chunk_size
+        self.offset = 0
+        self.n_records = 0
+        self.reset()
+
+    def reset(self):
+        self.parser = etree.XMLPullParser(events=('start', 'end'), tag=TAGS_ROW)
+        self.row_reader = RowReader()
+        self.offset = 0
+
+    def to_values(self, attrib: typing.Mapping[str, str]) -> typing.Dict[str, float]:
+        values = {}
+        for key_name in (self.attributes if self.attributes is not None else attrib.keys()):
+            if key_name in KEY_ATTRIBUTES or key_name not in attrib:
+                continue
+            # end if
+            try:
+                values[key_name] = float(attrib[key_name])
+            except ValueError:
+                continue
+            # end try
+        # end for
+        return values
+
+    def poll(self) -> typing.List[IntervalRecord]:
+        """Read new rows. Returns an empty list if nothing is appended."""
+        if not self.path_output_file.exists():
+            return []
+        # end if
+        size_file = self.path_output_file.stat().st_size
+        if size_file < self.offset:
+            # the file is written again from the head.
+            logger.debug(f'{self.path_output_file} is truncated. Read it again.')
+            self.reset()
+        # end if
+        if size_file == self.offset:
+            return []
+        # end if
+        with self.path_output_file.open('rb') as f:
+            f.seek(self.offset)
+            while True:
+                chunk = f.read(self.chunk_size)
+                if len(chunk) == 0:
+                    break
+                # end if
+                self.parser.feed(chunk)
+                self.offset += len(chunk)
+            # end while
+        # end with
+        seq_records = []
+        for event, elem in self.parser.read_events():
+            row = self.row_reader.read(event, elem)
+            if row is not None:
+                detector_id, time_begin, time_end, attrib = row
+                seq_records.append(IntervalRecord(job_id=self.job_id,
+                                                  output_file_name=self.path_output_file.name,
+                                                  detector_id=detector_id,
+                                                  begin=time_begin,
+                                                  end=time_end,
+                                                  values=self.to_values(attrib)))
+            # end if
+            if event == 'end':
+                release_element(elem)
+            # end if
+        # end for
+        self.n_records += len(seq_records)
+        return seq_records
+
+    async def follow(self,
+                     is_running: typing.Callable[[], bool],
+                     interval_poll: float = 1.0) -> typing.AsyncIterator[IntervalRecord]:
+        """Yield rows while `is_running()` is True, and the rest after it becomes False.
+
+        Ex. `async for record in tailer.follow(lambda: process.returncode is None): ...`
+        """
+        while True:
+            is_running_now = is_running()
+            for record in self.poll():
+                yield record
+            # end for
+            if not is_running_now:
+                break
+            # end if
+            await asyncio.sleep(interval_poll)
+        # end while
+
+
+class OutputMonitor(object):
+    def __init__(self,
+                 output_file_names: typing.List[str],
+                 on_interval: typing.Callable[[IntervalRecord], typing.Optional[bool]],
+                 attributes: typing.Optional[typing.List[str]] = None,
+                 interval_poll: float = 1.0):
+        """Watches detector outputs of running jobs and aborts a job when the callback says so.
+
+        Pipelines call `start` when a job launches, `check` while it runs and `finish` when it ends.
+
+        Args:
+            output_file_names: names of outputs to watch. Ex. ["grid_loop.out.xml"]
+            on_interval: a function called with every `IntervalRecord`. Returning True aborts the job.
+            attributes: (optional) attribute names to read. All numeric attributes if None.
+            interval_poll: interval (seconds) to read outputs of a job.
+        """
+        self.output_file_names = output_file_names
+        self.on_interval = on_interval
+        self.attributes = attributes
+        self.interval_poll = interval_poll
+        self.d_job_id2tailers: typing.Dict[str, typing.List[OutputTailer]] = {}
+        self.d_job_id2checked_at: typing.Dict[str, float] = {}
+
+    def start(self, job_id: str, path_config_file: Path):
+        """Create tailers of a job. Gzip outputs are skipped, since they can not be read while being written."""
+        seq_tailers = []
+        for name in self.output_file_names:
+            if name.endswith('.gz'):
+                logger.warning(f'{name} is a gzip output. It is not watched while job_id={job_id} runs.')
+                continue
+            # end if
+            seq_tailers.append(OutputTailer(get_output_path(path_config_file, name), job_id=job_id,
+                                            attributes=self.attributes))
+        # end for
+        self.d_job_id2tailers[job_id] = seq_tailers
+        self.d_job_id2checked_at[job_id] = time.monotonic()
+
+    def read(self, job_id: str) -> bool:
+        """Read new rows of a job. A file that is not XML is logged and not read again; the job keeps running."""
+        is_abort = False
+        for tailer in list(self.d_job_id2tailers.get(job_id, [])):
+            try:
+                seq_records = tailer.poll()
+            except etree.XMLSyntaxError as e:
+                logger.warning(f'stop reading {tailer.path_output_file} of job_id={job_id}. The reason is {e}')
+                self.d_job_id2tailers[job_id].remove(tailer)
+                continue
+            # end try
+            for record in seq_records:
+                if self.on_interval(record) is True:
+                    is_abort = True
+                # end if
+            # end for
+        # end for
+        return is_abort
+
+    def check(self, job_id: str) -> bool:
+        """Read new rows of a running job once per `interval_poll`.
+
+        Returns: True if the job should be aborted.
+        """
+        if job_id not in self.d_job_id2tailers:
+            return False
+        # end if
+        if time.monotonic() - self.d_job_id2checked_at[job_id] < self.interval_poll:
+            return False
+        # end if
+        self.d_job_id2checked_at[job_id] = time.monotonic()
+        is_abort = self.read(job_id)
+        if is_abort:
+            logger.info(f'job_id={job_id} is aborted by the output monitor.')
+        # end if
+        return is_abort
+
+    def finish(self, job_id: str):
+        """Read the rest of rows of an ended job and forget the job."""
+        if job_id not in self.d_job_id2tailers:
+            return
+        # end if
+        self.read(job_id)
+        del self.d_job_id2tailers[job_id]
+        del self.d_job_id2checked_at[job_id]
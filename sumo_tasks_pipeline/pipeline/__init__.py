@@ -1 +1,3 @@
-from .pipeline import DockerPipeline, LocalSumoPipeline
\ No newline at end of file
+from .pipeline import DockerPipeline, LocalSumoPipeline
+from .async_pipeline import AsyncDockerPipeline, AsyncLocalPipeline
+from .persistence_module import PersistenceStage
@@ -0,0 +1,495 @@
+import asyncio
+import os
+import signal
+import typing
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from pathlib import Path
+
+from ..logger_unit import logger
+from ..operation_module.docker_operation_module import SumoDockerController
+from ..operation_module.local_operation_module import LocalSumoController
+from ..commons.result_module import SumoResultObjects
+from ..commons.sumo_config_obj import SumoConfigObject
+from ..file_handler import BaseFileHandler
+from ..scheduler_module import LptScheduler
+from ..result_cache import BaseResultCache
+from ..sweep_module import LazySumoConfig
+from ..columnar_module import ColumnarConverter
+from ..output_tailer_module import OutputMonitor
+from ..trace_module import StageTracer
+from ..shard_module import select_shard
+from .pipeline import LocalSumoPipeline, DockerPipeline
+
+
+class AsyncPipelineMixin(object):
+    """Common functions of asyncio pipelines.
+
+    Blocking calls (file handlers, config copies and the docker API) run in a dedicated thread pool of
+    `n_io_workers` threads. The number of running SUMO jobs is limited by `n_jobs` with a semaphore.
+    """
+    n_jobs: int
+    n_io_workers: int
+    failed_job_ids: typing.List[str]
+    order_jobs: typing.Callable[[typing.List[SumoConfigObject]], typing.List[SumoConfigObject]]
+    prepare_config: typing.Callable[[SumoConfigObject], None]
+    release_config: typing.Callable[[SumoConfigObject], None]
+    get_cache_key: typing.Callable[[SumoConfigObject, str], typing.Optional[str]]
+    load_cached_result: typing.Callable[[SumoConfigObject, typing.Optional[str]], typing.Optional[SumoResultObjects]]
+    split_finished_jobs: typing.Callable[[typing.List[SumoConfigObject]],
+                                         typing.Tuple[typing.List[SumoResultObjects], typing.List[SumoConfigObject]]]
+
+    def get_io_executor(self) -> ThreadPoolExecutor:
+        return ThreadPoolExecutor(self.n_io_workers)
+
+    @staticmethod
+    async def run_blocking(io_executor: ThreadPoolExecutor, func: typing.Callable, *args) -> typing.Any:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(io_executor, func, *args)
+
+    def split_cached_jobs(self, sumo_configs: typing.List[SumoConfigObject], sumo_version: str
+                          ) -> typing.Tuple[typing.List[SumoResultObjects], typing.List[SumoConfigObject],
+                                            typing.Dict[str, typing.Optional[str]]]:
+        """Look up the result cache for all jobs before any job starts, as the synchronous pipelines do.
+
+        Returns: (results of cache hits, jobs to run, {job-id: cache key}).
+        """
+        seq_cached, seq_not_cached, d_job_id2cache_key = [], [], {}
+        for conf in sumo_configs:
+            self.prepare_config(conf)
+            d_job_id2cache_key[conf.job_id] = self.get_cache_key(conf, sumo_version)
+            # rendered again when the job starts. Only running jobs keep directories.
+            self.release_config(conf)
+            result_obj = self.load_cached_result(conf, d_job_id2cache_key[conf.job_id])
+            if result_obj is None:
+                seq_not_cached.append(conf)
+            else:
+                seq_cached.append(result_obj)
+            # end if
+        # end for
+        return seq_cached, seq_not_cached, d_job_id2cache_key
+
+    async def run_jobs(self,
+                       sumo_configs: typing.List[SumoConfigObject],
+                       one_job: typing.Callable[..., typing.Awaitable[typing.Optional[SumoResultObjects]]],
+                       io_executor: ThreadPoolExecutor,
+                       on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None,
+                       sumo_version: typing.Optional[str] = None
+                       ) -> typing.List[SumoResultObjects]:
+        """Run `one_job` coroutines for unfinished jobs and collect results in the same order as `sumo_configs`.
+
+        `one_job` is called with a job, the semaphore and the cache key of the job.
+        Jobs are looked up in the result cache when `sumo_version` is given.
+        """
+        seq_finished, seq_pending = await self.run_blocking(io_executor, self.split_finished_jobs, sumo_configs)
+        d_job_id2cache_key = {}
+        if sumo_version is not None:
+            seq_cached, seq_pending, d_job_id2cache_key = await self.run_blocking(
+                io_executor, self.split_cached_jobs, seq_pending, sumo_version)
+            seq_finished += seq_cached
+        # end if
+        d_job_id2finished = {r.sumo_config_obj.job_id: r for r in seq_finished}
+        for r in seq_finished:
+            if on_job_done is not None:
+                on_job_done(r)
+            # end if
+        # end for
+        semaphore = asyncio.Semaphore(self.n_jobs)
+        # tasks are created in the scheduled order; the semaphore lets them run in that order.
+        d_job_id2task = {
+            conf.job_id: asyncio.ensure_future(one_job(conf, semaphore, d_job_id2cache_key.get(conf.job_id)))
+            for conf in self.order_jobs(seq_pending)}
+        tasks = list(d_job_id2task.values())
+        try:
+            for coroutine in asyncio.as_completed(tasks):
+                r = await coroutine
+                if r is not None and on_job_done is not None:
+                    on_job_done(r)
+                # end if
+            # end for
+        finally:
+            for task in tasks:
+                task.cancel()
+            # end for
+            # cancelled jobs kill their SUMO processes before the run ends.
+            await asyncio.gather(*tasks, return_exceptions=True)
+        # end try
+        if len(self.failed_job_ids) > 0:
+            logger.warning(f'{len(self.failed_job_ids)} jobs failed. job_id={self.failed_job_ids}')
+        # end if
+        seq_results = []
+        for conf in sumo_configs:
+            if conf.job_id in d_job_id2finished:
+                seq_results.append(d_job_id2finished[conf.job_id])
+            elif d_job_id2task[conf.job_id].result() is not None:
+                seq_results.append(d_job_id2task[conf.job_id].result())
+            # end if
+        # end for
+        return seq_results
+
+
+class AsyncLocalPipeline(AsyncPipelineMixin, LocalSumoPipeline):
+    def __init__(self,
+                 file_handler: BaseFileHandler,
+                 is_rewrite_windows_path: bool = True,
+                 path_working_dir: Path = None,
+                 n_jobs: int = 1,
+                 sumo_command: str = '/bin/sumo',
+                 timeout_per_job: typing.Optional[float] = None,
+                 n_io_workers: int = 8,
+                 scheduler: typing.Optional[LptScheduler] = None,
+                 result_cache: typing.Optional[BaseResultCache] = None,
+                 staging_mode: str = 'copy',
+                 columnar_converter: typing.Optional[ColumnarConverter] = None,
+                 output_monitor: typing.Optional[OutputMonitor] = None,
+                 tracer: typing.Optional[StageTracer] = None):
+        """A pipeline to run SUMO on local with asyncio. SUMO runs with `asyncio.create_subprocess_exec`.
+
+        Args:
+            path_working_dir: a path to save tmp files.
+            n_jobs: the number of SUMO processes running at the same time.
+            timeout_per_job: (optional) wall-clock time limit in seconds per job. A SUMO process over the limit is killed.
+            n_io_workers: the number of threads for blocking I/O such as uploads.
+            scheduler: (optional) a scheduler that decides the order of jobs. Jobs run in the given order if None.
+            result_cache: (optional) a cache of outputs keyed on contents of input files. A hit skips SUMO.
+            staging_mode: how to prepare a job directory. 'copy', 'hardlink', 'reflink' or 'auto'.
+            columnar_converter: (optional) converts outputs into columnar files before the outputs are saved.
+            output_monitor: (optional) reads detector outputs while SUMO runs. A job is killed when
+             the callback of the monitor returns True, and it is recorded in `failed_job_ids`.
+            tracer: (optional) records time of stages of jobs. A trace file is written per run.
+        """
+        super(AsyncLocalPipeline, self).__init__(file_handler=file_handler,
+                                                 is_rewrite_windows_path=is_rewrite_windows_path,
+                                                 path_working_dir=path_working_dir,
+                                                 n_jobs=n_jobs,
+                                                 sumo_command=sumo_command,
+                                                 timeout_per_job=timeout_per_job,
+                                                 scheduler=scheduler,
+                                                 result_cache=result_cache,
+                                                 staging_mode=staging_mode,
+                                                 columnar_converter=columnar_converter,
+                                                 output_monitor=output_monitor,
+                                                 tracer=tracer)
+        self.n_io_workers = n_io_workers
+
+    @staticmethod
+    async def kill_process(process: asyncio.subprocess.Process):
+        try:
+            if os.name == 'posix':
+                os.killpg(process.pid, signal.SIGKILL)
+            else:
+                process.kill()
+            # end if
+        except ProcessLookupError:
+            pass
+        # end try
+        await process.wait()
+
+    async def watch_outputs(self, job_id: str, process: asyncio.subprocess.Process, event_abort: asyncio.Event):
+        """Check outputs of a running process with `output_monitor`. `event_abort` is set when the process is killed."""
+        while process.returncode is None:
+            await asyncio.sleep(self.output_monitor.interval_poll)
+            if process.returncode is None and self.output_monitor.check(job_id):
+                event_abort.set()
+                await self.kill_process(process)
+                return
+            # end if
+        # end while
+
+    async def run_sumo_process(self, sumo_config_object: SumoConfigObject, command: typing.List[str]
+                               ) -> typing.Optional[bytes]:
+        """Run a SUMO process and return its log. Returns None if the process fails or can not start.
+
+        The process is killed when the job is cancelled, Ex. the caller cancels `run_simulation`.
+        """
+        try:
+            process = await asyncio.create_subprocess_exec(*command,
+                                                           stdout=asyncio.subprocess.PIPE,
+                                                           stderr=asyncio.subprocess.STDOUT,
+                                                           start_new_session=(os.name == 'posix'))
+        except (OSError, ValueError) as e:
+            logger.error(f'job_id={sumo_config_object.job_id} failed to start the process. The reason is {e}')
+            return None
+        # end try
+        task_watch = None
+        event_abort = asyncio.Event()
+        if self.output_monitor is not None:
+            task_watch = asyncio.ensure_future(self.watch_outputs(sumo_config_object.job_id, process, event_abort))
+        # end if
+        try:
+            outs, __ = await asyncio.wait_for(process.communicate(), timeout=self.timeout_per_job)
+        except asyncio.TimeoutError:
+            logger.error(f'job_id={sumo_config_object.job_id} exceeded {self.timeout_per_job} seconds. Killing it.')
+            return None
+        finally:
+            if task_watch is not None:
+                task_watch.cancel()
+                self.output_monitor.finish(sumo_config_object.job_id)
+            # end if
+            if process.returncode is None:
+                # timeout or cancellation. The process group is killed, so that no SUMO process is left behind.
+                await self.kill_process(process)
+            # end if
+        # end try
+        if event_abort.is_set():
+            logger.error(f'job_id={sumo_config_object.job_id} is aborted by the output monitor.')
+            return None
+        # end if
+        if process.returncode != 0:
+            logger.error(f'job_id={sumo_config_object.job_id} failed. return-code={process.returncode}, '
+                         f'message={outs.decode("utf-8", errors="replace")}')
+            return None
+        # end if
+        return outs
+
+    def one_simulation(self, sumo_config_object: SumoConfigObject) -> SumoResultObjects:
+        """Run one job in a new event loop. Await `run_simulation` instead in a running event loop."""
+        seq_results = asyncio.run(self.run_simulation([sumo_config_object]))
+        if len(seq_results) == 0:
+            raise Exception(f'job_id={sumo_config_object.job_id} failed.')
+        # end if
+        return seq_results[0]
+
+    async def one_simulation_async(self,
+                                   sumo_config_object: SumoConfigObject,
+                                   semaphore: asyncio.Semaphore,
+                                   sumo_controller: LocalSumoController,
+                                   io_executor: ThreadPoolExecutor,
+                                   cache_key: typing.Optional[str] = None) -> typing.Optional[SumoResultObjects]:
+        async with semaphore:
+            await self.run_blocking(io_executor, self.prepare_config, sumo_config_object)
+            await self.run_blocking(io_executor, self.file_handler.start_job, sumo_config_object.job_id)
+            sumo_config_object, command = await self.run_blocking(io_executor, sumo_controller.build_job_command,
+                                                                  sumo_config_object)
+            if self.output_monitor is not None:
+                self.output_monitor.start(sumo_config_object.job_id,
+                                          sumo_config_object.path_config_dir.joinpath(sumo_config_object.config_name))
+            # end if
+            time_at_start = datetime.now()
+            log_output = await self.run_sumo_process(sumo_config_object, command)
+            if self.tracer is not None:
+                self.tracer.record('sumo_run', sumo_config_object.job_id,
+                                   (datetime.now() - time_at_start).total_seconds())
+            # end if
+        # end with
+        if log_output is None:
+            self.failed_job_ids.append(sumo_config_object.job_id)
+            await self.run_blocking(io_executor, self.release_config, sumo_config_object)
+            return None
+        # end if
+        self.record_elapsed_time(sumo_config_object, (datetime.now() - time_at_start).total_seconds())
+        # saving runs outside the semaphore. The next SUMO process starts during the upload.
+        sumo_result_obj = await self.run_blocking(io_executor, sumo_controller.pack_sumo_result,
+                                                  sumo_config_object, log_output)
+        path_out = await self.run_blocking(io_executor, self.persist_result,
+                                           sumo_config_object, sumo_result_obj, cache_key)
+        return SumoResultObjects(id_scenario=sumo_config_object.scenario_name,
+                                 sumo_config_obj=sumo_config_object,
+                                 path_output_dir=path_out,
+                                 log_message=sumo_result_obj.log_message)
+
+    async def run_simulation(self,
+                             sumo_configs: typing.List[SumoConfigObject],
+                             on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None,
+                             shard: typing.Optional[typing.Tuple[int, int]] = None
+                             ) -> typing.List[SumoResultObjects]:
+        """Run SUMO simulation.
+
+        Args:
+            sumo_configs: List of SUMO Config objects.
+            on_job_done: (optional) a function called with `SumoResultObjects` each time a job ends.
+            shard: (optional) (i, N). Only jobs whose job-id hashes into the i-th of N shards run.
+
+        Returns: list of `SumoResultObjects` in the same order as `sumo_configs`. Failed jobs are not included.
+        """
+        sumo_configs = select_shard(list(sumo_configs), shard)
+        self.check_job_ids(sumo_configs)
+        self.failed_job_ids = []
+        self.start_trace()
+        io_executor = self.get_io_executor()
+        try:
+            sumo_controller = await self.run_blocking(io_executor, lambda: LocalSumoController(
+                sumo_command=self.sumo_command, is_rewrite_windows_path=self.is_rewrite_windows_path,
+                staging_mode=self.staging_mode, tracer=self.tracer))
+            if self.result_cache is not None:
+                sumo_version = await self.run_blocking(io_executor, sumo_controller.get_sumo_version)
+            else:
+                sumo_version = None
+            # end if
+
+            async def one_job(conf: SumoConfigObject, semaphore: asyncio.Semaphore, cache_key: typing.Optional[str]):
+                return await self.one_simulation_async(conf, semaphore, sumo_controller, io_executor, cache_key)
+
+            return await self.run_jobs(sumo_configs, one_job, io_executor, on_job_done=on_job_done,
+                                       sumo_version=sumo_version)
+        finally:
+            io_executor.shutdown(wait=False)
+            self.save_scheduler()
+            self.finish_trace()
+        # end try
+
+
+class AsyncDockerPipeline(AsyncPipelineMixin, DockerPipeline):
+    def __init__(self,
+                 file_handler: BaseFileHandler,
+                 path_mount_working_dir: typing.Optional[Path] = None,
+                 docker_image_name: str = 'kensukemi/sumo-ubuntu18',
+                 is_rewrite_windows_path: bool = True,
+                 n_jobs: int = 1,
+                 timeout_per_job: typing.Optional[float] = None,
+                 interval_poll: float = 0.5,
+                 n_io_workers: int = 8,
+                 scheduler: typing.Optional[LptScheduler] = None,
+                 result_cache: typing.Optional[BaseResultCache] = None,
+                 staging_mode: str = 'copy',
+                 columnar_converter: typing.Optional[ColumnarConverter] = None,
+                 tracer: typing.Optional[StageTracer] = None):
+        """A pipeline to run SUMO-docker with asyncio. Every job runs in a detached container.
+
+        Args:
+            file_handler:
+            path_mount_working_dir: A path to directory where a container mount as the shared directory.
+            docker_image_name: A name of docker-image that you call.
+            is_rewrite_windows_path: True, then the class updates Path only when your OS is Windows.
+            n_jobs: the number of containers running at the same time.
+            timeout_per_job: (optional) wall-clock time limit in seconds per job. A container over the limit is killed.
+            interval_poll: interval (seconds) to check the state of running containers.
+            n_io_workers: the number of threads for blocking I/O such as the docker API and uploads.
+            scheduler: (optional) a scheduler that decides the order of jobs. Jobs run in the given order if None.
+            result_cache: (optional) a cache of outputs keyed on contents of input files. A hit skips SUMO.
+            staging_mode: how to prepare a job directory. 'copy', 'hardlink', 'reflink' or 'auto'.
+            columnar_converter: (optional) converts outputs into columnar files before the outputs are saved.
+            tracer: (optional) records time of stages of jobs. A trace file is written per run.
+        """
+        super(AsyncDockerPipeline, self).__init__(file_handler=file_handler,
+                                                  path_mount_working_dir=path_mount_working_dir,
+                                                  docker_image_name=docker_image_name,
+                                                  is_rewrite_windows_path=is_rewrite_windows_path,
+                                                  n_jobs=n_jobs,
+                                                  is_use_container_pool=False,
+                                                  scheduler=scheduler,
+                                                  result_cache=result_cache,
+                                                  staging_mode=staging_mode,
+                                                  columnar_converter=columnar_converter,
+                                                  tracer=tracer,
+                                                  timeout_per_job=timeout_per_job)
+        self.interval_poll = interval_poll
+        self.n_io_workers = n_io_workers
+        self.failed_job_ids: typing.List[str] = []
+
+    async def run_container(self,
+                            sumo_config_obj: SumoConfigObject,
+                            job_command: str,
+                            sumo_controller: SumoDockerController,
+                            io_executor: ThreadPoolExecutor) -> typing.Optional[bytes]:
+        """Run a detached container and wait for its end without blocking a thread. Returns None if the job fails."""
+        container = await self.run_blocking(io_executor, lambda: sumo_controller.client.containers.run(
+            image=sumo_controller.image_name,
+            command=job_command,
+            name=sumo_controller.generate_container_name(),
+            detach=True,
+            volumes=sumo_controller.get_mount_volumes()))
+        time_at_start = datetime.now()
+        try:
+            while True:
+                await self.run_blocking(io_executor, container.reload)
+                if container.status in ('exited', 'dead'):
+                    break
+                # end if
+                if self.timeout_per_job is not None and \
+                        (datetime.now() - time_at_start).total_seconds() > self.timeout_per_job:
+                    logger.error(f'job_id={sumo_config_obj.job_id} exceeded {self.timeout_per_job} seconds. '
+                                 f'Killing the container.')
+                    await self.run_blocking(io_executor, container.kill)
+                    return None
+                # end if
+                await asyncio.sleep(self.interval_poll)
+            # end while
+            exit_code = container.attrs['State']['ExitCode']
+            command_message = await self.run_blocking(io_executor, container.logs)
+        finally:
+            await self.run_blocking(io_executor, lambda: container.remove(force=True))
+        # end try
+        if exit_code != 0:
+            logger.error(f'job_id={sumo_config_obj.job_id} failed. exit-code={exit_code}, '
+                         f'message={command_message.decode("utf-8", errors="replace")}')
+            return None
+        # end if
+        return command_message
+
+    async def one_job_async(self,
+                            sumo_config_obj: SumoConfigObject,
+                            semaphore: asyncio.Semaphore,
+                            sumo_controller: SumoDockerController,
+                            io_executor: ThreadPoolExecutor,
+                            cache_key: typing.Optional[str] = None) -> typing.Optional[SumoResultObjects]:
+        async with semaphore:
+            await self.run_blocking(io_executor, self.prepare_config, sumo_config_obj)
+            await self.run_blocking(io_executor, self.file_handler.start_job, sumo_config_obj.job_id)
+            sumo_config_obj, job_command = await self.run_blocking(io_executor, sumo_controller.build_job_command,
+                                                                   sumo_config_obj)
+            logger.debug(f'executing job with command {job_command}')
+            time_at_start = datetime.now()
+            command_message = await self.run_container(sumo_config_obj, job_command, sumo_controller, io_executor)
+            if self.tracer is not None:
+                self.tracer.record('container_run', sumo_config_obj.job_id,
+                                   (datetime.now() - time_at_start).total_seconds())
+            # end if
+        # end with
+        if command_message is None:
+            self.failed_job_ids.append(sumo_config_obj.job_id)
+            await self.run_blocking(io_executor, self.release_config, sumo_config_obj)
+            return None
+        # end if
+        self.record_elapsed_time(sumo_config_obj, (datetime.now() - time_at_start).total_seconds())
+        sumo_result_obj = await self.run_blocking(io_executor, sumo_controller.pack_sumo_result,
+                                                  sumo_config_obj, command_message)
+        path_out = await self.run_blocking(io_executor, self.persist_result, sumo_config_obj, sumo_result_obj, cache_key)
+        if isinstance(sumo_config_obj, LazySumoConfig):
+            # the local outputs are removed with the job directory.
+            return SumoResultObjects(id_scenario=sumo_config_obj.scenario_name,
+                                     sumo_config_obj=sumo_config_obj,
+                                     path_output_dir=path_out,
+                                     log_message=sumo_result_obj.log_message)
+        # end if
+        return sumo_result_obj
+
+    async def run_simulation(self,
+                             sumo_configs: typing.List[SumoConfigObject],
+                             on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None,
+                             shard: typing.Optional[typing.Tuple[int, int]] = None
+                             ) -> typing.List[SumoResultObjects]:
+        """Run SUMO simulation in docker containers.
+
+        Args:
+            sumo_configs: List of SumoConfigObject.
+            on_job_done: (optional) a function called with `SumoResultObjects` each time a job ends.
+            shard: (optional) (i, N). Only jobs whose job-id hashes into the i-th of N shards run.
+        Returns:
+            list of `SumoResultObjects` in the same order as `sumo_configs`. Failed jobs are not included.
+        """
+        sumo_configs = select_shard(list(sumo_configs), shard)
+        self.check_job_ids(sumo_configs)
+        self.failed_job_ids = []
+        self.start_trace()
+        io_executor = self.get_io_executor()
+        try:
+            sumo_controller = await self.run_blocking(io_executor, lambda: SumoDockerController(
+                image_name=self.docker_image_name, is_rewrite_windows_path=self.is_rewrite_windows_path,
+                staging_mode=self.staging_mode, tracer=self.tracer))
+            if self.result_cache is not None:
+                sumo_version = await self.run_blocking(io_executor, sumo_controller.get_sumo_version)
+            else:
+                sumo_version = None
+            # end if
+
+            async def one_job(conf: SumoConfigObject, semaphore: asyncio.Semaphore, cache_key: typing.Optional[str]):
+                return await self.one_job_async(conf, semaphore, sumo_controller, io_executor, cache_key)
+
+            return await self.run_jobs(sumo_configs, one_job, io_executor, on_job_done=on_job_done,
+                                       sumo_version=sumo_version)
+        finally:
+            io_executor.shutdown(wait=False)
+            self.save_scheduler()
+            self.finish_trace()
+        # end try
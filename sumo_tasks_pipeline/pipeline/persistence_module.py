@@ -0,0 +1,95 @@
+import threading
+import typing
+from concurrent.futures import ThreadPoolExecutor, Future
+from pathlib import Path
+
+from ..logger_unit import logger
+
+
+def get_dir_size(path_dir: Path) -> int:
+    if not Path(path_dir).exists():
+        return 0
+    # end if
+    return sum(p.stat().st_size for p in Path(path_dir).rglob('*') if p.is_file())
+
+
+class PersistenceStage(object):
+    def __init__(self,
+                 n_workers: int = 4,
+                 max_pending_bytes: typing.Optional[int] = None):
+        """Saves simulation outputs in background threads, so that a simulation slot is free during uploads.
+
+        Outputs waiting for the upload stay on the local disk.
+        `submit` blocks while the total size of waiting outputs exceeds `max_pending_bytes`,
+        which slows down simulations when uploads can not keep up.
+        A caller that must not block checks `is_accepting` before it starts a new job and submits with `is_wait=False`.
+
+        Args:
+            n_workers: the number of threads to save outputs.
+            max_pending_bytes: (optional) the limit of bytes of outputs waiting for the upload. None is unlimited.
+             One task is always accepted even if it is larger than the limit.
+        """
+        assert n_workers > 0, f'n_workers must be > 0. Given {n_workers}'
+        self.n_workers = n_workers
+        self.max_pending_bytes = max_pending_bytes
+        self.pool = ThreadPoolExecutor(n_workers, thread_name_prefix='persistence')
+        self.condition = threading.Condition()
+        self.pending_bytes = 0
+        self.n_pending = 0
+
+    def __enter__(self) -> "PersistenceStage":
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def is_full(self, size_bytes: int) -> bool:
+        if self.max_pending_bytes is None or self.n_pending == 0:
+            return False
+        # end if
+        return self.pending_bytes + size_bytes > self.max_pending_bytes
+
+    def is_accepting(self) -> bool:
+        """False while waiting outputs exceed `max_pending_bytes`. New jobs should not start then."""
+        with self.condition:
+            return not self.is_full(0)
+        # end with
+
+    def submit(self,
+               func: typing.Callable[..., typing.Any],
+               *args,
+               path_output_dir: typing.Optional[Path] = None,
+               is_wait: bool = True) -> Future:
+        """Run `func(*args)` in the background.
+
+        Args:
+            func: a function to save outputs. Ex. upload files and then mark the job as finished.
+            path_output_dir: (optional) the local directory of outputs. Its size counts while the task is pending.
+            is_wait: True blocks while the limit is exceeded. False accepts the task at once.
+        Returns: `Future` of the return value of `func`.
+        """
+        size_bytes = get_dir_size(path_output_dir) if path_output_dir is not None else 0
+        with self.condition:
+            if is_wait and self.is_full(size_bytes):
+                logger.debug(f'{self.pending_bytes} bytes are waiting for the upload. Waiting...')
+            # end if
+            while is_wait and self.is_full(size_bytes):
+                self.condition.wait()
+            # end while
+            self.pending_bytes += size_bytes
+            self.n_pending += 1
+        # end with
+        future = self.pool.submit(func, *args)
+
+        def release(__f: Future):
+            with self.condition:
+                self.pending_bytes -= size_bytes
+                self.n_pending -= 1
+                self.condition.notify_all()
+            # end with
+
+        future.add_done_callback(release)
+        return future
+
+    def close(self, wait: bool = True):
+        self.pool.shutdown(wait=wait)
@@ -1,31 +1,59 @@
 import typing
-import joblib
-import time
 import collections
+import itertools
+import warnings
+from concurrent.futures import ThreadPoolExecutor, Future, as_completed, wait, FIRST_COMPLETED
 from tqdm import tqdm
 from datetime import datetime
 from pathlib import Path
 from typing import Optional
 from ..logger_unit import logger
 from ..operation_module.docker_operation_module import SumoDockerController
+from ..operation_module.docker_pool_module import SumoDockerContainerPool
 from ..operation_module.local_operation_module import LocalSumoController
+from ..operation_module.local_executor_module import SumoProcessExecutor, ProcessJob
+from ..operation_module.libsumo_pool_module import LibsumoWorkerPool
 from ..commons.result_module import SumoResultObjects
 from ..commons.sumo_config_obj import SumoConfigObject
 from ..file_handler import LocalFileHandler, GcsFileHandler, BaseFileHandler
+from ..scheduler_module import LptScheduler
+from ..result_cache import BaseResultCache, compute_cache_key
+from ..sweep_module import LazySumoConfig
+from ..columnar_module import ColumnarConverter
+from ..output_tailer_module import OutputMonitor
+from ..warmup_module import WarmupStateCache
+from ..trace_module import StageTracer, trace_stage
+from ..shard_module import select_shard
+from .persistence_module import PersistenceStage
+from .. import static
 
 
 class BasePipeline(object):
     def __init__(self,
                  file_handler: BaseFileHandler,
                  path_working_dir: typing.Optional[Path] = None,
-                 n_jobs: int = 1):
+                 n_jobs: int = 1,
+                 scheduler: typing.Optional[LptScheduler] = None,
+                 result_cache: typing.Optional[BaseResultCache] = None,
+                 n_persistence_workers: int = 4,
+                 max_pending_bytes: typing.Optional[int] = None,
+                 columnar_converter: typing.Optional[ColumnarConverter] = None,
+                 tracer: typing.Optional[StageTracer] = None):
         self.n_jobs = n_jobs
+        self.scheduler = scheduler
+        self.result_cache = result_cache
+        self.n_persistence_workers = n_persistence_workers
+        self.max_pending_bytes = max_pending_bytes
+        self.columnar_converter = columnar_converter
+        self.tracer = tracer
         if path_working_dir is None:
             self.path_working_dir = Path('/tmp').joinpath('sumo_tasks_pipeline').absolute()
         else:
             self.path_working_dir = path_working_dir.absolute()
         # end if
         self.file_handler = file_handler
+        # job-ids of jobs that failed in the last run.
+        self.failed_job_ids: typing.List[str] = []
 
     @staticmethod
     def check_job_ids(sumo_configs: typing.List[SumoConfigObject]) -> bool:
@@ -37,14 +65,185 @@ class BasePipeline(object):
         # end for
         return True
 
+    def split_finished_jobs(self, sumo_configs: typing.List[SumoConfigObject]
+                            ) -> typing.Tuple[typing.List[SumoResultObjects], typing.List[SumoConfigObject]]:
+        """Look up status of all jobs at once and separate finished jobs.
+
+        Returns: (`SumoResultObjects` of finished jobs, configs of jobs to run)
+        """
+        with trace_stage(self.tracer, 'job_status'):
+            d_job_id2status = self.file_handler.get_job_statuses([conf.job_id for conf in sumo_configs])
+        # end with
+        seq_finished = []
+        seq_pending = []
+        for conf in sumo_configs:
+            job_status, __ = d_job_id2status[conf.job_id]
+            if job_status == 'finished':
+                logger.debug(f'job_id={conf.job_id} is already done. Skip it.')
+                # the saved outputs, as `persist_result` returns for a job that runs now.
+                seq_finished.append(SumoResultObjects(id_scenario=conf.scenario_name,
+                                                      sumo_config_obj=conf,
+                                                      path_output_dir=self.file_handler.get_output_path(conf.job_id)))
+            else:
+                seq_pending.append(conf)
+            # end if
+        # end for
+        return seq_finished, seq_pending
+
+    def order_jobs(self, sumo_configs: typing.List[SumoConfigObject]) -> typing.List[SumoConfigObject]:
+        """Order jobs with the scheduler. The given order is kept if the scheduler is None.
+
+        A `LazySumoConfig` is rendered only while its cost is estimated, so that disk usage stays bounded.
+        """
+        if self.scheduler is None:
+            return list(sumo_configs)
+        # end if
+        return self.scheduler.order(sumo_configs, prepare_config=self.prepare_config,
+                                    release_config=self.release_config)
+
+    def record_elapsed_time(self, sumo_config: SumoConfigObject, elapsed_seconds: float):
+        """Give the elapsed time of a job to the scheduler, so that cost estimators can learn from history."""
+        if self.scheduler is not None:
+            self.scheduler.update(sumo_config, elapsed_seconds)
+        # end if
+
+    def get_cache_key(self, sumo_config: SumoConfigObject, sumo_version: str) -> typing.Optional[str]:
+        """A key of the result cache. None if the cache is not used or the job is not cacheable."""
+        if self.result_cache is None:
+            return None
+        # end if
+        try:
+            return compute_cache_key(sumo_config, sumo_version)
+        except Exception as e:
+            logger.warning(f'failed to compute a cache key of job_id={sumo_config.job_id}. The reason is {e}')
+            return None
+        # end try
+
+    def load_cached_result(self, sumo_config: SumoConfigObject, cache_key: typing.Optional[str]
+                           ) -> typing.Optional[SumoResultObjects]:
+        """Save cached outputs with the file handler as if the job ran. None if the cache does not have the key."""
+        if cache_key is None:
+            return None
+        # end if
+        path_cached = self.result_cache.get(cache_key)
+        if path_cached is None:
+            return None
+        # end if
+        logger.debug(f'job_id={sumo_config.job_id} is in the result cache. Skip the simulation.')
+        self.file_handler.start_job(sumo_config.job_id)
+        path_out = self.file_handler.save_file(sumo_config.job_id,
+                                               SumoResultObjects(id_scenario=sumo_config.scenario_name,
+                                                                 sumo_config_obj=sumo_config,
+                                                                 path_output_dir=path_cached))
+        self.file_handler.end_job(sumo_config.job_id)
+        return SumoResultObjects(id_scenario=sumo_config.scenario_name,
+                                 sumo_config_obj=sumo_config,
+                                 path_output_dir=path_out)
+
+    def store_cached_result(self, cache_key: typing.Optional[str], sumo_result_obj: SumoResultObjects):
+        if cache_key is None or sumo_result_obj.is_compressed:
+            return
+        # end if
+        try:
+            self.result_cache.put(cache_key, sumo_result_obj.path_output_dir)
+        except Exception as e:
+            logger.warning(f'failed to store outputs in the result cache. The reason is {e}')
+        # end try
+
+    @staticmethod
+    def prepare_config(sumo_config: SumoConfigObject):
+        """Render the config directory of `LazySumoConfig`. Do nothing for `SumoConfigObject`."""
+        if isinstance(sumo_config, LazySumoConfig):
+            sumo_config.materialize()
+        # end if
+
+    @staticmethod
+    def release_config(sumo_config: SumoConfigObject):
+        """Remove directories of `LazySumoConfig`, so that disk usage is bounded by running jobs."""
+        if isinstance(sumo_config, LazySumoConfig):
+            sumo_config.cleanup()
+        # end if
+
+    def create_persistence_stage(self) -> PersistenceStage:
+        return PersistenceStage(n_workers=self.n_persistence_workers, max_pending_bytes=self.max_pending_bytes)
+
+    def persist_result(self,
+                       sumo_config: SumoConfigObject,
+                       sumo_result_obj: SumoResultObjects,
+                       cache_key: typing.Optional[str] = None) -> Path:
+        """Save outputs of a finished simulation. The job is marked as finished only after the outputs are saved.
+
+        Returns: a path returned by `file_handler.save_file`.
+        """
+        if self.columnar_converter is not None:
+            # columnar files are saved and cached together with the XML outputs.
+            with trace_stage(self.tracer, 'columnar', sumo_config.job_id):
+                self.columnar_converter.convert(sumo_result_obj)
+            # end with
+        # end if
+        self.store_cached_result(cache_key, sumo_result_obj)
+        with trace_stage(self.tracer, 'save_file', sumo_config.job_id):
+            path_out = self.file_handler.save_file(sumo_config.job_id, sumo_result=sumo_result_obj)
+        # end with
+        with trace_stage(self.tracer, 'end_job', sumo_config.job_id):
+            self.file_handler.end_job(sumo_config.job_id)
+        # end with
+        self.release_config(sumo_config)
+        return path_out
+
+    def start_trace(self):
+        if self.tracer is not None:
+            self.tracer.start_run()
+        # end if
+
+    def finish_trace(self):
+        if self.tracer is not None:
+            self.tracer.finish_run()
+        # end if
+
+    def save_scheduler(self):
+        """Save the history of the scheduler at the end of a run."""
+        if self.scheduler is None:
+            return
+        # end if
+        try:
+            self.scheduler.save()
+        except Exception as e:
+            logger.warning(f'failed to save the history of the scheduler. The reason is {e}')
+        # end try
+
     def get_data_directory(self) -> Path:
         raise NotImplementedError()
 
     def one_simulation(self, sumo_config_object: SumoConfigObject) -> typing.Tuple[str, SumoResultObjects]:
         raise NotImplementedError()
 
+    def iter_simulation(self,
+                        sumo_configs: typing.List[SumoConfigObject],
+                        on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None,
+                        shard: typing.Optional[typing.Tuple[int, int]] = None
+                        ) -> typing.Iterator[SumoResultObjects]:
+        raise NotImplementedError()
+
+    def iter_stream(self,
+                    sumo_configs: typing.Iterable[SumoConfigObject],
+                    on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None
+                    ) -> typing.Iterator[SumoResultObjects]:
+        """Run jobs as they are taken from `sumo_configs`. This takes `n_jobs` jobs at a time for `iter_simulation`."""
+        iter_configs = iter(sumo_configs)
+        while True:
+            seq_batch = list(itertools.islice(iter_configs, self.n_jobs))
+            if len(seq_batch) == 0:
+                return
+            # end if
+            yield from self.iter_simulation(seq_batch, on_job_done=on_job_done)
+        # end while
+
     def run_simulation(self,
-                       sumo_configs: typing.List[SumoConfigObject]) -> SumoResultObjects:
+                       sumo_configs: typing.List[SumoConfigObject],
+                       on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None,
+                       shard: typing.Optional[typing.Tuple[int, int]] = None
+                       ) -> typing.List[SumoResultObjects]:
         raise NotImplementedError()
 
 
@@ -54,55 +253,318 @@ class LocalSumoPipeline(BasePipeline):
                  is_rewrite_windows_path: bool = True,
                  path_working_dir: Path = None,
                  n_jobs: int = 1,
-                 sumo_command: str = '/bin/sumo'):
+                 sumo_command: str = '/bin/sumo',
+                 timeout_per_job: typing.Optional[float] = None,
+                 interval_poll: float = 0.05,
+                 scheduler: typing.Optional[LptScheduler] = None,
+                 result_cache: typing.Optional[BaseResultCache] = None,
+                 n_persistence_workers: int = 4,
+                 max_pending_bytes: typing.Optional[int] = None,
+                 staging_mode: str = 'copy',
+                 columnar_converter: typing.Optional[ColumnarConverter] = None,
+                 output_monitor: typing.Optional[OutputMonitor] = None,
+                 libsumo_pool: typing.Optional[LibsumoWorkerPool] = None,
+                 warmup_cache: typing.Optional[WarmupStateCache] = None,
+                 tracer: typing.Optional[StageTracer] = None):
         """A pipeline interface to run SUMO-docker.
 
         Args:
             path_working_dir: a path to save tmp files.
             n_jobs: the number of cores.
+            timeout_per_job: (optional) wall-clock time limit in seconds per job. A SUMO process over the limit is killed.
+            interval_poll: interval (seconds) to check running SUMO processes.
+            scheduler: (optional) a scheduler that decides the order of jobs. Jobs run in the given order if None.
+            result_cache: (optional) a cache of outputs keyed on contents of input files. A hit skips SUMO.
+            n_persistence_workers: the number of threads saving outputs with the file handler.
+             Saving runs in the background while the next SUMO processes run.
+            max_pending_bytes: (optional) the limit of bytes of outputs waiting to be saved.
+             New SUMO processes wait while the limit is exceeded. Running processes are not stopped.
+            staging_mode: how to prepare a job directory. 'copy' copies the scenario directory.
+             'hardlink', 'reflink' or 'auto' links input files and creates an empty output directory.
+            columnar_converter: (optional) converts outputs into columnar files before the outputs are saved.
+            output_monitor: (optional) reads detector outputs while SUMO runs. A job is killed when
+             the callback of the monitor returns True, and it is recorded in `failed_job_ids`.
+            libsumo_pool: (optional) runs jobs in libsumo workers instead of new SUMO processes.
+             Jobs with the same net file are sent to the same worker. `n_jobs` and `timeout_per_job` are not used.
+            warmup_cache: (optional) runs the warm-up shared by all jobs once, and jobs start from the saved state.
+            tracer: (optional) records time of stages of jobs. A trace file is written per run.
         """
         super(LocalSumoPipeline, self).__init__(path_working_dir=path_working_dir,
                                                 n_jobs=n_jobs,
-                                                file_handler=file_handler)
+                                                file_handler=file_handler,
+                                                scheduler=scheduler,
+                                                result_cache=result_cache,
+                                                n_persistence_workers=n_persistence_workers,
+                                                max_pending_bytes=max_pending_bytes,
+                                                columnar_converter=columnar_converter,
+                                                tracer=tracer)
         self.sumo_command = sumo_command
         self.is_rewrite_windows_path = is_rewrite_windows_path
+        self.timeout_per_job = timeout_per_job
+        self.interval_poll = interval_poll
+        self.staging_mode = staging_mode
+        self.output_monitor = output_monitor
+        self.libsumo_pool = libsumo_pool
+        self.warmup_cache = warmup_cache
 
     def one_simulation(self, sumo_config_object: SumoConfigObject) -> SumoResultObjects:
-        job_status, path = self.file_handler.get_job_status(job_id=sumo_config_object.job_id)
-        if job_status == 'finished':
-            logger.debug(f'job_id={sumo_config_object.job_id} is already done. Skip it.')
-            result_obj = SumoResultObjects(id_scenario=sumo_config_object.scenario_name,
-                                           sumo_config_obj=sumo_config_object,
-                                           path_output_dir=path)
-            return result_obj
+        """Run one job with the same executor as `run_simulation`."""
+        seq_results = self.run_simulation([sumo_config_object])
+        if len(seq_results) == 0:
+            raise Exception(f'job_id={sumo_config_object.job_id} failed.')
         # end if
+        return seq_results[0]
 
-        sumo_controller = LocalSumoController(sumo_command=self.sumo_command)
-        self.file_handler.start_job(sumo_config_object.job_id)
-        sumo_result_obj = sumo_controller.start_job(sumo_config=sumo_config_object)
-        path_out = self.file_handler.save_file(sumo_config_object.job_id, sumo_result=sumo_result_obj)
-        self.file_handler.end_job(sumo_config_object.job_id)
-        result_obj = SumoResultObjects(id_scenario=sumo_config_object.scenario_name,
-                                       sumo_config_obj=sumo_config_object,
-                                       path_output_dir=path_out)
-        return result_obj
+    @staticmethod
+    def get_affinity_key(sumo_config_object: SumoConfigObject) -> str:
+        """The net file of the scenario. Staged copies of the same scenario share the key."""
+        if sumo_config_object.path_config_dir_original is not None:
+            path_config_dir = sumo_config_object.path_config_dir_original
+        else:
+            path_config_dir = sumo_config_object.path_config_dir
+        # end if
+        path_net_file = LocalSumoController.extract_net_file(path_config_dir.joinpath(sumo_config_object.config_name))
+        return str(path_net_file.resolve())
+
+    def iter_simulation(self,
+                        sumo_configs: typing.List[SumoConfigObject],
+                        on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None,
+                        shard: typing.Optional[typing.Tuple[int, int]] = None
+                        ) -> typing.Iterator[SumoResultObjects]:
+        """Run SUMO simulation and yield results in the order of completion.
+
+        SUMO processes are launched directly by `SumoProcessExecutor`. A job that fails or exceeds `timeout_per_job`
+        is logged and recorded in `failed_job_ids`; it is not yielded.
+
+        Args:
+            sumo_configs: List of SUMO Config objects or `ParameterSweep`.
+            on_job_done: (optional) a function called with `SumoResultObjects` each time a job ends.
+            shard: (optional) (i, N). Only jobs whose job-id hashes into the i-th of N shards run.
+
+        Returns: Iterator of `SumoResultObjects`.
+        """
+        self.start_trace()
+        try:
+            yield from self.__iter_simulation(select_shard(list(sumo_configs), shard), on_job_done)
+        finally:
+            self.save_scheduler()
+            self.finish_trace()
+        # end try
+
+    def __iter_simulation(self,
+                          sumo_configs: typing.List[SumoConfigObject],
+                          on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None
+                          ) -> typing.Iterator[SumoResultObjects]:
+        sumo_configs = list(sumo_configs)
+        self.check_job_ids(sumo_configs)
+        self.failed_job_ids = []
+        seq_finished, seq_pending = self.split_finished_jobs(sumo_configs)
+        for result_obj in seq_finished:
+            if on_job_done is not None:
+                on_job_done(result_obj)
+            # end if
+            yield result_obj
+        # end for
+        if len(seq_pending) == 0:
+            return
+        # end if
+
+        sumo_controller = LocalSumoController(sumo_command=self.sumo_command,
+                                              is_rewrite_windows_path=self.is_rewrite_windows_path,
+                                              staging_mode=self.staging_mode,
+                                              tracer=self.tracer)
+        d_job_id2cache_key = {}
+        if self.result_cache is not None:
+            sumo_version = sumo_controller.get_sumo_version()
+            # outputs of a job started from a state differ from outputs of the whole simulation.
+            warmup_key = self.warmup_cache.get_key(sumo_version) if self.warmup_cache is not None else None
+            seq_not_cached = []
+            for conf in seq_pending:
+                self.prepare_config(conf)
+                d_job_id2cache_key[conf.job_id] = self.get_cache_key(conf, sumo_version)
+                if d_job_id2cache_key[conf.job_id] is not None and warmup_key is not None:
+                    d_job_id2cache_key[conf.job_id] += f'-warmup-{warmup_key}'
+                # end if
+                self.release_config(conf)
+                result_obj = self.load_cached_result(conf, d_job_id2cache_key[conf.job_id])
+                if result_obj is None:
+                    seq_not_cached.append(conf)
+                    continue
+                # end if
+                if on_job_done is not None:
+                    on_job_done(result_obj)
+                # end if
+                yield result_obj
+            # end for
+            seq_pending = seq_not_cached
+        # end if
+        if len(seq_pending) == 0:
+            return
+        # end if
+        yield from self.__run_jobs(self.order_jobs(seq_pending), sumo_controller, d_job_id2cache_key, on_job_done)
+
+    def iter_stream(self,
+                    sumo_configs: typing.Iterable[SumoConfigObject],
+                    on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None
+                    ) -> typing.Iterator[SumoResultObjects]:
+        """Run jobs as they are taken from `sumo_configs` and yield results in the order of completion.
+
+        `sumo_configs` is consumed only when a process slot is free, so that a generator can decide the next job
+        at that time. Ex. claiming a job from a shared queue. Jobs are neither checked for their status,
+        looked up in the result cache nor ordered by the scheduler.
+
+        Returns: Iterator of `SumoResultObjects`. Failed jobs are recorded in `failed_job_ids`.
+        """
+        self.start_trace()
+        try:
+            self.failed_job_ids = []
+            sumo_controller = LocalSumoController(sumo_command=self.sumo_command,
+                                                  is_rewrite_windows_path=self.is_rewrite_windows_path,
+                                                  staging_mode=self.staging_mode,
+                                                  tracer=self.tracer)
+            yield from self.__run_jobs(sumo_configs, sumo_controller, {}, on_job_done)
+        finally:
+            self.save_scheduler()
+            self.finish_trace()
+        # end try
+
+    def __run_jobs(self,
+                   seq_pending: typing.Iterable[SumoConfigObject],
+                   sumo_controller: LocalSumoController,
+                   d_job_id2cache_key: typing.Dict[str, typing.Optional[str]],
+                   on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None
+                   ) -> typing.Iterator[SumoResultObjects]:
+        """Launch jobs with the executor and save outputs in the background. `seq_pending` is consumed lazily."""
+        if self.warmup_cache is not None:
+            with trace_stage(self.tracer, 'warmup'):
+                self.warmup_cache.prepare(self.sumo_command, sumo_controller.get_sumo_version())
+            # end with
+        # end if
+        path_log_dir = Path(static.PATH_PACKAGE_WORK_DIR).joinpath(static.SUBDIRECTORY_LOG)
+
+        def generate_process_jobs() -> typing.Iterator[ProcessJob]:
+            # the config directory is copied just before the process launches.
+            for sumo_config_object in seq_pending:
+                self.prepare_config(sumo_config_object)
+                with trace_stage(self.tracer, 'start_job', sumo_config_object.job_id):
+                    self.file_handler.start_job(sumo_config_object.job_id)
+                # end with
+                sumo_config_object, command = sumo_controller.build_job_command(sumo_config_object)
+                if self.warmup_cache is not None:
+                    self.warmup_cache.apply(sumo_config_object)
+                # end if
+                if self.output_monitor is not None:
+                    path_config_file = sumo_config_object.path_config_dir.joinpath(sumo_config_object.config_name)
+                    self.output_monitor.start(sumo_config_object.job_id, path_config_file)
+                # end if
+                yield ProcessJob(job_id=sumo_config_object.job_id,
+                                 command=command,
+                                 path_log=path_log_dir.joinpath(f'{sumo_config_object.job_id}.log'),
+                                 payload=sumo_config_object,
+                                 affinity_key=(self.get_affinity_key(sumo_config_object)
+                                               if self.libsumo_pool is not None else None))
+            # end for
+
+        if self.libsumo_pool is not None:
+            executor = self.libsumo_pool
+        else:
+            executor = SumoProcessExecutor(n_jobs=self.n_jobs,
+                                           timeout_per_job=self.timeout_per_job,
+                                           interval_poll=self.interval_poll)
+        # end if
+        persistence_stage = self.create_persistence_stage()
+        d_future2result: typing.Dict[Future, SumoResultObjects] = {}
+
+        def collect_persisted(is_wait: bool) -> typing.Iterator[SumoResultObjects]:
+            seq_futures = list(d_future2result.keys())
+            for future in (as_completed(seq_futures) if is_wait else [f for f in seq_futures if f.done()]):
+                sumo_result_obj = d_future2result.pop(future)
+                sumo_config_object = sumo_result_obj.sumo_config_obj
+                try:
+                    path_out = future.result()
+                except Exception as e:
+                    logger.error(f'failed to save outputs of job_id={sumo_config_object.job_id}. The reason is {e}')
+                    self.failed_job_ids.append(sumo_config_object.job_id)
+                    self.release_config(sumo_config_object)
+                    continue
+                # end try
+                result_obj = SumoResultObjects(id_scenario=sumo_config_object.scenario_name,
+                                               sumo_config_obj=sumo_config_object,
+                                               path_output_dir=path_out,
+                                               log_message=sumo_result_obj.log_message)
+                if on_job_done is not None:
+                    on_job_done(result_obj)
+                # end if
+                yield result_obj
+            # end for
+
+        try:
+            def on_poll(job: ProcessJob) -> bool:
+                return self.output_monitor.check(job.job_id)
+
+            for process_result in executor.run(generate_process_jobs(),
+                                               on_poll=on_poll if self.output_monitor is not None else None,
+                                               can_launch=persistence_stage.is_accepting):
+                sumo_config_object: SumoConfigObject = process_result.job.payload
+                if self.tracer is not None:
+                    self.tracer.record('sumo_run', sumo_config_object.job_id, process_result.elapsed_seconds)
+                # end if
+                if self.output_monitor is not None:
+                    self.output_monitor.finish(sumo_config_object.job_id)
+                # end if
+                if not process_result.is_success:
+                    logger.error(f'job_id={sumo_config_object.job_id} failed. '
+                                 f'timeout={process_result.is_timeout}, aborted={process_result.is_aborted}, '
+                                 f'return-code={process_result.return_code}, '
+                                 f'message={process_result.log_output.decode("utf-8", errors="replace")}')
+                    self.failed_job_ids.append(sumo_config_object.job_id)
+                    self.release_config(sumo_config_object)
+                    continue
+                # end if
+                self.record_elapsed_time(sumo_config_object, process_result.elapsed_seconds)
+                sumo_result_obj = sumo_controller.pack_sumo_result(sumo_config_object, process_result.log_output)
+                # saving runs in the background. The byte limit is applied before a new job launches,
+                # so that running processes are still checked while outputs wait for the upload.
+                future = persistence_stage.submit(self.persist_result,
+                                                  sumo_config_object,
+                                                  sumo_result_obj,
+                                                  d_job_id2cache_key.get(sumo_config_object.job_id),
+                                                  path_output_dir=sumo_result_obj.path_output_dir,
+                                                  is_wait=False)
+                d_future2result[future] = sumo_result_obj
+                yield from collect_persisted(is_wait=False)
+            # end for
+            yield from collect_persisted(is_wait=True)
+        finally:
+            persistence_stage.close()
+        # end try
 
     def run_simulation(self,
-                       sumo_configs: typing.List[SumoConfigObject]
+                       sumo_configs: typing.List[SumoConfigObject],
+                       on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None,
+                       shard: typing.Optional[typing.Tuple[int, int]] = None
                        ) -> typing.List[SumoResultObjects]:
         """Run SUMO simulation.
 
         Args:
             sumo_configs: List of SUMO Config objects.
+            on_job_done: (optional) a function called with `SumoResultObjects` each time a job ends.
+            shard: (optional) (i, N). Only jobs whose job-id hashes into the i-th of N shards run.
+             Machines given the same jobs and different i run disjoint jobs without coordination.
 
-        Returns: {scenario-name: `SumoResultObjects`}
+        Returns: list of `SumoResultObjects` in the same order as `sumo_configs`. Failed jobs are not included.
         """
-        self.check_job_ids(sumo_configs)
         logger.info(f'running sumo simulator now...')
-        sumo_result_objects = joblib.Parallel(n_jobs=self.n_jobs)(joblib.delayed(
-            self.one_simulation)(conf) for conf in tqdm(sumo_configs))
+        sumo_configs = select_shard(list(sumo_configs), shard)
+        d_job_id2result = {}
+        for r in tqdm(self.iter_simulation(sumo_configs, on_job_done=on_job_done), total=len(sumo_configs)):
+            d_job_id2result[r.sumo_config_obj.job_id] = r
+        # end for
         logger.info(f'done the simulation.')
-        return sumo_result_objects
+        if len(self.failed_job_ids) > 0:
+            logger.warning(f'{len(self.failed_job_ids)} jobs failed. job_id={self.failed_job_ids}')
+        # end if
+        return [d_job_id2result[conf.job_id] for conf in sumo_configs if conf.job_id in d_job_id2result]
 
 
 class DockerPipeline(BasePipeline):
@@ -112,8 +574,18 @@ class DockerPipeline(BasePipeline):
                  docker_image_name: str = 'kensukemi/sumo-ubuntu18',
                  is_rewrite_windows_path: bool = True,
                  n_jobs: int = 1,
-                 time_interval_future_check: float = 3.0,
-                 limit_max_wait: float = 3600):
+                 time_interval_future_check: typing.Optional[float] = None,
+                 limit_max_wait: typing.Optional[float] = None,
+                 is_use_container_pool: typing.Optional[bool] = None,
+                 max_jobs_per_container: typing.Optional[int] = 100,
+                 scheduler: typing.Optional[LptScheduler] = None,
+                 result_cache: typing.Optional[BaseResultCache] = None,
+                 n_persistence_workers: int = 4,
+                 max_pending_bytes: typing.Optional[int] = None,
+                 staging_mode: str = 'copy',
+                 columnar_converter: typing.Optional[ColumnarConverter] = None,
+                 tracer: typing.Optional[StageTracer] = None,
+                 timeout_per_job: typing.Optional[float] = None):
         """A pipeline interface to run SUMO-docker.
 
         Args:
@@ -122,81 +594,255 @@ class DockerPipeline(BasePipeline):
             docker_image_name: A name of docker-image that you call.
             is_rewrite_windows_path: True, then the class updates Path only when your OS is Windows.
             n_jobs: the number of parallel computations.
-            time_interval_future_check: Time interval to check Task status.
-            limit_max_wait: Time limit (seconds) to force end process.
+            time_interval_future_check: Deprecated. Not used. Results are notified as soon as a task ends.
+            limit_max_wait: Deprecated. Use `timeout_per_job`. It is used as `timeout_per_job` if that is None.
+            is_use_container_pool: True runs jobs in `n_jobs` long-lived containers. None uses the pool when n_jobs > 1.
+            max_jobs_per_container: a pooled container is recycled after running this number of jobs.
+            scheduler: (optional) a scheduler that decides the order of jobs. Jobs run in the given order if None.
+            result_cache: (optional) a cache of outputs keyed on contents of input files. A hit skips SUMO.
+            n_persistence_workers: the number of threads saving outputs with the file handler.
+             Saving runs in the background while the next containers run.
+            max_pending_bytes: (optional) the limit of bytes of outputs waiting to be saved.
+             New containers wait while the limit is exceeded.
+            staging_mode: how to prepare a job directory in the mount directory. 'copy' copies the scenario directory.
+             'hardlink', 'reflink' or 'auto' links input files and creates an empty output directory.
+            columnar_converter: (optional) converts outputs into columnar files before the outputs are saved.
+            tracer: (optional) records time of stages of jobs. A trace file is written per run.
+            timeout_per_job: (optional) wall-clock time limit in seconds per job. SUMO over the limit is killed,
+             and the job is recorded in `failed_job_ids`. Other jobs keep running.
         """
+        if time_interval_future_check is not None:
+            warnings.warn('time_interval_future_check is deprecated and not used.', DeprecationWarning, stacklevel=2)
+        # end if
+        if limit_max_wait is not None:
+            warnings.warn('limit_max_wait is deprecated. Use timeout_per_job.', DeprecationWarning, stacklevel=2)
+            if timeout_per_job is None:
+                timeout_per_job = limit_max_wait
+            # end if
+        # end if
         super(DockerPipeline, self).__init__(file_handler=file_handler,
                                              path_working_dir=path_mount_working_dir,
-                                             n_jobs=n_jobs)
+                                             n_jobs=n_jobs,
+                                             scheduler=scheduler,
+                                             result_cache=result_cache,
+                                             n_persistence_workers=n_persistence_workers,
+                                             max_pending_bytes=max_pending_bytes,
+                                             columnar_converter=columnar_converter,
+                                             tracer=tracer)
         self.path_mount_working_dir = self.path_working_dir
         self.docker_image_name = docker_image_name
         self.is_rewrite_windows_path = is_rewrite_windows_path
-        self.time_interval_future_check = time_interval_future_check
-        self.limit_max_wait = limit_max_wait
+        self.timeout_per_job = timeout_per_job
+        if is_use_container_pool is None:
+            self.is_use_container_pool = n_jobs > 1
+        else:
+            self.is_use_container_pool = is_use_container_pool
+        # end if
+        self.max_jobs_per_container = max_jobs_per_container
+        self.staging_mode = staging_mode
 
     def get_data_directory(self) -> Path:
         return self.path_mount_working_dir
 
-    def one_job(self, sumo_config_obj: SumoConfigObject) -> SumoResultObjects:
-        job_status, path = self.file_handler.get_job_status(job_id=sumo_config_obj.job_id)
-        if job_status == 'finished':
-            logger.debug(f'job_id={sumo_config_obj.job_id} is already done. Skip it.')
-            result_obj = SumoResultObjects(id_scenario=sumo_config_obj.scenario_name,
-                                           sumo_config_obj=sumo_config_obj,
-                                           path_output_dir=path)
+    def one_job(self,
+                sumo_config_obj: SumoConfigObject,
+                sumo_controller: typing.Optional[SumoDockerController] = None,
+                sumo_version: typing.Optional[str] = None,
+                is_check_job_status: bool = True,
+                persistence_stage: typing.Optional[PersistenceStage] = None
+                ) -> typing.Union[SumoResultObjects, Future]:
+        """Run a job in a docker container.
+
+        Args:
+            persistence_stage: (optional) if given, outputs are saved in the background
+             and `Future` of `SumoResultObjects` is returned.
+        """
+        if is_check_job_status:
+            with trace_stage(self.tracer, 'job_status', sumo_config_obj.job_id):
+                job_status, path = self.file_handler.get_job_status(job_id=sumo_config_obj.job_id)
+            # end with
+            if job_status == 'finished':
+                logger.debug(f'job_id={sumo_config_obj.job_id} is already done. Skip it.')
+                result_obj = SumoResultObjects(id_scenario=sumo_config_obj.scenario_name,
+                                               sumo_config_obj=sumo_config_obj,
+                                               path_output_dir=path)
+                return result_obj
+            # end if
+        # end if
+        self.prepare_config(sumo_config_obj)
+        cache_key = self.get_cache_key(sumo_config_obj, sumo_version) if sumo_version is not None else None
+        result_obj = self.load_cached_result(sumo_config_obj, cache_key)
+        if result_obj is not None:
+            self.release_config(sumo_config_obj)
             return result_obj
         # end if
         logger.debug(f'running sumo simulator now...')
         time_stamp_current = datetime.utcnow()
-        self.file_handler.start_job(sumo_config_obj.job_id)
-        sumo_controller = SumoDockerController(
-            container_name_base=f'sumo-docker-{sumo_config_obj.scenario_name}-{time_stamp_current}',
-            image_name=self.docker_image_name)
-        sumo_result_obj = sumo_controller.start_job(sumo_config=sumo_config_obj)
-        path_out = self.file_handler.save_file(sumo_config_obj.job_id, sumo_result_obj)
+        with trace_stage(self.tracer, 'start_job', sumo_config_obj.job_id):
+            self.file_handler.start_job(sumo_config_obj.job_id)
+        # end with
+        if sumo_controller is None:
+            sumo_controller = SumoDockerController(
+                container_name_base=f'sumo-docker-{sumo_config_obj.scenario_name}-{time_stamp_current}',
+                image_name=self.docker_image_name,
+                staging_mode=self.staging_mode,
+                tracer=self.tracer,
+                timeout_per_job=self.timeout_per_job)
+        # end if
+        time_at_start = datetime.now()
+        try:
+            sumo_result_obj = sumo_controller.start_job(sumo_config=sumo_config_obj)
+        except Exception:
+            self.release_config(sumo_config_obj)
+            raise
+        # end try
+        self.record_elapsed_time(sumo_config_obj, (datetime.now() - time_at_start).total_seconds())
         logger.debug(f'done the simulation.')
-        self.file_handler.end_job(sumo_config_obj.job_id)
-        return sumo_result_obj
 
-    def run_simulation(self,
-                       sumo_configs: typing.List[SumoConfigObject]
-                       ) -> typing.List[SumoResultObjects]:
-        """Run SUMO simulation in a docker container.
+        def persist() -> SumoResultObjects:
+            path_out = self.persist_result(sumo_config_obj, sumo_result_obj, cache_key)
+            if isinstance(sumo_config_obj, LazySumoConfig):
+                # the local outputs are removed with the job directory.
+                return SumoResultObjects(id_scenario=sumo_config_obj.scenario_name,
+                                         sumo_config_obj=sumo_config_obj,
+                                         path_output_dir=path_out,
+                                         log_message=sumo_result_obj.log_message)
+            # end if
+            return sumo_result_obj
+
+        if persistence_stage is None:
+            return persist()
+        # end if
+        # the thread is free for the next simulation while the outputs are saved.
+        return persistence_stage.submit(persist, path_output_dir=sumo_result_obj.path_output_dir)
+
+    def iter_simulation(self,
+                        sumo_configs: typing.List[SumoConfigObject],
+                        on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None,
+                        shard: typing.Optional[typing.Tuple[int, int]] = None
+                        ) -> typing.Iterator[SumoResultObjects]:
+        """Run SUMO simulation in docker containers and yield results in the order of completion.
+
+        A result is yielded as soon as its job ends, so you can start analysis before the last job ends.
+        Breaking the loop cancels jobs that have not started yet.
 
         Args:
-            sumo_configs: List of SumoConfigObject.
-            False raises Exception if there is a destination directory already. Default False.
+            sumo_configs: List of SumoConfigObject or `ParameterSweep`.
+            on_job_done: (optional) a function called with `SumoResultObjects` each time a job ends.
+            shard: (optional) (i, N). Only jobs whose job-id hashes into the i-th of N shards run.
         Returns:
-            dict {scenario-name: `SumoResultObjects`}
+            Iterator of `SumoResultObjects`.
         """
+        self.start_trace()
+        try:
+            yield from self.__iter_simulation(select_shard(list(sumo_configs), shard), on_job_done)
+        finally:
+            self.save_scheduler()
+            self.finish_trace()
+        # end try
+
+    def __iter_simulation(self,
+                          sumo_configs: typing.List[SumoConfigObject],
+                          on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None
+                          ) -> typing.Iterator[SumoResultObjects]:
+        sumo_configs = list(sumo_configs)
         self.check_job_ids(sumo_configs)
-        logger.info(f'making the new config files')
-        from concurrent.futures import ThreadPoolExecutor
+        self.failed_job_ids = []
+        seq_finished, sumo_configs = self.split_finished_jobs(sumo_configs)
+        for r in seq_finished:
+            if on_job_done is not None:
+                on_job_done(r)
+            # end if
+            yield r
+        # end for
+        if len(sumo_configs) == 0:
+            return
+        # end if
+        if self.result_cache is not None:
+            sumo_version = SumoDockerController(image_name=self.docker_image_name).get_sumo_version()
+        else:
+            sumo_version = None
+        # end if
+        if self.is_use_container_pool:
+            container_pool = SumoDockerContainerPool(n_containers=self.n_jobs,
+                                                     image_name=self.docker_image_name,
+                                                     is_rewrite_windows_path=self.is_rewrite_windows_path,
+                                                     max_jobs_per_container=self.max_jobs_per_container)
+            container_pool.start()
+            sumo_controller = SumoDockerController(container_pool=container_pool,
+                                                   staging_mode=self.staging_mode,
+                                                   tracer=self.tracer,
+                                                   timeout_per_job=self.timeout_per_job)
+        else:
+            container_pool = None
+            sumo_controller = None
+        # end if
         pool = ThreadPoolExecutor(self.n_jobs)
-        s_future_pool = []
+        persistence_stage = self.create_persistence_stage()
         logger.debug(f'starting tasks...')
-        for conf in sumo_configs:
-            future = pool.submit(self.one_job, (conf))
-            s_future_pool.append(future)
-        # end for
+        d_future2job_id = {pool.submit(self.one_job, conf, sumo_controller, sumo_version, False, persistence_stage):
+                           conf.job_id for conf in self.order_jobs(sumo_configs)}
+        s_future_pool = list(d_future2job_id.keys())
         logger.debug(f'submitted all tasks.')
-
-        time_at_start = datetime.now()
-        logger.debug(f'waiting for task-ends...')
-        while True:
-            is_end_all = all(f.done() is True for f in s_future_pool)
-            if is_end_all:
-                break
-            time.sleep(self.time_interval_future_check)
-            if (datetime.now() - time_at_start).total_seconds() > self.limit_max_wait:
-                raise TimeoutError(f'We waited {self.limit_max_wait} seconds. Not finished yet.')
+        try:
+            # a simulation task returns `Future` of saving. The result is yielded when the saving ends.
+            set_waiting = set(s_future_pool)
+            while len(set_waiting) > 0:
+                set_done, set_waiting = wait(set_waiting, return_when=FIRST_COMPLETED)
+                for f_obj in set_done:
+                    try:
+                        r = f_obj.result()
+                    except TimeoutError as e:
+                        if f_obj not in d_future2job_id:
+                            # not a simulation, Ex. a network timeout while saving.
+                            raise
+                        # end if
+                        # the job is over `timeout_per_job`. Other jobs keep running.
+                        logger.error(str(e))
+                        self.failed_job_ids.append(d_future2job_id[f_obj])
+                        continue
+                    # end try
+                    if isinstance(r, Future):
+                        set_waiting.add(r)
+                        continue
+                    # end if
+                    if on_job_done is not None:
+                        on_job_done(r)
+                    # end if
+                    yield r
+                # end for
+            # end while
+            if len(self.failed_job_ids) > 0:
+                logger.warning(f'{len(self.failed_job_ids)} jobs failed. job_id={self.failed_job_ids}')
             # end if
-        # end while
+        finally:
+            for f_obj in s_future_pool:
+                f_obj.cancel()
+            # end for
+            pool.shutdown(wait=True)
+            persistence_stage.close()
+            if container_pool is not None:
+                container_pool.close()
+            # end if
+        # end try
 
-        d_scenario_name2result = []
-        for f_obj in s_future_pool:
-            r: SumoResultObjects = f_obj.result()
-            d_scenario_name2result.append(r)
-        # end for
+    def run_simulation(self,
+                       sumo_configs: typing.List[SumoConfigObject],
+                       on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None,
+                       shard: typing.Optional[typing.Tuple[int, int]] = None
+                       ) -> typing.List[SumoResultObjects]:
+        """Run SUMO simulation in a docker container.
 
-        return d_scenario_name2result
+        Args:
+            sumo_configs: List of SumoConfigObject.
+            on_job_done: (optional) a function called with `SumoResultObjects` each time a job ends.
+            shard: (optional) (i, N). Only jobs whose job-id hashes into the i-th of N shards run.
+        Returns:
+            list of `SumoResultObjects` in the same order as `sumo_configs`. Failed jobs are not included.
+        """
+        sumo_configs = select_shard(list(sumo_configs), shard)
+        d_job_id2result = {}
+        for r in self.iter_simulation(sumo_configs, on_job_done=on_job_done):
+            d_job_id2result[r.sumo_config_obj.job_id] = r
+        # end for
+        return [d_job_id2result[conf.job_id] for conf in sumo_configs if conf.job_id in d_job_id2result]
@@ -0,0 +1,3 @@
+from .base import BaseResultCache, compute_cache_key
+from .local_cache import LocalResultCache
+from .gcs_cache import GcsResultCache
@@ -0,0 +1,112 @@
+import gzip
+import hashlib
+import typing
+from pathlib import Path
+
+from lxml import etree
+
+from ..commons.sumo_config_obj import SumoConfigObject
+from ..config_generation_module import extract_input_files
+
+# the seed of SUMO when a config does not set it.
+DEFAULT_SUMO_SEED = '23423'
+
+
+def update_hash_normalized_xml(hash_obj: "hashlib._Hash", path_file: Path):
+    """Update a hash with normalized contents of an XML file.
+
+    Comments (SUMO writes a generation timestamp in them), blank lines and indentation are dropped.
+    The file is read line by line, so memory usage does not depend on the file size.
+    """
+    if Path(path_file).suffix == '.gz':
+        f = gzip.open(path_file, 'rb')
+    else:
+        f = Path(path_file).open('rb')
+    # end if
+    is_in_comment = False
+    with f:
+        for line in f:
+            if is_in_comment:
+                index_end = line.find(b'-->')
+                if index_end == -1:
+                    continue
+                # end if
+                line = line[index_end + 3:]
+                is_in_comment = False
+            # end if
+            while b'<!--' in line:
+                index_start = line.find(b'<!--')
+                index_end = line.find(b'-->', index_start + 4)
+                if index_end == -1:
+                    line = line[:index_start]
+                    is_in_comment = True
+                    break
+                # end if
+                line = line[:index_start] + line[index_end + 3:]
+            # end while
+            line = line.strip()
+            if line != b'':
+                hash_obj.update(line + b'\n')
+            # end if
+        # end for
+    # end with
+
+
+def compute_cache_key(sumo_config: SumoConfigObject, sumo_version: str) -> typing.Optional[str]:
+    """Compute a key of simulation results from contents of input files, the SUMO version and the seed.
+
+    Input files are found in the same way as `Template2SuMoConfig`. The key does not depend on the scenario name
+    nor on file names; the input options are hashed with the contents of the files they point to.
+
+    Returns: a hex digest. None if the config sets <random value="true"/>, i.e. the results are not reproducible.
+    """
+    path_config_file = Path(sumo_config.path_config_dir).joinpath(sumo_config.config_name)
+    root = etree.parse(str(path_config_file)).getroot()
+    random_element = root.find('random_number/random')
+    if random_element is not None and random_element.attrib.get('value') == 'true':
+        return None
+    # end if
+    seed_element = root.find('random_number/seed')
+    seed = DEFAULT_SUMO_SEED if seed_element is None else seed_element.attrib['value']
+
+    hash_obj = hashlib.sha256()
+    hash_obj.update(f'version={sumo_version.strip()}\n'.encode('utf-8'))
+    hash_obj.update(f'seed={seed}\n'.encode('utf-8'))
+    d_option2files: typing.Dict[str, typing.List[Path]] = {}
+    for element_name, path_input_file in extract_input_files(path_config_file):
+        d_option2files.setdefault(element_name, []).append(path_input_file)
+    # end for
+    # options other than input files
+    seq_options = []
+    for section in root:
+        if not isinstance(section.tag, str):
+            continue
+        # end if
+        for option in section:
+            if not isinstance(option.tag, str) or option.tag in d_option2files:
+                continue
+            # end if
+            seq_options.append(f'{section.tag}/{option.tag}={option.attrib.get("value")}')
+        # end for
+    # end for
+    for option_txt in sorted(seq_options):
+        hash_obj.update(f'{option_txt}\n'.encode('utf-8'))
+    # end for
+    # input files
+    for element_name in sorted(d_option2files.keys()):
+        for path_input_file in d_option2files[element_name]:
+            hash_obj.update(f'input/{element_name}\n'.encode('utf-8'))
+            update_hash_normalized_xml(hash_obj, path_input_file)
+        # end for
+    # end for
+    return hash_obj.hexdigest()
+
+
+class BaseResultCache(object):
+    def get(self, cache_key: str) -> typing.Optional[Path]:
+        """Returns a local directory with cached outputs. None if the key is not in the cache."""
+        raise NotImplementedError()
+
+    def put(self, cache_key: str, path_output_dir: Path):
+        """Store outputs in `path_output_dir` with the key."""
+        raise NotImplementedError()
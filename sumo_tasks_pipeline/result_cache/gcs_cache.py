@@ -0,0 +1,68 @@
+import typing
+import uuid
+from pathlib import Path
+
+from google.cloud import storage
+
+from ..logger_unit import logger
+from ..static import PATH_PACKAGE_WORK_DIR
+from .base import BaseResultCache
+
+# an object written after all outputs are uploaded. An entry without it is ignored.
+NAME_COMPLETE_MARKER = '.complete'
+
+
+class GcsResultCache(BaseResultCache):
+    def __init__(self,
+                 storage_client: storage.Client,
+                 bucket_name: str,
+                 prefix: str = 'result-cache',
+                 path_local_dir: typing.Optional[Path] = None):
+        """A result cache on Google Cloud Storage. Objects are stored at {prefix}/{cache-key}/{file-name}.
+
+        Use a lifecycle rule of the bucket if you need to bound the size.
+
+        Args:
+            storage_client: a client of GCS. Ex. `GcsFileHandler.storage_client`.
+            bucket_name: a bucket name.
+            prefix: a prefix of objects.
+            path_local_dir: (optional) a directory where cached outputs are downloaded.
+        """
+        self.storage_client = storage_client
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+        if path_local_dir is None:
+            path_local_dir = Path(PATH_PACKAGE_WORK_DIR).joinpath('result-cache')
+        # end if
+        self.path_local_dir = Path(path_local_dir)
+        self.bucket = self.storage_client.bucket(self.bucket_name)
+
+    def get(self, cache_key: str) -> typing.Optional[Path]:
+        prefix_entry = f'{self.prefix}/{cache_key}/'
+        blobs = list(self.storage_client.list_blobs(self.bucket_name, prefix=prefix_entry))
+        seq_names = [blob.name[len(prefix_entry):] for blob in blobs]
+        if NAME_COMPLETE_MARKER not in seq_names:
+            return None
+        # end if
+        path_destination = self.path_local_dir.joinpath(f'{cache_key}-{uuid.uuid4()}')
+        path_destination.mkdir(parents=True, exist_ok=True)
+        for blob, name in zip(blobs, seq_names):
+            if name == NAME_COMPLETE_MARKER:
+                continue
+            # end if
+            path_local = path_destination.joinpath(name)
+            path_local.parent.mkdir(parents=True, exist_ok=True)
+            blob.download_to_filename(str(path_local))
+        # end for
+        logger.debug(f'cache hit. key={cache_key}')
+        return path_destination
+
+    def put(self, cache_key: str, path_output_dir: Path):
+        for path_local in Path(path_output_dir).rglob('*'):
+            if not path_local.is_file():
+                continue
+            # end if
+            blob = self.bucket.blob(f'{self.prefix}/{cache_key}/{path_local.relative_to(path_output_dir).as_posix()}')
+            blob.upload_from_filename(str(path_local))
+        # end for
+        self.bucket.blob(f'{self.prefix}/{cache_key}/{NAME_COMPLETE_MARKER}').upload_from_string(b'')
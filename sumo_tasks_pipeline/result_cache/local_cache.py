@@ -0,0 +1,102 @@
+import json
+import shutil
+import threading
+import time
+import typing
+import uuid
+from pathlib import Path
+
+from ..logger_unit import logger
+from .base import BaseResultCache
+
+NAME_META_FILE = 'meta.json'
+NAME_OUTPUT_DIR = 'output'
+
+
+class LocalResultCache(BaseResultCache):
+    def __init__(self,
+                 path_cache_root: Path,
+                 max_size_bytes: typing.Optional[int] = None):
+        """A result cache on the local storage. The least recently used results are evicted beyond the size limit.
+
+        Layout: {path_cache_root}/{cache-key}/output/* and {path_cache_root}/{cache-key}/meta.json
+
+        Args:
+            path_cache_root: a directory of the cache.
+            max_size_bytes: (optional) upper limit of the total size of cached outputs. None never evicts.
+        """
+        self.path_cache_root = Path(path_cache_root)
+        self.path_cache_root.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def get_dir_size(path_dir: Path) -> int:
+        return sum(p.stat().st_size for p in Path(path_dir).rglob('*') if p.is_file())
+
+    def write_meta(self, path_entry: Path, size_bytes: int):
+        with path_entry.joinpath(NAME_META_FILE).open('w') as f:
+            f.write(json.dumps({'size_bytes': size_bytes, 'last_access': time.time()}))
+        # end with
+
+    def read_meta(self, path_entry: Path) -> typing.Optional[typing.Dict[str, typing.Any]]:
+        try:
+            with path_entry.joinpath(NAME_META_FILE).open('r') as f:
+                return json.loads(f.read())
+            # end with
+        except (FileNotFoundError, ValueError):
+            return None
+        # end try
+
+    def get(self, cache_key: str) -> typing.Optional[Path]:
+        path_entry = self.path_cache_root.joinpath(cache_key)
+        with self.lock:
+            meta = self.read_meta(path_entry)
+            if meta is None:
+                return None
+            # end if
+            self.write_meta(path_entry, meta['size_bytes'])
+        # end with
+        logger.debug(f'cache hit. key={cache_key}')
+        return path_entry.joinpath(NAME_OUTPUT_DIR)
+
+    def put(self, cache_key: str, path_output_dir: Path):
+        path_entry = self.path_cache_root.joinpath(cache_key)
+        if path_entry.exists():
+            return
+        # end if
+        # write into a temporary directory first, then rename it. A half-written entry is never visible.
+        path_tmp = self.path_cache_root.joinpath(f'.tmp-{uuid.uuid4()}')
+        shutil.copytree(path_output_dir, path_tmp.joinpath(NAME_OUTPUT_DIR))
+        self.write_meta(path_tmp, self.get_dir_size(path_tmp.joinpath(NAME_OUTPUT_DIR)))
+        with self.lock:
+            try:
+                path_tmp.rename(path_entry)
+            except OSError:
+                # the same key was stored by another process.
+                shutil.rmtree(path_tmp, ignore_errors=True)
+            # end try
+            self.evict()
+        # end with
+
+    def evict(self):
+        """Remove the least recently used entries until the total size is within `max_size_bytes`."""
+        if self.max_size_bytes is None:
+            return
+        # end if
+        seq_entries = []
+        for path_entry in self.path_cache_root.iterdir():
+            meta = self.read_meta(path_entry) if path_entry.is_dir() else None
+            if meta is not None:
+                seq_entries.append((meta['last_access'], meta['size_bytes'], path_entry))
+            # end if
+        # end for
+        total_size = sum(size_bytes for __, size_bytes, __ in seq_entries)
+        for __, size_bytes, path_entry in sorted(seq_entries, key=lambda t: t[0]):
+            if total_size <= self.max_size_bytes:
+                break
+            # end if
+            logger.debug(f'evicting a cache entry {path_entry.name}')
+            shutil.rmtree(path_entry, ignore_errors=True)
+            total_size -= size_bytes
+        # end for
@@ -0,0 +1,183 @@
+import dataclasses
+import typing
+import warnings
+
+import joblib
+import numpy
+import pandas
+
+from .commons.result_module import SumoResultObjects
+from .output_parser_module import DetectorMatrix
+
+
+def parse_result_output(sumo_result_obj: SumoResultObjects,
+                        output_file_name: str,
+                        attributes: typing.Optional[typing.List[str]]) -> DetectorMatrix:
+    return sumo_result_obj.parse_output(output_file_name, attributes=attributes)
+
+
+@dataclasses.dataclass
+class ScenarioStack(object):
+    """Outputs of many scenarios in (scenario, detector, interval) arrays.
+
+    Detectors and intervals are the union over scenarios. A cell that a scenario does not have is NaN.
+
+    Args:
+        scenario_names: names of scenarios. The first axis.
+        detector_ids: ids of detectors. The second axis.
+        interval_begins: begin times of intervals. The third axis.
+        interval_ends: end times of intervals.
+        arrays: {attribute-name: array of (scenario, detector, interval)}
+    """
+    scenario_names: typing.List[str]
+    detector_ids: typing.List[str]
+    interval_begins: numpy.ndarray
+    interval_ends: numpy.ndarray
+    arrays: typing.Dict[str, numpy.ndarray]
+
+    def __getitem__(self, attribute_name: str) -> numpy.ndarray:
+        return self.arrays[attribute_name]
+
+    @property
+    def shape(self) -> typing.Tuple[int, int, int]:
+        return len(self.scenario_names), len(self.detector_ids), len(self.interval_begins)
+
+    def mean(self, attribute_name: str) -> numpy.ndarray:
+        """Mean over scenarios. Returns an array of (detector, interval). NaN is ignored."""
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            return numpy.nanmean(self.arrays[attribute_name], axis=0)
+        # end with
+
+    def quantile(self, attribute_name: str, q: typing.Union[float, typing.List[float]]) -> numpy.ndarray:
+        """Quantiles over scenarios. Returns an array of (detector, interval), or (q, detector, interval)."""
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            return numpy.nanquantile(self.arrays[attribute_name], q, axis=0)
+        # end with
+
+    def scenario_means(self, attribute_name: str) -> pandas.Series:
+        """Mean over detectors and intervals per scenario."""
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            values = numpy.nanmean(self.arrays[attribute_name], axis=(1, 2))
+        # end with
+        return pandas.Series(values, index=pandas.Index(self.scenario_names, name='scenario'), name=attribute_name)
+
+    def detector_stats(self, attribute_name: str) -> pandas.DataFrame:
+        """Statistics per detector over scenarios and intervals.
+
+        Returns: a DataFrame indexed by detector ids with columns mean, std, min, max and count.
+        """
+        values = self.arrays[attribute_name].transpose(1, 0, 2).reshape(len(self.detector_ids), -1)
+        with warnings.catch_warnings():
+            warnings.simplefilter('ignore', category=RuntimeWarning)
+            return pandas.DataFrame({'mean': numpy.nanmean(values, axis=1),
+                                     'std': numpy.nanstd(values, axis=1),
+                                     'min': numpy.nanmin(values, axis=1),
+                                     'max': numpy.nanmax(values, axis=1),
+                                     'count': numpy.sum(~numpy.isnan(values), axis=1)},
+                                    index=pandas.Index(self.detector_ids, name='detector_id'))
+        # end with
+
+    def to_frame(self) -> pandas.DataFrame:
+        """A long table of (scenario, detector_id, begin, end, attributes...). Keys are categorical."""
+        n_scenarios, n_detectors, n_intervals = self.shape
+        index_scenario, index_detector, index_interval = numpy.indices(self.shape).reshape(3, -1)
+        frame = pandas.DataFrame({
+            'scenario': pandas.Categorical.from_codes(index_scenario, categories=self.scenario_names),
+            'detector_id': pandas.Categorical.from_codes(index_detector, categories=self.detector_ids),
+            'begin': self.interval_begins[index_interval],
+            'end': self.interval_ends[index_interval]})
+        for attribute_name, array in self.arrays.items():
+            frame[attribute_name] = array.reshape(-1)
+        # end for
+        return frame
+
+
+class ResultCollection(object):
+    def __init__(self,
+                 sumo_results: typing.Union[typing.List[SumoResultObjects], typing.Dict[str, SumoResultObjects]],
+                 n_jobs: int = 1):
+        """A list of `SumoResultObjects` to aggregate over scenarios.
+
+        Args:
+            sumo_results: results returned by `run_simulation`.
+            n_jobs: the number of processes to parse outputs. Parsing runs with joblib.
+        """
+        if isinstance(sumo_results, dict):
+            sumo_results = list(sumo_results.values())
+        # end if
+        self.sumo_results = list(sumo_results)
+        self.n_jobs = n_jobs
+
+    def __len__(self) -> int:
+        return len(self.sumo_results)
+
+    def __iter__(self) -> typing.Iterator[SumoResultObjects]:
+        return iter(self.sumo_results)
+
+    @property
+    def scenario_names(self) -> typing.List[str]:
+        return [r.id_scenario for r in self.sumo_results]
+
+    def parse(self,
+              output_file_name: str,
+              attributes: typing.Optional[typing.List[str]] = None) -> typing.List[DetectorMatrix]:
+        """Parse the output of every scenario. A columnar file is read if it exists.
+
+        Returns: `DetectorMatrix` in the order of `sumo_results`.
+        """
+        if self.n_jobs == 1 or len(self.sumo_results) <= 1:
+            return [parse_result_output(r, output_file_name, attributes) for r in self.sumo_results]
+        # end if
+        return joblib.Parallel(n_jobs=self.n_jobs)(
+            joblib.delayed(parse_result_output)(r, output_file_name, attributes) for r in self.sumo_results)
+
+    def stack(self,
+              output_file_name: str,
+              attributes: typing.Optional[typing.List[str]] = None) -> ScenarioStack:
+        """Parse outputs and put them in (scenario, detector, interval) arrays.
+
+        Args:
+            output_file_name: a name of a detector output. Ex. "grid_loop.out.xml"
+            attributes: (optional) attribute names. Ex. ['flow']. All numeric attributes if None.
+        Returns: `ScenarioStack`
+        """
+        seq_matrices = self.parse(output_file_name, attributes)
+        d_detector2index: typing.Dict[str, int] = {}
+        d_begin2end: typing.Dict[float, float] = {}
+        for matrix in seq_matrices:
+            for detector_id in matrix.detector_ids:
+                d_detector2index.setdefault(detector_id, len(d_detector2index))
+            # end for
+            d_begin2end.update(zip(matrix.interval_begins.tolist(), matrix.interval_ends.tolist()))
+        # end for
+        if attributes is None:
+            attributes = list(dict.fromkeys(a for matrix in seq_matrices for a in matrix.attributes))
+        # end if
+        interval_begins = numpy.array(sorted(d_begin2end.keys()), dtype=float)
+        interval_ends = numpy.array([d_begin2end[b] for b in interval_begins], dtype=float)
+        shape = (len(seq_matrices), len(d_detector2index), len(interval_begins))
+        arrays = {a: numpy.full(shape, numpy.nan) for a in attributes}
+        for i_scenario, matrix in enumerate(seq_matrices):
+            index_detector = numpy.array([d_detector2index[d] for d in matrix.detector_ids], dtype=int)
+            index_interval = numpy.searchsorted(interval_begins, matrix.interval_begins)
+            for attribute_name in attributes:
+                if attribute_name in matrix.matrices:
+                    arrays[attribute_name][i_scenario][numpy.ix_(index_detector, index_interval)] = \
+                        matrix[attribute_name]
+                # end if
+            # end for
+        # end for
+        return ScenarioStack(scenario_names=self.scenario_names,
+                             detector_ids=list(d_detector2index.keys()),
+                             interval_begins=interval_begins,
+                             interval_ends=interval_ends,
+                             arrays=arrays)
+
+    def to_frame(self,
+                 output_file_name: str,
+                 attributes: typing.Optional[typing.List[str]] = None) -> pandas.DataFrame:
+        """A long table of all scenarios with categorical keys. See `ScenarioStack.to_frame`."""
+        return self.stack(output_file_name, attributes).to_frame()
@@ -0,0 +1,328 @@
+import collections
+import dataclasses
+import functools
+import json
+import os
+import statistics
+import threading
+import typing
+from pathlib import Path
+
+from lxml import etree
+
+from .logger_unit import logger
+from .commons.sumo_config_obj import SumoConfigObject
+
+
+@dataclasses.dataclass
+class ScenarioFeatures(object):
+    """Features of a SUMO scenario that drive the simulation cost.
+
+    Args:
+        n_edges: the number of non-internal edges in the net file.
+        n_lanes: the number of lanes on the non-internal edges.
+        time_begin: <time><begin>
+        time_end: <time><end>. The last departure in route files if the config does not set it.
+        step_length: <time><step-length>
+        n_routes: the number of vehicle, trip, flow and route definitions.
+        n_vehicles: the expected number of vehicles. Flows are expanded with number, period or vehsPerHour.
+    """
+    n_edges: int
+    n_lanes: int
+    time_begin: float
+    time_end: float
+    step_length: float
+    n_routes: int
+    n_vehicles: float
+
+    @property
+    def n_steps(self) -> float:
+        return max(self.time_end - self.time_begin, 0.0) / self.step_length
+
+
+@functools.lru_cache(maxsize=128)
+def _count_network(path_net_file: str, time_modified: float) -> typing.Tuple[int, int]:
+    n_edges = 0
+    n_lanes = 0
+    for __, elem in etree.iterparse(path_net_file, events=('end',), tag=('edge', 'lane')):
+        if elem.tag == 'edge':
+            if elem.attrib.get('function') != 'internal':
+                n_edges += 1
+                n_lanes += len(elem.findall('lane'))
+            # end if
+            elem.clear()
+        # end if
+    # end for
+    return n_edges, n_lanes
+
+
+def count_network(path_net_file: Path) -> typing.Tuple[int, int]:
+    """Count (edges, lanes) in a net file. The result is cached while the file is not modified."""
+    return _count_network(str(path_net_file), Path(path_net_file).stat().st_mtime)
+
+
+def _get_float(elem: etree._Element, key: str, default: typing.Optional[float] = None) -> typing.Optional[float]:
+    """Get a float attribute. A <flow> inherits begin/end from a parent <interval>."""
+    if key in elem.attrib:
+        return float(elem.attrib[key])
+    # end if
+    parent = elem.getparent()
+    if parent is not None and parent.tag == 'interval' and key in parent.attrib:
+        return float(parent.attrib[key])
+    # end if
+    return default
+
+
+def count_routes(path_route_file: Path) -> typing.Tuple[int, float, float]:
+    """Count (route definitions, expected vehicles, the last departure time) in a route file."""
+    n_routes = 0
+    n_vehicles = 0.0
+    time_last_depart = 0.0
+    for __, elem in etree.iterparse(str(path_route_file), events=('end',),
+                                    tag=('vehicle', 'trip', 'flow', 'route', 'person')):
+        n_routes += 1
+        if elem.tag in ('vehicle', 'trip', 'person'):
+            n_vehicles += 1
+            try:
+                time_last_depart = max(time_last_depart, float(elem.attrib.get('depart', 0)))
+            except ValueError:
+                # depart="triggered" etc.
+                pass
+            # end try
+        elif elem.tag == 'flow':
+            time_begin = _get_float(elem, 'begin', 0.0)
+            time_end = _get_float(elem, 'end', time_begin)
+            time_last_depart = max(time_last_depart, time_end)
+            if 'number' in elem.attrib:
+                n_vehicles += float(elem.attrib['number'])
+            elif 'period' in elem.attrib:
+                n_vehicles += (time_end - time_begin) / float(elem.attrib['period'])
+            elif 'vehsPerHour' in elem.attrib:
+                n_vehicles += (time_end - time_begin) * float(elem.attrib['vehsPerHour']) / 3600
+            elif 'probability' in elem.attrib:
+                n_vehicles += (time_end - time_begin) * float(elem.attrib['probability'])
+            # end if
+        # end if
+        elem.clear()
+    # end for
+    return n_routes, n_vehicles, time_last_depart
+
+
+def extract_scenario_features(sumo_config: SumoConfigObject) -> ScenarioFeatures:
+    """Extract `ScenarioFeatures` from the files referenced by the SUMO config."""
+    path_config_file = Path(sumo_config.path_config_dir).joinpath(sumo_config.config_name)
+    root = etree.parse(str(path_config_file)).getroot()
+
+    def get_option(section: str, key: str) -> typing.Optional[str]:
+        elem_section = root.find(section)
+        if elem_section is None or elem_section.find(key) is None:
+            return None
+        # end if
+        return elem_section.find(key).attrib['value']
+
+    def get_paths(key: str) -> typing.List[Path]:
+        value = get_option('input', key)
+        if value is None:
+            return []
+        # end if
+        return [path_config_file.parent.joinpath(v.strip()) for v in value.split(',') if v.strip() != '']
+
+    n_edges = 0
+    n_lanes = 0
+    for path_net_file in get_paths('net-file'):
+        n_edges, n_lanes = count_network(path_net_file)
+    # end for
+    n_routes = 0
+    n_vehicles = 0.0
+    time_last_depart = 0.0
+    for path_route_file in get_paths('route-files'):
+        __n_routes, __n_vehicles, __time_last_depart = count_routes(path_route_file)
+        n_routes += __n_routes
+        n_vehicles += __n_vehicles
+        time_last_depart = max(time_last_depart, __time_last_depart)
+    # end for
+
+    time_begin = float(get_option('time', 'begin') or 0.0)
+    time_end = float(get_option('time', 'end') or -1)
+    if time_end < 0:
+        time_end = time_last_depart
+    # end if
+    step_length = float(get_option('time', 'step-length') or 1.0)
+    return ScenarioFeatures(n_edges=n_edges,
+                            n_lanes=n_lanes,
+                            time_begin=time_begin,
+                            time_end=time_end,
+                            step_length=step_length,
+                            n_routes=n_routes,
+                            n_vehicles=n_vehicles)
+
+
+class BaseCostEstimator(object):
+    def estimate(self, sumo_config: SumoConfigObject) -> float:
+        """Expected cost of a job. Only the relative order matters for scheduling."""
+        raise NotImplementedError()
+
+    def update(self, sumo_config: SumoConfigObject, elapsed_seconds: float):
+        """Receive the actual elapsed time of a finished job. Do nothing by default."""
+        pass
+
+    def save(self):
+        """Save what was learnt. Pipelines call it at the end of a run. Do nothing by default."""
+        pass
+
+
+class StaticCostEstimator(BaseCostEstimator):
+    def __init__(self,
+                 weight_lane: float = 1.0,
+                 weight_vehicle: float = 1.0):
+        """Estimates the cost from the files: the number of simulation steps * (lanes + vehicles).
+
+        Args:
+            weight_lane: weight of the number of lanes.
+            weight_vehicle: weight of the expected number of vehicles.
+        """
+        self.weight_lane = weight_lane
+        self.weight_vehicle = weight_vehicle
+
+    def estimate(self, sumo_config: SumoConfigObject) -> float:
+        features = extract_scenario_features(sumo_config)
+        return features.n_steps * (self.weight_lane * features.n_lanes + self.weight_vehicle * features.n_vehicles)
+
+
+class HistoryCostEstimator(BaseCostEstimator):
+    def __init__(self,
+                 base_estimator: typing.Optional[BaseCostEstimator] = None,
+                 path_history: typing.Optional[Path] = None,
+                 n_updates_per_save: int = 100,
+                 max_ratios: int = 1000):
+        """Estimates the cost in seconds with history of earlier runs.
+
+        A job that ran before gets its last elapsed time.
+        A new job gets the base estimation scaled by the median ratio of (elapsed seconds / base estimation).
+
+        Args:
+            base_estimator: an estimator for new jobs. `StaticCostEstimator` by default.
+            path_history: (optional) a json file to load and save the history.
+             It is saved every `n_updates_per_save` updates and at the end of a run.
+            n_updates_per_save: the number of updates between saves of the history.
+            max_ratios: the number of latest ratios kept for the median.
+        """
+        assert n_updates_per_save > 0, f'n_updates_per_save must be > 0. Given {n_updates_per_save}'
+        if base_estimator is None:
+            base_estimator = StaticCostEstimator()
+        # end if
+        self.base_estimator = base_estimator
+        self.path_history = path_history
+        self.n_updates_per_save = n_updates_per_save
+        self.lock = threading.Lock()
+        self.d_job_id2seconds: typing.Dict[str, float] = {}
+        self.seq_ratio: typing.Deque[float] = collections.deque(maxlen=max_ratios)
+        self.d_job_id2base_cost: typing.Dict[str, float] = {}
+        self.n_unsaved = 0
+        if path_history is not None and Path(path_history).exists():
+            with Path(path_history).open('r') as f:
+                history = json.loads(f.read())
+            # end with
+            self.d_job_id2seconds = history['elapsed_seconds']
+            self.seq_ratio.extend(history['ratio'])
+        # end if
+
+    def estimate_base(self, sumo_config: SumoConfigObject) -> float:
+        # the base estimation is kept because the config directory may be gone when the job ends.
+        if sumo_config.job_id not in self.d_job_id2base_cost:
+            self.d_job_id2base_cost[sumo_config.job_id] = self.base_estimator.estimate(sumo_config)
+        # end if
+        return self.d_job_id2base_cost[sumo_config.job_id]
+
+    def estimate(self, sumo_config: SumoConfigObject) -> float:
+        if sumo_config.job_id in self.d_job_id2seconds:
+            return self.d_job_id2seconds[sumo_config.job_id]
+        # end if
+        ratio = statistics.median(self.seq_ratio) if len(self.seq_ratio) > 0 else 1.0
+        return self.estimate_base(sumo_config) * ratio
+
+    def update(self, sumo_config: SumoConfigObject, elapsed_seconds: float):
+        try:
+            cost_base = self.estimate_base(sumo_config)
+        except Exception as e:
+            logger.warning(f'failed to estimate the cost of job_id={sumo_config.job_id}. The reason is {e}')
+            cost_base = 0.0
+        # end try
+        with self.lock:
+            self.d_job_id2seconds[sumo_config.job_id] = elapsed_seconds
+            if cost_base > 0:
+                self.seq_ratio.append(elapsed_seconds / cost_base)
+            # end if
+            self.n_unsaved += 1
+            is_save = self.n_unsaved >= self.n_updates_per_save
+        # end with
+        if is_save:
+            self.save()
+        # end if
+
+    def save(self):
+        """Write the history to a temporary file and rename it, so that a crash never leaves a broken file."""
+        if self.path_history is None:
+            return
+        # end if
+        with self.lock:
+            if self.n_unsaved == 0 and Path(self.path_history).exists():
+                return
+            # end if
+            data = json.dumps({'elapsed_seconds': self.d_job_id2seconds, 'ratio': list(self.seq_ratio)})
+            self.n_unsaved = 0
+            path_tmp = Path(self.path_history).with_name(f'.{Path(self.path_history).name}.{os.getpid()}.tmp')
+            with path_tmp.open('w') as f:
+                f.write(data)
+            # end with
+            os.replace(path_tmp, self.path_history)
+        # end with
+
+
+class LptScheduler(object):
+    def __init__(self, estimator: typing.Optional[BaseCostEstimator] = None):
+        """Orders jobs by Longest-Processing-Time-first to reduce the makespan.
+
+        Args:
+            estimator: a cost estimator. `StaticCostEstimator` by default.
+        """
+        if estimator is None:
+            estimator = StaticCostEstimator()
+        # end if
+        self.estimator = estimator
+
+    def order(self,
+              sumo_configs: typing.List[SumoConfigObject],
+              prepare_config: typing.Optional[typing.Callable[[SumoConfigObject], typing.Any]] = None,
+              release_config: typing.Optional[typing.Callable[[SumoConfigObject], typing.Any]] = None
+              ) -> typing.List[SumoConfigObject]:
+        """Sort jobs by the expected cost in descending order. A job that fails to be estimated comes first.
+
+        Args:
+            sumo_configs: jobs.
+            prepare_config: (optional) called before the estimation of a job. Ex. render a `LazySumoConfig`.
+            release_config: (optional) called after the estimation of a job. Ex. remove the rendered directory.
+        """
+        d_job_id2cost = {}
+        for conf in sumo_configs:
+            try:
+                if prepare_config is not None:
+                    prepare_config(conf)
+                # end if
+                d_job_id2cost[conf.job_id] = self.estimator.estimate(conf)
+            except Exception as e:
+                logger.warning(f'failed to estimate the cost of job_id={conf.job_id}. The reason is {e}')
+                d_job_id2cost[conf.job_id] = float('inf')
+            finally:
+                if release_config is not None:
+                    release_config(conf)
+                # end if
+            # end try
+        # end for
+        return sorted(sumo_configs, key=lambda conf: d_job_id2cost[conf.job_id], reverse=True)
+
+    def update(self, sumo_config: SumoConfigObject, elapsed_seconds: float):
+        self.estimator.update(sumo_config, elapsed_seconds)
+
+    def save(self):
+        self.estimator.save()
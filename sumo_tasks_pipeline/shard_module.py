@@ -0,0 +1,138 @@
+import hashlib
+import json
+import typing
+from datetime import datetime
+
+from .commons.result_module import SumoResultObjects
+from .commons.sumo_config_obj import SumoConfigObject
+from .file_handler.base import BaseFileHandler
+
+PREFIX_SHARD_MANIFEST = 'shard-'
+NAME_MERGED_MANIFEST = 'manifest.json'
+
+
+def parse_shard(text: str) -> typing.Tuple[int, int]:
+    """Parse "i/N" into (i, N). Shards are numbered from 0."""
+    try:
+        index, n_shards = [int(s) for s in text.split('/')]
+    except ValueError:
+        raise ValueError(f'a shard must be "i/N". Given {text}')
+    # end try
+    if not (n_shards > 0 and 0 <= index < n_shards):
+        raise ValueError(f'a shard must be 0 <= i < N. Given {text}')
+    # end if
+    return index, n_shards
+
+
+def check_shard(shard: typing.Tuple[int, int]):
+    index, n_shards = shard
+    assert n_shards > 0 and 0 <= index < n_shards, f'a shard must be 0 <= i < N. Given {index}/{n_shards}'
+
+
+def get_shard_index(job_id: str, n_shards: int) -> int:
+    """The shard of a job. It depends only on the job-id, so that every machine computes the same shards.
+
+    `hash()` of Python is not used; it differs between processes.
+    """
+    digest = hashlib.sha1(job_id.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big') % n_shards
+
+
+def select_shard(sumo_configs: typing.List[SumoConfigObject],
+                 shard: typing.Optional[typing.Tuple[int, int]]) -> typing.List[SumoConfigObject]:
+    """Jobs of the shard (i, N). All jobs if `shard` is None."""
+    if shard is None:
+        return list(sumo_configs)
+    # end if
+    check_shard(shard)
+    index, n_shards = shard
+    return [conf for conf in sumo_configs if get_shard_index(conf.job_id, n_shards) == index]
+
+
+def get_shard_manifest_name(shard: typing.Tuple[int, int]) -> str:
+    return f'{PREFIX_SHARD_MANIFEST}{shard[0]:05d}-of-{shard[1]:05d}.json'
+
+
+def create_shard_manifest(shard: typing.Tuple[int, int],
+                          sumo_configs: typing.List[SumoConfigObject],
+                          sumo_results: typing.List[SumoResultObjects],
+                          file_handler: typing.Optional[BaseFileHandler] = None) -> typing.Dict[str, typing.Any]:
+    """A record of jobs of a shard. A job of the shard without a result is 'failed'.
+
+    Args:
+        shard: (i, N).
+        sumo_configs: jobs of the shard.
+        sumo_results: results returned by `run_simulation`.
+        file_handler: (optional) the file handler of the run. Output paths are resolved with it,
+         so that jobs finished in an earlier run have the same kind of path as jobs that ran now.
+         Paths of results are recorded if None.
+    """
+    d_job_id2result = {r.sumo_config_obj.job_id: r for r in sumo_results}
+    seq_jobs = []
+    for conf in sumo_configs:
+        result = d_job_id2result.get(conf.job_id)
+        if result is None:
+            path_output_dir = None
+        elif file_handler is not None:
+            path_output_dir = str(file_handler.get_output_path(conf.job_id))
+        else:
+            path_output_dir = str(result.path_output_dir)
+        # end if
+        seq_jobs.append({'job_id': conf.job_id,
+                         'scenario_name': conf.scenario_name,
+                         'status': 'finished' if result is not None else 'failed',
+                         'path_output_dir': path_output_dir})
+    # end for
+    return {'shard': list(shard), 'created_at': datetime.utcnow().isoformat(), 'jobs': seq_jobs}
+
+
+def save_shard_manifest(file_handler: BaseFileHandler, manifest: typing.Dict[str, typing.Any]) -> str:
+    """Returns: the name of the manifest."""
+    name = get_shard_manifest_name(tuple(manifest['shard']))
+    file_handler.save_manifest(name, json.dumps(manifest).encode('utf-8'))
+    return name
+
+
+def merge_manifests(file_handler: BaseFileHandler,
+                    sumo_configs: typing.Optional[typing.List[SumoConfigObject]] = None
+                    ) -> typing.Dict[str, typing.Any]:
+    """Assemble one manifest from manifests of all shards.
+
+    Args:
+        file_handler: a file handler where shards saved their manifests.
+        sumo_configs: (optional) all jobs of the sweep. Jobs in no manifest are recorded as 'missing'.
+
+    Returns: {'n_shards', 'shards_missing', 'n_jobs', 'n_finished', 'n_failed', 'n_missing', 'jobs'}.
+    """
+    seq_manifests = [json.loads(data) for name, data in sorted(file_handler.load_manifests().items())
+                     if name.startswith(PREFIX_SHARD_MANIFEST)]
+    if len(seq_manifests) == 0:
+        raise Exception('no manifest of shards found.')
+    # end if
+    set_n_shards = {m['shard'][1] for m in seq_manifests}
+    if len(set_n_shards) > 1:
+        raise Exception(f'manifests of different numbers of shards are mixed. N={sorted(set_n_shards)}')
+    # end if
+    n_shards = set_n_shards.pop()
+    set_indices = {m['shard'][0] for m in seq_manifests}
+    d_job_id2job = {}
+    for manifest in seq_manifests:
+        for job in manifest['jobs']:
+            d_job_id2job[job['job_id']] = job
+        # end for
+    # end for
+    if sumo_configs is not None:
+        seq_jobs = [d_job_id2job.get(conf.job_id, {'job_id': conf.job_id,
+                                                   'scenario_name': conf.scenario_name,
+                                                   'status': 'missing',
+                                                   'path_output_dir': None}) for conf in sumo_configs]
+    else:
+        seq_jobs = list(d_job_id2job.values())
+    # end if
+    return {'n_shards': n_shards,
+            'shards_missing': [i for i in range(n_shards) if i not in set_indices],
+            'n_jobs': len(seq_jobs),
+            'n_finished': len([j for j in seq_jobs if j['status'] == 'finished']),
+            'n_failed': len([j for j in seq_jobs if j['status'] == 'failed']),
+            'n_missing': len([j for j in seq_jobs if j['status'] == 'missing']),
+            'jobs': seq_jobs}
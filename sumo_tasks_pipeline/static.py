@@ -3,3 +3,4 @@ SUBDIRECTORY_COMPRESSED = 'compressed'
 SUBDIRECTORY_COPIED = 'outputs'
 DIR_NAME_DOCKER_MOUNT = 'docker-host-side'
 DEFAULT_SUMO_COMMAND = '/bin/sumo'
+SUBDIRECTORY_LOG = 'logs'
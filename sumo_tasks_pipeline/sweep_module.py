@@ -0,0 +1,269 @@
+import dataclasses
+import functools
+import hashlib
+import itertools
+import json
+import operator
+import shutil
+import typing
+from pathlib import Path
+
+import numpy
+
+from .logger_unit import logger
+from .commons.sumo_config_obj import SumoConfigObject
+from .config_generation_module import CompiledTemplate
+from . import static
+
+try:
+    from scipy.stats import qmc
+except ImportError:
+    qmc = None
+# end try
+
+DESIGNS = ('grid', 'random', 'lhs', 'sobol')
+
+
+@dataclasses.dataclass
+class SweepParameter(object):
+    """A wildcard slot to sweep.
+
+    Give either `values` (discrete choices) or `low` and `high` (a continuous range).
+
+    Args:
+        file_name: a name of the config file. Ex. "grid.flows.xml"
+        xpath: xpath of the element. Ex. "/routes/flows/vType[1]"
+        key_name: an attribute name. Ex. "maxSpeed"
+        values: (optional) discrete values.
+        low: (optional) the lower bound of the range.
+        high: (optional) the upper bound of the range.
+        n_levels: the number of levels of the range in the grid design.
+        is_integer: True rounds values of the range to integers.
+    """
+    file_name: str
+    xpath: str
+    key_name: str
+    values: typing.Optional[typing.List[typing.Any]] = None
+    low: typing.Optional[float] = None
+    high: typing.Optional[float] = None
+    n_levels: int = 5
+    is_integer: bool = False
+
+    def __post_init__(self):
+        assert self.values is not None or (self.low is not None and self.high is not None), \
+            f'{self.name} needs values or (low, high).'
+        if self.values is not None:
+            assert len(self.values) > 0, f'{self.name} has no values.'
+        # end if
+
+    @property
+    def name(self) -> str:
+        return f'{self.file_name}:{self.xpath}@{self.key_name}'
+
+    def convert(self, value: float) -> typing.Any:
+        if self.is_integer:
+            return int(round(value))
+        # end if
+        return float(value)
+
+    def get_levels(self) -> typing.List[typing.Any]:
+        """Values in the grid design."""
+        if self.values is not None:
+            return list(self.values)
+        # end if
+        return [self.convert(v) for v in numpy.linspace(self.low, self.high, self.n_levels)]
+
+    def from_unit(self, u: float) -> typing.Any:
+        """Map a number in [0, 1) to a value."""
+        if self.values is not None:
+            return self.values[min(int(u * len(self.values)), len(self.values) - 1)]
+        # end if
+        return self.convert(self.low + u * (self.high - self.low))
+
+
+@dataclasses.dataclass
+class LazySumoConfig(SumoConfigObject):
+    """`SumoConfigObject` whose config directory is rendered just before the job starts.
+
+    Args:
+        template: a `CompiledTemplate`.
+        update_values: values to fill wildcards. {"sub config file name": {"xml key": {values}}}
+        parameters: {parameter-name: value} of this point.
+    """
+    template: typing.Optional[CompiledTemplate] = None
+    update_values: typing.Optional[typing.Dict[str, typing.Dict[str, typing.Dict[str, typing.Any]]]] = None
+    parameters: typing.Optional[typing.Dict[str, typing.Any]] = None
+
+    def __post_init__(self):
+        # the directory does not exist until `materialize` is called.
+        if self.job_id is None:
+            self.job_id = self.scenario_name
+        # end if
+        self.path_materialized_dir = Path(self.path_config_dir)
+
+    @property
+    def is_materialized(self) -> bool:
+        return self.path_materialized_dir.joinpath(self.config_name).exists()
+
+    def materialize(self) -> "LazySumoConfig":
+        """Render config files into `path_config_dir`.
+
+        The directory is rendered again every time. A directory left by a crashed run is never reused as it is.
+        """
+        if self.path_materialized_dir.exists():
+            shutil.rmtree(self.path_materialized_dir)
+        # end if
+        self.template.generate(self.update_values, self.path_materialized_dir)
+        return self
+
+    def cleanup(self):
+        """Remove the rendered directory and the job directory copied from it."""
+        for path_dir in {self.path_materialized_dir, Path(self.path_config_dir)}:
+            if path_dir.exists():
+                shutil.rmtree(path_dir, ignore_errors=True)
+            # end if
+        # end for
+        self.path_config_dir = self.path_materialized_dir
+        self.path_config_dir_original = None
+
+
+class ParameterSweep(object):
+    def __init__(self,
+                 template: typing.Union[CompiledTemplate, Path],
+                 parameters: typing.List[SweepParameter],
+                 design: str = 'grid',
+                 n_samples: typing.Optional[int] = None,
+                 seed: typing.Optional[int] = None,
+                 fixed_values: typing.Optional[typing.Dict[str, typing.Dict[str, typing.Dict[str, typing.Any]]]] = None,
+                 path_work_dir: typing.Optional[Path] = None,
+                 name_prefix: str = 'sweep'):
+        """A design of experiments over wildcard slots of a template.
+
+        Iterating the object yields `LazySumoConfig`. Nothing is written on disk until a pipeline runs the job,
+        and the pipeline removes the directory after the outputs are saved.
+
+        Args:
+            template: a `CompiledTemplate` or a path to the sumo.cfg template.
+            parameters: slots to sweep.
+            design: 'grid' (all combinations), 'random' (uniform), 'lhs' (Latin hypercube) or 'sobol'.
+             'sobol' needs scipy.
+            n_samples: the number of points. Required except 'grid'.
+            seed: a random seed of 'random', 'lhs' and 'sobol'.
+            fixed_values: (optional) values of the other slots. The same format as `Template2SuMoConfig.update_configs`.
+            path_work_dir: (optional) a directory where config directories are rendered.
+            name_prefix: a prefix of scenario names. A scenario name is {name_prefix}-{index}-{hash}.
+             The hash is of the template and the values of the point, so that sweeps never share a job-id
+             for different values.
+        """
+        assert design in DESIGNS, f'design must be one of {DESIGNS}. Given {design}'
+        assert len(parameters) > 0, 'parameters is empty.'
+        if design != 'grid':
+            assert n_samples is not None and n_samples > 0, f'n_samples is required for design={design}'
+        # end if
+        if design == 'sobol' and qmc is None:
+            raise Exception('design=sobol needs scipy. Run `pip install scipy`.')
+        # end if
+        if isinstance(template, CompiledTemplate):
+            self.template = template
+        else:
+            self.template = CompiledTemplate(Path(template))
+        # end if
+        self.parameters = parameters
+        self.design = design
+        self.n_samples = n_samples
+        self.seed = seed
+        self.fixed_values = fixed_values if fixed_values is not None else {}
+        if path_work_dir is None:
+            path_work_dir = Path(static.PATH_PACKAGE_WORK_DIR).joinpath('sweep')
+        # end if
+        self.path_work_dir = Path(path_work_dir)
+        self.name_prefix = name_prefix
+        self.check_slots()
+
+    def check_slots(self):
+        """Every wildcard must be filled by a parameter or a fixed value."""
+        set_filled = {(p.file_name, p.xpath, p.key_name) for p in self.parameters}
+        for file_name, d_xpath2values in self.fixed_values.items():
+            for xpath, d_key2value in d_xpath2values.items():
+                set_filled.update((file_name, xpath, k) for k in d_key2value.keys())
+            # end for
+        # end for
+        set_slots = {(file_name, xpath, key_name)
+                     for file_name, slots in self.template.get_wildcards().items()
+                     for xpath, key_name in slots}
+        for p in self.parameters:
+            if (p.file_name, p.xpath, p.key_name) not in set_slots:
+                raise Exception(f'{p.name} is not a wildcard of the template.')
+            # end if
+        # end for
+        set_missing = set_slots - set_filled
+        if len(set_missing) > 0:
+            raise Exception(f'wildcards without values: {sorted(set_missing)}')
+        # end if
+
+    def __len__(self) -> int:
+        if self.design == 'grid':
+            return functools.reduce(operator.mul, [len(p.get_levels()) for p in self.parameters], 1)
+        # end if
+        return self.n_samples
+
+    def generate_unit_points(self) -> numpy.ndarray:
+        """Points in [0, 1)^d of 'random', 'lhs' and 'sobol'."""
+        n_dim = len(self.parameters)
+        rng = numpy.random.default_rng(self.seed)
+        if self.design == 'random':
+            return rng.random((self.n_samples, n_dim))
+        elif self.design == 'lhs':
+            # one point in each of n_samples strata per dimension.
+            strata = numpy.stack([rng.permutation(self.n_samples) for __ in range(n_dim)], axis=1)
+            return (strata + rng.random((self.n_samples, n_dim))) / self.n_samples
+        elif self.design == 'sobol':
+            if self.n_samples & (self.n_samples - 1) != 0:
+                logger.warning(f'Sobol points are balanced when n_samples is a power of 2. Given {self.n_samples}')
+            # end if
+            return qmc.Sobol(d=n_dim, scramble=True, seed=self.seed).random(self.n_samples)
+        else:
+            raise Exception(f'design={self.design} has no unit points.')
+        # end if
+
+    def iter_points(self) -> typing.Iterator[typing.Dict[str, typing.Any]]:
+        """Yield {parameter-name: value}."""
+        if self.design == 'grid':
+            for values in itertools.product(*[p.get_levels() for p in self.parameters]):
+                yield {p.name: v for p, v in zip(self.parameters, values)}
+            # end for
+            return
+        # end if
+        for unit_point in self.generate_unit_points():
+            yield {p.name: p.from_unit(u) for p, u in zip(self.parameters, unit_point)}
+        # end for
+
+    def get_update_values(self, point: typing.Dict[str, typing.Any]
+                          ) -> typing.Dict[str, typing.Dict[str, typing.Dict[str, typing.Any]]]:
+        update_values = {file_name: {xpath: dict(d_key2value) for xpath, d_key2value in d_xpath2values.items()}
+                         for file_name, d_xpath2values in self.fixed_values.items()}
+        for p in self.parameters:
+            update_values.setdefault(p.file_name, {}).setdefault(p.xpath, {})[p.key_name] = point[p.name]
+        # end for
+        return update_values
+
+    @staticmethod
+    def get_point_digest(template_digest: str,
+                         update_values: typing.Dict[str, typing.Dict[str, typing.Dict[str, typing.Any]]]) -> str:
+        data = json.dumps(update_values, sort_keys=True, default=str)
+        return hashlib.sha256(f'{template_digest}:{data}'.encode('utf-8')).hexdigest()
+
+    def __iter__(self) -> typing.Iterator[LazySumoConfig]:
+        n_digits = len(str(max(len(self) - 1, 0)))
+        template_digest = self.template.get_digest()
+        for i, point in enumerate(self.iter_points()):
+            update_values = self.get_update_values(point)
+            digest = self.get_point_digest(template_digest, update_values)
+            scenario_name = f'{self.name_prefix}-{i:0{n_digits}d}-{digest[:16]}'
+            yield LazySumoConfig(scenario_name=scenario_name,
+                                 path_config_dir=self.path_work_dir.joinpath(scenario_name),
+                                 config_name=self.template.name_sumo_cfg,
+                                 template=self.template,
+                                 update_values=update_values,
+                                 parameters=point)
+        # end for
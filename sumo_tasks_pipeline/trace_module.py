@@ -0,0 +1,205 @@
+import contextlib
+import dataclasses
+import json
+import os
+import threading
+import time
+import tracemalloc
+import typing
+from datetime import datetime
+from pathlib import Path
+
+import numpy
+import pandas
+
+from .logger_unit import logger
+
+
+@dataclasses.dataclass
+class StageEvent(object):
+    """A span of a stage.
+
+    Args:
+        name: a stage name. Ex. "copy_config"
+        job_id: (optional) job-id. None for stages of the whole run.
+        started_at: seconds since the tracer started.
+        duration: seconds.
+        thread_id: an id of the thread that ran the stage.
+        memory_peak_bytes: (optional) the peak of memory allocated by Python during the stage.
+    """
+    name: str
+    job_id: typing.Optional[str]
+    started_at: float
+    duration: float
+    thread_id: int
+    memory_peak_bytes: typing.Optional[int] = None
+
+
+class StageTracer(object):
+    def __init__(self,
+                 path_trace_dir: typing.Optional[Path] = None,
+                 is_trace_memory: bool = False):
+        """Records how long each stage of jobs takes. Pipelines and controllers call `stage` around their steps.
+
+        A pipeline calls `start_run` and `finish_run`. `finish_run` writes a Chrome trace-event file
+        (open it with chrome://tracing or https://ui.perfetto.dev) and logs p50/p95 of stages.
+
+        Args:
+            path_trace_dir: (optional) a directory of trace files. One file per run. Nothing is written if None.
+            is_trace_memory: True samples peaks of Python memory with `tracemalloc`. It slows Python code down.
+             Peaks are of the whole process; stages running at the same time see the same peak.
+             Memory of SUMO processes is not included.
+        """
+        self.path_trace_dir = Path(path_trace_dir) if path_trace_dir is not None else None
+        self.is_trace_memory = is_trace_memory
+        self.events: typing.List[StageEvent] = []
+        self.lock = threading.Lock()
+        self.time_origin = time.perf_counter()
+        self.wall_clock_origin = datetime.now()
+
+    def now(self) -> float:
+        return time.perf_counter() - self.time_origin
+
+    def start_run(self):
+        """Forget events of the previous run."""
+        with self.lock:
+            self.events = []
+            self.time_origin = time.perf_counter()
+            self.wall_clock_origin = datetime.now()
+        # end with
+        if self.is_trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        # end if
+
+    def record(self,
+               name: str,
+               job_id: typing.Optional[str],
+               duration: float,
+               started_at: typing.Optional[float] = None,
+               memory_peak_bytes: typing.Optional[int] = None):
+        """Add a stage measured elsewhere. Ex. the elapsed time of a SUMO process.
+
+        The stage is regarded to end now if `started_at` is None.
+        """
+        if started_at is None:
+            started_at = self.now() - duration
+        # end if
+        with self.lock:
+            self.events.append(StageEvent(name=name,
+                                          job_id=job_id,
+                                          started_at=started_at,
+                                          duration=duration,
+                                          thread_id=threading.get_ident(),
+                                          memory_peak_bytes=memory_peak_bytes))
+        # end with
+
+    @contextlib.contextmanager
+    def stage(self, name: str, job_id: typing.Optional[str] = None) -> typing.Iterator[None]:
+        """Measure the block. Ex. `with tracer.stage('save_file', job_id): ...`"""
+        is_trace_memory = self.is_trace_memory and tracemalloc.is_tracing()
+        if is_trace_memory and hasattr(tracemalloc, 'reset_peak'):
+            # Python >= 3.9. The peak of older versions is the peak since tracemalloc started.
+            tracemalloc.reset_peak()
+        # end if
+        started_at = self.now()
+        try:
+            yield
+        finally:
+            memory_peak_bytes = tracemalloc.get_traced_memory()[1] if is_trace_memory else None
+            self.record(name, job_id, self.now() - started_at, started_at, memory_peak_bytes)
+        # end try
+
+    def to_chrome_trace(self) -> typing.Dict[str, typing.Any]:
+        """Events in the Chrome trace-event format. Every job is a row; stages of the whole run are in row 0."""
+        pid = os.getpid()
+        d_job_id2tid: typing.Dict[typing.Optional[str], int] = {None: 0}
+        seq_trace_events = []
+        with self.lock:
+            seq_events = list(self.events)
+        # end with
+        for event in sorted(seq_events, key=lambda e: e.started_at):
+            if event.job_id not in d_job_id2tid:
+                d_job_id2tid[event.job_id] = len(d_job_id2tid)
+            # end if
+            args = {'job_id': event.job_id, 'thread_id': event.thread_id}
+            if event.memory_peak_bytes is not None:
+                args['memory_peak_bytes'] = event.memory_peak_bytes
+            # end if
+            seq_trace_events.append({'name': event.name,
+                                     'cat': 'pipeline',
+                                     'ph': 'X',
+                                     'ts': event.started_at * 1e6,
+                                     'dur': event.duration * 1e6,
+                                     'pid': pid,
+                                     'tid': d_job_id2tid[event.job_id],
+                                     'args': args})
+        # end for
+        for job_id, tid in d_job_id2tid.items():
+            seq_trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid,
+                                     'args': {'name': 'run' if job_id is None else job_id}})
+        # end for
+        return {'traceEvents': seq_trace_events,
+                'displayTimeUnit': 'ms',
+                'otherData': {'started_at': self.wall_clock_origin.isoformat()}}
+
+    def save_chrome_trace(self, path_trace_file: Path) -> Path:
+        Path(path_trace_file).parent.mkdir(parents=True, exist_ok=True)
+        with Path(path_trace_file).open('w') as f:
+            json.dump(self.to_chrome_trace(), f)
+        # end with
+        return Path(path_trace_file)
+
+    def summarize(self) -> pandas.DataFrame:
+        """A table of stages over all jobs of the run. Seconds are p50, p95 and max of a stage per job."""
+        with self.lock:
+            seq_events = list(self.events)
+        # end with
+        d_name2events: typing.Dict[str, typing.List[StageEvent]] = {}
+        for event in seq_events:
+            d_name2events.setdefault(event.name, []).append(event)
+        # end for
+        seq_rows = []
+        for name, seq_stage_events in d_name2events.items():
+            durations = numpy.array([e.duration for e in seq_stage_events])
+            seq_memory = [e.memory_peak_bytes for e in seq_stage_events if e.memory_peak_bytes is not None]
+            seq_rows.append({'stage': name,
+                             'count': len(durations),
+                             'total_seconds': durations.sum(),
+                             'p50_seconds': numpy.percentile(durations, 50),
+                             'p95_seconds': numpy.percentile(durations, 95),
+                             'max_seconds': durations.max(),
+                             'memory_peak_bytes': max(seq_memory) if len(seq_memory) > 0 else numpy.nan})
+        # end for
+        columns = ['stage', 'count', 'total_seconds', 'p50_seconds', 'p95_seconds', 'max_seconds', 'memory_peak_bytes']
+        return pandas.DataFrame(seq_rows, columns=columns).set_index('stage')
+
+    def finish_run(self) -> typing.Optional[Path]:
+        """Log the summary and write the trace file of the run.
+
+        Returns: a path to the trace file. None if `path_trace_dir` is None.
+        """
+        with self.lock:
+            n_events = len(self.events)
+        # end with
+        if n_events == 0:
+            return None
+        # end if
+        logger.info(f'time per stage\n{self.summarize().to_string()}')
+        if self.path_trace_dir is None:
+            return None
+        # end if
+        time_stamp = self.wall_clock_origin.strftime('%Y%m%d-%H%M%S-%f')
+        path_trace_file = self.path_trace_dir.joinpath(f'trace-{time_stamp}.json')
+        self.save_chrome_trace(path_trace_file)
+        logger.info(f'the trace is saved at {path_trace_file}')
+        return path_trace_file
+
+
+def trace_stage(tracer: typing.Optional[StageTracer],
+                name: str,
+                job_id: typing.Optional[str] = None) -> typing.ContextManager:
+    """`tracer.stage` if a tracer is given, otherwise a context doing nothing."""
+    if tracer is None:
+        return contextlib.nullcontext()
+    # end if
+    return tracer.stage(name, job_id)
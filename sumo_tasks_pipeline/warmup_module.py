@@ -0,0 +1,121 @@
+import shutil
+import subprocess
+import threading
+import typing
+import uuid
+from pathlib import Path
+
+from lxml import etree
+
+from .logger_unit import logger
+from .commons.sumo_config_obj import SumoConfigObject
+from .config_generation_module import update_load_state, copy_file
+from .operation_module.staging_module import stage_config_dir, STAGING_MODES
+from .result_cache import compute_cache_key
+
+NAME_STATE_FILE = 'state.xml.gz'
+
+
+class WarmupStateCache(object):
+    def __init__(self,
+                 path_base_config_file: Path,
+                 warmup_seconds: float,
+                 path_cache_root: Path,
+                 staging_mode: str = 'auto'):
+        """Runs the warm-up shared by scenarios once and starts every scenario from the saved state.
+
+        The base config is simulated until `warmup_seconds` with `--save-state.times`. The state is stored under
+        a key computed from contents of the base inputs, the SUMO version and the warm-up time,
+        so that the next run with the same inputs skips the warm-up. Config files of jobs are rewritten
+        with <load-state> and <begin> in their staged directories; the scenario directories are never touched.
+
+        Scenarios must be the same as the base until `warmup_seconds`. Vehicles departing before it are not loaded
+        from route files of the scenarios.
+
+        Layout: {path_cache_root}/{key}/state.xml.gz
+
+        Args:
+            path_base_config_file: a SUMO config file of the common prefix.
+            warmup_seconds: simulation time where scenarios start from the state.
+            path_cache_root: a directory of saved states.
+            staging_mode: how to prepare the directory where the warm-up runs. Outputs of the warm-up are removed.
+        """
+        assert Path(path_base_config_file).exists(), f'No file found at {path_base_config_file}'
+        assert warmup_seconds > 0, f'warmup_seconds must be > 0. Given {warmup_seconds}'
+        assert staging_mode in STAGING_MODES, f'staging_mode must be one of {STAGING_MODES}. Given {staging_mode}'
+        self.path_base_config_file = Path(path_base_config_file).absolute()
+        self.warmup_seconds = warmup_seconds
+        self.path_cache_root = Path(path_cache_root)
+        self.path_cache_root.mkdir(parents=True, exist_ok=True)
+        self.staging_mode = staging_mode
+        self.path_state_file: typing.Optional[Path] = None
+        # (sumo-version, key). The key hashes every base input, Ex. the net file, so it is computed once.
+        self.version_key: typing.Optional[typing.Tuple[str, str]] = None
+        self.lock = threading.Lock()
+
+    def get_key(self, sumo_version: str) -> str:
+        """A key of the state. It is computed at the first call and kept for the SUMO version."""
+        if self.version_key is not None and self.version_key[0] == sumo_version:
+            return self.version_key[1]
+        # end if
+        base_config = SumoConfigObject(scenario_name='warmup',
+                                       path_config_dir=self.path_base_config_file.parent,
+                                       config_name=self.path_base_config_file.name)
+        cache_key = compute_cache_key(base_config, sumo_version)
+        if cache_key is None:
+            raise Exception(f'{self.path_base_config_file} sets <random value="true"/>. '
+                            f'The warm-up state can not be shared.')
+        # end if
+        self.version_key = (sumo_version, f'{cache_key}-{self.warmup_seconds:g}')
+        return self.version_key[1]
+
+    def run_warmup(self, sumo_command: str, path_state_file: Path):
+        """Simulate the base config until `warmup_seconds` in a temporary directory and save the state."""
+        path_tmp = self.path_cache_root.joinpath(f'.tmp-{uuid.uuid4()}')
+        try:
+            stage_config_dir(path_source_dir=self.path_base_config_file.parent,
+                             path_target_dir=path_tmp,
+                             config_name=self.path_base_config_file.name,
+                             staging_mode=self.staging_mode)
+            path_tmp_state = path_tmp.joinpath(NAME_STATE_FILE)
+            command = [sumo_command, '-c', str(path_tmp.joinpath(self.path_base_config_file.name)),
+                       '--save-state.times', f'{self.warmup_seconds:g}',
+                       '--save-state.files', str(path_tmp_state),
+                       '--end', f'{self.warmup_seconds:g}']
+            logger.debug(f'running the warm-up with command {command}')
+            process = subprocess.run(command, stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+            if process.returncode != 0 or not path_tmp_state.exists():
+                raise Exception(f'the warm-up failed. return-code={process.returncode}, '
+                                f'message={process.stdout.decode("utf-8", errors="replace")}')
+            # end if
+            path_state_file.parent.mkdir(parents=True, exist_ok=True)
+            # the state appears with a rename. A half-written state is never visible.
+            path_tmp_state.replace(path_state_file)
+        finally:
+            shutil.rmtree(path_tmp, ignore_errors=True)
+        # end try
+
+    def prepare(self, sumo_command: str, sumo_version: str) -> Path:
+        """Returns the saved state. The warm-up runs only if the cache does not have it."""
+        with self.lock:
+            path_state_file = self.path_cache_root.joinpath(self.get_key(sumo_version)).joinpath(NAME_STATE_FILE)
+            if path_state_file.exists():
+                logger.debug(f'the warm-up state is in the cache. {path_state_file}')
+            else:
+                self.run_warmup(sumo_command, path_state_file)
+            # end if
+            self.path_state_file = path_state_file
+        # end with
+        return path_state_file
+
+    def apply(self, sumo_config: SumoConfigObject) -> SumoConfigObject:
+        """Put the state into the staged directory of a job and rewrite its config file to load the state."""
+        assert self.path_state_file is not None, 'call `prepare` first.'
+        assert sumo_config.path_config_dir_original is not None, \
+            f'job_id={sumo_config.job_id} is not staged. The scenario directory must not be rewritten.'
+        path_config_file = Path(sumo_config.path_config_dir).joinpath(sumo_config.config_name)
+        copy_file(self.path_state_file, Path(sumo_config.path_config_dir).joinpath(NAME_STATE_FILE),
+                  staging_mode=self.staging_mode)
+        tree = update_load_state(etree.parse(str(path_config_file)), NAME_STATE_FILE, self.warmup_seconds)
+        tree.write(str(path_config_file), xml_declaration=True, encoding='UTF-8')
+        return sumo_config
@@ -0,0 +1,295 @@
+import random
+import socket
+import threading
+import time
+import typing
+import uuid
+
+from .logger_unit import logger
+from .commons.result_module import SumoResultObjects
+from .commons.sumo_config_obj import SumoConfigObject
+from .file_handler.base import BaseFileHandler, Lease
+
+
+class LeaseHeartbeat(object):
+    def __init__(self,
+                 file_handler: BaseFileHandler,
+                 lease_seconds: float,
+                 interval: float):
+        """A thread renewing leases of jobs that the worker holds.
+
+        Args:
+            file_handler: a file handler where leases are.
+            lease_seconds: a lease is extended by this every renewal.
+            interval: seconds between renewals. It must be shorter than `lease_seconds`.
+        """
+        assert interval < lease_seconds, f'interval must be < lease_seconds. Given {interval} >= {lease_seconds}'
+        self.file_handler = file_handler
+        self.lease_seconds = lease_seconds
+        self.interval = interval
+        self.d_job_id2lease: typing.Dict[str, Lease] = {}
+        self.lock = threading.Lock()
+        self.event_stop = threading.Event()
+        self.thread: typing.Optional[threading.Thread] = None
+
+    def add(self, lease: Lease):
+        with self.lock:
+            self.d_job_id2lease[lease.job_id] = lease
+        # end with
+
+    def remove(self, job_id: str) -> typing.Optional[Lease]:
+        """Stop renewing the lease. Returns: the latest lease. None if the lease was lost."""
+        with self.lock:
+            return self.d_job_id2lease.pop(job_id, None)
+        # end with
+
+    def renew_all(self):
+        with self.lock:
+            seq_leases = list(self.d_job_id2lease.values())
+        # end with
+        for lease in seq_leases:
+            try:
+                lease_renewed = self.file_handler.renew_lease(lease, self.lease_seconds)
+            except Exception as e:
+                # a network error. The lease is valid until it expires; the next renewal retries.
+                logger.warning(f'failed to renew the lease of job_id={lease.job_id}. The reason is {e}')
+                continue
+            # end try
+            with self.lock:
+                if lease.job_id not in self.d_job_id2lease:
+                    continue
+                # end if
+                if lease_renewed is None:
+                    logger.warning(f'the lease of job_id={lease.job_id} is lost. Another worker may run the job.')
+                    del self.d_job_id2lease[lease.job_id]
+                else:
+                    self.d_job_id2lease[lease.job_id] = lease_renewed
+                # end if
+            # end with
+        # end for
+
+    def run(self):
+        while not self.event_stop.wait(self.interval):
+            self.renew_all()
+        # end while
+
+    def start(self):
+        self.event_stop.clear()
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def close(self):
+        self.event_stop.set()
+        if self.thread is not None:
+            self.thread.join()
+            self.thread = None
+        # end if
+
+
+class WorkQueue(object):
+    def __init__(self,
+                 file_handler: BaseFileHandler,
+                 sumo_configs: typing.Iterable[SumoConfigObject],
+                 worker_id: typing.Optional[str] = None,
+                 lease_seconds: float = 300.0,
+                 heartbeat_interval: typing.Optional[float] = None):
+        """A queue of jobs shared by workers on many machines. The file handler is the only shared state.
+
+        A worker claims a job by writing a lease with a precondition, so that two workers never hold the same job.
+        The lease is renewed while the job runs. When a worker dies (Ex. a preempted VM), its leases expire and
+        the jobs are claimed again by other workers. A job is done when its status is 'finished'.
+
+        Leases depend on clocks of machines. Clock differences must be much smaller than `lease_seconds`.
+        A worker stalled longer than `lease_seconds` loses its leases; its outputs are saved to the same path
+        as the outputs of the worker that took the job over.
+
+        Args:
+            file_handler: a file handler supporting leases. `LocalFileHandler` on a shared file system or
+             `GcsFileHandler`.
+            sumo_configs: all jobs of the queue. Every worker must be given the same jobs.
+            worker_id: (optional) an id of this worker. The host name and a random suffix if None.
+            lease_seconds: seconds until a lease of a silent worker expires.
+            heartbeat_interval: (optional) seconds between renewals of leases. `lease_seconds` / 3 if None.
+        """
+        self.file_handler = file_handler
+        self.sumo_configs = list(sumo_configs)
+        self.worker_id = worker_id if worker_id is not None else f'{socket.gethostname()}-{uuid.uuid4().hex[:8]}'
+        self.lease_seconds = lease_seconds
+        self.heartbeat = LeaseHeartbeat(file_handler=file_handler,
+                                        lease_seconds=lease_seconds,
+                                        interval=heartbeat_interval if heartbeat_interval is not None
+                                        else lease_seconds / 3)
+        self.d_job_id2config = {conf.job_id: conf for conf in self.sumo_configs}
+        self.pending_job_ids: typing.List[str] = [conf.job_id for conf in self.sumo_configs]
+        # jobs that failed in this worker. They are not claimed again by this worker.
+        self.failed_job_ids: typing.Set[str] = set()
+
+    def __enter__(self) -> "WorkQueue":
+        self.heartbeat.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def refresh(self):
+        """Drop finished jobs from the pending jobs with one lookup of statuses."""
+        d_job_id2status = self.file_handler.get_job_statuses(self.pending_job_ids)
+        self.pending_job_ids = [job_id for job_id in self.pending_job_ids if d_job_id2status[job_id][0] != 'finished']
+
+    def claim(self, n_jobs: int, is_refresh: bool = True) -> typing.List[SumoConfigObject]:
+        """Claim at most `n_jobs` jobs that are not finished and not held by other workers.
+
+        Args:
+            n_jobs: the max number of jobs to claim.
+            is_refresh: False skips the lookup of statuses. A job finished by another worker since the last
+             refresh is found finished after its claim and given back.
+        """
+        if is_refresh:
+            self.refresh()
+        # end if
+        with self.heartbeat.lock:
+            set_held_job_ids = set(self.heartbeat.d_job_id2lease.keys())
+        # end with
+        seq_candidates = [job_id for job_id in self.pending_job_ids
+                          if job_id not in self.failed_job_ids and job_id not in set_held_job_ids]
+        # workers start from different positions, so that they rarely compete for the same job.
+        offset = random.randrange(len(seq_candidates)) if len(seq_candidates) > 0 else 0
+        seq_claimed = []
+        for job_id in seq_candidates[offset:] + seq_candidates[:offset]:
+            if len(seq_claimed) == n_jobs:
+                break
+            # end if
+            lease = self.file_handler.claim_job(job_id, self.worker_id, self.lease_seconds)
+            if lease is None:
+                continue
+            # end if
+            # the previous holder may have finished the job just before its lease was released.
+            if self.file_handler.get_job_status(job_id)[0] == 'finished':
+                self.file_handler.release_lease(lease)
+                self.pending_job_ids.remove(job_id)
+                continue
+            # end if
+            logger.debug(f'worker_id={self.worker_id} claimed job_id={job_id}. generation={lease.generation}')
+            self.heartbeat.add(lease)
+            seq_claimed.append(self.d_job_id2config[job_id])
+        # end for
+        return seq_claimed
+
+    def release(self, sumo_config: SumoConfigObject):
+        lease = self.heartbeat.remove(sumo_config.job_id)
+        if lease is not None and not self.file_handler.release_lease(lease):
+            logger.warning(f'the lease of job_id={sumo_config.job_id} had been lost before the release.')
+        # end if
+
+    def finish(self, sumo_config: SumoConfigObject):
+        """Release a job that this worker finished. It is not claimed again."""
+        self.release(sumo_config)
+        if sumo_config.job_id in self.pending_job_ids:
+            self.pending_job_ids.remove(sumo_config.job_id)
+        # end if
+
+    def fail(self, sumo_config: SumoConfigObject):
+        """Release a job that failed in this worker. Other workers may try it."""
+        self.failed_job_ids.add(sumo_config.job_id)
+        self.release(sumo_config)
+
+    def is_drained(self) -> bool:
+        """True if all jobs are finished, except jobs that failed in this worker."""
+        return all(job_id in self.failed_job_ids for job_id in self.pending_job_ids)
+
+    def close(self):
+        self.heartbeat.close()
+        for job_id in list(self.heartbeat.d_job_id2lease.keys()):
+            self.release(self.d_job_id2config[job_id])
+        # end for
+
+
+def run_worker(pipeline,
+               sumo_configs: typing.Iterable[SumoConfigObject],
+               worker_id: typing.Optional[str] = None,
+               lease_seconds: float = 300.0,
+               heartbeat_interval: typing.Optional[float] = None,
+               interval_wait: float = 10.0,
+               on_job_done: typing.Optional[typing.Callable[[SumoResultObjects], None]] = None
+               ) -> typing.List[SumoResultObjects]:
+    """Pull jobs from the queue and run them with the pipeline until the queue drains.
+
+    Run this function on as many machines as you like with the same jobs and the same file handler.
+    A job is claimed when the pipeline has a free slot (`pipeline.iter_stream`), so that a long job does not
+    hold back the claim of the next jobs, and a worker holds leases only of jobs that are running.
+
+    Args:
+        pipeline: a pipeline. `pipeline.file_handler` keeps statuses and leases.
+        sumo_configs: all jobs of the queue.
+        worker_id: (optional) an id of this worker.
+        lease_seconds: seconds until a lease of a silent worker expires.
+        heartbeat_interval: (optional) seconds between renewals of leases.
+        interval_wait: seconds to wait when all remaining jobs are held by other workers.
+        on_job_done: (optional) a function called with `SumoResultObjects` each time a job ends.
+
+    Returns: `SumoResultObjects` of jobs that this worker ran.
+    """
+    seq_results = []
+    with WorkQueue(file_handler=pipeline.file_handler,
+                   sumo_configs=sumo_configs,
+                   worker_id=worker_id,
+                   lease_seconds=lease_seconds,
+                   heartbeat_interval=heartbeat_interval) as queue:
+        logger.info(f'worker_id={queue.worker_id} starts. {len(queue.sumo_configs)} jobs in the queue.')
+        while True:
+            d_job_id2claimed: typing.Dict[str, SumoConfigObject] = {}
+
+            def release_failed_jobs():
+                for job_id in pipeline.failed_job_ids:
+                    if job_id in d_job_id2claimed and job_id not in queue.failed_job_ids:
+                        queue.fail(d_job_id2claimed[job_id])
+                    # end if
+                # end for
+
+            def generate_claimed_jobs() -> typing.Iterator[SumoConfigObject]:
+                # called by the pipeline when a slot is free. Statuses are looked up once per round.
+                is_refresh = True
+                while True:
+                    release_failed_jobs()
+                    seq_claimed = queue.claim(1, is_refresh=is_refresh)
+                    is_refresh = False
+                    if len(seq_claimed) == 0:
+                        return
+                    # end if
+                    d_job_id2claimed[seq_claimed[0].job_id] = seq_claimed[0]
+                    yield seq_claimed[0]
+                # end while
+
+            try:
+                for result in pipeline.iter_stream(generate_claimed_jobs(), on_job_done=on_job_done):
+                    queue.finish(d_job_id2claimed[result.sumo_config_obj.job_id])
+                    seq_results.append(result)
+                # end for
+            finally:
+                # jobs without a result failed, or the pipeline stopped. Jobs finished in this round are no-ops.
+                release_failed_jobs()
+                for sumo_config in d_job_id2claimed.values():
+                    queue.release(sumo_config)
+                # end for
+            # end try
+            set_done_job_ids = {r.sumo_config_obj.job_id for r in seq_results}
+            for job_id, sumo_config in d_job_id2claimed.items():
+                if job_id not in set_done_job_ids and job_id not in queue.failed_job_ids:
+                    queue.fail(sumo_config)
+                # end if
+            # end for
+            if len(d_job_id2claimed) == 0:
+                queue.refresh()
+                if queue.is_drained():
+                    break
+                # end if
+                # held jobs come back when the leases of dead workers expire.
+                logger.info(f'{len(queue.pending_job_ids)} jobs are held by other workers. '
+                            f'Wait {interval_wait} seconds.')
+                time.sleep(interval_wait)
+            # end if
+        # end while
+    # end with
+    logger.info(f'worker_id={queue.worker_id} ends. It ran {len(seq_results)} jobs. '
+                f'{len(queue.failed_job_ids)} jobs failed in this worker.')
+    return seq_results
@@ -0,0 +1,108 @@
+import io
+import tarfile
+from pathlib import Path
+from tempfile import mkdtemp
+
+from sumo_tasks_pipeline.commons.archive_module import zstandard
+from sumo_tasks_pipeline.file_handler.gcs_transfer_module import list_upload_files, write_archive, GcsTransfer
+
+
+def make_output_dir() -> Path:
+    path_dir = Path(mkdtemp())
+    path_dir.joinpath('sub').mkdir()
+    path_dir.joinpath('fcd.xml').write_text('<fcd-export/>')
+    path_dir.joinpath('sub', 'detector.xml').write_text('<detector/>')
+    return path_dir
+
+
+def test_list_upload_files():
+    path_dir = make_output_dir()
+    seq_files = list_upload_files(path_dir, 'output/job-1/')
+    assert [name for __, name in seq_files] == ['output/job-1/fcd.xml', 'output/job-1/sub/detector.xml']
+    assert all(p.is_file() for p, __ in seq_files)
+
+
+def test_write_archive():
+    path_dir = make_output_dir()
+    path_archive = write_archive(path_dir, Path(mkdtemp()).joinpath('output.tar.gz'), 'tar.gz')
+    with tarfile.open(path_archive, 'r:gz') as tar:
+        names = [Path(n).as_posix() for n in tar.getnames()]
+    # end with
+    assert 'fcd.xml' in names
+    assert 'sub/detector.xml' in names
+
+    if zstandard is not None:
+        path_archive = write_archive(path_dir, Path(mkdtemp()).joinpath('output.tar.zst'), 'tar.zst')
+        with path_archive.open('rb') as f:
+            reader = zstandard.ZstdDecompressor().stream_reader(f)
+            with tarfile.open(fileobj=reader, mode='r|') as tar:
+                names = [Path(m.name).as_posix() for m in tar]
+            # end with
+        # end with
+        assert 'sub/detector.xml' in names
+    # end if
+
+
+class FakeBlobWriter(io.RawIOBase):
+    """A stand-in of `BlobWriter`. It fails on seek and flush before the end, as an upload stream does."""
+    def __init__(self, d_name2data: dict, name: str):
+        self.d_name2data = d_name2data
+        self.name = name
+        self.buffer = bytearray()
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer += bytes(data)
+        return len(data)
+
+    def seek(self, *args):
+        raise io.UnsupportedOperation('seek')
+
+    def close(self):
+        if not self.closed:
+            self.d_name2data[self.name] = bytes(self.buffer)
+        # end if
+        super(FakeBlobWriter, self).close()
+
+
+class FakeBucket(object):
+    def __init__(self):
+        self.d_name2data = {}
+
+    def blob(self, name: str, chunk_size=None):
+        bucket = self
+
+        class FakeBlob(object):
+            def open(self, mode: str, ignore_flush: bool = False):
+                assert mode == 'wb' and ignore_flush
+                return FakeBlobWriter(bucket.d_name2data, name)
+
+        return FakeBlob()
+
+
+class FakeClient(object):
+    def __init__(self):
+        self.fake_bucket = FakeBucket()
+
+    def bucket(self, name: str) -> FakeBucket:
+        return self.fake_bucket
+
+
+def test_upload_archive_stream():
+    path_dir = make_output_dir()
+    client = FakeClient()
+    transfer = GcsTransfer(client, 'bucket')
+    assert transfer.upload_directory(path_dir, 'output/job-1', upload_format='tar.gz') == ['output/job-1/output.tar.gz']
+    data = client.fake_bucket.d_name2data['output/job-1/output.tar.gz']
+    with tarfile.open(fileobj=io.BytesIO(data), mode='r:gz') as tar:
+        names = [Path(n).as_posix() for n in tar.getnames()]
+    # end with
+    assert 'sub/detector.xml' in names
+
+
+if __name__ == '__main__':
+    test_list_upload_files()
+    test_write_archive()
+    test_upload_archive_stream()
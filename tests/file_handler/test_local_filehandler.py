@@ -28,6 +28,9 @@ def test_local_filehandler():
     local_filehandler.end_job('test-job')
     status = local_filehandler.get_job_status('test-job')
     assert status[0] in ('finished', )
+    d_statuses = local_filehandler.get_job_statuses(['test-job', 'unknown-job'])
+    assert d_statuses['test-job'][0] == 'finished'
+    assert d_statuses['unknown-job'][0] == 'empty'
 
 
 if __name__ == '__main__':
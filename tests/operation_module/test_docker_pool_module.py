@@ -0,0 +1,95 @@
+import shutil
+import typing
+from tempfile import mkdtemp
+
+import docker
+import pytest
+
+from sumo_tasks_pipeline.operation_module.docker_operation_module import SumoDockerController
+from sumo_tasks_pipeline.operation_module.docker_pool_module import SumoDockerContainerPool
+from pathlib import Path
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+
+
+def test_pooled_start_job(resource_path_root: Path):
+    with SumoDockerContainerPool(n_containers=2, mount_dir_host=resource_path_root,
+                                 max_jobs_per_container=1) as container_pool:
+        controller = SumoDockerController(container_pool=container_pool)
+        for scenario_name in ('t1', 't2', 't3'):
+            obj = SumoConfigObject(scenario_name=scenario_name,
+                                   path_config_dir=resource_path_root.joinpath('config_complete'),
+                                   config_name='grid.sumo.cfg')
+            job_result = controller.start_job(obj)
+            assert job_result.path_output_dir.exists()
+            shutil.rmtree(job_result.path_output_dir)
+        # end for
+        assert len(container_pool.pooled_containers) == 2
+    # end with
+    assert len(container_pool.pooled_containers) == 0
+
+
+class FakeContainer(object):
+    def __init__(self, name: str):
+        self.name = name
+        self.status = 'running'
+        self.error: typing.Optional[Exception] = None
+
+    def reload(self):
+        pass
+
+    def exec_run(self, command: str) -> typing.Tuple[int, bytes]:
+        if self.error is not None:
+            raise self.error
+        # end if
+        return 0, b'Eclipse SUMO sumo Version 1.8.0 by German Aerospace Center (DLR) and others'
+
+    def remove(self, force: bool = False):
+        self.status = 'removed'
+
+
+class FakeContainers(object):
+    def __init__(self):
+        self.error: typing.Optional[Exception] = None
+
+    def run(self, image: str, command: str, name: str, detach: bool, volumes: dict) -> FakeContainer:
+        if self.error is not None:
+            raise self.error
+        # end if
+        return FakeContainer(name)
+
+
+class FakeDockerClient(object):
+    def __init__(self):
+        self.containers = FakeContainers()
+
+
+def test_pooled_exec_job_error():
+    client = FakeDockerClient()
+    with SumoDockerContainerPool(n_containers=1, mount_dir_host=Path(mkdtemp()),
+                                 docker_client=client) as container_pool:
+        pooled = container_pool.pooled_containers[0]
+        pooled.container.error = docker.errors.APIError('exec failed')
+        # the broken container is replaced by a new one.
+        with pytest.raises(docker.errors.APIError):
+            container_pool.exec_job('sumo')
+        # end with
+        assert pooled.container.status == 'removed'
+        assert len(container_pool.pooled_containers) == 1
+        assert container_pool.pooled_containers[0] is not pooled
+        assert container_pool.exec_job('sumo')[0] == 0
+        # the error of the job is raised even if a new container does not start. The pool shrinks then.
+        container_pool.pooled_containers[0].container.error = docker.errors.APIError('exec failed')
+        client.containers.error = docker.errors.APIError('run failed')
+        with pytest.raises(docker.errors.APIError, match='exec failed'):
+            container_pool.exec_job('sumo')
+        # end with
+        assert len(container_pool.pooled_containers) == 0
+        assert container_pool.idle_containers.qsize() == 0
+        with pytest.raises(Exception, match='No container'):
+            container_pool.exec_job('sumo')
+        # end with
+    # end with
+
+
+if __name__ == '__main__':
+    test_pooled_start_job(Path('resources').absolute())
@@ -0,0 +1,77 @@
+from pathlib import Path
+
+import pytest
+
+from sumo_tasks_pipeline.operation_module.base_operation import BaseController, is_simulation_running
+from sumo_tasks_pipeline.operation_module.libsumo_pool_module import LibsumoWorkerPool, select_job
+from sumo_tasks_pipeline.operation_module.local_executor_module import ProcessJob
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+from sumo_tasks_pipeline.pipeline.pipeline import LocalSumoPipeline
+
+
+def test_extract_net_file(resource_path_root: Path):
+    path_config_dir = resource_path_root.joinpath('config_complete')
+    path_net_file = BaseController.extract_net_file(path_config_dir.joinpath('grid.sumo.cfg'))
+    assert path_net_file == path_config_dir.joinpath('grid.net.xml')
+
+
+def test_select_job():
+    seq_jobs = [ProcessJob(job_id=str(i), command=[], path_log=Path('log'), affinity_key=key)
+                for i, key in enumerate(['a', 'b', 'a', 'c'])]
+    assert select_job(seq_jobs, 'c').job_id == '3'
+    assert select_job(seq_jobs, 'a').job_id == '0'
+    assert select_job(seq_jobs, 'd').job_id == '1'
+    assert select_job(seq_jobs, None).job_id == '2'
+    assert len(seq_jobs) == 0
+
+
+class FakeSimulation(object):
+    def __init__(self, time_end: float, n_expected: int):
+        self.time_end = time_end
+        self.time = 0.0
+        self.n_expected = n_expected
+
+    def getEndTime(self) -> float:
+        return self.time_end
+
+    def getTime(self) -> float:
+        return self.time
+
+    def getMinExpectedNumber(self) -> int:
+        return self.n_expected
+
+
+def test_is_simulation_running():
+    # the simulation runs until <end> even if the network is empty.
+    simulation = FakeSimulation(time_end=100.0, n_expected=0)
+    assert is_simulation_running(simulation)
+    simulation.time = 100.0
+    assert not is_simulation_running(simulation)
+    # without <end>, the simulation ends when the network is empty.
+    simulation = FakeSimulation(time_end=-1.0, n_expected=3)
+    assert is_simulation_running(simulation)
+    simulation.n_expected = 0
+    assert not is_simulation_running(simulation)
+
+
+def test_get_affinity_key(resource_path_root: Path):
+    path_config_dir = resource_path_root.joinpath('config_complete')
+    sumo_config = SumoConfigObject(scenario_name='test', path_config_dir=path_config_dir, config_name='grid.sumo.cfg')
+    assert LocalSumoPipeline.get_affinity_key(sumo_config) == str(path_config_dir.joinpath('grid.net.xml').resolve())
+
+
+def test_run(resource_path_root: Path, tmp_path: Path):
+    pytest.importorskip('libsumo')
+    path_config_file = resource_path_root.joinpath('config_complete/grid.sumo.cfg')
+    seq_jobs = [ProcessJob(job_id=f'job-{i}', command=['sumo', '-c', str(path_config_file)],
+                           path_log=tmp_path.joinpath(f'job-{i}.log'), affinity_key='grid')
+                for i in range(2)]
+    with LibsumoWorkerPool(n_workers=1) as pool:
+        seq_results = list(pool.run(seq_jobs))
+    # end with
+    assert [r.job.job_id for r in seq_results] == ['job-0', 'job-1']
+    assert all(r.is_success for r in seq_results)
+
+
+if __name__ == '__main__':
+    test_select_job()
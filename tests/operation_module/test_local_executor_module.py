@@ -0,0 +1,78 @@
+import sys
+
+from sumo_tasks_pipeline.operation_module.local_executor_module import SumoProcessExecutor, ProcessJob
+from tempfile import mkdtemp
+from pathlib import Path
+
+
+def test_run_processes():
+    path_log_dir = Path(mkdtemp())
+    jobs = [ProcessJob(job_id=f'job-{i}',
+                       command=[sys.executable, '-c', f'print("hello {i}")'],
+                       path_log=path_log_dir.joinpath(f'job-{i}.log')) for i in range(5)]
+    executor = SumoProcessExecutor(n_jobs=2)
+    results = list(executor.run(jobs))
+    assert len(results) == 5
+    for r in results:
+        assert r.is_success
+        assert r.log_output.decode('utf-8').strip() == f'hello {r.job.job_id.split("-")[1]}'
+    # end for
+
+
+def test_timeout():
+    path_log_dir = Path(mkdtemp())
+    jobs = [ProcessJob(job_id='hung', command=[sys.executable, '-c', 'import time; time.sleep(60)'],
+                       path_log=path_log_dir.joinpath('hung.log')),
+            ProcessJob(job_id='quick', command=[sys.executable, '-c', 'pass'],
+                       path_log=path_log_dir.joinpath('quick.log'))]
+    executor = SumoProcessExecutor(n_jobs=1, timeout_per_job=0.5)
+    results = {r.job.job_id: r for r in executor.run(jobs)}
+    assert results['hung'].is_timeout
+    assert results['hung'].elapsed_seconds < 30
+    assert results['quick'].is_success
+
+
+def test_can_launch():
+    """Running jobs are checked while new jobs are held back."""
+    path_log_dir = Path(mkdtemp())
+    jobs = [ProcessJob(job_id='hung', command=[sys.executable, '-c', 'import time; time.sleep(60)'],
+                       path_log=path_log_dir.joinpath('hung.log')),
+            ProcessJob(job_id='quick', command=[sys.executable, '-c', 'pass'],
+                       path_log=path_log_dir.joinpath('quick.log'))]
+    seq_taken = []
+    seq_results = []
+
+    def generate_jobs():
+        for job in jobs:
+            seq_taken.append(job.job_id)
+            yield job
+        # end for
+
+    executor = SumoProcessExecutor(n_jobs=2, timeout_per_job=0.5)
+    for r in executor.run(generate_jobs(), can_launch=lambda: len(seq_taken) == 0 or len(seq_results) > 0):
+        seq_results.append(r)
+    # end for
+    assert [r.job.job_id for r in seq_results] == ['hung', 'quick']
+    assert seq_results[0].is_timeout and seq_results[1].is_success
+
+
+
+def test_launch_failure():
+    """A command that can not start is a failed result. The other jobs still run."""
+    path_log_dir = Path(mkdtemp())
+    jobs = [ProcessJob(job_id='missing', command=[str(path_log_dir.joinpath('no-such-sumo'))],
+                       path_log=path_log_dir.joinpath('missing.log')),
+            ProcessJob(job_id='quick', command=[sys.executable, '-c', 'pass'],
+                       path_log=path_log_dir.joinpath('quick.log'))]
+    results = {r.job.job_id: r for r in SumoProcessExecutor(n_jobs=2).run(jobs)}
+    assert not results['missing'].is_success
+    assert b'failed to start' in results['missing'].log_output
+    assert results['quick'].is_success
+    assert list(path_log_dir.iterdir()) == []
+
+
+if __name__ == '__main__':
+    test_run_processes()
+    test_timeout()
+    test_can_launch()
+    test_launch_failure()
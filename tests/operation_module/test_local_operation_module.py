@@ -20,6 +20,21 @@ def test_start_job(resource_path_root: Path):
     assert job_result.path_output_dir.exists()
 
 
+def test_start_job_compress(resource_path_root: Path):
+    controller = LocalSumoController(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                     is_compress_result=True,
+                                     default_archive_format='tar.gz')
+    obj = SumoConfigObject(scenario_name='test-compress',
+                           path_config_dir=resource_path_root.joinpath('config_complete'),
+                           config_name='grid.sumo.cfg')
+    job_result = controller.start_job(obj)
+    assert job_result.is_compressed
+    assert job_result.path_output_dir.name == 'test-compress.tar.gz'
+    # only outputs are archived.
+    assert 'grid.net.xml' not in job_result.result_files
+    assert job_result.parse_output('grid_loop.out.xml', attributes=['flow'])['flow'].shape == (64, 21)
+
+
 if __name__ == '__main__':
     p_sumo_resource = Path('../resources').absolute()
     test_container_init(p_sumo_resource)
@@ -0,0 +1,42 @@
+import os
+from pathlib import Path
+from tempfile import mkdtemp
+
+from sumo_tasks_pipeline.operation_module.staging_module import stage_config_dir, stage_file, find_output_dir
+
+
+def test_stage_config_dir(resource_path_root: Path):
+    path_source = resource_path_root.joinpath('config_complete')
+    assert find_output_dir(path_source.joinpath('grid.sumo.cfg')) == path_source.joinpath('output')
+
+    path_target = Path(mkdtemp()).joinpath('job')
+    d_method2count = stage_config_dir(path_source, path_target, 'grid.sumo.cfg', staging_mode='hardlink')
+    assert d_method2count['hardlink'] + d_method2count['copy'] == 5
+    # input files share data with the source. config files are copied.
+    if d_method2count['hardlink'] > 0:
+        assert os.path.samefile(path_source.joinpath('grid.net.xml'), path_target.joinpath('grid.net.xml'))
+    # end if
+    assert not os.path.samefile(path_source.joinpath('grid.sumo.cfg'), path_target.joinpath('grid.sumo.cfg'))
+    # stale outputs are not staged. The output directory is empty.
+    assert path_target.joinpath('output').is_dir()
+    assert list(path_target.joinpath('output').iterdir()) == []
+
+    # staging again replaces the job directory.
+    d_method2count = stage_config_dir(path_source, path_target, 'grid.sumo.cfg', staging_mode='auto')
+    assert sum(d_method2count.values()) == 5
+
+    d_method2count = stage_config_dir(path_source, path_target, 'grid.sumo.cfg', staging_mode='copy')
+    assert path_target.joinpath('output', 'grid_loop.out.xml').exists()
+
+
+def test_stage_file_fallback():
+    path_dir = Path(mkdtemp())
+    path_source = path_dir.joinpath('a.xml')
+    path_source.write_text('<a/>')
+    method = stage_file(path_source, path_dir.joinpath('b.xml'), 'reflink')
+    assert method in ('reflink', 'copy')
+    assert path_dir.joinpath('b.xml').read_text() == '<a/>'
+
+
+if __name__ == '__main__':
+    test_stage_file_fallback()
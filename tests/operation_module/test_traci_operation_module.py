@@ -0,0 +1,70 @@
+import shutil
+from pathlib import Path
+
+import numpy
+import pytest
+
+from sumo_tasks_pipeline.operation_module.traci_operation_module import SubscriptionSpec, SubscriptionBuffer, \
+    TraciStepState, KpiConvergence, TraciSumoController, stop_when_network_empty, \
+    FILE_NAME_SUBSCRIPTIONS
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+
+# variable ids of TraCI. LAST_STEP_VEHICLE_NUMBER and LAST_STEP_MEAN_SPEED
+VAR_NUMBER = 0x10
+VAR_SPEED = 0x11
+
+
+def test_subscription_buffer():
+    spec = SubscriptionSpec(domain='edge', object_ids=['e1', 'e2'], variables=[VAR_NUMBER, VAR_SPEED])
+    assert spec.name == 'edge'
+    buffer = SubscriptionBuffer(spec, initial_capacity=2)
+    for i in range(5):
+        buffer.append(float(i), {'e1': {VAR_NUMBER: i, VAR_SPEED: 10.0},
+                                 'e2': {VAR_NUMBER: 0, VAR_SPEED: (1, 2)},
+                                 'not-subscribed': {VAR_NUMBER: 1}})
+    # end for
+    assert buffer.get_values().shape == (5, 2, 2)
+    assert list(buffer.get_times()) == [0.0, 1.0, 2.0, 3.0, 4.0]
+    assert list(buffer.get_variable(VAR_NUMBER)[:, 0]) == [0, 1, 2, 3, 4]
+    # a non-numeric value is NaN
+    assert numpy.all(numpy.isnan(buffer.get_variable(VAR_SPEED)[:, 1]))
+
+
+def test_kpi_convergence():
+    spec = SubscriptionSpec(domain='edge', object_ids=['e1'], variables=[VAR_SPEED])
+    buffer = SubscriptionBuffer(spec)
+    condition = KpiConvergence('edge', VAR_SPEED, window=10, rtol=0.01)
+    state = TraciStepState(connection=None, time_step=0.0, n_steps=0, buffers={'edge': buffer})
+    seq_converged = []
+    for i in range(60):
+        # the speed goes up until step 30 and then stays.
+        buffer.append(float(i), {'e1': {VAR_SPEED: float(min(i, 30))}})
+        state.n_steps = i + 1
+        if condition(state):
+            seq_converged.append(state.n_steps)
+        # end if
+    # end for
+    assert seq_converged[0] == 50
+
+
+def test_start_job(resource_path_root: Path):
+    pytest.importorskip('traci')
+    controller = TraciSumoController(
+        sumo_command=shutil.which('sumo') or 'sumo',
+        subscriptions=[SubscriptionSpec(domain='inductionloop', object_ids=['left0A0_0'],
+                                        variables=['LAST_STEP_VEHICLE_NUMBER'])],
+        stop_conditions=[stop_when_network_empty],
+        max_steps=100)
+    for i in range(2):
+        obj = SumoConfigObject(scenario_name=f'test-traci-{i}',
+                               path_config_dir=resource_path_root.joinpath('config_complete'),
+                               config_name='grid.sumo.cfg')
+        result = controller.start_job(obj)
+        assert FILE_NAME_SUBSCRIPTIONS in result.result_files
+    # end for
+    controller.close()
+
+
+if __name__ == '__main__':
+    test_subscription_buffer()
+    test_kpi_convergence()
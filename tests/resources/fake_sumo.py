@@ -0,0 +1,12 @@
+#!/usr/bin/env python
+"""A stand-in of the `sumo` command for tests. It runs `benchmarks/fake_sumo.py`; see it for the options.
+
+Set FAKE_SUMO_SLEEP (seconds) to make the process hang for a while.
+Set FAKE_SUMO_SLEEP_AFTER_OUTPUT (seconds) to make the process hang after writing the output.
+"""
+import runpy
+from pathlib import Path
+
+if __name__ == '__main__':
+    runpy.run_path(str(Path(__file__).absolute().parents[2].joinpath('benchmarks', 'fake_sumo.py')),
+                   run_name='__main__')
@@ -0,0 +1,52 @@
+import shutil
+
+from sumo_tasks_pipeline.result_cache import LocalResultCache, compute_cache_key
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+from tempfile import mkdtemp
+from pathlib import Path
+
+
+def test_compute_cache_key(resource_path_root: Path):
+    path_copy = Path(mkdtemp()).joinpath('renamed-scenario')
+    shutil.copytree(resource_path_root.joinpath('config_complete'), path_copy)
+    obj = SumoConfigObject(scenario_name='test',
+                           path_config_dir=resource_path_root.joinpath('config_complete'),
+                           config_name='grid.sumo.cfg')
+    obj_copy = SumoConfigObject(scenario_name='renamed', path_config_dir=path_copy, config_name='grid.sumo.cfg')
+    key = compute_cache_key(obj, 'SUMO 1.9.1')
+    # a different scenario name and comments do not change the key.
+    with path_copy.joinpath('grid.flows.xml').open('a') as f:
+        f.write('<!-- regenerated\n on another day -->\n')
+    # end with
+    assert key == compute_cache_key(obj_copy, 'SUMO 1.9.1')
+    assert key != compute_cache_key(obj, 'SUMO 1.10.0')
+    # the contents of input files change the key.
+    path_flow = path_copy.joinpath('grid.flows.xml')
+    path_flow.write_text(path_flow.read_text().replace('number="180"', 'number="181"', 1))
+    assert key != compute_cache_key(obj_copy, 'SUMO 1.9.1')
+    # random seeds are not reproducible.
+    obj_template = SumoConfigObject(scenario_name='template',
+                                    path_config_dir=resource_path_root.joinpath('config_template'),
+                                    config_name='grid.sumo.cfg')
+    assert compute_cache_key(obj_template, 'SUMO 1.9.1') is None
+
+
+def test_local_result_cache(resource_path_root: Path):
+    path_output = resource_path_root.joinpath('config_complete/output')
+    size_output = LocalResultCache.get_dir_size(path_output)
+    cache = LocalResultCache(Path(mkdtemp()), max_size_bytes=int(size_output * 2.5))
+    assert cache.get('key-1') is None
+    cache.put('key-1', path_output)
+    cache.put('key-2', path_output)
+    path_cached = cache.get('key-1')
+    assert path_cached.joinpath('grid_loop.out.xml').exists()
+    # key-2 is the least recently used one.
+    cache.put('key-3', path_output)
+    assert cache.get('key-2') is None
+    assert cache.get('key-1') is not None
+    assert cache.get('key-3') is not None
+
+
+if __name__ == '__main__':
+    test_compute_cache_key(Path('../resources'))
+    test_local_result_cache(Path('../resources'))
@@ -0,0 +1,136 @@
+import asyncio
+import uuid
+
+import pytest
+
+from sumo_tasks_pipeline.pipeline import AsyncLocalPipeline, AsyncDockerPipeline
+from sumo_tasks_pipeline.file_handler import LocalFileHandler
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+from sumo_tasks_pipeline.commons.result_module import SumoResultObjects
+from sumo_tasks_pipeline.result_cache import LocalResultCache
+from tempfile import mkdtemp
+from pathlib import Path
+
+
+def test_async_local_pipeline(resource_path_root: Path):
+    file_handler = LocalFileHandler(path_save_root=Path(mkdtemp()))
+    pipeline = AsyncLocalPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                  n_jobs=2,
+                                  file_handler=file_handler)
+    sumo_configs = [SumoConfigObject(scenario_name=f'test-async-{i}',
+                                     path_config_dir=resource_path_root.joinpath('config_complete'),
+                                     config_name='grid.sumo.cfg') for i in range(4)]
+    seq_done = []
+    res = asyncio.run(pipeline.run_simulation(sumo_configs, on_job_done=seq_done.append))
+    assert [r.id_scenario for r in res] == [f'test-async-{i}' for i in range(4)]
+    assert len(seq_done) == 4
+    for r in res:
+        assert isinstance(r, SumoResultObjects)
+        assert file_handler.get_job_status(r.sumo_config_obj.job_id)[0] == 'finished'
+    # end for
+
+
+def test_async_local_pipeline_timeout(resource_path_root: Path, monkeypatch):
+    monkeypatch.setenv('FAKE_SUMO_SLEEP', '30')
+    file_handler = LocalFileHandler(path_save_root=Path(mkdtemp()))
+    pipeline = AsyncLocalPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                  n_jobs=2,
+                                  file_handler=file_handler,
+                                  timeout_per_job=0.5)
+    sumo_configs = [SumoConfigObject(scenario_name='test-async-timeout',
+                                     path_config_dir=resource_path_root.joinpath('config_complete'),
+                                     config_name='grid.sumo.cfg')]
+    res = asyncio.run(pipeline.run_simulation(sumo_configs))
+    assert len(res) == 0
+    assert pipeline.failed_job_ids == ['test-async-timeout']
+
+
+def test_async_local_pipeline_result_cache(resource_path_root: Path, monkeypatch):
+    result_cache = LocalResultCache(Path(mkdtemp()))
+    sumo_command = str(resource_path_root.joinpath('fake_sumo.py'))
+    path_config_dir = resource_path_root.joinpath('config_complete')
+    pipeline = AsyncLocalPipeline(sumo_command=sumo_command,
+                                  file_handler=LocalFileHandler(path_save_root=Path(mkdtemp())),
+                                  result_cache=result_cache)
+    asyncio.run(pipeline.run_simulation([SumoConfigObject(scenario_name='test-async-cache',
+                                                          path_config_dir=path_config_dir,
+                                                          config_name='grid.sumo.cfg')]))
+    # the same inputs with another name hit the cache. SUMO would time out if it ran.
+    monkeypatch.setenv('FAKE_SUMO_SLEEP', '30')
+    file_handler = LocalFileHandler(path_save_root=Path(mkdtemp()))
+    pipeline = AsyncLocalPipeline(sumo_command=sumo_command, file_handler=file_handler, result_cache=result_cache,
+                                  timeout_per_job=0.5)
+    seq_done = []
+    res = asyncio.run(pipeline.run_simulation(
+        [SumoConfigObject(scenario_name='test-async-cache-renamed',
+                          path_config_dir=path_config_dir,
+                          config_name='grid.sumo.cfg')], on_job_done=seq_done.append))
+    assert len(res) == 1
+    assert len(seq_done) == 1
+    assert file_handler.get_job_status('test-async-cache-renamed')[0] == 'finished'
+
+
+def find_processes(text: str):
+    """pids of processes whose command line has the text."""
+    seq_pids = []
+    for path_proc in Path('/proc').iterdir():
+        try:
+            if path_proc.name.isdigit() and text.encode() in path_proc.joinpath('cmdline').read_bytes():
+                seq_pids.append(int(path_proc.name))
+            # end if
+        except OSError:
+            continue
+        # end try
+    # end for
+    return seq_pids
+
+
+@pytest.mark.skipif(not Path('/proc').exists(), reason='needs /proc to find processes.')
+def test_async_local_pipeline_cancel(resource_path_root: Path, monkeypatch):
+    monkeypatch.setenv('FAKE_SUMO_SLEEP', '30')
+    scenario_name = f'test-async-cancel-{uuid.uuid4().hex[:8]}'
+    pipeline = AsyncLocalPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                  file_handler=LocalFileHandler(path_save_root=Path(mkdtemp())))
+    sumo_configs = [SumoConfigObject(scenario_name=scenario_name,
+                                     path_config_dir=resource_path_root.joinpath('config_complete'),
+                                     config_name='grid.sumo.cfg')]
+
+    async def run_and_cancel():
+        task = asyncio.ensure_future(pipeline.run_simulation(sumo_configs))
+        while len(find_processes(scenario_name)) == 0:
+            await asyncio.sleep(0.1)
+        # end while
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        # end with
+
+    asyncio.run(asyncio.wait_for(run_and_cancel(), timeout=20))
+    # the SUMO process is killed with the cancelled job.
+    assert find_processes(scenario_name) == []
+
+
+def test_async_local_pipeline_one_simulation(resource_path_root: Path):
+    pipeline = AsyncLocalPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                  file_handler=LocalFileHandler(path_save_root=Path(mkdtemp())))
+    result = pipeline.one_simulation(SumoConfigObject(scenario_name='test-async-one',
+                                                      path_config_dir=resource_path_root.joinpath('config_complete'),
+                                                      config_name='grid.sumo.cfg'))
+    assert result.path_output_dir.joinpath('grid_loop.out.xml').exists()
+
+
+def test_async_docker_pipeline(resource_path_root: Path):
+    file_handler = LocalFileHandler(path_save_root=Path(mkdtemp()))
+    pipeline = AsyncDockerPipeline(n_jobs=2, file_handler=file_handler)
+    sumo_configs = [SumoConfigObject(scenario_name=f'test-async-docker-{i}',
+                                     path_config_dir=resource_path_root.joinpath('config_complete'),
+                                     config_name='grid.sumo.cfg') for i in range(2)]
+    res = asyncio.run(pipeline.run_simulation(sumo_configs))
+    for r in res:
+        assert isinstance(r, SumoResultObjects)
+    # end for
+
+
+if __name__ == '__main__':
+    test_async_local_pipeline(Path('./resources'))
+    test_async_docker_pipeline(Path('./resources'))
@@ -0,0 +1,29 @@
+import json
+from pathlib import Path
+
+from benchmarks import run_benchmarks
+from benchmarks.synthetic_scenario import generate_grid_template, fill_wildcards
+from sumo_tasks_pipeline.config_generation_module import CompiledTemplate
+
+
+def test_synthetic_scenario(tmp_path: Path):
+    path_template = generate_grid_template(tmp_path.joinpath('template'), grid_size=3, n_wildcards=5)
+    assert len(CompiledTemplate(path_template).get_wildcards()['grid.flows.xml']) == 5
+    path_config = fill_wildcards(path_template, n_wildcards=5, seed=0)
+    assert '"?"' not in path_config.parent.joinpath('grid.flows.xml').read_text()
+
+
+def test_run_benchmarks(tmp_path: Path):
+    path_output = tmp_path.joinpath('benchmark.json')
+    assert run_benchmarks.main(['--quick', '--only', 'template', 'parsing', '--output', str(path_output)]) == 0
+    report = json.loads(path_output.read_text())
+    assert {r['name'] for r in report['results']} == \
+        {'template2sumo_config', 'compiled_template', 'parse_xml', 'parse_xml_gzip', 'load_npz'}
+    # the same run is never slower than itself by a factor of 1000.
+    assert run_benchmarks.main(['--quick', '--only', 'template', '--output', str(tmp_path.joinpath('b.json')),
+                                '--baseline', str(path_output), '--max-slowdown', '1000']) == 0
+
+
+if __name__ == '__main__':
+    from tempfile import mkdtemp
+    test_run_benchmarks(Path(mkdtemp()))
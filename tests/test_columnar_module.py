@@ -0,0 +1,70 @@
+import shutil
+from pathlib import Path
+from tempfile import mkdtemp
+
+import numpy
+import pytest
+
+from sumo_tasks_pipeline.columnar_module import ColumnarConverter
+from sumo_tasks_pipeline.commons.result_module import SumoResultObjects
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+from sumo_tasks_pipeline.output_parser_module import parse_detector_output, save_columnar, load_columnar
+
+
+def make_result(resource_path_root: Path) -> SumoResultObjects:
+    path_config_dir = Path(mkdtemp()).joinpath('config_complete')
+    shutil.copytree(resource_path_root.joinpath('config_complete'), path_config_dir)
+    obj = SumoConfigObject(scenario_name='test-columnar',
+                           path_config_dir=path_config_dir,
+                           config_name='grid.sumo.cfg')
+    return SumoResultObjects(id_scenario='test-columnar',
+                             sumo_config_obj=obj,
+                             path_output_dir=path_config_dir.joinpath('output'))
+
+
+def test_columnar_converter(resource_path_root: Path):
+    result = make_result(resource_path_root)
+    matrix_xml = result.parse_output('grid_loop.out.xml')
+    converter = ColumnarConverter(output_file_names=['grid_loop.out.xml', 'not_exist.xml'],
+                                  attributes=['flow', 'occupancy', 'speed'])
+    converter.convert(result)
+    assert 'grid_loop.out.xml.npz' in result.result_files
+    assert result.path_output_dir.joinpath('grid_loop.out.xml.npz').exists()
+    # parse_output reads the columnar file.
+    matrix = result.parse_output('grid_loop.out.xml', attributes=['speed'])
+    assert matrix.attributes == ['speed']
+    assert matrix.detector_ids == matrix_xml.detector_ids
+    assert numpy.array_equal(matrix['speed'], matrix_xml['speed'])
+    assert numpy.array_equal(matrix.interval_ends, matrix_xml.interval_ends)
+    # files are collected again from the directory.
+    result_reloaded = SumoResultObjects(id_scenario='test-columnar',
+                                        sumo_config_obj=result.sumo_config_obj,
+                                        path_output_dir=result.path_output_dir)
+    assert 'grid_loop.out.xml.npz' in result_reloaded.result_files
+
+
+def test_npz_mmap(resource_path_root: Path, tmp_path: Path):
+    matrix_xml = parse_detector_output(resource_path_root.joinpath('config_complete/output/grid_loop.out.xml'))
+    path_npz = save_columnar(matrix_xml, tmp_path.joinpath('grid_loop.out.xml.npz'), is_compress=False)
+    matrix = load_columnar(path_npz, attributes=['flow', 'speed'], mmap_mode='r')
+    assert isinstance(matrix['flow'], numpy.memmap)
+    assert numpy.array_equal(matrix['flow'], matrix_xml['flow'], equal_nan=True)
+    assert numpy.array_equal(matrix['speed'], matrix_xml['speed'], equal_nan=True)
+    # arrays of a compressed file are not on the disk as they are.
+    path_npz = save_columnar(matrix_xml, tmp_path.joinpath('compressed.out.xml.npz'), is_compress=True)
+    with pytest.raises(Exception):
+        load_columnar(path_npz, attributes=['flow'], mmap_mode='r')
+    # end with
+
+
+def test_parquet(resource_path_root: Path, tmp_path: Path):
+    pytest.importorskip('pyarrow')
+    matrix_xml = parse_detector_output(resource_path_root.joinpath('config_complete/output/grid_loop.out.xml'))
+    path_parquet = save_columnar(matrix_xml, tmp_path.joinpath('grid_loop.out.xml.parquet'))
+    matrix = load_columnar(path_parquet, attributes=['flow'])
+    assert matrix.detector_ids == matrix_xml.detector_ids
+    assert numpy.array_equal(matrix['flow'], matrix_xml['flow'])
+
+
+if __name__ == '__main__':
+    test_columnar_converter(Path('./resources'))
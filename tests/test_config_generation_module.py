@@ -1,5 +1,8 @@
-from sumo_tasks_pipeline.config_generation_module import Template2SuMoConfig, SubConfigFile
+from sumo_tasks_pipeline.config_generation_module import Template2SuMoConfig, SubConfigFile, CompiledTemplate, \
+    scan_wildcard
 from pathlib import Path
+from tempfile import mkdtemp
+import shutil
 
 
 def test_generate_config(resource_path_root: Path):
@@ -66,6 +69,74 @@ def test_config_object(resource_path_root: Path):
     sub_cfg_object.replace_wildcard_element(seq_elem_obj)
 
 
+def make_wildcard_template(resource_path_root: Path) -> Path:
+    path_template_dir = Path(mkdtemp()).joinpath('template')
+    shutil.copytree(resource_path_root.joinpath('config_template'), path_template_dir)
+    path_flows = path_template_dir.joinpath('grid.flows.xml')
+    text_flows = path_flows.read_text()
+    for key_name in ('maxSpeed', 'minGap', 'accel', 'decel'):
+        text_flows = text_flows.replace(f' {key_name}="', f' {key_name}="?" __{key_name}="')
+    # end for
+    path_flows.write_text(text_flows)
+    return path_template_dir.joinpath('grid.sumo.cfg')
+
+
+def test_compiled_template(resource_path_root: Path):
+    path_template = make_wildcard_template(resource_path_root)
+    values_target = {
+        '/routes/flows/vType[1]': {'maxSpeed': 15, 'minGap': 1.0, 'accel': 10, 'decel': 5},
+        '/routes/flows/vType[2]': {'maxSpeed': 10, 'minGap': 0.5, 'accel': 5, 'decel': '<&>'}
+    }
+    compiled_template = CompiledTemplate(path_template)
+    assert len(compiled_template.get_wildcards()['grid.flows.xml']) == 8
+
+    # the same outputs as Template2SuMoConfig
+    path_expected = Path(mkdtemp())
+    config_generator = Template2SuMoConfig(path_config_file=path_template, path_destination_dir=path_expected)
+    config_generator.update_configs({'grid.flows.xml': values_target})
+    config_generator.generate_updated_config_file()
+    path_rendered = compiled_template.generate({'grid.flows.xml': values_target}, Path(mkdtemp()))
+    for name in ('grid.flows.xml', 'grid.sumo.cfg'):
+        assert path_rendered.joinpath(name).read_bytes() == path_expected.joinpath(name).read_bytes()
+    # end for
+    assert path_rendered.joinpath('grid.net.xml').exists()
+    assert path_rendered.joinpath('output').is_dir()
+
+    seq_dirs = [Path(mkdtemp()) for __ in range(3)]
+    seq_values = [{'grid.flows.xml': {xpath: dict(maxSpeed=d['maxSpeed'] + i, minGap=d['minGap'], accel=d['accel'], decel=1)
+                                      for xpath, d in values_target.items()}} for i in range(3)]
+    for n_jobs in (1, 2):
+        seq_out = compiled_template.render_many(seq_values, seq_dirs, n_jobs=n_jobs)
+        assert seq_out == seq_dirs
+        assert b'maxSpeed="17"' in seq_dirs[2].joinpath('grid.flows.xml').read_bytes()
+    # end for
+
+
+def test_pass_through_files(resource_path_root: Path):
+    path_template = make_wildcard_template(resource_path_root)
+    path_net = path_template.parent.joinpath('grid.net.xml')
+    assert scan_wildcard(path_template.parent.joinpath('grid.flows.xml'))
+    assert not scan_wildcard(path_net)
+
+    path_destination_dir = Path(mkdtemp())
+    config_generator = Template2SuMoConfig(path_config_file=path_template,
+                                           path_destination_dir=path_destination_dir,
+                                           staging_mode='hardlink')
+    d_sub_configs = config_generator.get_config_objects()
+    assert d_sub_configs['grid.flows.xml'].is_wildcard_element
+    assert not d_sub_configs['grid.net.xml'].is_wildcard_element
+    config_generator.update_configs({'grid.flows.xml': {
+        '/routes/flows/vType[1]': {'maxSpeed': 15, 'minGap': 1.0, 'accel': 10, 'decel': 5},
+        '/routes/flows/vType[2]': {'maxSpeed': 10, 'minGap': 0.5, 'accel': 5, 'decel': 5}}})
+    config_generator.generate_updated_config_file()
+    # files without wildcards are byte-for-byte the same.
+    assert path_destination_dir.joinpath('grid.net.xml').read_bytes() == path_net.read_bytes()
+    assert path_destination_dir.joinpath('grid_detectors.det.xml').read_bytes() == \
+        path_template.parent.joinpath('grid_detectors.det.xml').read_bytes()
+
+
 if __name__ == '__main__':
     test_generate_config(Path('./resources'))
     test_config_object(Path('./resources'))
+    test_compiled_template(Path('./resources'))
+    test_pass_through_files(Path('./resources'))
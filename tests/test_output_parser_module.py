@@ -0,0 +1,84 @@
+import gzip
+import shutil
+from pathlib import Path
+
+import numpy
+from lxml import etree
+
+from sumo_tasks_pipeline.output_parser_module import parse_detector_output
+
+EDGE_DATA = """<?xml version="1.0" encoding="UTF-8"?>
+<meandata>
+    <interval begin="0.00" end="60.00" id="edge_data">
+        <edge id="e1" sampledSeconds="10.0" speed="12.5"/>
+        <edge id="e2" sampledSeconds="5.0" speed="8.0"/>
+    </interval>
+    <interval begin="60.00" end="120.00" id="edge_data">
+        <edge id="e2" sampledSeconds="3.0" speed="9.0"/>
+    </interval>
+</meandata>
+"""
+
+LANE_DATA = """<?xml version="1.0" encoding="UTF-8"?>
+<meandata>
+    <interval begin="0.00" end="60.00" id="lane_data">
+        <edge id="e1">
+            <lane id="e1_0" speed="10.0"/>
+            <lane id="e1_1" speed="11.0"/>
+        </edge>
+    </interval>
+</meandata>
+"""
+
+
+def test_parse_detector_output(resource_path_root: Path):
+    path_output = resource_path_root.joinpath('config_complete/output/grid_loop.out.xml')
+    matrix = parse_detector_output(path_output, attributes=['flow', 'occupancy', 'speed'])
+    assert matrix.attributes == ['flow', 'occupancy', 'speed']
+    assert matrix['flow'].shape == (64, 21)
+    assert len(matrix.detector_ids) == 64
+    assert numpy.all(numpy.diff(matrix.interval_begins) > 0)
+    # the same values as a DOM parser
+    d_detector2index = matrix.get_detector_index()
+    d_begin2index = {b: i for i, b in enumerate(matrix.interval_begins)}
+    for elem in etree.parse(str(path_output)).getroot().iter('interval'):
+        i = d_detector2index[elem.attrib['id']]
+        j = d_begin2index[float(elem.attrib['begin'])]
+        assert matrix['speed'][i, j] == float(elem.attrib['speed'])
+        assert matrix['flow'][i, j] == float(elem.attrib['flow'])
+    # end for
+    # all numeric attributes without `attributes`
+    matrix_all = parse_detector_output(path_output)
+    assert 'nVehContrib' in matrix_all.attributes
+    assert 'id' not in matrix_all.attributes
+
+
+def test_parse_edge_data(tmp_path: Path):
+    path_edge = tmp_path.joinpath('edge.out.xml')
+    path_edge.write_text(EDGE_DATA)
+    matrix = parse_detector_output(path_edge)
+    assert matrix.detector_ids == ['e1', 'e2']
+    assert matrix['speed'].shape == (2, 2)
+    assert numpy.isnan(matrix['speed'][0, 1])
+    assert matrix['speed'][1, 1] == 9.0
+    assert list(matrix.interval_ends) == [60.0, 120.0]
+
+    path_lane = tmp_path.joinpath('lane.out.xml')
+    path_lane.write_text(LANE_DATA)
+    matrix = parse_detector_output(path_lane)
+    assert matrix.detector_ids == ['e1_0', 'e1_1']
+    assert list(matrix['speed'][:, 0]) == [10.0, 11.0]
+
+
+def test_parse_gzip(resource_path_root: Path, tmp_path: Path):
+    path_output = resource_path_root.joinpath('config_complete/output/grid_loop.out.xml')
+    path_gzip = tmp_path.joinpath('grid_loop.out.xml.gz')
+    with path_output.open('rb') as f_source, gzip.open(path_gzip, 'wb') as f_target:
+        shutil.copyfileobj(f_source, f_target)
+    # end with
+    matrix = parse_detector_output(path_gzip, attributes=['flow'])
+    assert numpy.array_equal(matrix['flow'], parse_detector_output(path_output, attributes=['flow'])['flow'])
+
+
+if __name__ == '__main__':
+    test_parse_detector_output(Path('./resources'))
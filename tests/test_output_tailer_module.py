@@ -0,0 +1,110 @@
+import asyncio
+import gzip
+import time
+from pathlib import Path
+from tempfile import mkdtemp
+
+from sumo_tasks_pipeline.output_tailer_module import OutputTailer, OutputMonitor, get_output_path
+from sumo_tasks_pipeline.pipeline import LocalSumoPipeline, AsyncLocalPipeline
+from sumo_tasks_pipeline.file_handler import LocalFileHandler
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+
+HEAD = '<?xml version="1.0" encoding="UTF-8"?>\n<detector>\n'
+ROW_1 = '    <interval begin="0.00" end="100.00" id="d0" nVehContrib="5" flow="180.00" speed="11.27"/>\n'
+ROW_2 = '    <interval begin="0.00" end="100.00" id="d1" nVehContrib="1" flow="36.00" speed="4.55"/>\n'
+
+
+def test_output_tailer():
+    path_output = Path(mkdtemp()).joinpath('grid_loop.out.xml')
+    tailer = OutputTailer(path_output, job_id='test', attributes=['flow', 'speed'])
+    assert tailer.poll() == []
+    path_output.write_text(HEAD + ROW_1 + ROW_2[:30])
+    seq_records = tailer.poll()
+    assert len(seq_records) == 1
+    assert seq_records[0].detector_id == 'd0'
+    assert seq_records[0].values == {'flow': 180.0, 'speed': 11.27}
+    # the half-written row is read when the rest is flushed.
+    with path_output.open('a') as f:
+        f.write(ROW_2[30:])
+    # end with
+    seq_records = tailer.poll()
+    assert [r.detector_id for r in seq_records] == ['d1']
+    assert tailer.poll() == []
+    assert tailer.n_records == 2
+
+
+def test_output_tailer_follow():
+    path_output = Path(mkdtemp()).joinpath('grid_loop.out.xml')
+    path_output.write_text(HEAD + ROW_1 + ROW_2 + '</detector>\n')
+    tailer = OutputTailer(path_output)
+
+    async def collect():
+        return [r async for r in tailer.follow(lambda: False, interval_poll=0.01)]
+
+    seq_records = asyncio.run(collect())
+    assert [r.detector_id for r in seq_records] == ['d0', 'd1']
+    assert 'nVehContrib' in seq_records[0].values
+
+
+def test_get_output_path(resource_path_root: Path):
+    path_config_file = resource_path_root.joinpath('config_complete/grid.sumo.cfg')
+    assert get_output_path(path_config_file, 'grid_loop.out.xml') == \
+        resource_path_root.joinpath('config_complete/outputgrid_loop.out.xml')
+
+
+def test_output_monitor_gzip():
+    path_config_dir = Path(mkdtemp())
+    path_config_file = path_config_dir.joinpath('grid.sumo.cfg')
+    path_config_file.write_text('<configuration><output><output-prefix value="output/"/></output></configuration>')
+    seq_records = []
+    monitor = OutputMonitor(['grid_loop.out.xml.gz', 'grid_loop.out.xml'], seq_records.append)
+    monitor.start('test', path_config_file)
+    # a gzip output is not watched.
+    assert [t.path_output_file.name for t in monitor.d_job_id2tailers['test']] == ['grid_loop.out.xml']
+    # a file that is not XML stops its tailer, not the job.
+    path_config_dir.joinpath('output').mkdir()
+    path_config_dir.joinpath('output/grid_loop.out.xml').write_bytes(gzip.compress((HEAD + ROW_1).encode()))
+    assert monitor.read('test') is False
+    assert monitor.d_job_id2tailers['test'] == []
+    monitor.finish('test')
+    assert seq_records == []
+
+
+def test_pipeline_abort(resource_path_root: Path, monkeypatch):
+    monkeypatch.setenv('FAKE_SUMO_SLEEP_AFTER_OUTPUT', '30')
+    seq_records = []
+
+    def on_interval(record) -> bool:
+        seq_records.append(record)
+        return record.values['flow'] > 100
+
+    def make_configs():
+        return [SumoConfigObject(scenario_name=f'test-abort-{i}',
+                                 path_config_dir=resource_path_root.joinpath('config_complete'),
+                                 config_name='grid.sumo.cfg') for i in range(2)]
+
+    pipeline = LocalSumoPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                 n_jobs=2,
+                                 file_handler=LocalFileHandler(path_save_root=Path(mkdtemp())),
+                                 output_monitor=OutputMonitor(['grid_loop.out.xml'], on_interval, interval_poll=0.1))
+    time_start = time.monotonic()
+    res = pipeline.run_simulation(make_configs())
+    assert time.monotonic() - time_start < 20
+    assert len(res) == 0
+    assert sorted(pipeline.failed_job_ids) == ['test-abort-0', 'test-abort-1']
+    assert len(seq_records) > 0
+
+    pipeline = AsyncLocalPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                  n_jobs=2,
+                                  file_handler=LocalFileHandler(path_save_root=Path(mkdtemp())),
+                                  output_monitor=OutputMonitor(['grid_loop.out.xml'], on_interval, interval_poll=0.1))
+    time_start = time.monotonic()
+    res = asyncio.run(pipeline.run_simulation(make_configs()))
+    assert time.monotonic() - time_start < 20
+    assert len(res) == 0
+    assert sorted(pipeline.failed_job_ids) == ['test-abort-0', 'test-abort-1']
+
+
+if __name__ == '__main__':
+    test_output_tailer()
+    test_pipeline_abort(Path('./resources'))
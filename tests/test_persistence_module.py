@@ -0,0 +1,53 @@
+import threading
+import time
+from pathlib import Path
+from tempfile import mkdtemp
+
+from sumo_tasks_pipeline.pipeline.persistence_module import PersistenceStage, get_dir_size
+
+
+def make_output_dir(size_bytes: int) -> Path:
+    path_dir = Path(mkdtemp())
+    path_dir.joinpath('out.xml').write_bytes(b'a' * size_bytes)
+    return path_dir
+
+
+def test_persistence_stage():
+    path_dir = make_output_dir(100)
+    assert get_dir_size(path_dir) == 100
+    with PersistenceStage(n_workers=2) as stage:
+        futures = [stage.submit(lambda x: x * 2, i, path_output_dir=path_dir) for i in range(5)]
+        assert [f.result() for f in futures] == [0, 2, 4, 6, 8]
+    # end with
+    assert stage.pending_bytes == 0
+    assert stage.n_pending == 0
+
+
+def test_persistence_stage_backpressure():
+    event_release = threading.Event()
+    stage = PersistenceStage(n_workers=2, max_pending_bytes=150)
+    # the first task is accepted even when it is larger than the limit.
+    future_first = stage.submit(event_release.wait, path_output_dir=make_output_dir(100))
+    assert stage.pending_bytes == 100
+
+    is_submitted = threading.Event()
+
+    def submit_second():
+        stage.submit(lambda: None, path_output_dir=make_output_dir(100))
+        is_submitted.set()
+
+    thread = threading.Thread(target=submit_second)
+    thread.start()
+    time.sleep(0.2)
+    assert is_submitted.is_set() is False
+    event_release.set()
+    thread.join(timeout=5)
+    assert is_submitted.is_set()
+    assert future_first.result() is True
+    stage.close()
+    assert stage.pending_bytes == 0
+
+
+if __name__ == '__main__':
+    test_persistence_stage()
+    test_persistence_stage_backpressure()
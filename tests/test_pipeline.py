@@ -4,8 +4,13 @@ from pathlib import Path
 from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
 from sumo_tasks_pipeline.commons.result_module import SumoResultObjects
 from sumo_tasks_pipeline.static import PATH_PACKAGE_WORK_DIR
+from sumo_tasks_pipeline.scheduler_module import LptScheduler, HistoryCostEstimator
+from sumo_tasks_pipeline.result_cache import LocalResultCache
+from sumo_tasks_pipeline.columnar_module import ColumnarConverter
 import shutil
 import uuid
+from tempfile import mkdtemp
+import pytest
 
 
 def test_local_pipeline(resource_path_root: Path):
@@ -26,6 +31,115 @@ def test_local_pipeline(resource_path_root: Path):
         assert isinstance(r, SumoResultObjects)
 
 
+def test_local_pipeline_fake_sumo(resource_path_root: Path):
+    file_handler = LocalFileHandler(path_save_root=Path(mkdtemp()))
+    pipeline = LocalSumoPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                 n_jobs=2,
+                                 file_handler=file_handler,
+                                 scheduler=LptScheduler(HistoryCostEstimator()))
+    sumo_configs = [SumoConfigObject(scenario_name=f'test-fake-{i}',
+                                     path_config_dir=resource_path_root.joinpath('config_complete'),
+                                     config_name='grid.sumo.cfg') for i in range(3)]
+    seq_done = []
+    res = pipeline.run_simulation(sumo_configs, on_job_done=seq_done.append)
+    assert [r.id_scenario for r in res] == ['test-fake-0', 'test-fake-1', 'test-fake-2']
+    assert len(pipeline.scheduler.estimator.d_job_id2seconds) == 3
+    assert len(seq_done) == 3
+    for r in res:
+        assert file_handler.get_job_status(r.sumo_config_obj.job_id)[0] == 'finished'
+    # end for
+
+
+def test_local_pipeline_one_simulation(resource_path_root: Path, monkeypatch):
+    file_handler = LocalFileHandler(path_save_root=Path(mkdtemp()))
+    pipeline = LocalSumoPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                 file_handler=file_handler)
+    r = pipeline.one_simulation(SumoConfigObject(scenario_name='test-one',
+                                                 path_config_dir=resource_path_root.joinpath('config_complete'),
+                                                 config_name='grid.sumo.cfg'))
+    assert r.id_scenario == 'test-one'
+    assert file_handler.get_job_status('test-one')[0] == 'finished'
+    monkeypatch.setenv('FAKE_SUMO_SLEEP', '30')
+    pipeline = LocalSumoPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                 file_handler=file_handler,
+                                 timeout_per_job=0.5)
+    with pytest.raises(Exception):
+        pipeline.one_simulation(SumoConfigObject(scenario_name='test-one-missing',
+                                                 path_config_dir=resource_path_root.joinpath('config_complete'),
+                                                 config_name='grid.sumo.cfg'))
+    # end with
+    assert pipeline.failed_job_ids == ['test-one-missing']
+
+
+def test_local_pipeline_iter_stream(resource_path_root: Path):
+    """Jobs are taken from the iterable only when a process slot is free."""
+    pipeline = LocalSumoPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                 file_handler=LocalFileHandler(path_save_root=Path(mkdtemp())),
+                                 n_jobs=1)
+    seq_taken = []
+
+    def generate_configs():
+        for i in range(4):
+            seq_taken.append(i)
+            yield SumoConfigObject(scenario_name=f'test-stream-{i}',
+                                   path_config_dir=resource_path_root.joinpath('config_complete'),
+                                   config_name='grid.sumo.cfg')
+        # end for
+
+    seq_taken_at_result = [len(seq_taken) for __ in pipeline.iter_stream(generate_configs())]
+    assert len(seq_taken_at_result) == 4
+    assert seq_taken_at_result[0] <= 2
+
+
+def test_local_pipeline_result_cache(resource_path_root: Path, monkeypatch):
+    result_cache = LocalResultCache(Path(mkdtemp()))
+    sumo_command = str(resource_path_root.joinpath('fake_sumo.py'))
+    pipeline = LocalSumoPipeline(sumo_command=sumo_command,
+                                 file_handler=LocalFileHandler(path_save_root=Path(mkdtemp())),
+                                 result_cache=result_cache)
+    pipeline.run_simulation([SumoConfigObject(scenario_name='test-cache',
+                                              path_config_dir=resource_path_root.joinpath('config_complete'),
+                                              config_name='grid.sumo.cfg')])
+    # the same inputs with another name hit the cache. SUMO would time out if it ran.
+    monkeypatch.setenv('FAKE_SUMO_SLEEP', '30')
+    file_handler = LocalFileHandler(path_save_root=Path(mkdtemp()))
+    pipeline = LocalSumoPipeline(sumo_command=sumo_command, file_handler=file_handler, result_cache=result_cache,
+                                 timeout_per_job=0.5)
+    res = pipeline.run_simulation([SumoConfigObject(scenario_name='test-cache-renamed',
+                                                    path_config_dir=resource_path_root.joinpath('config_complete'),
+                                                    config_name='grid.sumo.cfg')])
+    assert len(res) == 1
+    assert file_handler.get_job_status('test-cache-renamed')[0] == 'finished'
+
+
+def test_local_pipeline_columnar(resource_path_root: Path):
+    file_handler = LocalFileHandler(path_save_root=Path(mkdtemp()))
+    pipeline = LocalSumoPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                 file_handler=file_handler,
+                                 columnar_converter=ColumnarConverter(output_file_names=['grid_loop.out.xml']))
+    res = pipeline.run_simulation([SumoConfigObject(scenario_name='test-columnar',
+                                                    path_config_dir=resource_path_root.joinpath('config_complete'),
+                                                    config_name='grid.sumo.cfg')])
+    assert 'grid_loop.out.xml.npz' in res[0].result_files
+    path_saved = file_handler.path_save_root.joinpath(file_handler.subdir_output).joinpath('test-columnar')
+    assert path_saved.joinpath('grid_loop.out.xml.npz').exists()
+
+
+def test_local_pipeline_timeout(resource_path_root: Path, monkeypatch):
+    monkeypatch.setenv('FAKE_SUMO_SLEEP', '30')
+    file_handler = LocalFileHandler(path_save_root=Path(mkdtemp()))
+    pipeline = LocalSumoPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                 n_jobs=2,
+                                 file_handler=file_handler,
+                                 timeout_per_job=0.5)
+    sumo_configs = [SumoConfigObject(scenario_name=f'test-timeout-{i}',
+                                     path_config_dir=resource_path_root.joinpath('config_complete'),
+                                     config_name='grid.sumo.cfg') for i in range(2)]
+    res = pipeline.run_simulation(sumo_configs)
+    assert len(res) == 0
+    assert sorted(pipeline.failed_job_ids) == ['test-timeout-0', 'test-timeout-1']
+
+
 def test_docker_pipeline(resource_path_root: Path):
     file_handler = LocalFileHandler(path_save_root=Path(PATH_PACKAGE_WORK_DIR))
     p_copy = f'/tmp/sumo_docker_pipeline_{uuid.uuid1()}'
@@ -42,6 +156,39 @@ def test_docker_pipeline(resource_path_root: Path):
         assert isinstance(r, SumoResultObjects)
 
 
+def test_docker_pipeline_iter(resource_path_root: Path):
+    file_handler = LocalFileHandler(path_save_root=Path(PATH_PACKAGE_WORK_DIR))
+    p_copy = f'/tmp/sumo_docker_pipeline_{uuid.uuid1()}'
+    shutil.copytree(resource_path_root.joinpath('config_complete'), p_copy)
+    pipeline_obj = DockerPipeline(n_jobs=2, file_handler=file_handler)
+    sumo_configs = [SumoConfigObject(scenario_name='test-iter',
+                                     path_config_dir=resource_path_root.joinpath('config_complete'),
+                                     config_name='grid.sumo.cfg'),
+                    SumoConfigObject(scenario_name='test-iter2',
+                                     path_config_dir=Path(p_copy),
+                                     config_name='grid.sumo.cfg')]
+    seq_done = []
+    for r in pipeline_obj.iter_simulation(sumo_configs=sumo_configs, on_job_done=seq_done.append):
+        assert isinstance(r, SumoResultObjects)
+    # end for
+    assert len(seq_done) == 2
+
+
+def test_docker_pipeline_timeout(resource_path_root: Path):
+    file_handler = LocalFileHandler(path_save_root=Path(mkdtemp()))
+    with pytest.warns(DeprecationWarning):
+        pipeline_obj = DockerPipeline(n_jobs=2, file_handler=file_handler, limit_max_wait=0.01)
+    # end with
+    assert pipeline_obj.timeout_per_job == 0.01
+    sumo_configs = [SumoConfigObject(scenario_name=f'test-docker-timeout-{i}',
+                                     path_config_dir=resource_path_root.joinpath('config_complete'),
+                                     config_name='grid.sumo.cfg') for i in range(2)]
+    # a job over the limit fails alone. The run goes on.
+    assert pipeline_obj.run_simulation(sumo_configs=sumo_configs) == []
+    assert sorted(pipeline_obj.failed_job_ids) == ['test-docker-timeout-0', 'test-docker-timeout-1']
+
+
 if __name__ == '__main__':
     test_local_pipeline(Path('../resources'))
     test_docker_pipeline(Path('../resources'))
+    test_docker_pipeline_iter(Path('../resources'))
@@ -0,0 +1,61 @@
+import shutil
+from pathlib import Path
+from tempfile import mkdtemp
+
+import numpy
+from lxml import etree
+
+from sumo_tasks_pipeline.commons.result_module import SumoResultObjects
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+from sumo_tasks_pipeline.result_collection_module import ResultCollection
+
+
+def make_results(resource_path_root: Path, n_scenarios: int):
+    seq_results = []
+    for i in range(n_scenarios):
+        path_config_dir = Path(mkdtemp()).joinpath(f'scenario-{i}')
+        shutil.copytree(resource_path_root.joinpath('config_complete'), path_config_dir)
+        # scale flows, so that scenarios are different.
+        path_output = path_config_dir.joinpath('output/grid_loop.out.xml')
+        tree = etree.parse(str(path_output))
+        for elem in tree.getroot().iter('interval'):
+            elem.attrib['flow'] = str(float(elem.attrib['flow']) * (i + 1))
+        # end for
+        if i == 1:
+            # a detector missing in a scenario
+            elem_first = next(tree.getroot().iter('interval'))
+            elem_first.getparent().remove(elem_first)
+        # end if
+        tree.write(str(path_output))
+        obj = SumoConfigObject(scenario_name=f'scenario-{i}', path_config_dir=path_config_dir,
+                               config_name='grid.sumo.cfg')
+        seq_results.append(SumoResultObjects(id_scenario=f'scenario-{i}', sumo_config_obj=obj,
+                                             path_output_dir=path_config_dir.joinpath('output')))
+    # end for
+    return seq_results
+
+
+def test_result_collection(resource_path_root: Path):
+    seq_results = make_results(resource_path_root, 3)
+    collection = ResultCollection(seq_results, n_jobs=2)
+    stack = collection.stack('grid_loop.out.xml', attributes=['flow', 'speed'])
+    assert stack.shape == (3, 64, 21)
+    flow = stack['flow']
+    assert numpy.isnan(flow[1, 0, 0])
+    assert numpy.allclose(flow[2], flow[0] * 3)
+    assert numpy.allclose(stack.mean('flow')[1:], (flow[0] * 2)[1:])
+    assert stack.quantile('flow', [0.0, 1.0]).shape == (2, 64, 21)
+    stats = stack.detector_stats('flow')
+    assert list(stats.index) == stack.detector_ids
+    assert stats['count'].iloc[0] == 3 * 21 - 1
+    assert len(stack.scenario_means('speed')) == 3
+
+    frame = collection.to_frame('grid_loop.out.xml', attributes=['flow'])
+    assert len(frame) == 3 * 64 * 21
+    assert str(frame['scenario'].dtype) == 'category'
+    assert numpy.allclose(frame.groupby('scenario', observed=True)['flow'].mean().to_numpy(),
+                          stack.scenario_means('flow').to_numpy())
+
+
+if __name__ == '__main__':
+    test_result_collection(Path('./resources'))
@@ -1,7 +1,11 @@
 from sumo_tasks_pipeline.commons.result_module import SumoResultObjects
 from sumo_tasks_pipeline.commons.result_module import ResultFile
 from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+from sumo_tasks_pipeline.commons.archive_module import write_tar_archive, zstandard
 from pathlib import Path
+from tempfile import mkdtemp
+
+import numpy
 
 
 def test_generate_output(resource_path_root: Path):
@@ -14,6 +18,67 @@ def test_generate_output(resource_path_root: Path):
         sumo_config_obj=obj,
         log_message='',
         path_output_dir=path_output_dir)
+    assert 'grid_loop.out.xml' in result_generator.result_files
+    matrix = result_generator.parse_output('grid_loop.out.xml', attributes=['flow', 'speed'])
+    assert matrix['flow'].shape == (64, 21)
+
+
+def test_compressed_output(resource_path_root: Path):
+    path_output_dir = resource_path_root.joinpath('config_complete/output')
+    obj = SumoConfigObject(scenario_name='test',
+                           path_config_dir=resource_path_root.joinpath('config_complete'),
+                           config_name='grid.sumo.cfg')
+    matrix_expected = SumoResultObjects(id_scenario='test', sumo_config_obj=obj, log_message='',
+                                        path_output_dir=path_output_dir).parse_output('grid_loop.out.xml')
+    seq_formats = ['tar.gz', 'tar.zst'] if zstandard is not None else ['tar.gz']
+    for archive_format in seq_formats:
+        path_archive = write_tar_archive(path_output_dir, Path(mkdtemp()).joinpath(f'test.{archive_format}'),
+                                         archive_format=archive_format, compress_level=1)
+        result = SumoResultObjects(id_scenario='test', sumo_config_obj=obj, log_message='',
+                                   path_output_dir=path_archive, is_compressed=True)
+        assert result.result_files['grid_loop.out.xml'].archive_member == './grid_loop.out.xml'
+        matrix = result.parse_output('grid_loop.out.xml')
+        assert numpy.array_equal(matrix['flow'], matrix_expected['flow'])
+    # end for
+
+
+def test_lazy_result_files(resource_path_root: Path):
+    path_output_dir = Path(mkdtemp())
+    obj = SumoConfigObject(scenario_name='test',
+                           path_config_dir=resource_path_root.joinpath('config_complete'),
+                           config_name='grid.sumo.cfg')
+    result = SumoResultObjects(id_scenario='test', sumo_config_obj=obj, path_output_dir=path_output_dir)
+    # files are listed at the first access, not when the object is created.
+    path_output_dir.joinpath('late.out.xml').write_text('<detector/>')
+    assert list(result.result_files.keys()) == ['late.out.xml']
+    path_output_dir.joinpath('later.out.xml').write_text('<detector/>')
+    assert list(result.result_files.keys()) == ['late.out.xml']
+    # given files are kept as they are.
+    result = SumoResultObjects(id_scenario='test', sumo_config_obj=obj, path_output_dir=path_output_dir)
+    result.result_files = {}
+    assert result.result_files == {}
+    assert 'result_files' not in repr(result)
+
+
+def test_result_files_relative_path(resource_path_root: Path):
+    path_output_dir = Path(mkdtemp())
+    obj = SumoConfigObject(scenario_name='test',
+                           path_config_dir=resource_path_root.joinpath('config_complete'),
+                           config_name='grid.sumo.cfg')
+    # files of the same name in sub-directories are kept apart.
+    path_output_dir.joinpath('a').mkdir()
+    path_output_dir.joinpath('b').mkdir()
+    path_output_dir.joinpath('a', 'e1.out.xml').write_text('<detector/>')
+    path_output_dir.joinpath('b', 'e1.out.xml').write_text('<detector/>')
+    path_output_dir.joinpath('e1.out.xml').write_text('<detector/>')
+    result = SumoResultObjects(id_scenario='test', sumo_config_obj=obj, path_output_dir=path_output_dir)
+    assert list(result.result_files.keys()) == ['a/e1.out.xml', 'b/e1.out.xml', 'e1.out.xml']
+    path_archive = write_tar_archive(path_output_dir, Path(mkdtemp()).joinpath('test.tar.gz'),
+                                     archive_format='tar.gz', compress_level=1)
+    result = SumoResultObjects(id_scenario='test', sumo_config_obj=obj, path_output_dir=path_archive,
+                               is_compressed=True)
+    assert sorted(result.result_files.keys()) == ['a/e1.out.xml', 'b/e1.out.xml', 'e1.out.xml']
+    assert result.result_files['a/e1.out.xml'].archive_member == './a/e1.out.xml'
 
 
 if __name__ == '__main__':
@@ -0,0 +1,74 @@
+from sumo_tasks_pipeline.scheduler_module import extract_scenario_features, LptScheduler, \
+    BaseCostEstimator, HistoryCostEstimator, StaticCostEstimator
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+import json
+from tempfile import mkdtemp
+from pathlib import Path
+
+
+class JobIdCostEstimator(BaseCostEstimator):
+    def estimate(self, sumo_config: SumoConfigObject) -> float:
+        return float(sumo_config.job_id.split('-')[-1])
+
+
+def test_extract_scenario_features(resource_path_root: Path):
+    obj = SumoConfigObject(scenario_name='test',
+                           path_config_dir=resource_path_root.joinpath('config_complete'),
+                           config_name='grid.sumo.cfg')
+    features = extract_scenario_features(obj)
+    assert features.n_edges == 44
+    assert features.n_lanes == 88
+    # <end value="-1"/>. The end comes from the flow intervals.
+    assert features.time_end == 1800
+    assert features.n_steps == 1800 / 0.25
+    assert features.n_routes == 16
+    assert features.n_vehicles == 1800
+    assert StaticCostEstimator().estimate(obj) > 0
+
+
+def test_lpt_order(resource_path_root: Path):
+    sumo_configs = [SumoConfigObject(scenario_name=f'test-{i}',
+                                     path_config_dir=resource_path_root.joinpath('config_complete'),
+                                     config_name='grid.sumo.cfg') for i in (3, 10, 1, 7)]
+    scheduler = LptScheduler(JobIdCostEstimator())
+    assert [c.job_id for c in scheduler.order(sumo_configs)] == ['test-10', 'test-7', 'test-3', 'test-1']
+
+
+def test_history_cost_estimator(resource_path_root: Path):
+    path_history = Path(mkdtemp()).joinpath('history.json')
+    sumo_configs = [SumoConfigObject(scenario_name=f'test-{i}',
+                                     path_config_dir=resource_path_root.joinpath('config_complete'),
+                                     config_name='grid.sumo.cfg') for i in (1, 2)]
+    estimator = HistoryCostEstimator(JobIdCostEstimator(), path_history=path_history)
+    assert estimator.estimate(sumo_configs[1]) == 2.0
+    estimator.update(sumo_configs[0], elapsed_seconds=10.0)
+    assert estimator.estimate(sumo_configs[0]) == 10.0
+    # a new job is scaled with the observed ratio.
+    assert estimator.estimate(sumo_configs[1]) == 20.0
+    # the history is saved at the end of a run, not at every update.
+    assert not path_history.exists()
+    estimator.save()
+    assert HistoryCostEstimator(JobIdCostEstimator(), path_history=path_history).estimate(sumo_configs[1]) == 20.0
+
+
+def test_history_cost_estimator_save(resource_path_root: Path):
+    path_history = Path(mkdtemp()).joinpath('history.json')
+    estimator = HistoryCostEstimator(JobIdCostEstimator(), path_history=path_history, n_updates_per_save=4,
+                                     max_ratios=3)
+    for i in range(1, 10):
+        estimator.update(SumoConfigObject(scenario_name=f'test-{i}',
+                                          path_config_dir=resource_path_root.joinpath('config_complete'),
+                                          config_name='grid.sumo.cfg'), elapsed_seconds=10.0 * i * i)
+    # end for
+    # saved at the 4th and the 8th updates. Only the latest ratios are kept.
+    history = json.loads(path_history.read_text())
+    assert len(history['elapsed_seconds']) == 8
+    assert history['ratio'] == [60.0, 70.0, 80.0]
+    assert [p.name for p in path_history.parent.iterdir()] == ['history.json']
+
+
+if __name__ == '__main__':
+    test_extract_scenario_features(Path('./resources'))
+    test_lpt_order(Path('./resources'))
+    test_history_cost_estimator(Path('./resources'))
+    test_history_cost_estimator_save(Path('./resources'))
@@ -0,0 +1,68 @@
+import json
+import uuid
+from pathlib import Path
+from tempfile import mkdtemp
+
+from sumo_tasks_pipeline import cli
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+from sumo_tasks_pipeline.file_handler import LocalFileHandler
+from sumo_tasks_pipeline.shard_module import parse_shard, select_shard, get_shard_index
+
+
+def test_select_shard(resource_path_root: Path):
+    sumo_configs = [SumoConfigObject(scenario_name=f'job-{i}',
+                                     path_config_dir=resource_path_root.joinpath('config_complete'),
+                                     config_name='grid.sumo.cfg') for i in range(100)]
+    seq_shards = [select_shard(sumo_configs, (i, 4)) for i in range(4)]
+    seq_job_ids = [conf.job_id for shard in seq_shards for conf in shard]
+    # shards are disjoint and cover all jobs.
+    assert sorted(seq_job_ids) == sorted(conf.job_id for conf in sumo_configs)
+    assert all(len(shard) > 10 for shard in seq_shards)
+    # the shard depends only on the job-id. A change of the hash would move finished jobs to other shards.
+    assert get_shard_index('job-0', 4) == 0
+    assert parse_shard('3/4') == (3, 4)
+    for text in ('4/4', '1', 'a/b'):
+        try:
+            parse_shard(text)
+        except ValueError:
+            pass
+        else:
+            raise AssertionError(f'{text} must be rejected.')
+        # end try
+    # end for
+
+
+def test_cli_shard_merge(resource_path_root: Path, tmp_path: Path):
+    prefix = f'test-shard-{uuid.uuid4().hex[:8]}'
+    path_jobs = tmp_path.joinpath('jobs.jsonl')
+    with path_jobs.open('w') as f:
+        for i in range(4):
+            f.write(json.dumps({'scenario_name': f'{prefix}-{i}',
+                                'path_config_dir': str(resource_path_root.joinpath('config_complete')),
+                                'config_name': 'grid.sumo.cfg'}) + '\n')
+        # end for
+    # end with
+    path_save_root = tmp_path.joinpath('outputs')
+    args_backend = ['--path-save-root', str(path_save_root)]
+    args_run = ['run', '--jobs', str(path_jobs), '--sumo-command', str(resource_path_root.joinpath('fake_sumo.py'))]
+    assert cli.main(args_run + args_backend + ['--shard', '0/2']) == 0
+    # a shard is missing.
+    assert cli.main(['merge', '--jobs', str(path_jobs)] + args_backend) == 1
+    assert cli.main(args_run + args_backend + ['--shard', '1/2']) == 0
+    path_manifest = tmp_path.joinpath('manifest.json')
+    assert cli.main(['merge', '--jobs', str(path_jobs), '--output', str(path_manifest)] + args_backend) == 0
+    manifest = json.loads(path_manifest.read_text())
+    assert manifest['n_shards'] == 2 and manifest['shards_missing'] == []
+    assert manifest['n_finished'] == 4
+    assert [job['job_id'] for job in manifest['jobs']] == [f'{prefix}-{i}' for i in range(4)]
+    assert 'manifest.json' in LocalFileHandler(path_save_root).load_manifests()
+    # a shard run again skips its finished jobs. Their paths are still the saved outputs.
+    assert cli.main(args_run + args_backend + ['--shard', '0/2']) == 0
+    assert cli.main(['merge', '--jobs', str(path_jobs), '--output', str(path_manifest)] + args_backend) == 0
+    manifest = json.loads(path_manifest.read_text())
+    assert [job['path_output_dir'] for job in manifest['jobs']] == \
+        [str(path_save_root.joinpath('pipeline-output', f'{prefix}-{i}')) for i in range(4)]
+
+
+if __name__ == '__main__':
+    test_cli_shard_merge(Path('./resources'), Path(mkdtemp()))
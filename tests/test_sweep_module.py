@@ -0,0 +1,131 @@
+from pathlib import Path
+from tempfile import mkdtemp
+
+import numpy
+
+from sumo_tasks_pipeline.sweep_module import ParameterSweep, SweepParameter, LazySumoConfig
+from sumo_tasks_pipeline.pipeline import LocalSumoPipeline
+from sumo_tasks_pipeline.file_handler import LocalFileHandler
+from sumo_tasks_pipeline.scheduler_module import LptScheduler, BaseCostEstimator
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+from tests.test_config_generation_module import make_wildcard_template
+
+
+def get_sweep_parameters():
+    return [SweepParameter('grid.flows.xml', '/routes/flows/vType[1]', 'maxSpeed', low=10, high=20, n_levels=3),
+            SweepParameter('grid.flows.xml', '/routes/flows/vType[2]', 'maxSpeed', values=[5, 8])]
+
+
+def get_fixed_values():
+    return {'grid.flows.xml': {
+        '/routes/flows/vType[1]': {'minGap': 1.0, 'accel': 10, 'decel': 5},
+        '/routes/flows/vType[2]': {'minGap': 0.5, 'accel': 5, 'decel': 5}}}
+
+
+def test_parameter_sweep_designs(resource_path_root: Path):
+    path_template = make_wildcard_template(resource_path_root)
+    sweep = ParameterSweep(path_template, get_sweep_parameters(), design='grid',
+                           fixed_values=get_fixed_values(), path_work_dir=Path(mkdtemp()))
+    assert len(sweep) == 6
+    seq_configs = list(sweep)
+    assert len({c.job_id for c in seq_configs}) == 6
+    assert {c.parameters['grid.flows.xml:/routes/flows/vType[1]@maxSpeed'] for c in seq_configs} == {10.0, 15.0, 20.0}
+    # nothing is written until a job starts.
+    assert not any(c.is_materialized for c in seq_configs)
+
+    for design in ('random', 'lhs'):
+        sweep = ParameterSweep(path_template, get_sweep_parameters(), design=design, n_samples=8, seed=1,
+                               fixed_values=get_fixed_values())
+        seq_points = list(sweep.iter_points())
+        assert len(seq_points) == 8
+        assert seq_points == list(sweep.iter_points())
+    # end for
+    # Latin hypercube: one point in each stratum of every dimension.
+    unit_points = sweep.generate_unit_points()
+    for i_dim in range(unit_points.shape[1]):
+        assert sorted(numpy.floor(unit_points[:, i_dim] * 8).astype(int).tolist()) == list(range(8))
+    # end for
+
+
+def test_lazy_sumo_config(resource_path_root: Path):
+    path_template = make_wildcard_template(resource_path_root)
+    sweep = ParameterSweep(path_template, get_sweep_parameters(), fixed_values=get_fixed_values(),
+                           path_work_dir=Path(mkdtemp()))
+    config: LazySumoConfig = next(iter(sweep))
+    config.materialize()
+    assert config.path_config_dir.joinpath('grid.sumo.cfg').exists()
+    assert b'maxSpeed="10.0"' in config.path_config_dir.joinpath('grid.flows.xml').read_bytes()
+    config.cleanup()
+    assert not config.path_config_dir.exists()
+
+
+def test_sweep_job_ids(resource_path_root: Path):
+    path_template = make_wildcard_template(resource_path_root)
+    path_work_dir = Path(mkdtemp())
+    sweep = ParameterSweep(path_template, get_sweep_parameters(), fixed_values=get_fixed_values(),
+                           path_work_dir=path_work_dir)
+    fixed_values = get_fixed_values()
+    fixed_values['grid.flows.xml']['/routes/flows/vType[1]']['minGap'] = 2.0
+    sweep_other = ParameterSweep(path_template, get_sweep_parameters(), fixed_values=fixed_values,
+                                 path_work_dir=path_work_dir)
+    # the same point of the same sweep has the same job-id. Points of other values never share it.
+    assert [c.job_id for c in sweep] == [c.job_id for c in sweep]
+    assert {c.job_id for c in sweep}.isdisjoint({c.job_id for c in sweep_other})
+
+    # a directory left with other values is rendered again.
+    config: LazySumoConfig = next(iter(sweep))
+    config.path_config_dir.mkdir(parents=True)
+    config.path_config_dir.joinpath('grid.sumo.cfg').write_text('<configuration/>')
+    config.path_config_dir.joinpath('grid.flows.xml').write_text('<routes/>')
+    config.materialize()
+    assert b'maxSpeed="10.0"' in config.path_config_dir.joinpath('grid.flows.xml').read_bytes()
+    config.cleanup()
+
+
+def test_local_pipeline_sweep(resource_path_root: Path):
+    path_template = make_wildcard_template(resource_path_root)
+    path_work_dir = Path(mkdtemp())
+    sweep = ParameterSweep(path_template, get_sweep_parameters(), fixed_values=get_fixed_values(),
+                           path_work_dir=path_work_dir)
+    file_handler = LocalFileHandler(path_save_root=Path(mkdtemp()))
+    pipeline = LocalSumoPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                 n_jobs=2,
+                                 file_handler=file_handler)
+    res = pipeline.run_simulation(sweep)
+    assert len(res) == 6
+    for r in res:
+        assert file_handler.get_job_status(r.sumo_config_obj.job_id)[0] == 'finished'
+        assert r.path_output_dir.joinpath('grid_loop.out.xml').exists()
+    # end for
+    # rendered directories are removed after the outputs are saved.
+    assert list(path_work_dir.iterdir()) == []
+
+
+class MaxSpeedCostEstimator(BaseCostEstimator):
+    """Reads the rendered flows file. It fails if the config directory is not rendered."""
+    def estimate(self, sumo_config: SumoConfigObject) -> float:
+        text = sumo_config.path_config_dir.joinpath('grid.flows.xml').read_text()
+        return sum(float(s.split('"')[1]) for s in text.split('maxSpeed=')[1:])
+
+
+def test_local_pipeline_sweep_lpt(resource_path_root: Path):
+    path_template = make_wildcard_template(resource_path_root)
+    path_work_dir = Path(mkdtemp())
+    sweep = ParameterSweep(path_template, get_sweep_parameters(), fixed_values=get_fixed_values(),
+                           path_work_dir=path_work_dir)
+    pipeline = LocalSumoPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                 file_handler=LocalFileHandler(path_save_root=Path(mkdtemp())),
+                                 scheduler=LptScheduler(MaxSpeedCostEstimator()))
+    seq_ordered = pipeline.order_jobs(list(sweep))
+    seq_costs = [sum(conf.parameters.values()) for conf in seq_ordered]
+    assert seq_costs == sorted(seq_costs, reverse=True) and seq_costs[0] > seq_costs[-1]
+    # directories rendered for the estimation are removed.
+    assert list(path_work_dir.iterdir()) == []
+    assert len(pipeline.run_simulation(sweep)) == 6
+
+
+if __name__ == '__main__':
+    test_parameter_sweep_designs(Path('./resources'))
+    test_lazy_sumo_config(Path('./resources'))
+    test_sweep_job_ids(Path('./resources'))
+    test_local_pipeline_sweep(Path('./resources'))
@@ -0,0 +1,56 @@
+import json
+import time
+from pathlib import Path
+from tempfile import mkdtemp
+
+from sumo_tasks_pipeline.trace_module import StageTracer, trace_stage
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+from sumo_tasks_pipeline.file_handler import LocalFileHandler
+from sumo_tasks_pipeline.pipeline.pipeline import LocalSumoPipeline
+
+
+def test_stage_tracer(tmp_path: Path):
+    tracer = StageTracer(path_trace_dir=tmp_path, is_trace_memory=True)
+    tracer.start_run()
+    for i in range(4):
+        with tracer.stage('copy_config', f'job-{i}'):
+            __ = [0] * 100000
+        # end with
+        tracer.record('sumo_run', f'job-{i}', duration=0.1 * (i + 1))
+    # end for
+    with trace_stage(None, 'nothing'):
+        time.sleep(0.01)
+    # end with
+    summary = tracer.summarize()
+    assert summary.loc['copy_config', 'count'] == 4
+    assert summary.loc['copy_config', 'memory_peak_bytes'] > 100000 * 8
+    assert abs(summary.loc['sumo_run', 'p50_seconds'] - 0.25) < 1e-9
+    assert abs(summary.loc['sumo_run', 'p95_seconds'] - 0.385) < 1e-9
+
+    path_trace_file = tracer.finish_run()
+    trace = json.loads(path_trace_file.read_text())
+    seq_spans = [e for e in trace['traceEvents'] if e['ph'] == 'X']
+    assert len(seq_spans) == 8
+    assert {e['tid'] for e in seq_spans} == {1, 2, 3, 4}
+    assert {e['args']['name'] for e in trace['traceEvents'] if e['ph'] == 'M'} == \
+        {'run', 'job-0', 'job-1', 'job-2', 'job-3'}
+
+
+def test_local_pipeline_trace(resource_path_root: Path, tmp_path: Path):
+    pipeline = LocalSumoPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                 file_handler=LocalFileHandler(path_save_root=Path(mkdtemp())),
+                                 tracer=StageTracer(path_trace_dir=tmp_path))
+    sumo_configs = [SumoConfigObject(scenario_name=f'test-trace-{i}',
+                                     path_config_dir=resource_path_root.joinpath('config_complete'),
+                                     config_name='grid.sumo.cfg') for i in range(2)]
+    pipeline.run_simulation(sumo_configs)
+    seq_trace_files = list(tmp_path.glob('trace-*.json'))
+    assert len(seq_trace_files) == 1
+    trace = json.loads(seq_trace_files[0].read_text())
+    set_stages = {e['name'] for e in trace['traceEvents'] if e['ph'] == 'X'}
+    assert {'job_status', 'start_job', 'copy_config', 'sumo_run', 'pack_sumo_result', 'save_file', 'end_job'} \
+        <= set_stages
+
+
+if __name__ == '__main__':
+    test_stage_tracer(Path(mkdtemp()))
@@ -0,0 +1,73 @@
+import shutil
+from pathlib import Path
+from tempfile import mkdtemp
+
+from lxml import etree
+
+from sumo_tasks_pipeline import warmup_module
+from sumo_tasks_pipeline.warmup_module import WarmupStateCache, NAME_STATE_FILE
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+from sumo_tasks_pipeline.file_handler import LocalFileHandler
+from sumo_tasks_pipeline.pipeline.pipeline import LocalSumoPipeline
+
+
+def test_prepare_apply(resource_path_root: Path, tmp_path: Path):
+    sumo_command = str(resource_path_root.joinpath('fake_sumo.py'))
+    path_base_config_file = resource_path_root.joinpath('config_complete/grid.sumo.cfg')
+    warmup_cache = WarmupStateCache(path_base_config_file,
+                                    warmup_seconds=1800,
+                                    path_cache_root=tmp_path.joinpath('cache'))
+    path_state_file = warmup_cache.prepare(sumo_command, sumo_version='1.9.1')
+    assert path_state_file.exists()
+    assert path_state_file.parent.name == warmup_cache.get_key('1.9.1')
+    assert len(list(tmp_path.joinpath('cache').iterdir())) == 1
+    # the second call takes the state from the cache.
+    path_state_file.write_text('<snapshot time="1800.00" cached="true"/>\n')
+    assert warmup_cache.prepare(sumo_command, sumo_version='1.9.1').read_text().find('cached') > 0
+    assert warmup_cache.get_key('1.10.0') != warmup_cache.get_key('1.9.1')
+
+    path_staged_dir = tmp_path.joinpath('staged')
+    shutil.copytree(path_base_config_file.parent, path_staged_dir)
+    sumo_config = SumoConfigObject(scenario_name='test', path_config_dir=path_staged_dir, config_name='grid.sumo.cfg',
+                                   path_config_dir_original=path_base_config_file.parent)
+    warmup_cache.apply(sumo_config)
+    root = etree.parse(str(path_staged_dir.joinpath('grid.sumo.cfg'))).getroot()
+    assert root.find('input/load-state').attrib['value'] == NAME_STATE_FILE
+    assert float(root.find('time/begin').attrib['value']) == 1800
+    assert path_staged_dir.joinpath(NAME_STATE_FILE).exists()
+    # the base config is not touched.
+    assert etree.parse(str(path_base_config_file)).getroot().find('input/load-state') is None
+
+
+def test_get_key_once(resource_path_root: Path, tmp_path: Path, monkeypatch):
+    seq_calls = []
+
+    def compute_cache_key(*args):
+        seq_calls.append(args)
+        return 'key'
+
+    monkeypatch.setattr(warmup_module, 'compute_cache_key', compute_cache_key)
+    warmup_cache = WarmupStateCache(resource_path_root.joinpath('config_complete/grid.sumo.cfg'),
+                                    warmup_seconds=1800,
+                                    path_cache_root=tmp_path.joinpath('cache'))
+    # inputs of the base config are hashed once, not per job.
+    assert [warmup_cache.get_key('1.9.1') for __ in range(3)] == ['key-1800'] * 3
+    assert len(seq_calls) == 1
+
+
+def test_local_pipeline_warmup(resource_path_root: Path, tmp_path: Path):
+    path_config_dir = resource_path_root.joinpath('config_complete')
+    pipeline = LocalSumoPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                 file_handler=LocalFileHandler(path_save_root=Path(mkdtemp())),
+                                 warmup_cache=WarmupStateCache(path_config_dir.joinpath('grid.sumo.cfg'),
+                                                               warmup_seconds=1800,
+                                                               path_cache_root=tmp_path))
+    sumo_configs = [SumoConfigObject(scenario_name=f'test-warmup-{i}', path_config_dir=path_config_dir,
+                                     config_name='grid.sumo.cfg') for i in range(2)]
+    res = pipeline.run_simulation(sumo_configs)
+    assert len(res) == 2
+    assert all('Loading state from' in r.log_message for r in res)
+
+
+if __name__ == '__main__':
+    test_local_pipeline_warmup(Path('./resources'), Path(mkdtemp()))
@@ -0,0 +1,120 @@
+import json
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from tempfile import mkdtemp
+
+from sumo_tasks_pipeline import cli
+from sumo_tasks_pipeline.commons.sumo_config_obj import SumoConfigObject
+from sumo_tasks_pipeline.file_handler import LocalFileHandler
+from sumo_tasks_pipeline.pipeline.pipeline import LocalSumoPipeline
+from sumo_tasks_pipeline.work_queue_module import run_worker
+
+
+def test_local_lease(tmp_path: Path):
+    file_handler = LocalFileHandler(path_save_root=tmp_path)
+    lease_a = file_handler.claim_job('job', 'worker-a', lease_seconds=0.5)
+    assert lease_a is not None and lease_a.generation == 0
+    assert file_handler.claim_job('job', 'worker-b', lease_seconds=0.5) is None
+    lease_a = file_handler.renew_lease(lease_a, lease_seconds=0.5)
+    assert lease_a.generation == 1
+    # the lease of a silent worker expires and the job is taken over.
+    time.sleep(0.6)
+    lease_b = file_handler.claim_job('job', 'worker-b', lease_seconds=10)
+    assert lease_b is not None and lease_b.worker_id == 'worker-b'
+    assert file_handler.renew_lease(lease_a, lease_seconds=10) is None
+    assert file_handler.release_lease(lease_b)
+    assert file_handler.read_lease('job').is_released
+    assert file_handler.claim_job('job', 'worker-a', lease_seconds=10) is not None
+
+
+def test_local_lease_race(tmp_path: Path):
+    file_handler = LocalFileHandler(path_save_root=tmp_path)
+    with ThreadPoolExecutor(8) as pool:
+        seq_leases = list(pool.map(lambda i: file_handler.claim_job('job', f'worker-{i}', 10), range(32)))
+    # end with
+    assert len([lease for lease in seq_leases if lease is not None]) == 1
+
+
+
+def test_local_lease_empty_file(tmp_path: Path):
+    file_handler = LocalFileHandler(path_save_root=tmp_path, lease_grace_seconds=0.5)
+    # a claim whose content is not renamed into the lease file yet, Ex. by a slow writer on NFS.
+    path_lease_dir = file_handler.get_lease_dir('job')
+    path_lease_dir.mkdir(parents=True)
+    path_lease_dir.joinpath(f'{0:010d}.json').touch()
+    assert file_handler.read_lease('job').is_held()
+    assert file_handler.claim_job('job', 'worker-b', lease_seconds=10) is None
+    # the writer died. The lease expires after the grace period.
+    time.sleep(0.6)
+    lease_b = file_handler.claim_job('job', 'worker-b', lease_seconds=10)
+    assert lease_b is not None and lease_b.generation == 1
+
+def test_run_worker(resource_path_root: Path, tmp_path: Path):
+    prefix = f'test-queue-{uuid.uuid4().hex[:8]}'
+    sumo_configs = [SumoConfigObject(scenario_name=f'{prefix}-{i}',
+                                     path_config_dir=resource_path_root.joinpath('config_complete'),
+                                     config_name='grid.sumo.cfg') for i in range(6)]
+
+    def work(worker_id: str):
+        pipeline = LocalSumoPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                     file_handler=LocalFileHandler(path_save_root=tmp_path))
+        return run_worker(pipeline, sumo_configs, worker_id=worker_id, lease_seconds=10, interval_wait=0.1)
+
+    with ThreadPoolExecutor(2) as pool:
+        seq_results = list(pool.map(work, ['worker-a', 'worker-b']))
+    # end with
+    seq_job_ids = [r.sumo_config_obj.job_id for results in seq_results for r in results]
+    # every job runs once in one of the workers.
+    assert sorted(seq_job_ids) == sorted(conf.job_id for conf in sumo_configs)
+    d_statuses = LocalFileHandler(path_save_root=tmp_path).get_job_statuses(seq_job_ids)
+    assert all(status == 'finished' for status, __ in d_statuses.values())
+
+
+def test_run_worker_take_over_saved_job(resource_path_root: Path, tmp_path: Path):
+    prefix = f'test-takeover-{uuid.uuid4().hex[:8]}'
+
+    def create_configs():
+        return [SumoConfigObject(scenario_name=f'{prefix}-{i}',
+                                 path_config_dir=resource_path_root.joinpath('config_complete'),
+                                 config_name='grid.sumo.cfg') for i in range(2)]
+
+    def work(worker_id: str):
+        pipeline = LocalSumoPipeline(sumo_command=str(resource_path_root.joinpath('fake_sumo.py')),
+                                     file_handler=LocalFileHandler(path_save_root=tmp_path))
+        return pipeline, run_worker(pipeline, create_configs(), worker_id=worker_id, lease_seconds=10,
+                                    interval_wait=0.1)
+
+    work('worker-a')
+    # worker-a was preempted after saving outputs of a job, before the job was marked finished.
+    job_id = f'{prefix}-0'
+    file_handler = LocalFileHandler(path_save_root=tmp_path)
+    file_handler.start_job(job_id)
+    assert tmp_path.joinpath('pipeline-output', job_id).exists()
+
+    pipeline, seq_results = work('worker-b')
+    assert [r.sumo_config_obj.job_id for r in seq_results] == [job_id]
+    assert len(pipeline.failed_job_ids) == 0
+    assert file_handler.get_job_status(job_id)[0] == 'finished'
+    assert {p.name for p in tmp_path.joinpath('pipeline-output').iterdir()} == {f'{prefix}-0', f'{prefix}-1'}
+
+
+def test_cli_worker(resource_path_root: Path, tmp_path: Path):
+    path_jobs = tmp_path.joinpath('jobs.jsonl')
+    prefix = f'test-cli-{uuid.uuid4().hex[:8]}'
+    with path_jobs.open('w') as f:
+        for i in range(2):
+            f.write(json.dumps({'scenario_name': f'{prefix}-{i}',
+                                'path_config_dir': str(resource_path_root.joinpath('config_complete')),
+                                'config_name': 'grid.sumo.cfg'}) + '\n')
+        # end for
+    # end with
+    path_save_root = tmp_path.joinpath('outputs')
+    assert cli.main(['worker', '--jobs', str(path_jobs), '--path-save-root', str(path_save_root),
+                     '--sumo-command', str(resource_path_root.joinpath('fake_sumo.py'))]) == 0
+    assert {p.name for p in path_save_root.joinpath('pipeline-output').iterdir()} == {f'{prefix}-0', f'{prefix}-1'}
+
+
+if __name__ == '__main__':
+    test_local_lease(Path(mkdtemp()))